@@ -42,7 +42,7 @@ This module defines constants, basic classes and methods for pelicun.
 
 """
 
-import os, sys, time
+import os, sys, time, json
 import warnings
 from datetime import datetime
 from time import strftime
@@ -117,44 +117,537 @@ def log_msg(msg='', prepend_timestamp=True):
         with open(globals()['log_file'], 'a') as f:
             f.write('\n'+formatted_msg)
 
-def describe(df):
+def _weighted_percentile(vals, weights, q):
+    """
+    Estimate percentiles of the columns of a 2D array of weighted samples.
+
+    NaN values are ignored. The percentiles are interpolated from the
+    empirical CDF defined by the normalized cumulative weights.
+
+    """
+    q = np.asarray(q) / 100.
+    res = np.full((len(q), vals.shape[1]), np.nan)
+
+    for c_i in range(vals.shape[1]):
+        v_i = vals[:, c_i]
+        ok = ~np.isnan(v_i)
+        w_i = weights[ok]
+        if (np.sum(ok) > 0) and (np.sum(w_i) > 0.):
+            sorter = np.argsort(v_i[ok])
+            v_i = v_i[ok][sorter]
+            w_i = w_i[sorter]
+            cdf = (np.cumsum(w_i) - 0.5 * w_i) / np.sum(w_i)
+            res[:, c_i] = np.interp(q, cdf, v_i)
+
+    return res
+
+class StatsAccumulator(object):
+    """
+    Mergeable summary statistics of realizations.
+
+    The accumulator collects the count, mean, standard deviation, minimum,
+    maximum and percentiles of every column of a set of realizations that are
+    provided in one or more chunks. Accumulators that describe different
+    subsets of the same set of realizations (e.g., chunks of a large sample,
+    parallel shards or stripes) can be merged and the merged accumulator
+    describes the union of those subsets.
+
+    The moments are collected with a weighted version of Welford's algorithm
+    and are exact irrespective of how the realizations are partitioned.
+    Percentiles are either calculated exactly from the stored realizations or
+    estimated from a t-digest sketch that keeps a bounded number of centroids
+    per column. The sketch is accurate in the tails and its resolution is
+    controlled by the compression parameter.
+
+    Parameters
+    ----------
+    exact: bool, default: True
+        If True, the realizations are stored and the percentiles are exact.
+        Otherwise, the percentiles are estimated from a t-digest sketch and
+        the memory footprint does not depend on the number of realizations.
+    compression: float, default: 500.
+        Compression parameter of the t-digest. The sketch keeps about
+        compression/2 centroids per column; larger values provide more
+        accurate percentiles. Only used if exact is False.
+
+    """
+
+    def __init__(self, exact=True, compression=500.):
+
+        self.exact = exact
+        self.compression = float(compression)
+
+        self.columns = None
+        self._weighted = False
+
+        self._count = None
+        self._W = None
+        self._mean = None
+        self._M2 = None
+        self._min = None
+        self._max = None
+
+        # exact: chunks of realizations and their weights
+        self._values = []
+        self._weights = []
+
+        # sketch: centroid means and weights for each column
+        self._centroids = None
+
+    def _init_columns(self, columns, labeled=True):
+
+        if self.columns is None:
+            self.columns = columns
+
+            n_cols = len(columns)
+            self._count = np.zeros(n_cols, dtype=np.int64)
+            self._W = np.zeros(n_cols)
+            self._mean = np.zeros(n_cols)
+            self._M2 = np.zeros(n_cols)
+            self._min = np.full(n_cols, np.inf)
+            self._max = np.full(n_cols, -np.inf)
+
+            if not self.exact:
+                self._centroids = [(np.zeros(0), np.zeros(0))
+                                   for c_i in range(n_cols)]
+
+        elif len(columns) != len(self.columns):
+            raise ValueError(
+                'The number of columns ({}) does not match the number of '
+                'columns in the accumulator ({}).'.format(
+                    len(columns), len(self.columns)))
+
+        # arrays have no labels, only their shape is checked
+        elif labeled and not columns.equals(self.columns):
+            raise ValueError(
+                'The column labels do not match the labels in the '
+                'accumulator.')
+
+    def _merge_moments(self, count, W, mean, M2, min_val, max_val):
+
+        W_a, W_b = self._W, W
+        W_tot = W_a + W_b
+        delta = mean - self._mean
 
-    if isinstance(df, (pd.Series, pd.DataFrame)):
-        vals = df.values
-        if isinstance(df, pd.DataFrame):
-            cols = df.columns
-        elif df.name is not None:
-            cols = df.name
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_tot = self._mean + delta * W_b / W_tot
+            M2_tot = self._M2 + M2 + delta ** 2. * W_a * W_b / W_tot
+
+        # keep the results exact when one of the sides is empty
+        self._mean = np.where(W_a == 0., mean,
+                              np.where(W_b == 0., self._mean, mean_tot))
+        self._M2 = np.where(W_a == 0., M2,
+                            np.where(W_b == 0., self._M2, M2_tot))
+        self._W = W_tot
+        self._count = self._count + count
+        self._min = np.minimum(self._min, min_val)
+        self._max = np.maximum(self._max, max_val)
+
+    def _compress(self, means, weights):
+        """
+        Merge the centroids of a column following the k1 scale of t-digest.
+
+        """
+        keep = weights > 0.
+        means, weights = means[keep], weights[keep]
+
+        if len(means) == 0:
+            return means, weights
+
+        sorter = np.argsort(means)
+        means, weights = means[sorter], weights[sorter]
+
+        q_mid = (np.cumsum(weights) - 0.5 * weights) / np.sum(weights)
+        k = (self.compression / (2. * np.pi) *
+             np.arcsin(np.clip(2. * q_mid - 1., -1., 1.)))
+        k_bin = np.floor(k)
+
+        # consecutive centroids in the same unit interval of k are merged
+        group = np.cumsum(np.r_[True, k_bin[1:] != k_bin[:-1]]) - 1
+        if group[-1] + 1 == len(means):
+            return means, weights
+
+        new_weights = np.bincount(group, weights=weights)
+        new_means = np.bincount(group, weights=weights * means) / new_weights
+
+        return new_means, new_weights
+
+    def _summarize(self, vals):
+        """
+        Centroids of unweighted realizations of a column.
+
+        The ranks that separate the centroids follow from the k1 scale, hence
+        the realizations only need to be partitioned at those ranks instead
+        of being sorted.
+
+        """
+        n = len(vals)
+        if n < 2:
+            return vals, np.ones(n)
+
+        k_lim = self.compression / 4.
+        k_j = np.arange(np.floor(-k_lim) + 1., np.floor(k_lim) + 1.)
+        q_j = (np.sin(2. * np.pi * k_j / self.compression) + 1.) / 2.
+        starts = np.unique(np.clip(np.ceil(n * q_j - 0.5), 1, n - 1)).astype(
+            np.int64)
+
+        if len(starts) >= n - 1:
+            return np.sort(vals), np.ones(n)
+
+        bounds = np.r_[0, starts]
+        weights = np.diff(np.r_[bounds, n]).astype(np.float64)
+        means = np.add.reduceat(np.partition(vals, starts), bounds) / weights
+
+        return means, weights
+
+    def _consolidate(self):
+        """
+        Replace the stored chunks of an exact accumulator with a single chunk.
+
+        The moments are recalculated in one pass over all realizations. This
+        makes the statistics independent of how the realizations were
+        partitioned, including the rounding of the last digits.
+
+        """
+        if len(self._values) > 1:
+            columns, weighted = self.columns, self._weighted
+
+            vals = np.concatenate(self._values, axis=0)
+            weights = np.concatenate(self._weights)
+
+            self.__init__(exact=True, compression=self.compression)
+            self.update(vals, weights=weights)
+
+            self.columns, self._weighted = columns, weighted
+
+    def update(self, data, weights=None):
+        """
+        Add a chunk of realizations to the accumulator.
+
+        Parameters
+        ----------
+        data: DataFrame, Series or ndarray
+            Realizations; rows correspond to realizations and columns to the
+            described quantities. NaN values are ignored.
+        weights: float ndarray, optional, default: None
+            Weights of the realizations, e.g., likelihood ratios from
+            importance sampling. Unweighted realizations have unit weight.
+
+        Returns
+        -------
+        self: StatsAccumulator
+        """
+        labeled = isinstance(data, (pd.DataFrame, pd.Series))
+        if isinstance(data, pd.DataFrame):
+            columns = data.columns
+            vals = data.values
+        elif isinstance(data, pd.Series):
+            columns = pd.Index([0 if data.name is None else data.name])
+            vals = data.values
         else:
-            cols = 0
-    else:
-        vals = df
-        cols = np.arange(vals.shape[1]) if vals.ndim > 1 else 0
-
-    if vals.ndim == 1:
-        df_10, df_50, df_90 = np.nanpercentile(vals, [10, 50, 90])
-        desc = pd.Series({
-            'count': np.sum(~np.isnan(vals)),
-            'mean': np.nanmean(vals),
-            'std': np.nanstd(vals),
-            'min': np.nanmin(vals),
-            '10%': df_10,
-            '50%': df_50,
-            '90%': df_90,
-            'max': np.nanmax(vals),
-        }, name=cols)
-    else:
-        df_10, df_50, df_90 = np.nanpercentile(vals, [10, 50, 90], axis=0)
-        desc = pd.DataFrame({
-            'count': np.sum(~np.isnan(vals), axis=0),
-            'mean': np.nanmean(vals, axis=0),
-            'std': np.nanstd(vals, axis=0),
-            'min': np.nanmin(vals, axis=0),
-            '10%': df_10,
-            '50%': df_50,
-            '90%': df_90,
-            'max': np.nanmax(vals, axis=0),
-        }, index=cols).T
+            vals = np.asarray(data)
+            columns = pd.RangeIndex(vals.shape[1] if vals.ndim > 1 else 1)
+
+        vals = np.asarray(vals, dtype=np.float64)
+        if vals.ndim == 1:
+            vals = vals.reshape(-1, 1)
+
+        self._init_columns(columns, labeled=labeled)
+
+        if weights is None:
+            weights = np.ones(vals.shape[0])
+        else:
+            weights = np.asarray(weights, dtype=np.float64)
+            self._weighted = True
+
+        # weights of missing values are ignored
+        missing = np.isnan(vals)
+        W = np.where(missing, 0., weights.reshape(-1, 1))
+        vals_0 = np.where(missing, 0., vals)
+
+        W_sum = np.sum(W, axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.sum(W * vals_0, axis=0) / W_sum
+        mean = np.where(W_sum > 0., mean, 0.)
+        M2 = np.sum(W * (vals_0 - mean) ** 2., axis=0)
+
+        self._merge_moments(
+            np.sum(~missing, axis=0), W_sum, mean, M2,
+            np.min(np.where(missing, np.inf, vals), axis=0, initial=np.inf),
+            np.max(np.where(missing, -np.inf, vals), axis=0, initial=-np.inf))
+
+        if self.exact:
+            self._values.append(vals)
+            self._weights.append(weights)
+        else:
+            # the chunk is summarized before it is merged with the sketch
+            unit_weights = not np.any(weights != 1.)
+
+            for c_i, (c_means, c_weights) in enumerate(self._centroids):
+                ok = ~missing[:, c_i]
+                if unit_weights:
+                    chunk = self._summarize(vals[ok, c_i])
+                else:
+                    chunk = self._compress(vals[ok, c_i], weights[ok])
+
+                self._centroids[c_i] = self._compress(
+                    np.concatenate([c_means, chunk[0]]),
+                    np.concatenate([c_weights, chunk[1]]))
+
+        return self
+
+    def merge(self, other):
+        """
+        Add the realizations described by another accumulator.
+
+        Parameters
+        ----------
+        other: StatsAccumulator
+            Accumulator with the same column labels and the same type of
+            percentile estimate (exact or sketch).
+
+        Returns
+        -------
+        self: StatsAccumulator
+        """
+        if other.columns is None:
+            return self
+
+        if other.exact != self.exact:
+            raise ValueError(
+                'Exact and approximate statistics cannot be merged.')
+
+        self._init_columns(other.columns)
+        self._weighted = self._weighted or other._weighted
+
+        self._merge_moments(other._count, other._W, other._mean, other._M2,
+                            other._min, other._max)
+
+        if self.exact:
+            self._values += other._values
+            self._weights += other._weights
+        else:
+            self._centroids = [
+                self._compress(np.concatenate([m_a, m_b]),
+                               np.concatenate([w_a, w_b]))
+                for (m_a, w_a), (m_b, w_b)
+                in zip(self._centroids, other._centroids)]
+
+        return self
+
+    def percentiles(self, q):
+        """
+        Percentiles of the realizations in each column.
+
+        Unweighted percentiles are interpolated linearly between the ordered
+        realizations (as in np.percentile). Weighted percentiles are
+        interpolated from the empirical CDF defined by the normalized
+        cumulative weights.
+
+        Parameters
+        ----------
+        q: float or list of floats
+            Percentiles in the [0, 100] range.
+
+        Returns
+        -------
+        res: ndarray
+            Percentiles of each column; rows correspond to the elements in q.
+        """
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+
+        if self.exact:
+            vals = np.concatenate(self._values, axis=0)
+
+            if vals.shape[0] == 0:
+                return np.full((len(q), vals.shape[1]), np.nan)
+
+            if not self._weighted:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', category=RuntimeWarning)
+                    return np.nanpercentile(vals, q, axis=0).reshape(
+                        len(q), vals.shape[1])
+
+            return _weighted_percentile(vals, np.concatenate(self._weights), q)
+
+        res = np.full((len(q), len(self.columns)), np.nan)
+        for c_i, (means, weights) in enumerate(self._centroids):
+            if len(means) == 0:
+                continue
+
+            cum_W = np.cumsum(weights)
+            if self._weighted:
+                pos = (cum_W - 0.5 * weights) / cum_W[-1]
+            else:
+                # rank of the center of each centroid
+                pos = (cum_W - 0.5 * (weights + 1.)) / max(cum_W[-1] - 1., 1.)
+
+            res[:, c_i] = np.interp(
+                q / 100., np.r_[0., pos, 1.],
+                np.r_[self._min[c_i], means, self._max[c_i]])
+
+        return res
+
+    def describe(self, percentiles=(10, 50, 90)):
+        """
+        Summary statistics of the realizations in the accumulator.
+
+        Parameters
+        ----------
+        percentiles: list of floats, default: (10, 50, 90)
+            Percentiles to include in the summary.
+
+        Returns
+        -------
+        desc: DataFrame
+            count, mean, std, min, the requested percentiles and max of each
+            column.
+        """
+        if self.columns is None:
+            raise ValueError('The accumulator does not have any realizations.')
+
+        if self.exact:
+            self._consolidate()
+
+        empty = self._W <= 0.
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(self._M2 / self._W)
+
+        desc_data = [
+            ('count', self._count),
+            ('mean', np.where(empty, np.nan, self._mean)),
+            ('std', np.where(empty, np.nan, std)),
+            ('min', np.where(self._count > 0, self._min, np.nan))]
+        desc_data += [('{:g}%'.format(q_i), q_vals) for q_i, q_vals
+                      in zip(percentiles, self.percentiles(percentiles))]
+        desc_data += [
+            ('max', np.where(self._count > 0, self._max, np.nan))]
+
+        return pd.DataFrame(dict(desc_data), index=self.columns).T
+
+    def save(self, filepath):
+        """
+        Save the state of the accumulator in a numpy (npz) file.
+
+        Parameters
+        ----------
+        filepath: string
+            Location of the file.
+        """
+        if isinstance(self.columns, pd.MultiIndex):
+            columns = [list(col) for col in self.columns]
+        elif self.columns is None:
+            columns = None
+        else:
+            columns = list(self.columns)
+
+        meta = {
+            'exact': self.exact,
+            'compression': self.compression,
+            'weighted': self._weighted,
+            'columns': columns,
+            'multi_index': isinstance(self.columns, pd.MultiIndex),
+            'column_names': None if self.columns is None else list(
+                self.columns.names)
+        }
+
+        data = {'meta': np.array(json.dumps(meta, default=str))}
+
+        if self.columns is not None:
+            data.update({
+                'count': self._count, 'W': self._W, 'mean': self._mean,
+                'M2': self._M2, 'min': self._min, 'max': self._max})
+
+            if self.exact:
+                data.update({
+                    'values': np.concatenate(self._values, axis=0),
+                    'weights': np.concatenate(self._weights)})
+            else:
+                data.update({
+                    'centroid_sizes': np.array(
+                        [len(m) for m, w in self._centroids], dtype=np.int64),
+                    'centroid_means': np.concatenate(
+                        [m for m, w in self._centroids]),
+                    'centroid_weights': np.concatenate(
+                        [w for m, w in self._centroids])})
+
+        with open(filepath, 'wb') as f:
+            np.savez(f, **data)
+
+    @classmethod
+    def load(cls, filepath):
+        """
+        Load an accumulator from a file created by StatsAccumulator.save.
+
+        Parameters
+        ----------
+        filepath: string
+            Location of the file.
+
+        Returns
+        -------
+        acc: StatsAccumulator
+        """
+        with np.load(filepath, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+
+            acc = cls(exact=meta['exact'], compression=meta['compression'])
+            acc._weighted = meta['weighted']
+
+            if meta['columns'] is None:
+                return acc
+
+            if meta['multi_index']:
+                acc.columns = pd.MultiIndex.from_tuples(
+                    [tuple(col) for col in meta['columns']],
+                    names=meta['column_names'])
+            else:
+                acc.columns = pd.Index(meta['columns'],
+                                       name=meta['column_names'][0])
+
+            acc._count = data['count']
+            acc._W = data['W']
+            acc._mean = data['mean']
+            acc._M2 = data['M2']
+            acc._min = data['min']
+            acc._max = data['max']
+
+            if acc.exact:
+                acc._values = [data['values']]
+                acc._weights = [data['weights']]
+            else:
+                bounds = np.cumsum(data['centroid_sizes'])[:-1]
+                acc._centroids = list(zip(
+                    np.split(data['centroid_means'], bounds),
+                    np.split(data['centroid_weights'], bounds)))
+
+        return acc
+
+def describe(df, weights=None):
+    """
+    Describe the samples in a DataFrame, Series or array.
+
+    Parameters
+    ----------
+    df: DataFrame, Series or ndarray
+        Samples to describe. Rows correspond to realizations.
+    weights: float ndarray, optional, default: None
+        Weights of the realizations, e.g., likelihood ratios from importance
+        sampling. When provided, the mean, standard deviation and percentiles
+        are weighted statistics. The weights do not need to be normalized.
+
+    Returns
+    -------
+    desc: Series or DataFrame
+        count, mean, std, min, 10%, 50%, 90% and max of the samples.
+    """
+
+    desc = StatsAccumulator(exact=True).update(df, weights=weights).describe()
+
+    # one-dimensional samples are described by a Series
+    if isinstance(df, pd.Series) or (
+        (not isinstance(df, pd.DataFrame)) and (np.ndim(df) == 1)):
+        desc = desc.iloc[:, 0]
 
     return desc
 
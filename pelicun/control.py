@@ -56,15 +56,109 @@ from .uq import *
 from .model import *
 from .file_io import *
 
+from . import __version__ as pelicun_version
+
+import pickle, hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+# version of the compiled loss model format; increase it whenever a change in
+# the Assessment classes makes earlier compiled models incompatible
+COMPILED_MODEL_VERSION = 4
 
 class Assessment(object):
     """
     A high-level class that collects features common to all supported loss
     assessment methods. This class will only rarely be called directly when
     using pelicun.
+
+    Parameters
+    ----------
+    log_file: boolean, default: True
+        If True, the log is saved in pelicun_log.txt.
+    n_threads: int, default: 1
+        Number of threads used to evaluate the Fragility Groups in the damage
+        and loss calculations. Fragility Groups are independent, hence they
+        can be evaluated concurrently. The results do not depend on the number
+        of threads.
     """
 
-    def __init__(self, log_file=True):
+    # stages of the calculation in the order of evaluation; each stage is
+    # listed with the stages whose results it uses and the result attributes
+    # it writes
+    _stages = [
+        ('define_random_variables', [],
+         ['_RV_dict', '_W', '_EDP_target_RV']),
+        ('define_loss_model', ['define_random_variables'],
+         ['_FG_dict', '_EDP_dict', '_DS_columns']),
+        # the damage depends on the fragilities in the loss model, but not on
+        # its consequence functions
+        ('calculate_damage', ['define_random_variables'],
+         ['_TIME', '_POP', '_COL', '_ID_dict', '_DMG']),
+        ('calculate_losses', ['define_random_variables', 'define_loss_model',
+                              'calculate_damage'],
+         ['_DV_dict', '_COL', '_ID_dict']),
+        ('aggregate_results', ['calculate_losses'],
+         ['_SUMMARY', '_DMG', '_DV_dict', '_ID_dict']),
+    ]
+
+    # input sections (see _input_sections) that each stage depends on
+    _stage_inputs = {
+        'define_random_variables': [
+            'response', 'fragilities', 'consequences', 'decision_variables',
+            'general'],
+        'define_loss_model': [
+            'response', 'fragilities', 'consequences', 'decision_variables',
+            'general', 'consequence_medians'],
+        'calculate_damage': [
+            'response', 'fragilities', 'consequences', 'decision_variables',
+            'general', 'population'],
+        'calculate_losses': [
+            'response', 'fragilities', 'consequences', 'decision_variables',
+            'general', 'consequence_medians', 'population', 'loss_parameters'],
+        'aggregate_results': [
+            'response', 'fragilities', 'consequences', 'decision_variables',
+            'general', 'consequence_medians', 'population', 'loss_parameters',
+            'replacement'],
+    }
+
+    # cost model of the stages used by estimate_resources; the runtime (s)
+    # and the memory allocated during the stage (bytes) are linear in the
+    # work units of the model (see _model_dimensions); the retained memory is
+    # the part of the allocated memory that the results of the stage keep
+    # after it. The coefficients were calibrated with the synthetic FEMA P58
+    # buildings of tools/benchmark.py on a desktop machine.
+    _resource_model = {
+        'define_random_variables': {
+            'time': {'base': 0.307, 'matrix_entries': 5.16e-06,
+                     'sample_values': 2.49e-06, 'truncated_values': 2.91e-05,
+                     'EDP_values': 3.07e-05},
+            'memory': {'matrix_entries': 22.4, 'sample_values': 7.41,
+                       'realizations': 96.7},
+            'retained': {'sample_values': 8.}},
+        'define_loss_model': {
+            'time': {'base': 0.000212, 'DS_columns': 3.07e-05},
+            'memory': {'DS_columns': 3600.},
+            'retained': {}},
+        'calculate_damage': {
+            'time': {'base': 0.00252, 'PGs': 0., 'CSGs': 0.0109,
+                     'DS_values': 4.74e-07},
+            'memory': {'DS_values': 26.1, 'realizations': 75.4},
+            'retained': {'DS_values': 8.}},
+        'calculate_losses': {
+            'time': {'base': 0.0329, 'PGs': 0.0113, 'DV_values': 1.51e-07},
+            'memory': {'DV_values': 13., 'realizations': 79.4},
+            'retained': {'DV_values': 8.}},
+        'aggregate_results': {
+            'time': {'base': 0.00218, 'DV_values': 4.06e-09},
+            'memory': {'DV_values': 1.9, 'realizations': 156.},
+            'retained': {}},
+        'save_outputs': {
+            'time': {'base': 0.0827, 'DV_values': 1.17e-06},
+            'memory': {'DV_values': 31.6, 'realizations': 971.},
+            'retained': {}},
+    }
+
+    def __init__(self, log_file=True, n_threads=1):
 
         # initialize the basic data containers
         # inputs
@@ -77,6 +171,10 @@ class Assessment(object):
         self._RV_dict = None # dictionary to store random variables
         self._EDP_dict = None
         self._FG_dict = None
+        self._DS_columns = None # positions of the damage state columns
+        self._EDP_target_RV = None # EDP distribution under importance sampling
+        self._screening = None # probability bound for damage screening
+        self._FG_screened = {} # inputs of the screened Fragility Groups
 
         # results
         self._TIME = None
@@ -86,8 +184,21 @@ class Assessment(object):
         self._DMG = None
         self._DV_dict = None
         self._SUMMARY = None
+        self._W = None # realization weights (likelihood ratios)
+        self._stats = None # mergeable statistics of the saved results
+        self._shard = None # the subset of realizations in a sharded run
+        self._crn = None # common random numbers for building-side RVs
+        self._precision = np.float64 # dtype of the samples and results
+        self._stage_records = None # inputs and results of evaluated stages
+        self._recalculating = False
 
         self._assessment_type = 'generic'
+        self._compiled = False # True if loaded from a compiled loss model
+
+        if int(n_threads) < 1:
+            raise ValueError(
+                'The number of threads shall be a positive integer.')
+        self._n_threads = int(n_threads)
 
         # initialize the log file
         if log_file:
@@ -247,6 +358,26 @@ class Assessment(object):
             log_msg('\t\t\t{}: {}'.format(att, val))
 
         # EDP file
+        self.read_EDP_input(path_EDP_input, verbose=verbose)
+
+    def read_EDP_input(self, path_EDP_input, verbose=False):
+        """
+        Read the EDP input file.
+
+        This method is called by read_inputs. It can also be used on its own
+        to provide new EDPs for an assessment loaded from a compiled loss
+        model (see from_compiled).
+
+        Parameters
+        ----------
+        path_EDP_input: string
+            Location of the EDP input file. The file is expected to follow the
+            output formatting of Dakota. The Input section of the documentation
+            provides more information about the expected formatting.
+        verbose: boolean, default: False
+            If True, the method echoes the information read from the file.
+        """
+
         log_msg('\tEDP file...')
         if self._hazard == 'EQ':
             self._EDP_in = read_SimCenter_EDP_input(
@@ -286,6 +417,468 @@ class Assessment(object):
         log_msg()
         log_msg('\t\tnumber of samples: {}'.format(len(data[list(data.keys())[0]][0]['raw_data'])))
 
+    def set_shard(self, shard_id, shard_count, seed=0, stream_id=0):
+        """
+        Limit the assessment to one shard of its realizations.
+
+        The realizations prescribed in the DL input are split into shard_count
+        shards of nearly equal size. Each shard is sampled with an independent
+        substream of random numbers identified by the seed, the stream_id and
+        the shard_id. Hence, every shard is reproducible and the shards can be
+        evaluated on different machines. The results of the shards can be
+        merged with merge_SimCenter_DL_shards. A single shard (shard_count=1)
+        provides a reproducible assessment of all realizations.
+
+        Call this method after the inputs are read and before the random
+        variables are defined. Damage screening is not available in
+        assessments with more than one shard because the screened components
+        depend on the EDPs sampled in each shard and the results of the shards
+        would not be comparable.
+
+        Parameters
+        ----------
+        shard_id: int
+            Index of the shard in the [0, shard_count) range.
+        shard_count: int
+            Number of shards.
+        seed: int, default: 0
+            Seed shared by the shards of the assessment.
+        stream_id: int, default: 0
+            Identifies separate assessments (e.g., stripes) that use the same
+            seed.
+
+        """
+        if self._AIM_in is None:
+            raise ValueError(
+                'The inputs need to be read before the assessment is sharded.')
+
+        if not (0 <= shard_id < shard_count):
+            raise ValueError(
+                'Shard {} is not available in an assessment with {} '
+                'shards.'.format(shard_id, shard_count))
+
+        # the realizations of coupled assessments are tied to the EDP inputs
+        if self._AIM_in['general']['coupled_assessment']:
+            raise ValueError(
+                'Coupled assessments cannot be sharded. Split the EDP inputs '
+                'instead.')
+
+        # screening depends on the sampled EDPs, so every shard would report
+        # a different set of components
+        if (shard_count > 1) and (self._screening is not None):
+            raise ValueError(
+                'Assessments with damage screening cannot be split into '
+                'shards.')
+
+        if self._shard is None:
+            realizations = self._AIM_in['general']['realizations']
+        else:
+            realizations = self._shard['total_realizations']
+
+        offset = realizations * shard_id // shard_count
+        count = realizations * (shard_id + 1) // shard_count - offset
+
+        self._AIM_in['general']['realizations'] = count
+        self._shard = {
+            'shard_id': shard_id,
+            'shard_count': shard_count,
+            'seed': seed,
+            'stream_id': stream_id,
+            'offset': offset,
+            'realizations': count,
+            'total_realizations': realizations}
+
+        seed_seq = np.random.SeedSequence(seed,
+                                          spawn_key=(stream_id, shard_id))
+        np.random.seed(seed_seq.generate_state(4))
+
+        log_msg('Shard {} of {}: {} of {} realizations (seed {}, stream '
+                '{})'.format(shard_id + 1, shard_count, count, realizations,
+                             seed, stream_id))
+
+    def set_common_random_numbers(self, seed=0, samples=None):
+        """
+        Use common random numbers for the building-side random variables.
+
+        The random variables other than the EDPs (component quantities,
+        fragilities and consequences) describe the building rather than the
+        hazard. With common random numbers, they are sampled from a separate
+        stream of random numbers identified by the seed, and only the EDPs are
+        sampled from the main stream. Assessments of the same building with
+        different EDPs (stripes, scenarios) or event times get the same
+        building samples. The samples of an assessment can also be passed
+        directly to the other assessments (see get_building_samples) to avoid
+        sampling them again.
+
+        Call this method before the random variables are defined. The
+        building samples of assessments with damage screening depend on the
+        screened components and they cannot be shared.
+
+        Parameters
+        ----------
+        seed: int, default: 0
+            Seed of the building-side random numbers.
+        samples: dict, optional
+            Building samples from get_building_samples of another assessment
+            of the same building with the same number of realizations.
+
+        """
+        self._crn = {'seed': seed, 'samples': samples}
+
+    def get_building_samples(self):
+        """
+        Return the samples of the building-side random variables.
+
+        Returns
+        -------
+        samples: dict
+            Samples of each random variable other than the EDPs.
+
+        """
+        if self._RV_dict is None:
+            raise ValueError(
+                'The random variables need to be defined before their samples '
+                'are available.')
+
+        return dict([(key, rv.samples) for key, rv in self._RV_dict.items()
+                     if (key != 'EDP') and (rv is not None) and
+                     (rv.samples is not None)])
+
+    def set_precision(self, precision='float64'):
+        """
+        Set the floating point precision of the samples and the results.
+
+        The random variables are always sampled in double precision (e.g.,
+        the Cholesky decomposition of their correlation matrix and the
+        transformation of the samples to the prescribed distributions). With
+        single precision, the samples are stored as float32 and the damage
+        and loss calculations work with float32 arrays. This halves the
+        memory footprint of the largest arrays of the assessment. The sums
+        in the SUMMARY and the statistics of the results are accumulated in
+        double precision to avoid the loss of accuracy in long sums.
+
+        Call this method before the random variables are sampled.
+
+        Parameters
+        ----------
+        precision: {'float64', 'float32'}, default: 'float64'
+            Precision of the samples and the results.
+
+        """
+        if precision not in ['float64', 'float32']:
+            raise ValueError(
+                'Unknown precision: {}. Use float64 or float32.'.format(
+                    precision))
+
+        self._precision = np.dtype(precision).type
+
+    def enable_stage_tracking(self, enabled=True):
+        """
+        Track the inputs and results of the stages of the assessment.
+
+        With stage tracking, each stage of the calculation (from
+        define_random_variables to aggregate_results) records the inputs it
+        depends on, the state of the random number generator and the results
+        of the earlier stages when it is evaluated. After the inputs are
+        edited, recalculate() evaluates only the stages affected by the
+        changes. The records keep earlier results referenced, hence tracking
+        increases the memory used by the assessment.
+
+        Call this method before the first stage is evaluated.
+
+        Parameters
+        ----------
+        enabled: bool, default: True
+            If False, stage tracking is turned off and the records are
+            discarded.
+
+        """
+        self._stage_records = {} if enabled else None
+
+    def recalculate(self):
+        """
+        Update the results of the assessment after its inputs were edited.
+
+        The inputs are compared with the ones recorded by each stage. A stage
+        is evaluated again if an input section it depends on has changed or if
+        it uses the results of a stage that is evaluated again. For example, a
+        new replacement cost only requires the aggregation of results, while
+        new repair cost medians require a new loss model and new losses, but
+        the damage is reused. The results of the other stages are restored
+        from the records.
+
+        Every stage that is evaluated again starts from its recorded state of
+        the random number generator. Hence, the changes are assessed with
+        common random numbers as long as the set of random variables in the
+        model does not change.
+
+        Returns
+        -------
+        stages: list of strings
+            The stages that were evaluated.
+
+        """
+        if self._stage_records is None:
+            raise ValueError(
+                'Stage tracking needs to be enabled before the assessment can '
+                'be recalculated.')
+
+        log_msg(log_div)
+        log_msg('Recalculating the assessment...')
+
+        fingerprints = self._input_fingerprints()
+
+        rerun = {}
+        for stage, uses, __ in self._stages:
+            record = self._stage_records.get(stage, None)
+            rerun.update({stage: (
+                (record is None) or
+                any([record['inputs'][section] != fingerprints[section]
+                     for section in self._stage_inputs[stage]]) or
+                any([rerun[used] for used in uses]))})
+
+        stage_list = [stage for stage, __, __ in self._stages]
+        stages = [stage for stage in stage_list if rerun[stage]]
+
+        if len(stages) == 0:
+            log_msg('\tThe results are up to date.')
+            return stages
+
+        log_msg('\tStages to evaluate: {}'.format(', '.join(stages)))
+
+        # roll back to the state before the first stage that is evaluated;
+        # the current state has the results of the last evaluated stage
+        final_state = self._result_state()
+        first_record = self._stage_records.get(stages[0], None)
+        if first_record is not None:
+            self._set_result_state(first_record['state'])
+
+        self._recalculating = True
+        try:
+            for s_i in range(stage_list.index(stages[0]), len(stage_list)):
+                stage, __, writes = self._stages[s_i]
+
+                if rerun[stage]:
+                    getattr(self, stage)()
+
+                else:
+                    # the results of the stage are still valid; they are
+                    # restored from the initial state of the next stage
+                    self._stage_records[stage].update(
+                        {'state': self._result_state()})
+
+                    next_record = None
+                    if s_i + 1 < len(stage_list):
+                        next_record = self._stage_records.get(
+                            stage_list[s_i + 1], None)
+
+                    if next_record is not None:
+                        self._set_result_state(next_record['state'], writes)
+                    else:
+                        self._set_result_state(final_state, writes)
+
+        finally:
+            self._recalculating = False
+
+        return stages
+
+    def estimate_resources(self, memory_budget=None):
+        """
+        Estimate the runtime and the memory needed to run the assessment.
+
+        The estimate only uses the dimensions of the loss model described by
+        the inputs (e.g., the number of EDPs, Performance Groups, Damage States
+        and realizations), so it is available right after the inputs are read
+        and before any random variable is sampled. The cost model is linear
+        in these dimensions (see _resource_model). Runtimes depend on the
+        machine and are approximate; the memory is the memory allocated by the
+        assessment on top of the memory used by Python and the libraries.
+
+        Parameters
+        ----------
+        memory_budget: float, optional
+            Memory available to the assessment in bytes. If the estimated peak
+            memory exceeds the budget, the number of realizations that fits in
+            the budget is recommended as a chunk size. The chunks can be
+            evaluated as shards of the assessment (see set_shard).
+
+        Returns
+        -------
+        estimate: dict
+            The dimensions of the model, the runtime (s) and the memory in use
+            (bytes) during each stage, their totals, and the recommended
+            chunk_size and shard_count. The latter two are None if the
+            assessment fits in the budget or there is no budget; the
+            chunk_size is 0 if even the parts of the model that do not
+            depend on the realizations exceed the budget.
+
+        """
+        if (self._AIM_in is None) or (self._FG_in is None):
+            raise ValueError(
+                'The inputs need to be read before the resources of the '
+                'assessment are estimated.')
+
+        dims = self._model_dimensions()
+
+        def linear_cost(coeffs, units):
+            return sum([coeff * (1. if unit == 'base' else units[unit])
+                        for unit, coeff in coeffs.items()])
+
+        # the realization-independent (fixed) and the per-realization part of
+        # the memory in use during each stage
+        realizations = dims['realizations']
+        unit_dims = dict(dims, realizations=1)
+        for unit in ['sample_values', 'DS_values', 'DV_values']:
+            unit_dims[unit] = dims[unit] / max(realizations, 1)
+        # the retained samples and results are stored with the precision of
+        # the assessment; the temporary arrays are estimated conservatively
+        value_size = np.dtype(self._precision).itemsize / 8.
+        stored_dims = dict(unit_dims)
+        for unit in ['sample_values', 'DS_values', 'DV_values']:
+            stored_dims[unit] = unit_dims[unit] * value_size
+        zero_dims = dict([(unit, 0.) for unit in dims.keys()])
+        zero_dims.update({'matrix_entries': dims['matrix_entries'],
+                          'DS_columns': dims['DS_columns'],
+                          'PGs': dims['PGs'],
+                          'EDP_values': dims['EDP_values']})
+
+        runtime, memory = {}, {}
+        mem_fixed, mem_per_rlz = {}, {}
+        retained_fixed, retained_per_rlz = 0., 0.
+        for stage, cost in self._resource_model.items():
+            runtime.update({stage: linear_cost(cost['time'], dims)})
+
+            # memory = retained memory of earlier stages + allocated memory
+            fixed = linear_cost(cost['memory'], zero_dims)
+            per_rlz = linear_cost(cost['memory'], unit_dims) - fixed
+            mem_fixed.update({stage: retained_fixed + fixed})
+            mem_per_rlz.update({stage: retained_per_rlz + per_rlz})
+            memory.update({stage: int(mem_fixed[stage] +
+                                      mem_per_rlz[stage] * realizations)})
+
+            fixed = linear_cost(cost['retained'], zero_dims)
+            retained_fixed += fixed
+            retained_per_rlz += (linear_cost(cost['retained'], stored_dims) -
+                                 fixed)
+
+        estimate = {
+            'dimensions': dims,
+            'runtime': runtime,
+            'memory': memory,
+            'total_runtime': sum(runtime.values()),
+            'peak_memory': max(memory.values()),
+            'chunk_size': None,
+            'shard_count': None}
+
+        if ((memory_budget is not None) and
+            (estimate['peak_memory'] > memory_budget)):
+            chunk_size = min([
+                int((memory_budget - mem_fixed[stage]) // mem_per_rlz[stage])
+                if mem_per_rlz[stage] > 0. else realizations
+                for stage in memory.keys()])
+            chunk_size = max(min(chunk_size, realizations), 0)
+
+            estimate['chunk_size'] = chunk_size
+            if chunk_size > 0:
+                estimate['shard_count'] = int(
+                    np.ceil(realizations / chunk_size))
+
+        log_msg(log_div)
+        log_msg('Estimated resources:')
+        log_msg('\tmodel dimensions:')
+        for key in ['realizations', 'EDP_dims', 'FGs', 'PGs', 'DS_columns',
+                    'RV_dims']:
+            log_msg('\t\t{}: {}'.format(key, dims[key]))
+        for stage in runtime.keys():
+            log_msg('\t{}: {:.1f} s, {:.1f} MB'.format(
+                stage, runtime[stage], memory[stage] / 2**20))
+        log_msg('\ttotal: {:.1f} s, peak memory: {:.1f} MB'.format(
+            estimate['total_runtime'], estimate['peak_memory'] / 2**20))
+        if estimate['chunk_size'] is not None:
+            if estimate['chunk_size'] > 0:
+                log_msg('\tThe assessment exceeds the memory budget. Run it '
+                        'in chunks of {} realizations (i.e., {} '
+                        'shards).'.format(estimate['chunk_size'],
+                                          estimate['shard_count']))
+            else:
+                log_msg('\tThe loss model exceeds the memory budget even with '
+                        'a single realization.')
+
+        return estimate
+
+    def _model_dimensions(self):
+        """
+        Count the dimensions of the loss model and the work units of the cost
+        model used by estimate_resources.
+
+        """
+        realizations = self._AIM_in['general']['realizations']
+        DVs = self._AIM_in['decision_variables']
+
+        EDP_data = [data for data_list in self._EDP_in.values()
+                    for data in data_list]
+        EDP_dims = len(EDP_data)
+        EDP_samples = max([np.size(data['raw_data']) for data in EDP_data]
+                          + [1, ])
+
+        PGs, CSGs, QNT_dims, FR_dims, DS_columns, FR_matrix = 0, 0, 0, 0, 0, 0
+        for comp in self._FG_in.values():
+            DS_count = sum([len(DSG['DS_set'])
+                            for DSG in comp['DSG_set'].values()])
+            CSG_count = sum([len(csg_w) for csg_w in comp['csg_weights']])
+            FG_FR_dims = CSG_count * len(comp['DSG_set'])
+
+            PGs += len(comp['locations'])
+            CSGs += CSG_count
+            QNT_dims += int(np.sum(np.asarray(comp['distribution_kind']) !=
+                                   'N/A'))
+            FR_dims += FG_FR_dims
+            FR_matrix += FG_FR_dims ** 2
+            DS_columns += len(comp['locations']) * DS_count
+
+        # decision variables with one value per Damage State column and the
+        # dimensions of their random variables (upper bounds)
+        inj_lvls = getattr(self, '_inj_lvls', 0)
+        DV_count = (int(DVs.get('rec_cost', False)) +
+                    int(DVs.get('rec_time', False)) +
+                    int(DVs.get('red_tag', False)) +
+                    int(DVs.get('injuries', False)) * inj_lvls)
+        red_tag = int(DVs.get('red_tag', False))
+        repairs = int(DVs.get('rec_cost', False) or DVs.get('rec_time', False))
+        injuries = int(DVs.get('injuries', False))
+        DV_dims = DS_columns * (red_tag + 2 * repairs + injuries * inj_lvls)
+
+        RV_dims = EDP_dims + QNT_dims + FR_dims + DV_dims
+
+        # the quantities, red tags and repairs are truncated after sampling,
+        # one value at a time
+        truncated_dims = QNT_dims + DS_columns * (red_tag + 2 * repairs)
+
+        # the dense correlation matrices are built for every Performance
+        # Group and Damage State, even if some of them are removed later; the
+        # repairs and the injuries use one matrix per DV (or injury level) and
+        # another one for the joint distribution
+        matrix_entries = (PGs ** 2 + FR_matrix + EDP_dims ** 2 +
+                          DS_columns ** 2 * (red_tag + 6 * repairs +
+                                             injuries * (inj_lvls ** 2 + 1)))
+
+        return {
+            'realizations': realizations,
+            'EDP_dims': EDP_dims,
+            'EDP_samples': EDP_samples,
+            'FGs': len(self._FG_in),
+            'PGs': PGs,
+            'CSGs': CSGs,
+            'DS_columns': DS_columns,
+            'DV_count': DV_count,
+            'RV_dims': RV_dims,
+            'matrix_entries': matrix_entries,
+            'EDP_values': EDP_samples * EDP_dims,
+            'sample_values': realizations * RV_dims,
+            'truncated_values': realizations * truncated_dims,
+            'DS_values': realizations * DS_columns,
+            'DV_values': realizations * DS_columns * DV_count}
+
     def define_random_variables(self):
         """
         Define the random variables used for loss assessment.
@@ -293,6 +886,7 @@ class Assessment(object):
         """
         log_msg(log_div)
         log_msg('Defining random variables...')
+        self._begin_stage('define_random_variables')
 
     def define_loss_model(self):
         """
@@ -301,6 +895,138 @@ class Assessment(object):
         """
         log_msg(log_div)
         log_msg('Creating the damage and loss model...')
+        self._begin_stage('define_loss_model')
+
+    def compile(self, path):
+        """
+        Save the loss model of the asset in a compiled binary file.
+
+        The compiled model includes the processed DL inputs, the component and
+        population data, the random variables other than the EDPs with the
+        Cholesky factors of their covariance matrices and the Fragility Groups
+        with their Performance Groups, Damage State Groups, Damage States and
+        consequence functions. It does not include the EDP inputs and the
+        samples. Use from_compiled to load the model and
+        assess the asset with new EDPs without re-building the loss model.
+
+        Parameters
+        ----------
+        path: string
+            Location of the compiled model file.
+
+        """
+
+        if self._FG_dict is None:
+            raise ValueError(
+                'The loss model needs to be defined before it can be compiled.')
+
+        # the screened components are missing from the model
+        if len(self._FG_screened) > 0:
+            raise ValueError(
+                'Loss models with screened Fragility Groups cannot be '
+                'compiled. Turn off damage screening and define the loss '
+                'model again.')
+
+        log_msg(log_div)
+        log_msg('Compiling the loss model...')
+
+        RV_dict = dict([(key, rv) for key, rv in self._RV_dict.items()
+                        if key != 'EDP'])
+
+        state = dict([(att, getattr(self, att)) for att in [
+            '_AIM_in', '_POP_in', '_FG_in', '_FG_dict', '_hazard',
+            '_assessment_type', '_inj_lvls']])
+        state.update({'_RV_dict': RV_dict})
+
+        # the covariance matrices are factored once and the factors are
+        # used every time the compiled model is sampled
+        for rv in RV_dict.values():
+            if (rv is not None) and (rv._COV is not None):
+                rv.COV_chol
+
+        # the samples are re-generated when the compiled model is used
+        samples = {}
+        for key, rv in RV_dict.items():
+            if (rv is not None) and (rv.samples is not None):
+                samples.update({key: rv.__dict__.pop('_samples')})
+
+        try:
+            with open(path, 'wb') as f:
+                pickle.dump({'format': 'pelicun compiled loss model',
+                             'version': COMPILED_MODEL_VERSION,
+                             'pelicun_version': pelicun_version,
+                             'class': type(self).__name__,
+                             'state': state},
+                            f, protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            for key, rv_samples in samples.items():
+                RV_dict[key]._samples = rv_samples
+
+        log_msg('\tCompiled model saved to {}'.format(path))
+
+    @classmethod
+    def from_compiled(cls, path, log_file=True, n_threads=1):
+        """
+        Create an assessment from a compiled loss model.
+
+        The returned assessment needs new EDPs before the calculation can
+        continue. Provide them with read_EDP_input and then call the usual
+        methods starting with define_random_variables. Only the EDP random
+        variables are created anew; the rest of the random variables and the
+        loss model are taken from the compiled model.
+
+        The compiled model is loaded with pickle.load, which can execute
+        arbitrary code while it reads the file. Only load compiled models
+        from trusted sources.
+
+        Parameters
+        ----------
+        path: string
+            Location of the compiled model file created by compile.
+        log_file: boolean, default: True
+            If True, the log is saved in pelicun_log.txt.
+        n_threads: int, default: 1
+            Number of threads used to evaluate the Fragility Groups.
+
+        Returns
+        -------
+        A: Assessment
+            An assessment of the same type as the one that was compiled.
+
+        """
+
+        with open(path, 'rb') as f:
+            model = pickle.load(f)
+
+        if ((not isinstance(model, dict)) or
+            (model.get('format', None) != 'pelicun compiled loss model')):
+            raise ValueError(
+                '{} is not a compiled pelicun loss model.'.format(path))
+
+        if model['version'] != COMPILED_MODEL_VERSION:
+            raise ValueError(
+                'The loss model in {} was compiled with version {} of the '
+                'format, but version {} is required. Please compile the model '
+                'again.'.format(path, model['version'],
+                                COMPILED_MODEL_VERSION))
+
+        model_class = globals().get(model['class'], None)
+        if (model_class is None) or (not issubclass(model_class, cls)):
+            raise ValueError(
+                'The loss model in {} belongs to a {} and cannot be loaded as '
+                'a {}.'.format(path, model['class'], cls.__name__))
+
+        A = model_class.__new__(model_class)
+        Assessment.__init__(A, log_file=log_file, n_threads=n_threads)
+        A.__dict__.update(model['state'])
+        A._compiled = True
+
+        log_msg('Loaded compiled loss model from {}'.format(path))
+        log_msg('\ttype: {}'.format(model['class']))
+        log_msg('\tcompiled with pelicun {}'.format(model['pelicun_version']))
+        log_msg(log_div)
+
+        return A
 
     def calculate_damage(self):
         """
@@ -309,6 +1035,7 @@ class Assessment(object):
         """
         log_msg(log_div)
         log_msg('Calculating damage...')
+        self._begin_stage('calculate_damage')
         self._ID_dict = {}
 
     def calculate_losses(self):
@@ -318,13 +1045,39 @@ class Assessment(object):
         """
         log_msg(log_div)
         log_msg('Calculating losses...')
+        self._begin_stage('calculate_losses')
         self._DV_dict = {}
 
+    def aggregate_results(self):
+        """
+        Aggregate the results of the assessment in a summary.
+
+        """
+        log_msg(log_div)
+        log_msg('Aggregating results...')
+        self._begin_stage('aggregate_results')
+
     def save_outputs(self, output_path, EDP_file, DM_file, DV_file,
-                     suffix="", detailed_results=True):
+                     suffix="", detailed_results=True, exact_stats=True,
+                     stats_compression=500.):
         """
         Export the results.
 
+        The statistics in the _stats files are collected in StatsAccumulator
+        objects that are kept in the _stats attribute of the assessment. These
+        can be merged with the statistics of other chunks of realizations of
+        the same assessment.
+
+        Parameters
+        ----------
+        exact_stats: bool, default: True
+            If True, the percentiles in the _stats files are exact. Otherwise,
+            they are estimated from a t-digest sketch of the results.
+        stats_compression: float, default: 500.
+            Compression parameter of the t-digest sketch. Larger values
+            provide more accurate percentiles. Only used if exact_stats is
+            False.
+
         """
         def replace_FG_IDs_with_FG_names(df):
             FG_list = sorted(self._FG_dict.keys())
@@ -334,6 +1087,22 @@ class Assessment(object):
 
             return df.rename(columns=new_col_names)
 
+        def get_weights(df):
+            # realization weights are only available under importance sampling
+            if self._W is None:
+                return None
+            else:
+                return self._W.loc[df.index].values
+
+        def get_stats(name, df):
+            stats = StatsAccumulator(exact=exact_stats,
+                                     compression=stats_compression)
+            stats.update(df, weights=get_weights(df))
+            self._stats[name] = stats
+            return stats
+
+        self._stats = {}
+
         log_msg(log_div)
         log_msg('Saving outputs...')
 
@@ -395,9 +1164,14 @@ class Assessment(object):
                 log_msg('\t\tOnly saving the main results.')
             else:
                 log_msg('\t\tSummary statistics')
+                SUMMARY_stats = self._SUMMARY
+                if ('sampling', 'weight') in SUMMARY_stats.columns:
+                    SUMMARY_stats = SUMMARY_stats.drop(
+                        columns=[('sampling', 'weight'), ])
                 write_SimCenter_DL_output(
                     output_path, '{}DL_summary_stats.csv'.format(suffix),
-                    self._SUMMARY, index_name='attribute', collapse_columns=True,
+                    get_stats('DL_summary', SUMMARY_stats),
+                    index_name='attribute', collapse_columns=True,
                     stats_only=True)
 
                 log_msg('\t\tEDP values')
@@ -409,7 +1183,7 @@ class Assessment(object):
                 log_msg('\t\tEDP statistics')
                 write_SimCenter_DL_output(
                     output_path, '{}EDP_stats.csv'.format(suffix),
-                    EDP_samples, index_name='#Num',
+                    get_stats('EDP', EDP_samples), index_name='#Num',
                     collapse_columns=False, stats_only=True)
 
                 log_msg('\t\tDamaged quantities')
@@ -420,13 +1194,14 @@ class Assessment(object):
                 log_msg('\t\tDamage statistics')
                 write_SimCenter_DL_output(
                     output_path, '{}DMG_stats.csv'.format(suffix),
-                    DMG_mod, index_name='#Num',
+                    get_stats('DMG', DMG_mod), index_name='#Num',
                     collapse_columns=False, stats_only=True)
 
                 log_msg('\t\tDamaged quantities - aggregated')
                 write_SimCenter_DL_output(
                     output_path, '{}DMG_agg.csv'.format(suffix),
-                    DMG_mod.T.groupby(level=0).aggregate(np.sum).T,
+                    DMG_mod.astype(np.float64, copy=False).T.groupby(
+                        level=0).aggregate(np.sum).T,
                     index_name='#Num', collapse_columns=False)
 
                 for DV_mod, DV_name in zip(DV_mods, DV_names):
@@ -435,7 +1210,8 @@ class Assessment(object):
                         output_path, '{}{}.csv'.format(suffix, DV_name),
                         DV_mod, index_name='#Num', collapse_columns=False)
 
-                    DV_mod_agg = DV_mod.T.groupby(level=0).aggregate(np.sum).T
+                    DV_mod_agg = DV_mod.astype(np.float64, copy=False).T.groupby(
+                        level=0).aggregate(np.sum).T
 
                     log_msg('\t\tDecision variable {} - aggregated'.format(DV_name))
                     write_SimCenter_DL_output(
@@ -445,7 +1221,8 @@ class Assessment(object):
                     log_msg('\t\tAggregated statistics for {}'.format(DV_name))
                     write_SimCenter_DL_output(
                         output_path, '{}{}_agg_stats.csv'.format(suffix, DV_name),
-                        DV_mod_agg, index_name='#Num', collapse_columns=False,
+                        get_stats(DV_name[len(suffix):] + '_agg', DV_mod_agg),
+                        index_name='#Num', collapse_columns=False,
                         stats_only=True)
 
             #if True:
@@ -473,6 +1250,481 @@ class Assessment(object):
         except:
             print("ERROR when trying to create DL output files.")
 
+    def _evaluate_FGs(self, calc_FG, s_fg_keys, *args):
+        """
+        Evaluate calc_FG for each Fragility Group in s_fg_keys.
+
+        If the assessment uses more than one thread, the Fragility Groups are
+        evaluated concurrently in a thread pool. The results are returned in
+        the order of s_fg_keys regardless of the number of threads.
+
+        Parameters
+        ----------
+        calc_FG: callable
+            Function that takes the ID of a Fragility Group (and the
+            corresponding elements of args) and returns its results.
+        s_fg_keys: list of strings
+            Sorted list of Fragility Group IDs.
+        args: lists, optional
+            Additional arguments for calc_FG, one element per Fragility Group.
+
+        Returns
+        -------
+        FG_results: list
+            The results of calc_FG for each Fragility Group.
+
+        """
+
+        if (self._n_threads == 1) or (len(s_fg_keys) < 2):
+            return list(map(calc_FG, s_fg_keys, *args))
+
+        with ThreadPoolExecutor(max_workers=self._n_threads) as executor:
+            return list(executor.map(calc_FG, s_fg_keys, *args))
+
+    def _collect_FG_columns(self, s_fg_keys, FG_results, IDs):
+        """
+        Collect the results of each Fragility Group in a DataFrame.
+
+        The results of an FG are arrays with one column for each of its
+        damage state columns (see _DS_columns). They are placed in the
+        corresponding block of the damage state columns of the loss model
+        and the columns are labeled at the end.
+
+        Parameters
+        ----------
+        s_fg_keys: list of strings
+            Sorted list of Fragility Group IDs.
+        FG_results: list of ndarrays
+            The results of each Fragility Group in s_fg_keys.
+        IDs: int ndarray
+            Realization IDs of the rows in the results.
+
+        Returns
+        -------
+        results: DataFrame
+            Results with the labeled damage state columns of the loss model.
+        """
+        DS_cols = self._DS_columns
+
+        values = np.zeros((len(IDs), DS_cols.size), dtype=self._precision)
+        for fg_id, FG_values in zip(s_fg_keys, FG_results):
+            values[:, DS_cols.FG_columns(self._FG_dict[fg_id]._ID)] = FG_values
+
+        return pd.DataFrame(values, columns=DS_cols.labels(), index=IDs)
+
+    def _PG_quantity(self, PG, IDs):
+        """
+        Return the quantity of components in a Performance Group in each of
+        the realizations identified by IDs.
+
+        """
+        if isinstance(PG._quantity, RandomVariableSubset):
+            return PG._quantity.samples.loc[IDs].values[:, 0]
+        else:
+            return np.full(len(IDs), PG._quantity, dtype=self._precision)
+
+    def _allocate_damage_states(self, FG_damages, DSG, allocations,
+                                random_state=None):
+        """
+        Allocate the damaged components in a DSG to its damage states.
+
+        The DSG has the same damage states in every PG of the FG, so the
+        damage states are sampled for every PG and CSG at once.
+
+        Parameters
+        ----------
+        FG_damages: float ndarray
+            The damaged fraction of components in each damage state column of
+            the FG. The allocated fractions are added to these values.
+        DSG: DamageStateGroup
+            The DSG in one of the PGs of the FG.
+        allocations: list of tuples
+            The realizations in the DSG, the positions of the damage state
+            columns in FG_damages, and the CSG weight for each PG and CSG.
+        random_state: RandomState, optional
+            The source of the random numbers. The global random state of
+            numpy is used by default.
+        """
+        kind = DSG._DS_set_kind
+
+        if kind == 'single':
+            for in_this_DSG, DS_pos, csg_w in allocations:
+                FG_damages[in_this_DSG, DS_pos[0]] += csg_w
+            return
+
+        elif kind not in ['mutually exclusive', 'simultaneous']:
+            raise ValueError(
+                "Unknown damage state type: {}".format(kind)
+            )
+
+        sample_size = sum([len(alloc[0]) for alloc in allocations])
+        if sample_size == 0:
+            return
+
+        DS_weights = [DS._weight for DS in DSG._DS_set]
+
+        if kind == 'mutually exclusive':
+            DS_ids = mutually_exclusive_rvs(DS_weights, size=sample_size,
+                                            random_state=random_state)
+            which_DS = DS_ids[:, np.newaxis] == np.arange(len(DS_weights))
+        else:
+            which_DS = simultaneous_rvs(DS_weights, size=sample_size,
+                                        random_state=random_state)
+
+        start = 0
+        for in_this_DSG, DS_pos, csg_w in allocations:
+            DSG_which_DS = which_DS[start:start + len(in_this_DSG)]
+            start += len(in_this_DSG)
+            for ds_i, pos in enumerate(DS_pos):
+                FG_damages[in_this_DSG[DSG_which_DS[:, ds_i]], pos] += csg_w
+
+    def _create_consequence_table(self, medians, quantities, RV, DS_tags,
+                                  PG_tags):
+        """
+        Collect one type of consequence of the damage states of an FG in a
+        ConsequenceTable.
+
+        Parameters
+        ----------
+        medians: list
+            The median DVs of each damage state. None indicates that the
+            damage state has no consequence of this type.
+        quantities: list
+            The component quantities that correspond to the medians of each
+            damage state. None is accepted for damage states with a single
+            median.
+        RV: RandomVariable
+            The random variable that describes the uncertainty in the DVs.
+        DS_tags: list
+            The RV tag of each damage state without the location and
+            direction. None indicates that there is no uncertainty in the DV.
+        PG_tags: str list
+            The location and direction part of the RV tags in each PG.
+
+        Returns
+        -------
+        CT: ConsequenceTable
+            None if none of the damage states has a consequence of this type.
+        """
+        medians = [None if m is None else np.atleast_1d(m) for m in medians]
+        if all([m is None for m in medians]):
+            return None
+
+        offsets = np.cumsum([0, ] + [0 if m is None else m.size
+                                     for m in medians])
+        qnt_list = []
+        for m, q in zip(medians, quantities):
+            if m is not None:
+                qnt_list.append(np.zeros(m.size) if q is None
+                                else np.atleast_1d(q))
+
+        RV_positions = None
+        RV_DS = [ds_i for ds_i, (m, tag) in enumerate(zip(medians, DS_tags))
+                 if (m is not None) and (tag is not None)]
+        if (RV is not None) and (len(RV_DS) > 0):
+            RV_positions = np.full((len(PG_tags), len(medians)), -1,
+                                   dtype=np.int64)
+            RV_tags = [DS_tags[ds_i] + PG_tag
+                       for PG_tag in PG_tags for ds_i in RV_DS]
+            RV_positions[:, RV_DS] = np.reshape(
+                RV.dimension_positions(RV_tags), (len(PG_tags), len(RV_DS)))
+
+        return ConsequenceTable(
+            medians=np.concatenate([m for m in medians if m is not None]),
+            quantities=np.concatenate(qnt_list),
+            offsets=offsets, RV=RV, RV_positions=RV_positions)
+
+    def _input_sections(self):
+        """
+        Collect the inputs of the assessment in the sections that the stages
+        of the calculation depend on.
+
+        The component data is split into fragilities, consequences and
+        consequence medians. The medians of repair consequences and the
+        affected areas are only used in the loss model, while the rest of the
+        consequence data also defines random variables.
+
+        Returns
+        -------
+        sections: dict
+            Input data in each section.
+
+        """
+        CONS = ['repair_cost', 'repair_time', 'red_tag', 'injuries',
+                'affected_area']
+        MEDIANS = ['medians', 'quantities']
+
+        FG_in = dict(self._FG_in, **self._FG_screened)
+
+        fragilities, consequences, medians = {}, {}, {}
+        for c_id in sorted(FG_in.keys()):
+            comp = FG_in[c_id]
+            fragilities.update({c_id: dict([
+                (key, val) for key, val in comp.items() if key != 'DSG_set'])})
+
+            for DSG_id, DSG in comp['DSG_set'].items():
+                fragilities.update({(c_id, DSG_id): dict([
+                    (key, val) for key, val in DSG.items()
+                    if key != 'DS_set'])})
+
+                for DS_id, DS in DSG['DS_set'].items():
+                    tag = (c_id, DSG_id, DS_id)
+                    fragilities.update({tag: dict([
+                        (key, val) for key, val in DS.items()
+                        if key not in CONS])})
+
+                    DS_cons, DS_medians = {}, {}
+                    for key in CONS:
+                        if key not in DS.keys():
+                            continue
+
+                        if isinstance(DS[key], dict):
+                            DS_cons.update({key: dict([
+                                (att, val) for att, val in DS[key].items()
+                                if att not in MEDIANS])})
+                            DS_medians.update({key: dict([
+                                (att, val) for att, val in DS[key].items()
+                                if att in MEDIANS])})
+                        elif key == 'affected_area':
+                            DS_medians.update({key: DS[key]})
+                        else:
+                            DS_cons.update({key: DS[key]})
+
+                    consequences.update({tag: DS_cons})
+                    medians.update({tag: DS_medians})
+
+        general = dict(self._AIM_in['general'])
+
+        def pop_general(keys):
+            return dict([(key, general.pop(key)) for key in keys
+                         if key in general.keys()])
+
+        sections = {
+            'response': self._EDP_in,
+            'fragilities': fragilities,
+            'consequences': consequences,
+            'consequence_medians': medians,
+            'decision_variables': self._AIM_in['decision_variables'],
+            'population': (self._POP_in, pop_general(
+                ['population', 'occupancy_type', 'event_time'])),
+            'loss_parameters': (self._AIM_in.get('collapse_modes', None),
+                                pop_general(['irreparable_res_drift',
+                                             'plan_area'])),
+            'replacement': pop_general(['replacement_cost',
+                                        'replacement_time']),
+        }
+
+        # the rest of the inputs
+        sections.update({'general': (general, dict([
+            (key, val) for key, val in self._AIM_in.items()
+            if key not in ['general', 'decision_variables',
+                           'collapse_modes']]))})
+
+        return sections
+
+    def _input_fingerprints(self):
+        """
+        Return a hash of the data in each input section.
+
+        """
+        return dict([
+            (section, hashlib.sha1(pickle.dumps(
+                data, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest())
+            for section, data in self._input_sections().items()])
+
+    def _result_state(self):
+        """
+        Return the result attributes of the assessment.
+
+        Dictionaries are copied because some stages update them in place.
+
+        """
+        attributes = set()
+        for __, __, writes in self._stages:
+            attributes.update(writes)
+
+        state = {}
+        for att in sorted(attributes):
+            val = getattr(self, att)
+            state.update({att: val.copy() if isinstance(val, dict) else val})
+
+        return state
+
+    def _set_result_state(self, state, attributes=None):
+        """
+        Restore the result attributes of the assessment from a state.
+
+        """
+        if attributes is None:
+            attributes = state.keys()
+
+        for att in attributes:
+            val = state[att]
+            setattr(self, att, val.copy() if isinstance(val, dict) else val)
+
+    def _begin_stage(self, stage):
+        """
+        Record the inputs and the initial state of a stage if stage tracking
+        is enabled.
+
+        During recalculation, the stage starts from its recorded state of the
+        random number generator. Otherwise, the records of the later stages
+        are discarded because those stages need to be evaluated again.
+
+        """
+        if self._stage_records is None:
+            return
+
+        record = self._stage_records.get(stage, None)
+
+        if self._recalculating and (record is not None):
+            np.random.set_state(record['rng_state'])
+
+        else:
+            record = {'rng_state': np.random.get_state()}
+
+            if not self._recalculating:
+                stage_list = [s for s, __, __ in self._stages]
+                for later in stage_list[stage_list.index(stage) + 1:]:
+                    self._stage_records.pop(later, None)
+
+        record.update({'inputs': self._input_fingerprints(),
+                       'state': self._result_state()})
+        self._stage_records.update({stage: record})
+
+    def _define_compiled_random_variables(self):
+        """
+        Create the EDP random variables of a compiled model and sample them
+        together with the random variables stored in the model.
+
+        """
+
+        log_msg('\tUsing the random variables of the compiled model')
+
+        # demands 200
+        log_msg('\tEDPs...')
+
+        self._RV_dict.update({'EDP': self._create_RV_demands()})
+
+        self._sample_random_variables()
+
+    def _sample_random_variables(self, rv_keys=None):
+        """
+        Generate samples from the random variables in _RV_dict.
+
+        The random variables are sampled in the order of their keys to keep
+        the results reproducible.
+
+        Parameters
+        ----------
+        rv_keys: list of strings, optional
+            Keys of the random variables to sample. By default, every random
+            variable in _RV_dict is sampled.
+
+        """
+
+        log_msg()
+        log_msg('Sampling the random variables...')
+
+        realization_count = self._AIM_in['general']['realizations']
+        is_coupled = self._AIM_in['general']['coupled_assessment']
+
+        if rv_keys is None:
+            rv_keys = self._RV_dict.keys()
+
+        s_rv_keys = sorted(rv_keys)
+
+        # only the EDPs are sampled from the main stream of random numbers
+        # when common random numbers are used
+        if self._crn is not None:
+            building_keys = [key for key in s_rv_keys
+                             if (key != 'EDP') and
+                             (self._RV_dict[key] is not None)]
+            self._sample_building_random_variables(building_keys)
+            s_rv_keys = [key for key in s_rv_keys if key not in building_keys]
+
+        for r_i in s_rv_keys:
+            rv = self._RV_dict[r_i]
+            if rv is not None:
+                log_msg('\t{}...'.format(r_i))
+                rv.sample_distribution(
+                    sample_size=realization_count,
+                    preserve_order=((r_i=='EDP') and is_coupled))
+
+        # likelihood ratios for importance sampling (if needed)
+        self._W = self._calc_sampling_weights()
+
+        # the samples are stored with the precision of the assessment once
+        # the weights are calculated from the double precision values
+        for r_i in sorted(rv_keys):
+            rv = self._RV_dict[r_i]
+            if ((rv is not None) and (rv._samples is not None) and
+                np.any(rv._samples.dtypes != self._precision)):
+                rv._samples = rv._samples.astype(self._precision)
+
+        log_msg('Sampling completed.')
+
+    def _sample_building_random_variables(self, rv_keys):
+        """
+        Sample the building-side random variables with common random numbers.
+
+        The samples are taken from the assessment that provided them or drawn
+        from a separate stream of random numbers that only depends on the
+        seed. In the latter case, every realization of the assessment is
+        sampled and a sharded assessment keeps the samples of its shard.
+        Hence, the samples do not depend on the EDPs or on the sharding.
+
+        Parameters
+        ----------
+        rv_keys: list of strings
+            Keys of the random variables to sample.
+
+        """
+        realization_count = self._AIM_in['general']['realizations']
+
+        samples = self._crn['samples']
+        if samples is not None:
+            log_msg('\tUsing the building samples of another assessment...')
+
+            for r_i in rv_keys:
+                rv = self._RV_dict[r_i]
+                if ((r_i not in samples.keys()) or
+                    (samples[r_i].shape[0] != realization_count) or
+                    (list(samples[r_i].columns) !=
+                     list(rv._dimension_tags))):
+                    raise ValueError(
+                        'The building samples do not match the {} random '
+                        'variable of the assessment.'.format(r_i))
+
+                rv._samples = samples[r_i]
+
+            return
+
+        if self._shard is None:
+            offset, sample_size = 0, realization_count
+        else:
+            offset = self._shard['offset']
+            sample_size = self._shard['total_realizations']
+
+        # the building stream has a one-element spawn key; the streams of the
+        # shards have two-element keys
+        main_state = np.random.get_state()
+        seed_seq = np.random.SeedSequence(self._crn['seed'], spawn_key=(0,))
+        np.random.seed(seed_seq.generate_state(4))
+
+        try:
+            for r_i in rv_keys:
+                log_msg('\t{} (common random numbers)...'.format(r_i))
+                rv = self._RV_dict[r_i]
+                rv.sample_distribution(sample_size=sample_size)
+
+                if sample_size != realization_count:
+                    rv._samples = rv._samples.iloc[
+                        offset:offset + realization_count].reset_index(
+                        drop=True)
+        finally:
+            np.random.set_state(main_state)
+
     def _create_RV_demands(self):
 
         # Unlike other random variables, the demand RV is based on raw data.
@@ -609,15 +1861,129 @@ class Assessment(object):
                     COV=COV_mod,
                     truncation_limits=demand_RV.tr_limits_pre)
 
-        return demand_RV
+        # If importance sampling is requested, the EDPs are sampled from a
+        # distribution that puts more emphasis on large demands. The fitted
+        # distribution is kept to calculate the likelihood ratios later.
+        self._EDP_target_RV = None
+        IS = GI['response'].get('importance_sampling', None)
+        if IS is not None:
+            if ((demand_RV.distribution_kind is None) or
+                (demand_RV.tr_limits_post is not None)):
+                show_warning(
+                    "Importance sampling requires a fitted EDP distribution. "
+                    "The EDPs are sampled without importance sampling.")
+            else:
+                demand_RV = self._create_RV_demands_IS(demand_RV, IS)
+
+        return demand_RV
+
+    def _create_RV_demands_IS(self, demand_RV, IS):
+        """
+        Create the sampling density for importance sampling of EDPs.
+
+        The sampling density has the same family, correlation structure and
+        truncation limits as the target EDP distribution. Its logarithmic mean
+        is shifted by `shift` times the logarithmic standard deviation and its
+        logarithmic standard deviation is multiplied by `dispersion_factor`.
+
+        Parameters
+        ----------
+        demand_RV: RandomVariable
+            The target EDP distribution.
+        IS: dict
+            Importance sampling settings with `shift` and `dispersion_factor`.
+
+        Returns
+        -------
+        IS_RV: RandomVariable
+            The EDP random variable that is used for sampling.
+        """
+
+        self._EDP_target_RV = demand_RV
+
+        log_msg('\t\tImportance sampling: shift {} sig, dispersion x{}'.format(
+            IS['shift'], IS['dispersion_factor']))
+
+        dist = demand_RV.distribution_kind
+
+        mu_IS = np.atleast_1d(demand_RV.mu) + IS['shift'] * np.atleast_1d(
+            demand_RV.sig)
+        if dist.shape == ():
+            theta_IS = np.exp(mu_IS) if dist == 'lognormal' else mu_IS
+        else:
+            theta_IS = np.where(dist == 'lognormal', np.exp(mu_IS), mu_IS)
+        if demand_RV.COV.shape == ():
+            theta_IS = theta_IS[0]
+
+        COV_IS = demand_RV.COV * IS['dispersion_factor'] ** 2.
+
+        tr_limits = demand_RV.tr_limits_pre
+        if tr_limits is not None:
+            tr_limits = deepcopy(tr_limits)
+
+        IS_RV = RandomVariable(
+            ID=200,
+            dimension_tags=demand_RV.dimension_tags,
+            distribution_kind=dist,
+            theta=theta_IS,
+            COV=COV_IS,
+            truncation_limits=tr_limits)
+
+        return IS_RV
+
+    def _calc_sampling_weights(self):
+        """
+        Calculate the likelihood ratio of each realization under importance
+        sampling.
+
+        The weights are the raw likelihood ratios of the target and sampling
+        densities; their expected value is one. They are not normalized by
+        the sampled realizations, hence the weights of a realization do not
+        depend on the shard it belongs to, and the statistics of the shards
+        (which are normalized by the sum of weights when they are described)
+        can be merged. Realizations are equally weighted (and None is
+        returned) when importance sampling is not used.
+
+        Returns
+        -------
+        W: Series
+            Weight of each realization.
+        """
+
+        if self._EDP_target_RV is None:
+            return None
+
+        EDP_RV = self._RV_dict['EDP']
+        samples = EDP_RV.samples
+        values = samples.values.astype(np.float64)
+
+        log_W = (self._EDP_target_RV.log_pdf(values) -
+                 EDP_RV.log_pdf(values))
+        W = np.exp(log_W)
+
+        log_msg('\tEffective sample size under importance sampling: {:.1f}'
+                .format(np.sum(W) ** 2. / np.sum(W ** 2.)))
+
+        return pd.Series(W, index=samples.index, name='weight')
+
+    def _add_sampling_weights(self, SUMMARY):
+        """
+        Attach the realization weights to the SUMMARY under importance
+        sampling.
+
+        """
+        if self._W is not None:
+            SUMMARY[('sampling', 'weight')] = self._W.loc[SUMMARY.index].values
+
+        return SUMMARY
 
 
 class FEMA_P58_Assessment(Assessment):
     """
     An Assessment class that implements the loss assessment method in FEMA P58.
     """
-    def __init__(self, inj_lvls = 2, log_file=True):
-        super(FEMA_P58_Assessment, self).__init__(log_file)
+    def __init__(self, inj_lvls = 2, log_file=True, n_threads=1):
+        super(FEMA_P58_Assessment, self).__init__(log_file, n_threads)
 
         # constants for the FEMA-P58 methodology
         self._inj_lvls = inj_lvls
@@ -686,6 +2052,117 @@ class FEMA_P58_Assessment(Assessment):
             POP['peak'] = BIM['general']['population']
             self._POP_in = POP
 
+    def set_damage_screening(self, p_bound=1e-6):
+        """
+        Skip the Fragility Groups that cannot be damaged at the sampled EDPs.
+
+        With damage screening, the EDPs are sampled before the other random
+        variables. A Fragility Group is screened out if, at the largest EDP
+        sampled at its locations, the probability of exceeding any of its
+        damage state limits is below p_bound. The random variables, damages
+        and losses of screened Fragility Groups are not evaluated and their
+        components are not included in the results. A bound on the neglected
+        probability of damage is logged for each screened Fragility Group.
+
+        Call this method before the random variables are defined. Screening
+        changes the order in which the random variables are sampled. Hence,
+        the results differ from those of an assessment without screening that
+        uses the same seed.
+
+        Parameters
+        ----------
+        p_bound: float or None, default: 1e-6
+            Probability of damage that is considered negligible. None turns
+            off damage screening.
+
+        """
+        if (p_bound is not None) and not (0. < p_bound < 1.):
+            raise ValueError(
+                'The damage screening probability shall be in the (0, 1) '
+                'range.')
+
+        # see set_shard()
+        if ((p_bound is not None) and (self._shard is not None) and
+            (self._shard['shard_count'] > 1)):
+            raise ValueError(
+                'Assessments with damage screening cannot be split into '
+                'shards.')
+
+        self._screening = p_bound
+
+    def _screen_fragility_groups(self):
+        """
+        Remove the Fragility Groups that cannot be damaged at the sampled EDPs.
+
+        The screened Fragility Groups are moved from _FG_in to _FG_screened.
+        See set_damage_screening() for details.
+
+        """
+        from scipy.stats import norm
+
+        log_msg('\tScreening the Fragility Groups...')
+
+        # largest sampled EDP of each type at each location
+        EDP_samples = self._RV_dict['EDP'].samples
+        EDP_max = {}
+        for tag, tag_max in zip(EDP_samples.columns,
+                                np.max(EDP_samples.values, axis=0)):
+            key = (tag[:3], int(tag.split('-')[2]))
+            EDP_max.update({key: max(EDP_max.get(key, -np.inf), tag_max)})
+
+        # probability of damage in each fragility function at the largest EDP
+        P_dmg = {}
+        s_fg_keys = sorted(self._FG_in.keys())
+        for c_id in s_fg_keys:
+            comp = self._FG_in[c_id]
+
+            # missing demands are left for the damage calculation to handle
+            EDP_list = [EDP_max.get((comp['demand_type'], loc + comp['offset']),
+                                    np.inf)
+                        for loc in np.unique(comp['locations'])]
+            EDP = np.max(EDP_list)
+
+            P_list = []
+            with np.errstate(divide='ignore', invalid='ignore'):
+                for DSG in comp['DSG_set'].values():
+                    if DSG['distribution_kind'] == 'lognormal':
+                        P_list.append(norm.cdf(
+                            np.log(EDP / DSG['theta']) / DSG['sig']))
+                    elif DSG['distribution_kind'] == 'normal':
+                        P_list.append(norm.cdf(
+                            (EDP - DSG['theta']) / DSG['sig']))
+                    else:
+                        P_list.append(1.0)
+
+            P_list = np.nan_to_num(np.array(P_list), nan=1.0)
+            P_dmg.update({c_id: np.max(P_list, initial=0.)})
+
+        screened = [c_id for c_id in s_fg_keys
+                    if P_dmg[c_id] < self._screening]
+
+        # at least one Fragility Group is kept in the model
+        if (len(screened) > 0) and (len(screened) == len(s_fg_keys)):
+            kept = max(s_fg_keys, key=lambda c_id: P_dmg[c_id])
+            screened.remove(kept)
+
+        P_total = 0.
+        for c_id in screened:
+            comp = self._FG_in.pop(c_id)
+            self._FG_screened.update({c_id: comp})
+
+            # union bound over the damage state limits of the Fragility Group
+            ff_count = len(comp['DSG_set']) * sum(
+                [len(csg_w) for csg_w in comp['csg_weights']])
+            P_bound = min(ff_count * P_dmg[c_id], 1.0)
+            P_total += P_bound
+
+            log_msg('\t\t{}: P(damage) < {:.1e} in each realization'.format(
+                c_id, P_bound))
+
+        log_msg('\t\t{} out of {} Fragility Groups screened out; neglected '
+                'P(damage) < {:.1e} in each realization'.format(
+            len(screened), len(s_fg_keys), min(P_total, 1.0)))
+
     def define_random_variables(self):
         """
         Define the random variables used for loss assessment.
@@ -750,11 +2227,31 @@ class FEMA_P58_Assessment(Assessment):
         """
         super(FEMA_P58_Assessment, self).define_random_variables()
 
+        if self._compiled:
+            if self._screening is not None:
+                log_msg('\tDamage screening is not available for compiled '
+                        'models.')
+            self._define_compiled_random_variables()
+            return
+
+        # restore the Fragility Groups screened out in a previous run
+        self._FG_in.update(self._FG_screened)
+        self._FG_screened = {}
+
         # create the random variables -----------------------------------------
         DEP = self._AIM_in['dependencies']
 
         self._RV_dict = {}
 
+        # with damage screening, the EDPs are sampled first and the Fragility
+        # Groups that cannot be damaged at those EDPs are removed
+        if self._screening is not None:
+            log_msg('\tEDPs...')
+            self._RV_dict.update({'EDP': self._create_RV_demands()})
+            self._sample_random_variables(rv_keys=['EDP', ])
+
+            self._screen_fragility_groups()
+
         # quantities 100
         log_msg('\tQuantities...')
         self._RV_dict.update({'QNT':
@@ -821,34 +2318,26 @@ class FEMA_P58_Assessment(Assessment):
                 log_msg('\t\tNone of the component damage states trigger injuries')
 
         # demands 200
-        log_msg('\tEDPs...')
+        if 'EDP' in self._RV_dict.keys():
+            # the EDPs have been sampled for damage screening
+            rv_keys = [key for key in self._RV_dict.keys() if key != 'EDP']
 
-        GR = self._AIM_in['general']['response']
-        if GR['EDP_dist_basis'] == 'non-collapse results':
-            discard_limits = self._AIM_in['general']['collapse_limits']
         else:
-            discard_limits = None
-
-        self._RV_dict.update({
-            'EDP': self._create_RV_demands()})
+            log_msg('\tEDPs...')
 
-        # sample the random variables -----------------------------------------
-        log_msg()
-        log_msg('Sampling the random variables...')
+            GR = self._AIM_in['general']['response']
+            if GR['EDP_dist_basis'] == 'non-collapse results':
+                discard_limits = self._AIM_in['general']['collapse_limits']
+            else:
+                discard_limits = None
 
-        realization_count = self._AIM_in['general']['realizations']
-        is_coupled = self._AIM_in['general']['coupled_assessment']
+            self._RV_dict.update({
+                'EDP': self._create_RV_demands()})
 
-        s_rv_keys = sorted(self._RV_dict.keys())
-        for r_i in s_rv_keys:
-            rv = self._RV_dict[r_i]
-            if rv is not None:
-                log_msg('\t{}...'.format(r_i))
-                rv.sample_distribution(
-                    sample_size=realization_count,
-                    preserve_order=((r_i=='EDP') and is_coupled))
+            rv_keys = None
 
-        log_msg('Sampling completed.')
+        # sample the random variables -----------------------------------------
+        self._sample_random_variables(rv_keys)
 
     def define_loss_model(self):
         """
@@ -863,8 +2352,10 @@ class FEMA_P58_Assessment(Assessment):
         """
         super(FEMA_P58_Assessment, self).define_loss_model()
 
-        # fragility groups
-        self._FG_dict = self._create_fragility_groups()
+        # fragility groups (these are already available in compiled models)
+        if not self._compiled:
+            self._FG_dict = self._create_fragility_groups()
+        self._DS_columns = ColumnRegistry(self._FG_dict.values())
 
         # demands
         self._EDP_dict = dict(
@@ -1012,9 +2503,7 @@ class FEMA_P58_Assessment(Assessment):
         -------
 
         """
-
-        log_msg(log_div)
-        log_msg('Aggregating results...')
+        super(FEMA_P58_Assessment, self).aggregate_results()
 
         DVs = self._AIM_in['decision_variables']
 
@@ -1044,97 +2533,110 @@ class FEMA_P58_Assessment(Assessment):
         colID = self._ID_dict['collapse']
         if DVs['rec_cost'] or DVs['rec_time']:
             repID = self._ID_dict['repairable']
-            irID = self._ID_dict['irreparable']
+            irID = np.asarray(self._ID_dict['irreparable'], dtype=int)
 
-        MI = pd.MultiIndex.from_tuples(MI_raw)
-
-        SUMMARY = pd.DataFrame(np.empty((
-            self._AIM_in['general']['realizations'],
-            len(MI))), columns=MI)
-        SUMMARY[:] = np.NaN
+        # the results are collected in arrays indexed by realization ID and
+        # the labeled SUMMARY is assembled once at the end
+        realizations = self._AIM_in['general']['realizations']
+        SUMMARY = dict([(col, np.full(realizations, np.nan))
+                        for col in MI_raw])
 
         # event time (if needed)
         if self._AIM_in['general'].get('event_time', None) != 'off':
-            for prop in ['month', 'weekday?', 'hour']:
-                offset = 0
-                if prop == 'month':
-                    offset = 1
-                SUMMARY.loc[:, ('event time', prop)] = \
-                    self._TIME.loc[:, prop] + offset
+            SUMMARY[('event time', 'month')] = self._TIME['month'].values + 1
+            for prop in ['weekday?', 'hour']:
+                SUMMARY[('event time', prop)] = self._TIME[prop].values
 
         # collapses
-        SUMMARY.loc[:, ('collapses', 'collapsed')] = self._COL.iloc[:, 0]
+        SUMMARY[('collapses', 'collapsed')] = self._COL.iloc[:, 0].values
 
         # red tag
         if DVs['red_tag']:
-            SUMMARY.loc[ncID, ('red tagged', '')] = \
-                self._DV_dict['red_tag'].max(axis=1)
+            DV_RED = self._DV_dict['red_tag']
+            if DV_RED.shape[1] > 0:
+                red_tag = np.nanmax(DV_RED.values, axis=1)
+
+                # the integer flags are kept if every realization has one
+                if len(DV_RED.index) == realizations:
+                    SUMMARY[('red tagged', '')] = red_tag[
+                        np.argsort(DV_RED.index.values)]
+                else:
+                    SUMMARY[('red tagged', '')][DV_RED.index.values] = red_tag
 
         # reconstruction cost
         if DVs['rec_cost']:
-            SUMMARY.loc[ncID, ('reconstruction', 'cost')] = \
-                self._DV_dict['rec_cost'].sum(axis=1)
+            cost = SUMMARY[('reconstruction', 'cost')]
+
+            DV_COST = self._DV_dict['rec_cost']
+            cost[DV_COST.index.values] = np.nansum(DV_COST.values, axis=1,
+                                                   dtype=np.float64)
 
             repl_cost = self._AIM_in['general']['replacement_cost']
-            SUMMARY.loc[colID, ('reconstruction', 'cost')] = repl_cost
+            cost[colID] = repl_cost
 
         if DVs['rec_cost'] or DVs['rec_time']:
-            SUMMARY.loc[ncID, ('reconstruction', 'irreparable')] = 0
-            SUMMARY.loc[irID, ('reconstruction', 'irreparable')] = 1
+            SUMMARY[('reconstruction', 'irreparable')][ncID] = 0
+            SUMMARY[('reconstruction', 'irreparable')][irID] = 1
 
         if DVs['rec_cost']:
-            SUMMARY.loc[irID, ('reconstruction', 'cost')] = repl_cost
+            cost[irID] = repl_cost
 
-            repair_impractical_IDs = SUMMARY.loc[
-                SUMMARY.loc[:, ('reconstruction', 'cost')] > repl_cost].index
-            SUMMARY.loc[repID, ('reconstruction', 'cost impractical')] = 0
-            SUMMARY.loc[repair_impractical_IDs,
-                        ('reconstruction', 'cost impractical')] = 1
-            SUMMARY.loc[
-                repair_impractical_IDs, ('reconstruction', 'cost')] = repl_cost
+            with np.errstate(invalid='ignore'):
+                repair_impractical = cost > repl_cost
+            SUMMARY[('reconstruction', 'cost impractical')][repID] = 0
+            SUMMARY[('reconstruction', 'cost impractical')][
+                repair_impractical] = 1
+            cost[repair_impractical] = repl_cost
 
         # reconstruction time
         if DVs['rec_time']:
-            SUMMARY.loc[ncID, ('reconstruction', 'time-sequential')] = \
-                self._DV_dict['rec_time'].sum(axis=1)
-            SUMMARY.loc[ncID, ('reconstruction', 'time-parallel')] = \
-                self._DV_dict['rec_time'].max(axis=1)
+            time_seq = SUMMARY[('reconstruction', 'time-sequential')]
+            time_par = SUMMARY[('reconstruction', 'time-parallel')]
+
+            DV_TIME = self._DV_dict['rec_time']
+            time_seq[DV_TIME.index.values] = np.nansum(DV_TIME.values, axis=1,
+                                                       dtype=np.float64)
+            if DV_TIME.shape[1] > 0:
+                time_par[DV_TIME.index.values] = np.nanmax(DV_TIME.values,
+                                                           axis=1)
 
             rep_time = self._AIM_in['general']['replacement_time']
 
-            for t_label in ['time-sequential', 'time-parallel']:
-                SUMMARY.loc[colID, ('reconstruction', t_label)] = rep_time
-                SUMMARY.loc[irID, ('reconstruction', t_label)] = rep_time
+            for t_array in [time_seq, time_par]:
+                t_array[colID] = rep_time
+                t_array[irID] = rep_time
 
-            repair_impractical_IDs = \
-                SUMMARY.loc[SUMMARY.loc[:, ('reconstruction',
-                                            'time-parallel')] > rep_time].index
-            SUMMARY.loc[repID, ('reconstruction', 'time impractical')] = 0
-            SUMMARY.loc[repair_impractical_IDs,('reconstruction',
-                                                'time impractical')] = 1
-            SUMMARY.loc[repair_impractical_IDs, ('reconstruction',
-                                                 'time-parallel')] = rep_time
+            with np.errstate(invalid='ignore'):
+                repair_impractical = time_par > rep_time
+            SUMMARY[('reconstruction', 'time impractical')][repID] = 0
+            SUMMARY[('reconstruction', 'time impractical')][
+                repair_impractical] = 1
+            time_par[repair_impractical] = rep_time
 
         # injuries
         if DVs['injuries']:
 
             # inhabitants
-            SUMMARY.loc[:, ('inhabitants', '')] = self._POP.sum(axis=1)
+            SUMMARY[('inhabitants', '')] = np.nansum(self._POP.values, axis=1)
 
             if 'CM' in self._COL.columns:
-                SUMMARY.loc[colID, ('collapses', 'mode')] = self._COL.loc[:, 'CM']
+                COL_INJ = self._COL.loc[colID, ['CM', 'INJ-0', 'INJ-1']].values
+                SUMMARY[('collapses', 'mode')][colID] = COL_INJ[:, 0]
+                SUMMARY[('injuries', 'sev1')][colID] = COL_INJ[:, 1]
+                SUMMARY[('injuries', 'sev2')][colID] = COL_INJ[:, 2]
 
-                SUMMARY.loc[colID, ('injuries', 'sev1')] = \
-                    self._COL.loc[:, 'INJ-0']
-                SUMMARY.loc[colID, ('injuries', 'sev2')] = \
-                    self._COL.loc[:, 'INJ-1']
+            for sev_id in range(2):
+                DV_INJ = self._DV_dict['injuries'][sev_id]
+                SUMMARY[('injuries', 'sev{}'.format(sev_id + 1))][
+                    DV_INJ.index.values] = np.nansum(DV_INJ.values, axis=1,
+                                                     dtype=np.float64)
 
-            SUMMARY.loc[ncID, ('injuries', 'sev1')] = \
-                self._DV_dict['injuries'][0].sum(axis=1)
-            SUMMARY.loc[ncID, ('injuries', 'sev2')] = \
-                self._DV_dict['injuries'][1].sum(axis=1)
+        # columns without any results are not included
+        SUMMARY = pd.DataFrame(dict([
+            (col, SUMMARY[col]) for col in MI_raw
+            if not np.all(np.isnan(SUMMARY[col]))]))
 
-        self._SUMMARY = SUMMARY.dropna(axis=1,how='all')
+        self._SUMMARY = self._add_sampling_weights(SUMMARY)
 
     def save_outputs(self, *args, **kwargs):
         """
@@ -1730,6 +3232,87 @@ class FEMA_P58_Assessment(Assessment):
 
             FG_ID = len(FG_dict.keys())+1
 
+            # collect the damage states of the FG - they are identical in
+            # every performance group
+            DSG_kinds, DSG_index, d_tags, DS_tags, DS_data = [], [], [], [], []
+            s_dsg_keys = sorted(comp['DSG_set'].keys())
+            for dsg_i, DSG_ID in enumerate(s_dsg_keys):
+                DSG = comp['DSG_set'][DSG_ID]
+                DSG_kinds.append(DSG['DS_set_kind'])
+                d_tags.append(c_id + '-' + DSG_ID)
+
+                s_ds_keys = sorted(DSG['DS_set'].keys())
+                for DS_ID in s_ds_keys:
+                    DSG_index.append(dsg_i)
+                    DS_tags.append(c_id + '-' + DSG_ID + '-' + DS_ID)
+                    DS_data.append(DSG['DS_set'][DS_ID])
+
+            # consequences are calculated on a performance group level, the
+            # random variables of the PGs are identified by their location
+            # and direction
+            PG_tags = ['-LOC-{}-DIR-{}'.format(loc, dir_) for loc, dir_ in
+                       zip(comp['locations'], comp['directions'])]
+
+            # create the consequence tables
+            CT_cost, CT_time, CT_red, CT_inj = None, None, None, []
+
+            if DVs['rec_cost']:
+                CT_cost = self._create_consequence_table(
+                    medians=[DS['repair_cost']['medians'] for DS in DS_data],
+                    quantities=[DS['repair_cost'].get('quantities', None)
+                                for DS in DS_data],
+                    RV=RVd['DV_REP'],
+                    DS_tags=[t + '-cost' for t in DS_tags],
+                    PG_tags=PG_tags)
+
+            if DVs['rec_time']:
+                CT_time = self._create_consequence_table(
+                    medians=[DS['repair_time']['medians'] for DS in DS_data],
+                    quantities=[DS['repair_time'].get('quantities', None)
+                                for DS in DS_data],
+                    RV=RVd['DV_REP'],
+                    DS_tags=[t + '-time' for t in DS_tags],
+                    PG_tags=PG_tags)
+
+            if DVs['red_tag']:
+                theta_list = [
+                    DS['red_tag']['theta'] if (('red_tag' in DS.keys()) and
+                                               (DS['red_tag']['theta'] > 0))
+                    else None for DS in DS_data]
+                CT_red = self._create_consequence_table(
+                    medians=theta_list, quantities=[None] * len(DS_data),
+                    RV=RVd.get('DV_RED', None), DS_tags=DS_tags,
+                    PG_tags=PG_tags)
+
+            if DVs['injuries']:
+                inj_lvls = max([len(DS['injuries']['theta']) for DS in DS_data
+                                if 'injuries' in DS.keys()], default=0)
+                for inj_i in range(inj_lvls):
+                    theta_list = [None] * len(DS_data)
+                    for DS_i, DS in enumerate(DS_data):
+                        if (('injuries' in DS.keys()) and
+                            (len(DS['injuries']['theta']) > inj_i)):
+                            theta = DS['injuries']['theta'][inj_i]
+                            if theta > 0.:
+                                theta_list[DS_i] = theta
+                    CT_inj.append(self._create_consequence_table(
+                        medians=theta_list, quantities=[None] * len(DS_data),
+                        RV=RVd.get('DV_INJ', None),
+                        DS_tags=[t + '-{}'.format(inj_i) for t in DS_tags],
+                        PG_tags=PG_tags))
+
+            DS_table = DamageStateTable(
+                DSG_kinds=DSG_kinds,
+                DSG_index=DSG_index,
+                weights=[DS['weight'] for DS in DS_data],
+                descriptions=[DS['description'] for DS in DS_data],
+                affected_areas=[DS.get('affected_area', 0.0)
+                                for DS in DS_data],
+                repair_cost=CT_cost,
+                reconstruction_time=CT_time,
+                red_tag=CT_red,
+                injuries=CT_inj)
+
             # create a list for the performance groups
             performance_groups = []
 
@@ -1739,8 +3322,8 @@ class FEMA_P58_Assessment(Assessment):
             PG_csg_lists = comp['csg_weights']
             PG_dists = comp['distribution_kind']
             PG_qnts = comp['quantities']
-            for loc, dir_, csg_list, dist, qnt, in zip(
-                PG_locations, PG_directions, PG_csg_lists, PG_dists, PG_qnts):
+            for PG_i, (loc, dir_, csg_list, dist, qnt) in enumerate(zip(
+                PG_locations, PG_directions, PG_csg_lists, PG_dists, PG_qnts)):
                 PG_ID = 10000 * FG_ID + 10 * loc + dir_
 
                 # get the quantity
@@ -1750,113 +3333,6 @@ class FEMA_P58_Assessment(Assessment):
                     QNT = RandomVariableSubset(RVd['QNT'],
                         tags=[f'{c_id}-QNT-{loc}-{dir_}', ])
 
-                # create the damage objects
-                # consequences are calculated on a performance group level
-
-                # create a list for the damage state groups and their tags
-                DSG_list = []
-                d_tags = []
-                s_dsg_keys = sorted(comp['DSG_set'].keys())
-                for dsg_i, DSG_ID in enumerate(s_dsg_keys):
-                    DSG = comp['DSG_set'][DSG_ID]
-                    d_tags.append(c_id + '-' + DSG_ID)
-
-                    # create a list for the damage states
-                    DS_set = []
-
-                    s_ds_keys = sorted(DSG['DS_set'].keys())
-                    for ds_i, DS_ID in enumerate(s_ds_keys):
-                        DS = DSG['DS_set'][DS_ID]
-
-                        # create the consequence functions
-                        if DVs['rec_cost']:
-                            data = DS['repair_cost']
-                            f_median = prep_bounded_multilinear_median_DV(
-                                **{k: data.get(k, None) for k in
-                                   ('medians', 'quantities')})
-                                   #('median_max', 'median_min',
-                                   # 'quantity_lower', 'quantity_upper')})
-                            cf_tag = c_id + '-' + DSG_ID + '-' + DS_ID + \
-                                     '-cost' + \
-                                     '-LOC-{}-DIR-{}'.format(loc, dir_)
-                            CF_RV = RandomVariableSubset(RVd['DV_REP'],
-                                                         tags=cf_tag)
-                            CF_cost = ConsequenceFunction(DV_median=f_median,
-                                                          DV_distribution=CF_RV)
-                        else:
-                            CF_cost = None
-
-                        if DVs['rec_time']:
-                            data = DS['repair_time']
-                            f_median = prep_bounded_multilinear_median_DV(
-                                **{k: data.get(k, None) for k in
-                                   ('medians', 'quantities')})
-                                   #('median_max', 'median_min',
-                                   # 'quantity_lower', 'quantity_upper')})
-                            cf_tag = c_id + '-' + DSG_ID + '-' + DS_ID + \
-                                     '-time' + \
-                                     '-LOC-{}-DIR-{}'.format(loc, dir_)
-                            CF_RV = RandomVariableSubset(RVd['DV_REP'],
-                                                         tags=cf_tag)
-                            CF_time = ConsequenceFunction(DV_median=f_median,
-                                                          DV_distribution=CF_RV)
-                        else:
-                            CF_time = None
-
-                        if (DVs['red_tag']) and ('red_tag' in DS.keys()):
-                            data = DS['red_tag']
-                            if data['theta'] > 0:
-                                f_median = prep_constant_median_DV(data['theta'])
-                                cf_tag = c_id + '-' + DSG_ID + '-' + DS_ID + \
-                                         '-LOC-{}-DIR-{}'.format(loc, dir_)
-                                CF_RV = RandomVariableSubset(RVd['DV_RED'],
-                                                             tags=cf_tag)
-                                CF_red_tag = ConsequenceFunction(DV_median=f_median,
-                                                                 DV_distribution=CF_RV)
-                            else:
-                                CF_red_tag = None
-                        else:
-                            CF_red_tag = None
-
-                        if (DVs['injuries']) and ('injuries' in DS.keys()):
-                            CF_inj_set = []
-                            for inj_i, theta in enumerate(DS['injuries']['theta']):
-                                if theta > 0.:
-                                    f_median = prep_constant_median_DV(theta)
-                                    cf_tag = c_id + '-' + DSG_ID + '-' + DS_ID + \
-                                             '-{}-LOC-{}-DIR-{}'.format(inj_i, loc, dir_)
-                                    CF_RV = RandomVariableSubset(RVd['DV_INJ'],
-                                                                 tags=cf_tag)
-                                    CF_inj_set.append(ConsequenceFunction(
-                                        DV_median=f_median,
-                                        DV_distribution=CF_RV))
-                                else:
-                                    CF_inj_set.append(None)
-                        else:
-                            CF_inj_set = [None,]
-
-                        # add the DS to the list
-                        if 'affected_area' in DS.keys():
-                            AA = DS['affected_area']
-                        else:
-                            AA = 0.0
-                        # TODO: make this smarter by making affected_area a property of DS
-                        DS_set.append(DamageState(
-                            ID=ds_i + 1,
-                            description=DS['description'],
-                            weight=DS['weight'],
-                            affected_area=AA,
-                            repair_cost_CF=CF_cost,
-                            reconstruction_time_CF=CF_time,
-                            red_tag_CF=CF_red_tag,
-                            injuries_CF_set=CF_inj_set))
-
-                    # add the DSG to the list
-                    DSG_list.append(DamageStateGroup(
-                        ID=dsg_i + 1,
-                        DS_set=DS_set,
-                        DS_set_kind=DSG['DS_set_kind']))
-
                 # create the fragility functions
                 FF_set = []
                 #CSG_this = np.where(comp['directions']==dir_)[0]
@@ -1878,7 +3354,7 @@ class FEMA_P58_Assessment(Assessment):
                                       location=loc,
                                       quantity=QNT,
                                       fragility_functions=FF_set,
-                                      DSG_set=DSG_list,
+                                      DSG_set=DS_table.DSG_set(PG_i),
                                       csg_weights=csg_list,
                                       direction=dir_
                                       )
@@ -2031,38 +3507,28 @@ class FEMA_P58_Assessment(Assessment):
 
         ncID = self._ID_dict['non-collapse']
         NC_samples = len(ncID)
-        DMG = pd.DataFrame()
 
-        s_fg_keys = sorted(self._FG_dict.keys())
-        for fg_id in s_fg_keys:
+        DS_cols = self._DS_columns
+
+        def calc_FG_damage(fg_id, seed):
             log_msg('\t\t{}...'.format(fg_id))
             FG = self._FG_dict[fg_id]
 
-            PG_set = FG._performance_groups
+            # each FG uses its own random number stream
+            rng = np.random.RandomState(seed)
 
-            DS_list = []
-            for DSG in PG_set[0]._DSG_set:
-                for DS in DSG._DS_set:
-                    DS_list.append(str(DSG._ID) + '_' + str(DS._ID))
-            d_count = len(DS_list)
+            PG_set = FG._performance_groups
 
-            MI = pd.MultiIndex.from_product([[FG._ID, ],
-                                             [pg._ID for pg in PG_set],
-                                             DS_list],
-                                            names=['FG', 'PG', 'DSG_DS'])
+            FG_cols = DS_cols.FG_columns(FG._ID)
+            FG_damages = np.zeros((NC_samples, FG_cols.stop - FG_cols.start),
+                                  dtype=self._precision)
 
-            FG_damages = pd.DataFrame(np.zeros((NC_samples, len(MI))),
-                                      columns=MI,
-                                      index=ncID)
+            # the realizations in each DSG of every PG and CSG
+            DSG_allocations = [[] for DSG in PG_set[0]._DSG_set]
 
-            for pg_i, PG in enumerate(PG_set):
+            for PG in PG_set:
 
                 PG_ID = PG._ID
-                if isinstance(PG._quantity, RandomVariableSubset):
-                    PG_qnt = PG._quantity.samples.loc[ncID]
-                else:
-                    PG_qnt = pd.DataFrame(np.ones(NC_samples) * PG._quantity,
-                                          index=ncID)
 
                 # get the corresponding demands
                 if not FG._directional:
@@ -2104,133 +3570,92 @@ class FEMA_P58_Assessment(Assessment):
                 for csg_i, csg_w in enumerate(csg_w_list):
                     DSG_df = PG._FF_set[csg_i].DSG_given_EDP(EDP_samples)
 
-                    for DSG in PG._DSG_set:
-                        in_this_DSG = DSG_df[DSG_df.values == DSG._ID].index
-                        if DSG._DS_set_kind == 'single':
-                            DS = DSG._DS_set[0]
-                            DS_tag = str(DSG._ID) + '_' + str(DS._ID)
-                            FG_damages.loc[in_this_DSG,
-                                           (FG._ID, PG_ID, DS_tag)] += csg_w
-                        elif DSG._DS_set_kind == 'mutually exclusive':
-                            DS_weights = [DS._weight for DS in DSG._DS_set]
-                            DS_RV = RandomVariable(
-                                ID=-1, dimension_tags=['me_DS', ],
-                                distribution_kind='multinomial',
-                                p_set=DS_weights)
-                            DS_df = DS_RV.sample_distribution(
-                                len(in_this_DSG)) + 1
-                            for DS in DSG._DS_set:
-                                DS_tag = str(DSG._ID) + '_' + str(DS._ID)
-                                in_this_DS = DS_df[DS_df.values == DS._ID].index
-                                FG_damages.loc[in_this_DSG[in_this_DS],
-                                               (FG._ID, PG_ID, DS_tag)] += csg_w
-                        elif DSG._DS_set_kind == 'simultaneous':
-                            DS_weights = [DS._weight for DS in DSG._DS_set]
-                            DS_df = np.random.uniform(
-                                size=(len(in_this_DSG), len(DS_weights)))
-                            which_DS = DS_df < DS_weights
-                            any_DS = np.any(which_DS, axis=1)
-                            no_DS_ids = np.where(any_DS == False)[0]
-
-                            while len(no_DS_ids) > 0:
-                                DS_df_add = np.random.uniform(
-                                    size=(len(no_DS_ids), len(DS_weights)))
-                                which_DS_add = DS_df_add < DS_weights
-                                which_DS[no_DS_ids] = which_DS_add
-
-                                any_DS = np.any(which_DS_add, axis=1)
-                                no_DS_ids = no_DS_ids[
-                                    np.where(any_DS == False)[0]]
-
-                            for ds_i, DS in enumerate(DSG._DS_set):
-                                DS_tag = str(DSG._ID) + '_' + str(DS._ID)
-                                in_this_DS = which_DS[:, ds_i]
-                                FG_damages.loc[in_this_DSG[in_this_DS], (
-                                FG._ID, PG_ID, DS_tag)] += csg_w
+                    for DSG, allocations in zip(PG._DSG_set,
+                                                DSG_allocations):
+                        in_this_DSG = np.where(DSG_df.values == DSG._ID)[0]
 
-                        else:
-                            raise ValueError(
-                                "Unknown damage state type: {}".format(
-                                    DSG._DS_set_kind)
-                            )
+                        # positions of the DS columns in the FG block
+                        DS_pos = [DS_cols.position(FG._ID, PG_ID, DSG._ID,
+                                                   DS._ID) - FG_cols.start
+                                  for DS in DSG._DS_set]
+
+                        allocations.append((in_this_DSG, DS_pos, csg_w))
+
+            # the damage states are sampled for all PGs at once
+            for DSG, allocations in zip(PG_set[0]._DSG_set, DSG_allocations):
+                self._allocate_damage_states(FG_damages, DSG, allocations,
+                                             random_state=rng)
+
+            # damaged fractions -> damaged quantities
+            for PG in PG_set:
+                PG_qnt = self._PG_quantity(PG, ncID)
+                PG_cols = DS_cols.PG_columns(FG._ID, PG._ID)
+                FG_damages[:, PG_cols.start - FG_cols.start:
+                           PG_cols.stop - FG_cols.start] *= PG_qnt[:, None]
 
-                FG_damages.iloc[:,pg_i * d_count:(pg_i + 1) * d_count] = \
-                    FG_damages.mul(PG_qnt.iloc[:, 0], axis=0)
+            return FG_damages
 
-            DMG = pd.concat((DMG, FG_damages), axis=1)
+        s_fg_keys = sorted(self._FG_dict.keys())
 
-        DMG.index = ncID
+        # the seeds of the FG streams come from the global random state to
+        # keep the results reproducible
+        FG_seeds = np.random.randint(np.iinfo(np.int32).max,
+                                     size=len(s_fg_keys))
 
-        # sort the columns to enable index slicing later
-        DMG = DMG.sort_index(axis=1, ascending=True)
+        FG_results = self._evaluate_FGs(calc_FG_damage, s_fg_keys, FG_seeds)
 
-        return DMG
+        return self._collect_FG_columns(s_fg_keys, FG_results, ncID)
 
     def _calc_red_tag(self):
-        idx = pd.IndexSlice
 
         ncID = self._ID_dict['non-collapse']
         NC_samples = len(ncID)
-        DV_RED = pd.DataFrame()
 
-        s_fg_keys = sorted(self._FG_dict.keys())
-        for fg_id in s_fg_keys:
+        DS_cols = self._DS_columns
+        DMG = self._DMG.values
+
+        def calc_FG_red_tag(fg_id):
             FG = self._FG_dict[fg_id]
 
             PG_set = FG._performance_groups
+            PG_qnts = [self._PG_quantity(PG, ncID) for PG in PG_set]
 
-            DS_list = self._DMG.loc[:, idx[FG._ID, PG_set[0]._ID, :]].columns
-            DS_list = DS_list.levels[2][DS_list.codes[2]].values
-
-            MI = pd.MultiIndex.from_product([[FG._ID, ],
-                                             [pg._ID for pg in PG_set],
-                                             DS_list],
-                                            names=['FG', 'PG', 'DSG_DS'])
-
-            FG_RED = pd.DataFrame(np.zeros((NC_samples, len(MI))),
-                                  columns=MI,
-                                  index=ncID)
-
-            for pg_i, PG in enumerate(PG_set):
-
-                PG_ID = PG._ID
-                if isinstance(PG._quantity, RandomVariableSubset):
-                    PG_qnt = PG._quantity.samples.loc[ncID]
-                else:
-                    PG_qnt = pd.DataFrame(np.ones(NC_samples) * PG._quantity,
-                                          index=ncID)
+            RED_pos, FG_RED = [], []
+            for pos in range(DS_cols.size)[DS_cols.FG_columns(FG._ID)]:
+                pg_i = DS_cols.PG_i[pos]
+                DS = PG_set[pg_i]._DSG_set[
+                    DS_cols.DSG_i[pos]]._DS_set[DS_cols.DS_i[pos]]
 
-                PG_DMG = self._DMG.loc[:, idx[FG._ID, PG_ID, :]].div(
-                    PG_qnt.iloc[:, 0],
-                    axis=0)
+                if DS._red_tag_CF is not None:
+                    RED_samples = DS.red_tag_dmg_limit(
+                        sample_size=NC_samples)
 
-                for d_i, d_tag in enumerate(DS_list):
-                    dsg_i = int(d_tag[0]) - 1
-                    ds_i = int(d_tag[-1]) - 1
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        is_red = (DMG[:, pos] / PG_qnts[pg_i] >
+                                  np.ravel(RED_samples))
 
-                    DS = PG._DSG_set[dsg_i]._DS_set[ds_i]
+                    RED_pos.append(pos)
+                    FG_RED.append(is_red)
 
-                    if DS._red_tag_CF is not None:
-                        RED_samples = DS.red_tag_dmg_limit(
-                            sample_size=NC_samples)
-                        RED_samples.index = ncID
+            return RED_pos, FG_RED
 
-                        is_red = PG_DMG.loc[:, (FG._ID, PG_ID, d_tag)].sub(
-                            RED_samples, axis=0)
+        s_fg_keys = sorted(self._FG_dict.keys())
 
-                        FG_RED.loc[:, (FG._ID, PG_ID, d_tag)] = (
-                            is_red > 0.).astype(int)
-                    else:
-                        FG_RED.drop(labels=[(FG._ID, PG_ID, d_tag), ], axis=1,
-                                    inplace=True)
+        RED_pos, DV_RED = [], []
+        for FG_pos, FG_RED in self._evaluate_FGs(calc_FG_red_tag, s_fg_keys):
+            RED_pos += FG_pos
+            DV_RED += FG_RED
 
-            if FG_RED.size > 0:
-                DV_RED = pd.concat((DV_RED, FG_RED), axis=1)
+        if (len(RED_pos) == 0) or (NC_samples == 0):
+            return pd.DataFrame()
 
-        # sort the columns to enable index slicing later
-        DV_RED = DV_RED.sort_index(axis=1, ascending=True)
+        # keep the order of the damage state columns
+        order = np.argsort(RED_pos)
+        RED_pos = np.asarray(RED_pos)[order]
+        DV_RED = np.column_stack(DV_RED)[:, order].astype(int)
 
-        return DV_RED
+        return pd.DataFrame(DV_RED, columns=DS_cols.labels(RED_pos),
+                            index=ncID)
 
     def _calc_irreparable(self):
 
@@ -2300,59 +3725,61 @@ class FEMA_P58_Assessment(Assessment):
 
     def _calc_repair_cost_and_time(self):
 
-        idx = pd.IndexSlice
         DVs = self._AIM_in['decision_variables']
 
-        DMG_by_FG_and_DS = self._DMG.groupby(level=[0, 2], axis=1).sum()
-
         repID = self._ID_dict['repairable']
         REP_samples = len(repID)
-        DV_COST = pd.DataFrame(np.zeros((REP_samples, len(self._DMG.columns))),
-                               columns=self._DMG.columns, index=repID)
-        DV_TIME = deepcopy(DV_COST)
 
-        s_fg_keys = sorted(self._FG_dict.keys())
-        for fg_id in s_fg_keys:
+        DS_cols = self._DS_columns
+        DMG = self._DMG.loc[repID].values
+
+        def calc_FG_repairs(fg_id):
             FG = self._FG_dict[fg_id]
 
             PG_set = FG._performance_groups
 
-            DS_list = self._DMG.loc[:, idx[FG._ID, PG_set[0]._ID, :]].columns
-            DS_list = DS_list.levels[2][DS_list.codes[2]].values
+            offset, PG_count, DS_count = DS_cols.FG_block(FG._ID)
+            FG_DMG = DMG[:, DS_cols.FG_columns(FG._ID)]
 
-            for pg_i, PG in enumerate(PG_set):
+            # the consequences depend on the damaged quantity of each DS in
+            # the whole FG
+            TOT_qnts = FG_DMG.reshape(REP_samples, PG_count, DS_count).sum(
+                axis=1)
 
-                PG_ID = PG._ID
+            FG_COST = np.zeros(FG_DMG.shape, dtype=self._precision)
+            FG_TIME = np.zeros(FG_DMG.shape, dtype=self._precision)
+
+            for col in range(FG_DMG.shape[1]):
+                pos = offset + col
+                DS = PG_set[DS_cols.PG_i[pos]]._DSG_set[
+                    DS_cols.DSG_i[pos]]._DS_set[DS_cols.DS_i[pos]]
 
-                for d_i, d_tag in enumerate(DS_list):
-                    dsg_i = int(d_tag[0]) - 1
-                    ds_i = int(d_tag[-1]) - 1
+                TOT_qnt = pd.Series(TOT_qnts[:, col % DS_count], index=repID)
+
+                # repair cost
+                if DVs['rec_cost']:
+                    COST_samples = DS.unit_repair_cost(quantity=TOT_qnt)
+                    FG_COST[:, col] = np.asarray(COST_samples) * FG_DMG[:, col]
 
-                    DS = PG._DSG_set[dsg_i]._DS_set[ds_i]
+                if DVs['rec_time']:
+                    # repair time
+                    TIME_samples = DS.unit_reconstruction_time(quantity=TOT_qnt)
+                    FG_TIME[:, col] = np.asarray(TIME_samples) * FG_DMG[:, col]
 
-                    TOT_qnt = DMG_by_FG_and_DS.loc[repID, (FG._ID, d_tag)]
-                    PG_qnt = self._DMG.loc[repID,
-                                           (FG._ID, PG_ID, d_tag)]
+            return FG_COST, FG_TIME
 
-                    # repair cost
-                    if DVs['rec_cost']:
-                        COST_samples = DS.unit_repair_cost(quantity=TOT_qnt)
-                        DV_COST.loc[:,
-                        (FG._ID, PG_ID, d_tag)] = COST_samples * PG_qnt
+        s_fg_keys = sorted(self._FG_dict.keys())
 
-                    if DVs['rec_time']:
-                        # repair time
-                        TIME_samples = DS.unit_reconstruction_time(quantity=TOT_qnt)
-                        DV_TIME.loc[:,
-                        (FG._ID, PG_ID, d_tag)] = TIME_samples * PG_qnt
+        FG_results = self._evaluate_FGs(calc_FG_repairs, s_fg_keys)
 
-        # sort the columns to enable index slicing later
         if DVs['rec_cost']:
-            DV_COST = DV_COST.sort_index(axis=1, ascending=True)
+            DV_COST = self._collect_FG_columns(
+                s_fg_keys, [FG_res[0] for FG_res in FG_results], repID)
         else:
             DV_COST = None
         if DVs['rec_time']:
-            DV_TIME = DV_TIME.sort_index(axis=1, ascending=True)
+            DV_TIME = self._collect_FG_columns(
+                s_fg_keys, [FG_res[1] for FG_res in FG_results], repID)
         else:
             DV_TIME = None
 
@@ -2369,102 +3796,171 @@ class FEMA_P58_Assessment(Assessment):
 
         if C_samples > 0:
 
-            inj_lvls = self._inj_lvls
             coll_modes = self._AIM_in['collapse_modes']
             P_keys = [cmk for cmk in coll_modes.keys()]
             P_modes = [coll_modes[k]['w'] for k in P_keys]
 
-            # create the DataFrame that collects the decision variables
-            inj_cols = ['CM',]
-            for i in range(inj_lvls):
-                inj_cols.append('INJ-{}'.format(i))
-            COL_INJ = pd.DataFrame(np.zeros((C_samples, inj_lvls + 1)),
-                                   columns=inj_cols, index=colID)
-
             CM_RV = RandomVariable(ID=-1, dimension_tags=['CM', ],
                                    distribution_kind='multinomial',
                                    p_set=P_modes)
-            COL_INJ['CM'] = CM_RV.sample_distribution(C_samples).values
+            CM = np.ravel(CM_RV.sample_distribution(C_samples).values)
 
             # get the popoulation values corresponding to the collapsed cases
             P_sel = self._POP.loc[colID]
 
             # calculate the exposure of the popoulation
+            INJ_sum = np.zeros((C_samples, inj_lvls), dtype=self._precision)
             for cm_i, cmk in enumerate(P_keys):
-                mode_IDs = COL_INJ[COL_INJ['CM'] == cm_i].index
+                mode_mask = CM == cm_i
                 CFAR = coll_modes[cmk]['affected_area']
-                INJ = coll_modes[cmk]['injuries']
+                INJ = np.asarray(coll_modes[cmk]['injuries'][:inj_lvls],
+                                 dtype=np.float64)
                 for loc_i in range(len(CFAR)):
                     loc_label = 'LOC{}'.format(loc_i + 1)
                     if loc_label in P_sel.columns:
-                        for inj_i in range(inj_lvls):
-                            INJ_i = P_sel.loc[mode_IDs, loc_label] * CFAR[loc_i] * \
-                                    INJ[inj_i]
-                            COL_INJ.loc[mode_IDs, 'INJ-{}'.format(inj_i)] = (
-                                COL_INJ.loc[mode_IDs, 'INJ-{}'.format(inj_i)].add(INJ_i, axis=0).values)
+                        P_loc = P_sel[loc_label].values[mode_mask]
+                        INJ_sum[mode_mask] += (P_loc * CFAR[loc_i])[:, None] * INJ
+
+            # create the DataFrame that collects the decision variables
+            COL_INJ = pd.DataFrame(dict(
+                [('CM', CM), ] +
+                [('INJ-{}'.format(i), INJ_sum[:, i]) for i in range(inj_lvls)]),
+                index=colID)
 
             return COL_INJ
 
         else:
             return None
 
-    def _calc_non_collapse_injuries(self):
+    def _unit_injury_samples(self, CF_list, sample_size):
+        """
+        Sample the unit injuries of a list of consequence functions.
+
+        The consequence functions that sample the same random variable are
+        evaluated together: their samples are gathered from the random variable
+        in one step and multiplied by the vector of their median values.
+
+        Parameters
+        ----------
+        CF_list: list of ConsequenceFunction
+            Injury consequence functions, one per damage column.
+        sample_size: int
+            Number of samples requested.
+
+        Returns
+        -------
+        unit_INJ: ndarray
+            Unit injury samples with one column per consequence function.
+
+        """
+
+        unit_INJ = np.empty((sample_size, len(CF_list)), dtype=self._precision)
+
+        RV_groups = {}
+        for cf_i, CF in enumerate(CF_list):
+            CF_RV = CF._DV_distribution
+            if (isinstance(CF_RV, RandomVariableSubset) and
+                (CF_RV._RV.samples is not None) and
+                (CF_RV._RV.samples.shape[0] >= sample_size)):
+                RV_groups.setdefault(id(CF_RV._RV), (CF_RV._RV, []))[1].append(
+                    cf_i)
+            else:
+                unit_INJ[:, cf_i] = CF.sample_unit_DV(sample_size=sample_size)
+
+        for RV, cf_ids in RV_groups.values():
+            positions = [CF_list[cf_i]._DV_distribution.positions
+                         for cf_i in cf_ids]
+            medians = np.array([CF_list[cf_i].median() for cf_i in cf_ids],
+                               dtype=np.float64)
+            unit_INJ[:, cf_ids] = (RV.samples.values[:sample_size, positions]
+                                   * medians)
 
-        idx = pd.IndexSlice
+        return unit_INJ
+
+    def _calc_non_collapse_injuries(self):
 
         ncID = self._ID_dict['non-collapse']
         NC_samples = len(ncID)
-        DV_INJ_dict = dict([(i, pd.DataFrame(np.zeros((NC_samples,
-                                                       len(self._DMG.columns))),
-                                             columns=self._DMG.columns,
-                                             index=ncID))
-                            for i in range(self._inj_lvls)])
-        s_fg_keys = sorted(self._FG_dict.keys())
-        for fg_id in s_fg_keys:
+
+        plan_area = self._AIM_in['general']['plan_area']
+
+        # gather the population of the non-collapsed cases once
+        POP = self._POP.loc[ncID]
+        POP_cols = dict([(loc_label, loc_i) for loc_i, loc_label
+                         in enumerate(POP.columns)])
+        POP = POP.values
+
+        DS_cols = self._DS_columns
+        DMG = self._DMG.values
+
+        def calc_FG_injuries(fg_id):
             FG = self._FG_dict[fg_id]
 
             PG_set = FG._performance_groups
 
-            DS_list = self._DMG.loc[:, idx[FG._ID, PG_set[0]._ID, :]].columns
-            DS_list = DS_list.levels[2][DS_list.codes[2]].values
+            # collect the columns with an affected area and the properties
+            # that are needed to estimate the injuries in them
+            col_ids, POP_ids, AA_ratios = [], [], []
+            CF_sets = [[] for i in range(self._inj_lvls)]
+            for pos in range(DS_cols.size)[DS_cols.FG_columns(FG._ID)]:
+                PG = PG_set[DS_cols.PG_i[pos]]
+                DS = PG._DSG_set[DS_cols.DSG_i[pos]]._DS_set[DS_cols.DS_i[pos]]
+
+                if DS._affected_area > 0.:
+                    col_ids.append(pos)
+                    POP_ids.append(POP_cols['LOC{}'.format(PG._location)])
+                    AA_ratios.append(DS._affected_area)
+
+                    for i in range(self._inj_lvls):
+                        if len(DS._injuries_CF_set) > i:
+                            CF_sets[i].append(DS._injuries_CF_set[i])
+                        else:
+                            CF_sets[i].append(None)
 
-            for pg_i, PG in enumerate(PG_set):
+            col_ids = np.array(col_ids, dtype=np.int64)
 
-                PG_ID = PG._ID
+            DV_INJ_dict = {}
 
-                for d_i, d_tag in enumerate(DS_list):
-                    dsg_i = int(d_tag[0]) - 1
-                    ds_i = int(d_tag[-1]) - 1
+            if len(col_ids) > 0:
+                P_affected = POP[:, POP_ids] * np.array(AA_ratios) / plan_area
+                QNT = DMG[:, col_ids]
 
-                    DS = PG._DSG_set[dsg_i]._DS_set[ds_i]
+            for i in range(self._inj_lvls):
+                INJ = np.zeros((NC_samples, len(col_ids)),
+                               dtype=self._precision)
 
-                    if DS._affected_area > 0.:
-                        P_affected = (self._POP.loc[ncID]
-                                      * DS._affected_area /
-                                      self._AIM_in['general']['plan_area'])
+                inj_ids = [c_i for c_i, CF in enumerate(CF_sets[i])
+                           if CF is not None]
 
-                        QNT = self._DMG.loc[:, (FG._ID, PG_ID, d_tag)]
+                # estimate injuries
+                if len(inj_ids) > 0:
+                    INJ_samples = self._unit_injury_samples(
+                        [CF_sets[i][c_i] for c_i in inj_ids], NC_samples)
 
-                        # estimate injuries
-                        for i in range(self._inj_lvls):
-                            INJ_samples = DS.unit_injuries(severity_level=i,
-                                                           sample_size=NC_samples)
-                            if INJ_samples is not None:
-                                INJ_samples.index = ncID
-                                P_aff_i = P_affected.loc[:,
-                                          'LOC{}'.format(PG._location)]
-                                INJ_i = INJ_samples * P_aff_i * QNT
-                                DV_INJ_dict[i].loc[:,
-                                (FG._ID, PG_ID, d_tag)] = INJ_i
+                    INJ[:, inj_ids] = (INJ_samples * P_affected[:, inj_ids]
+                                       * QNT[:, inj_ids])
 
-                                # remove the useless columns from DV_INJ
-        for i in range(self._inj_lvls):
-            DV_INJ = DV_INJ_dict[i]
-            DV_INJ_dict[i] = DV_INJ.loc[:, (DV_INJ != 0.0).any(axis=0)]
+                # keep only the columns with injuries
+                nz_ids = (INJ != 0.0).any(axis=0)
+                DV_INJ_dict.update({i: (col_ids[nz_ids], INJ[:, nz_ids])})
+
+            return DV_INJ_dict
+
+        s_fg_keys = sorted(self._FG_dict.keys())
+
+        FG_results = self._evaluate_FGs(calc_FG_injuries, s_fg_keys)
 
-        # sort the columns to enable index slicing later
+        DV_INJ_dict = {}
         for i in range(self._inj_lvls):
-            DV_INJ_dict[i] = DV_INJ_dict[i].sort_index(axis=1, ascending=True)
+            INJ_pos = np.concatenate([FG_res[i][0] for FG_res in FG_results])
+            INJ = np.concatenate([FG_res[i][1] for FG_res in FG_results],
+                                 axis=1)
+
+            # keep the order of the damage state columns
+            order = np.argsort(INJ_pos)
+            DV_INJ_dict.update({i: pd.DataFrame(
+                INJ[:, order], index=ncID,
+                columns=DS_cols.labels(INJ_pos[order]))})
 
         return DV_INJ_dict
 
@@ -2485,8 +3981,47 @@ class HAZUS_Assessment(Assessment):
         The HAZUS earthquake methodology uses 4 levels.
         default: 4
     """
-    def __init__(self, hazard='EQ', inj_lvls = 4, log_file=True):
-        super(HAZUS_Assessment, self).__init__(log_file)
+
+    # the repair consequences are defined relative to the replacement cost
+    _stage_inputs = dict(Assessment._stage_inputs, define_loss_model=(
+        Assessment._stage_inputs['define_loss_model'] + ['replacement', ]))
+
+    # calibrated with the HAZUS EQ buildings of tools/benchmark.py
+    _resource_model = {
+        'define_random_variables': {
+            'time': {'base': 0.0551, 'matrix_entries': 0.,
+                     'sample_values': 2.75e-08, 'truncated_values': 0.,
+                     'EDP_values': 2.99e-05},
+            'memory': {'matrix_entries': 1.38, 'sample_values': 1.,
+                       'realizations': 74.9},
+            # most injury dimensions are removed from the random variables
+            'retained': {'sample_values': 1.}},
+        'define_loss_model': {
+            'time': {'base': 0.000129, 'DS_columns': 4.98e-05},
+            'memory': {'DS_columns': 1790.},
+            'retained': {}},
+        'calculate_damage': {
+            'time': {'base': 0.0159, 'PGs': 0.0178, 'CSGs': 0.,
+                     'DS_values': 3.65e-07},
+            'memory': {'DS_values': 29.9, 'realizations': 272.},
+            'retained': {'DS_values': 8.}},
+        'calculate_losses': {
+            'time': {'base': 0.0142, 'PGs': 0.0474, 'DV_values': 5.81e-08},
+            'memory': {'DV_values': 9.38, 'realizations': 50.9},
+            'retained': {'DV_values': 8.}},
+        'aggregate_results': {
+            'time': {'base': 0.00557, 'DV_values': 2.92e-09},
+            'memory': {'DV_values': 4.1, 'realizations': 269.},
+            'retained': {}},
+        'save_outputs': {
+            'time': {'base': 0.193, 'DV_values': 1.12e-06},
+            'memory': {'DV_values': 30.4, 'realizations': 439.},
+            'retained': {}},
+    }
+
+    def __init__(self, hazard='EQ', inj_lvls = 4, log_file=True,
+                 n_threads=1):
+        super(HAZUS_Assessment, self).__init__(log_file, n_threads)
 
         self._inj_lvls = inj_lvls
         self._hazard = hazard
@@ -2580,6 +4115,10 @@ class HAZUS_Assessment(Assessment):
         """
         super(HAZUS_Assessment, self).define_random_variables()
 
+        if self._compiled:
+            self._define_compiled_random_variables()
+            return
+
         DEP = self._AIM_in['dependencies']
 
         # create the random variables -----------------------------------------
@@ -2631,22 +4170,7 @@ class HAZUS_Assessment(Assessment):
         self._RV_dict.update({'EDP': self._create_RV_demands()})
 
         # sample the random variables -----------------------------------------
-        log_msg()
-        log_msg('Sampling the random variables...')
-
-        realization_count = self._AIM_in['general']['realizations']
-        is_coupled = self._AIM_in['general']['coupled_assessment']
-
-        s_rv_keys = sorted(self._RV_dict.keys())
-        for r_i in s_rv_keys:
-            rv = self._RV_dict[r_i]
-            if rv is not None:
-                log_msg('\t{}...'.format(r_i))
-                rv.sample_distribution(
-                    sample_size=realization_count,
-                    preserve_order=((r_i=='EDP') and is_coupled))
-
-        log_msg('Sampling completed.')
+        self._sample_random_variables()
 
     def define_loss_model(self):
         """
@@ -2662,8 +4186,10 @@ class HAZUS_Assessment(Assessment):
         """
         super(HAZUS_Assessment, self).define_loss_model()
 
-        # fragility groups
-        self._FG_dict = self._create_fragility_groups()
+        # fragility groups (these are already available in compiled models)
+        if not self._compiled:
+            self._FG_dict = self._create_fragility_groups()
+        self._DS_columns = ColumnRegistry(self._FG_dict.values())
 
         # demands
         self._EDP_dict = dict(
@@ -2710,6 +4236,7 @@ class HAZUS_Assessment(Assessment):
 
         # apply the prescribed damge logic
         if self._AIM_in['damage_logic'] is not None:
+            idx = pd.IndexSlice
             for DL in self._AIM_in['damage_logic']:
                 if DL['type'] == 'propagate':
                     # identify the source and target FG ids
@@ -2762,6 +4289,9 @@ class HAZUS_Assessment(Assessment):
                 else:
                     log_msg(f'Unkown damage logic: {DL["type"]}')
 
+            # the assignments above may change the precision of the results
+            self._DMG = self._DMG.astype(self._precision, copy=False)
+
         # collapses are indicated by the ultimate DS in HAZUS
         DMG_agg = self._DMG.groupby(level=2, axis=1).sum()
         if '4_2' in DMG_agg.columns:
@@ -2834,9 +4364,7 @@ class HAZUS_Assessment(Assessment):
         -------
 
         """
-
-        log_msg(log_div)
-        log_msg('Aggregating results...')
+        super(HAZUS_Assessment, self).aggregate_results()
 
         DVs = self._AIM_in['decision_variables']
 
@@ -2874,78 +4402,82 @@ class HAZUS_Assessment(Assessment):
 
         ncID = self._ID_dict['non-collapse']
         colID = self._ID_dict['collapse']
-        if DVs['rec_cost'] or DVs['rec_time']:
-            repID = self._ID_dict['repairable']
-            irID = self._ID_dict['irreparable']
 
-        MI = pd.MultiIndex.from_tuples(MI_raw)
-
-        SUMMARY = pd.DataFrame(
-            np.empty((self._AIM_in['general']['realizations'], len(MI))),
-            columns=MI)
-        SUMMARY[:] = np.NaN
+        # the results are collected in arrays indexed by realization ID and
+        # the labeled SUMMARY is assembled once at the end
+        realizations = self._AIM_in['general']['realizations']
+        SUMMARY = dict([(col, np.full(realizations, np.nan))
+                        for col in MI_raw])
 
         # event time (if needed)
-        if (DVs['injuries'] and 
+        if (DVs['injuries'] and
             (self._AIM_in['general']['event_time'] != 'off')):
-            for prop in ['month', 'weekday?', 'hour']:
-                offset = 0
-                if prop == 'month':
-                    offset = 1
-                SUMMARY.loc[:, ('event time', prop)] = \
-                    self._TIME.loc[:, prop] + offset
+            SUMMARY[('event time', 'month')] = self._TIME['month'].values + 1
+            for prop in ['weekday?', 'hour']:
+                SUMMARY[('event time', prop)] = self._TIME[prop].values
 
         # collapses
-        SUMMARY.loc[:, ('collapses', 'collapsed')] = self._COL.iloc[:, 0]
+        SUMMARY[('collapses', 'collapsed')] = self._COL.iloc[:, 0].values
 
         # damage
-        # remove the ground failure FGs first
-        DMG = self._DMG.copy()
-        for FG_name in self._FG_dict.keys():
-            if FG_name.startswith('GF'):
-                del DMG[self._FG_dict[FG_name]._ID]
+        # the ground failure FGs are not considered
+        DS_cols = self._DS_columns
+        DMG_damaged = self._DMG.values > 0.0
 
         for comp_type in ['S', 'NSA', 'NSD']:
-            fg_list = [self._FG_dict[fg]._ID for fg in self._FG_dict.keys() if fg.startswith(comp_type)]
+            fg_list = [self._FG_dict[fg]._ID for fg in self._FG_dict.keys()
+                       if fg.startswith(comp_type)]
 
-            if len(fg_list)>0:
+            if len(fg_list) > 0:
 
-                DMG_agg = DMG.loc[:, fg_list].groupby(level=['DSG_DS',], axis=1).sum()
+                in_type = np.isin(DS_cols.FG, fg_list)
 
-                DMG_agg['DS'] = 0
-                for c_i, col in enumerate(DMG_agg.columns):
-                    if col != 'DS':
-                        DMG_agg.loc[DMG_agg.loc[:,col] > 0.0, 'DS'] = int(col[0])
+                # the highest damage state is the highest DSG with a non-zero
+                # damaged quantity
+                DS = np.max(np.where(DMG_damaged[:, in_type],
+                                     DS_cols.DSG[in_type], 0),
+                            axis=1, initial=0)
 
-                SUMMARY.loc[:, ('highest damage state', comp_type)] = DMG_agg['DS']
+                if len(self._DMG.index) == realizations:
+                    SUMMARY[('highest damage state', comp_type)] = DS[
+                        np.argsort(self._DMG.index.values)]
+                else:
+                    SUMMARY[('highest damage state', comp_type)][
+                        self._DMG.index.values] = DS
 
         # reconstruction cost
+        repair_impractical = np.zeros(realizations, dtype=bool)
         if DVs['rec_cost']:
-            SUMMARY.loc[ncID, ('reconstruction', 'cost')] = \
-                self._DV_dict['rec_cost'].sum(axis=1)
+            cost = SUMMARY[('reconstruction', 'cost')]
+
+            DV_COST = self._DV_dict['rec_cost']
+            cost[DV_COST.index.values] = np.nansum(DV_COST.values, axis=1,
+                                                   dtype=np.float64)
 
             repl_cost = self._AIM_in['general']['replacement_cost']
-            SUMMARY.loc[colID, ('reconstruction', 'cost')] = repl_cost
+            cost[colID] = repl_cost
 
-            SUMMARY.loc[:, ('reconstruction', 'cost impractical')] = 0
-            repair_impractical_IDs = SUMMARY.loc[ncID, ('reconstruction', 'cost')] > repl_cost
-            SUMMARY.loc[repair_impractical_IDs,
-                        ('reconstruction', 'cost impractical')] = 1
-            SUMMARY.loc[repair_impractical_IDs,
-                        ('reconstruction', 'cost')] = repl_cost
+            with np.errstate(invalid='ignore'):
+                repair_impractical[ncID] = cost[ncID] > repl_cost
+            SUMMARY[('reconstruction', 'cost impractical')] = \
+                repair_impractical.astype(int)
+            cost[repair_impractical] = repl_cost
 
             # only keep the non-collapsed cases in the DVs
             self._DV_dict['rec_cost'] = self._DV_dict['rec_cost'].loc[self._COL['COL'] == 0]
 
         # reconstruction time
         if DVs['rec_time']:
-            SUMMARY.loc[ncID, ('reconstruction', 'time')] = \
-                self._DV_dict['rec_time'].sum(axis=1)
+            time = SUMMARY[('reconstruction', 'time')]
+
+            DV_TIME = self._DV_dict['rec_time']
+            time[DV_TIME.index.values] = np.nansum(DV_TIME.values, axis=1,
+                                                   dtype=np.float64)
 
             repl_time = self._AIM_in['general']['replacement_time']
-            SUMMARY.loc[colID, ('reconstruction', 'time')] = repl_time
+            time[colID] = repl_time
 
-            SUMMARY.loc[repair_impractical_IDs, ('reconstruction', 'time')] = repl_time
+            time[repair_impractical] = repl_time
 
             # only keep the non-collapsed cases in the DVs
             self._DV_dict['rec_time'] = self._DV_dict['rec_time'].loc[self._COL['COL'] == 0]
@@ -2954,20 +4486,26 @@ class HAZUS_Assessment(Assessment):
         if DVs['injuries']:
 
             # inhabitants
-            SUMMARY.loc[:, ('inhabitants', '')] = self._POP.sum(axis=1)
+            SUMMARY[('inhabitants', '')] = np.nansum(self._POP.values, axis=1)
 
             for sev_id in range(4):
                 # both collapse and non-collapse cases
-                sev_tag = 'sev{}'.format(sev_id+1)
-                SUMMARY.loc[ncID, ('injuries', sev_tag)] = \
-                    self._DV_dict['injuries'][sev_id].sum(axis=1)
+                DV_INJ = self._DV_dict['injuries'][sev_id]
+                SUMMARY[('injuries', 'sev{}'.format(sev_id + 1))][
+                    DV_INJ.index.values] = np.nansum(DV_INJ.values, axis=1,
+                                                     dtype=np.float64)
 
         # keep only the non-collapse damage data
         self._DMG = self._DMG.loc[self._COL['COL'] == 0]
 
         self._ID_dict['non-collapse'] = self._DV_dict['rec_cost'].index.values.astype(int)
 
-        self._SUMMARY = SUMMARY.dropna(axis=1, how='all')
+        # columns without any results are not included
+        SUMMARY = pd.DataFrame(dict([
+            (col, SUMMARY[col]) for col in MI_raw
+            if not np.all(np.isnan(SUMMARY[col]))]))
+
+        self._SUMMARY = self._add_sampling_weights(SUMMARY)
 
     def save_outputs(self, *args, **kwargs):
         """
@@ -3410,6 +4948,90 @@ class HAZUS_Assessment(Assessment):
 
             FG_ID = len(FG_dict.keys()) + 1
 
+            # collect the damage states of the FG - they are identical in
+            # every performance group
+            DSG_kinds, DSG_index, d_tags, DS_tags, DS_data = [], [], [], [], []
+            s_dsg_keys = sorted(comp['DSG_set'].keys())
+            for dsg_i, DSG_ID in enumerate(s_dsg_keys):
+                DSG = comp['DSG_set'][DSG_ID]
+                DSG_kinds.append(DSG['DS_set_kind'])
+                d_tags.append(c_id + '-' + DSG_ID)
+
+                s_ds_keys = sorted(DSG['DS_set'].keys())
+                for DS_ID in s_ds_keys:
+                    DSG_index.append(dsg_i)
+                    DS_tags.append(c_id + '-' + DSG_ID + '-' + DS_ID)
+                    DS_data.append(DSG['DS_set'][DS_ID])
+
+            # consequences are calculated on a performance group level, the
+            # random variables of the PGs are identified by their location
+            # and direction
+            PG_tags = [f'-LOC-{loc}-DIR-{dir_}' for loc, dir_ in
+                       zip(comp['locations'], comp['directions'])]
+
+            # create the consequence tables
+            # note: consequences in HAZUS are conditioned on damage with no
+            # added uncertainty
+            CT_cost, CT_time, CT_inj = None, None, []
+
+            for DV_name, data_name, scale, DV_tag in [
+                ('rec_cost', 'repair_cost', repl_cost, '-cost'),
+                ('rec_time', 'repair_time', 1.0, '-time')]:
+
+                if DVs[DV_name]:
+                    medians, quantities, CT_tags = [], [], []
+                    for DS, DS_tag in zip(DS_data, DS_tags):
+                        if data_name in DS.keys():
+                            data = DS[data_name]
+                            medians.append(
+                                np.array(data['medians']) * scale)
+                            quantities.append(data.get('quantities', None))
+                            if data['distribution_kind'] is not None:
+                                CT_tags.append(DS_tag + DV_tag)
+                            else:
+                                CT_tags.append(None)
+                        else:
+                            medians.append(None)
+                            quantities.append(None)
+                            CT_tags.append(None)
+
+                    CT = self._create_consequence_table(
+                        medians=medians, quantities=quantities,
+                        RV=RVd.get('DV_REP', None), DS_tags=CT_tags,
+                        PG_tags=PG_tags)
+
+                    if DV_name == 'rec_cost':
+                        CT_cost = CT
+                    else:
+                        CT_time = CT
+
+            # note: no red tag in HAZUS assessments
+
+            if DVs['injuries']:
+                inj_lvls = max([len(DS['injuries']) for DS in DS_data
+                                if 'injuries' in DS.keys()], default=0)
+                for inj_i in range(inj_lvls):
+                    theta_list = [None] * len(DS_data)
+                    for DS_i, DS in enumerate(DS_data):
+                        if (('injuries' in DS.keys()) and
+                            (len(DS['injuries']) > inj_i)):
+                            theta = DS['injuries'][inj_i]
+                            if theta > 0.:
+                                theta_list[DS_i] = theta
+                    CT_inj.append(self._create_consequence_table(
+                        medians=theta_list, quantities=[None] * len(DS_data),
+                        RV=None, DS_tags=[None] * len(DS_data),
+                        PG_tags=PG_tags))
+
+            DS_table = DamageStateTable(
+                DSG_kinds=DSG_kinds,
+                DSG_index=DSG_index,
+                weights=[DS['weight'] for DS in DS_data],
+                descriptions=[DS['description'] for DS in DS_data],
+                repair_cost=CT_cost,
+                reconstruction_time=CT_time,
+                injuries=CT_inj)
+
             # create a list for the performance groups
             performance_groups = []
 
@@ -3419,8 +5041,8 @@ class HAZUS_Assessment(Assessment):
             PG_csg_lists = comp['csg_weights']
             PG_dists = comp['distribution_kind']
             PG_qnts = comp['quantities']
-            for loc, dir_, csg_list, dist, qnt, in zip(
-                PG_locations, PG_directions, PG_csg_lists, PG_dists, PG_qnts):
+            for PG_i, (loc, dir_, csg_list, dist, qnt) in enumerate(zip(
+                PG_locations, PG_directions, PG_csg_lists, PG_dists, PG_qnts)):
                 PG_ID = 10000 * FG_ID + 10 * loc + dir_
 
                 # get the quantity
@@ -3430,116 +5052,6 @@ class HAZUS_Assessment(Assessment):
                     QNT = RandomVariableSubset(RVd['QNT'],
                         tags=[f'{c_id}-QNT-{loc}-{dir_}', ])
 
-                # create the damage objects
-                # consequences are calculated on a performance group level
-
-                # create a list for the damage state groups and their tags
-                DSG_list = []
-                d_tags = []
-                s_dsg_keys = sorted(comp['DSG_set'].keys())
-                for dsg_i, DSG_ID in enumerate(s_dsg_keys):
-                    DSG = comp['DSG_set'][DSG_ID]
-                    d_tags.append(c_id + '-' + DSG_ID)
-
-                    # create a list for the damage states
-                    DS_set = []
-
-                    s_ds_keys = sorted(DSG['DS_set'].keys())
-                    for ds_i, DS_ID in enumerate(s_ds_keys):
-                        DS = DSG['DS_set'][DS_ID]
-
-                        # create the consequence functions
-                        # note: consequences in HAZUS are conditioned on
-                        # damage with no added uncertainty
-
-                        if DVs['rec_cost'] and ('repair_cost' in DS.keys()):
-                            data = DS['repair_cost']
-                            data_scaled = deepcopy(data)
-                            data_scaled['medians'] = np.array(data_scaled['medians'])
-                            data_scaled['medians'] *= repl_cost
-
-                            if len(data['medians']) > 1:
-                                f_median = prep_bounded_multilinear_median_DV(
-                                    **{k: data_scaled.get(k, None) for k in
-                                       ('medians', 'quantities')})
-                            else:
-                                f_median = prep_constant_median_DV(
-                                    data_scaled['medians'][0])
-
-                            if data['distribution_kind'] is not None:
-
-                                cf_tag = c_id + '-' + DSG_ID + '-' + DS_ID + \
-                                         '-cost' + f'-LOC-{loc}-DIR-{dir_}'
-
-                                CF_RV = RandomVariableSubset(RVd['DV_REP'],
-                                                             tags=cf_tag)
-                            else:
-                                CF_RV = None
-
-                            CF_cost = ConsequenceFunction(DV_median=f_median,
-                                                          DV_distribution=CF_RV)
-                        else:
-                            CF_cost = None
-
-                        if DVs['rec_time'] and ('repair_time' in DS.keys()):
-                            data = DS['repair_time']
-
-                            if len(data['medians']) > 1:
-                                f_median = prep_bounded_multilinear_median_DV(
-                                    **{k: data.get(k, None) for k in
-                                       ('medians', 'quantities')})
-                            else:
-                                f_median = prep_constant_median_DV(
-                                    data['medians'][0])
-
-                            if data['distribution_kind'] is not None:
-
-                                cf_tag = c_id + '-' + DSG_ID + '-' + DS_ID + \
-                                         '-time' + f'-LOC-{loc}-DIR-{dir_}'
-
-                                CF_RV = RandomVariableSubset(RVd['DV_REP'],
-                                                             tags=cf_tag)
-                            else:
-                                CF_RV = None
-
-                            CF_time = ConsequenceFunction(DV_median=f_median,
-                                                          DV_distribution=CF_RV)
-                        else:
-                            CF_time = None
-
-                        # note: no red tag in HAZUS assessments
-
-                        if (DVs['injuries']) and ('injuries' in DS.keys()):
-                            CF_inj_set = []
-                            for inj_i, theta in enumerate(
-                                DS['injuries']):
-                                if theta > 0.:
-                                    f_median = prep_constant_median_DV(
-                                        theta)
-                                    CF_inj_set.append(ConsequenceFunction(
-                                        DV_median=f_median,
-                                        DV_distribution=None))
-                                else:
-                                    CF_inj_set.append(None)
-                        else:
-                            CF_inj_set = [None, ]
-
-                        DS_set.append(DamageState(ID=ds_i + 1,
-                                                  description=DS[
-                                                      'description'],
-                                                  weight=DS['weight'],
-                                                  repair_cost_CF=CF_cost,
-                                                  reconstruction_time_CF=CF_time,
-                                                  injuries_CF_set=CF_inj_set
-                                                  ))
-
-                    # add the DSG to the list
-                    DSG_list.append(DamageStateGroup(ID=dsg_i + 1,
-                                                     DS_set=DS_set,
-                                                     DS_set_kind=DSG[
-                                                         'DS_set_kind']
-                                                     ))
-
                 # create the fragility functions
                 FF_set = []
                 #CSG_this = np.where(comp['directions'] == dir_)[0]
@@ -3561,7 +5073,7 @@ class HAZUS_Assessment(Assessment):
                                       location=loc,
                                       quantity=QNT,
                                       fragility_functions=FF_set,
-                                      DSG_set=DSG_list,
+                                      DSG_set=DS_table.DSG_set(PG_i),
                                       csg_weights=csg_list,
                                       direction=dir_
                                       )
@@ -3648,38 +5160,27 @@ class HAZUS_Assessment(Assessment):
         ncID = self._ID_dict['non-collapse']
         NC_samples = len(ncID)
 
-        FG_dmg_list = []
+        DS_cols = self._DS_columns
 
-        s_fg_keys = sorted(self._FG_dict.keys())
-        for fg_id in s_fg_keys:
+        def calc_FG_damage(fg_id, seed):
             log_msg('\t\t{}...'.format(fg_id))
             FG = self._FG_dict[fg_id]
 
-            PG_set = FG._performance_groups
+            # each FG uses its own random number stream
+            rng = np.random.RandomState(seed)
 
-            DS_list = []
-            for DSG in PG_set[0]._DSG_set:
-                for DS in DSG._DS_set:
-                    DS_list.append(str(DSG._ID) + '_' + str(DS._ID))
-            d_count = len(DS_list)
+            PG_set = FG._performance_groups
 
-            MI = pd.MultiIndex.from_product([[FG._ID, ],
-                                             [pg._ID for pg in PG_set],
-                                             DS_list],
-                                            names=['FG', 'PG', 'DSG_DS'])
+            FG_cols = DS_cols.FG_columns(FG._ID)
+            FG_damages = np.zeros((NC_samples, FG_cols.stop - FG_cols.start),
+                                  dtype=self._precision)
 
-            FG_damages = pd.DataFrame(np.zeros((NC_samples, len(MI))),
-                                      columns=MI,
-                                      index=ncID)
+            # the realizations in each DSG of every PG and CSG
+            DSG_allocations = [[] for DSG in PG_set[0]._DSG_set]
 
-            for pg_i, PG in enumerate(PG_set):
+            for PG in PG_set:
 
                 PG_ID = PG._ID
-                if isinstance(PG._quantity, RandomVariableSubset):
-                    PG_qnt = PG._quantity.samples.loc[ncID]
-                else:
-                    PG_qnt = pd.DataFrame(np.ones(NC_samples) * PG._quantity,
-                                          index=ncID)
 
                 # get the corresponding demands
                 if not FG._directional:
@@ -3719,98 +5220,77 @@ class HAZUS_Assessment(Assessment):
                 for csg_i, csg_w in enumerate(csg_w_list):
                     DSG_df = PG._FF_set[csg_i].DSG_given_EDP(EDP_samples)
 
-                    for DSG in PG._DSG_set:
-                        in_this_DSG = DSG_df[DSG_df.values == DSG._ID].index
-                        if DSG._DS_set_kind == 'single':
-                            DS = DSG._DS_set[0]
-                            DS_tag = str(DSG._ID) + '_' + str(DS._ID)
-                            FG_damages.loc[in_this_DSG,
-                                           (FG._ID, PG_ID, DS_tag)] += csg_w
-                        elif DSG._DS_set_kind == 'mutually exclusive':
-                            DS_weights = [DS._weight for DS in DSG._DS_set]
-                            DS_RV = RandomVariable(
-                                ID=-1, dimension_tags=['me_DS', ],
-                                distribution_kind='multinomial',
-                                p_set=DS_weights)
-                            DS_df = DS_RV.sample_distribution(
-                                len(in_this_DSG)) + 1
-                            for DS in DSG._DS_set:
-                                DS_tag = str(DSG._ID) + '_' + str(DS._ID)
-                                in_this_DS = DS_df[DS_df.values == DS._ID].index
-                                FG_damages.loc[in_this_DSG[in_this_DS],
-                                               (FG._ID, PG_ID, DS_tag)] += csg_w
-                        elif DSG._DS_set_kind == 'simultaneous':
-                            DS_weights = [DS._weight for DS in DSG._DS_set]
-                            DS_df = np.random.uniform(
-                                size=(len(in_this_DSG), len(DS_weights)))
-                            which_DS = DS_df < DS_weights
-                            any_DS = np.any(which_DS, axis=1)
-                            no_DS_ids = np.where(any_DS == False)[0]
-
-                            while len(no_DS_ids) > 0:
-                                DS_df_add = np.random.uniform(
-                                    size=(len(no_DS_ids), len(DS_weights)))
-                                which_DS_add = DS_df_add < DS_weights
-                                which_DS[no_DS_ids] = which_DS_add
-
-                                any_DS = np.any(which_DS_add, axis=1)
-                                no_DS_ids = no_DS_ids[
-                                    np.where(any_DS == False)[0]]
-
-                            for ds_i, DS in enumerate(DSG._DS_set):
-                                DS_tag = str(DSG._ID) + '_' + str(DS._ID)
-                                in_this_DS = which_DS[:, ds_i]
-                                FG_damages.loc[in_this_DSG[in_this_DS], (
-                                    FG._ID, PG_ID, DS_tag)] += csg_w
+                    for DSG, allocations in zip(PG._DSG_set,
+                                                DSG_allocations):
+                        in_this_DSG = np.where(DSG_df.values == DSG._ID)[0]
 
-                        else:
-                            raise ValueError(
-                                "Unknown damage state type: {}".format(
-                                    DSG._DS_set_kind)
-                            )
+                        # positions of the DS columns in the FG block
+                        DS_pos = [DS_cols.position(FG._ID, PG_ID, DSG._ID,
+                                                   DS._ID) - FG_cols.start
+                                  for DS in DSG._DS_set]
 
-                FG_damages.iloc[:, pg_i * d_count:(pg_i + 1) * d_count] = \
-                    FG_damages.iloc[:, pg_i * d_count:(pg_i + 1) * d_count].values * PG_qnt.iloc[:, 0].values.reshape(-1, *[1])
+                        allocations.append((in_this_DSG, DS_pos, csg_w))
 
+            # the damage states are sampled for all PGs at once
+            for DSG, allocations in zip(PG_set[0]._DSG_set, DSG_allocations):
+                self._allocate_damage_states(FG_damages, DSG, allocations,
+                                             random_state=rng)
 
-            FG_dmg_list.append(FG_damages)
+            # damaged fractions -> damaged quantities
+            for PG in PG_set:
+                PG_qnt = self._PG_quantity(PG, ncID)
+                PG_cols = DS_cols.PG_columns(FG._ID, PG._ID)
+                FG_damages[:, PG_cols.start - FG_cols.start:
+                           PG_cols.stop - FG_cols.start] *= PG_qnt[:, None]
 
-        DMG = pd.concat(FG_dmg_list, axis=1)
+            return FG_damages
+
+        s_fg_keys = sorted(self._FG_dict.keys())
 
-        DMG.index = ncID
+        # the seeds of the FG streams come from the global random state to
+        # keep the results reproducible
+        FG_seeds = np.random.randint(np.iinfo(np.int32).max,
+                                     size=len(s_fg_keys))
 
-        # sort the columns to enable index slicing later
-        DMG = DMG.sort_index(axis=1, ascending=True)
+        FG_results = self._evaluate_FGs(calc_FG_damage, s_fg_keys, FG_seeds)
 
-        return DMG
+        return self._collect_FG_columns(s_fg_keys, FG_results, ncID)
 
     def _calc_repair_cost_and_time(self):
 
-        idx = pd.IndexSlice
         DVs = self._AIM_in['decision_variables']
 
-        DMG_by_FG_and_DS = self._DMG.groupby(level=[0, 2], axis=1).sum()
-
         repID = self._ID_dict['repairable']
-        DV_COST = self._DMG.loc[repID, :].copy()
-        DV_TIME = DV_COST.copy()
 
-        s_fg_keys = sorted(self._FG_dict.keys())
-        for fg_id in s_fg_keys:
+        DS_cols = self._DS_columns
+        DMG = self._DMG.loc[repID].values
+
+        def calc_FG_repairs(fg_id):
             log_msg('\t\t{}...'.format(fg_id))
             FG = self._FG_dict[fg_id]
 
             PG_set = FG._performance_groups
 
-            DS_list = self._DMG.loc[:, idx[FG._ID, PG_set[0]._ID, :]].columns
-            DS_list = DS_list.levels[2][DS_list.codes[2]].values
+            offset, PG_count, DS_count = DS_cols.FG_block(FG._ID)
+            FG_DMG = DMG[:, DS_cols.FG_columns(FG._ID)]
+            TOT_qnts = FG_DMG.reshape(
+                len(repID), PG_count, DS_count).sum(axis=1)
 
-            for d_i, d_tag in enumerate(DS_list):
+            FG_COST = FG_DMG.copy()
+            FG_TIME = FG_DMG.copy()
 
-                dsg_i = int(d_tag[0]) - 1
-                ds_i = int(d_tag[-1]) - 1
+            # the columns without consequences are removed at the end
+            FG_has_cost = np.ones(FG_DMG.shape[1], dtype=bool)
+            FG_has_time = np.ones(FG_DMG.shape[1], dtype=bool)
 
-                TOT_qnt = DMG_by_FG_and_DS.loc[repID, (FG._ID, d_tag)]
+            for d_i in range(DS_count):
+
+                # the columns of the DS in each PG of the FG
+                DS_pos = d_i + DS_count * np.arange(PG_count)
+                dsg_i = DS_cols.DSG_i[offset + DS_pos[0]]
+                ds_i = DS_cols.DS_i[offset + DS_pos[0]]
+
+                TOT_qnt = pd.Series(TOT_qnts[:, d_i], index=repID)
 
                 # check what can we expect later
                 # pull the DS from the first PG
@@ -3821,52 +5301,72 @@ class HAZUS_Assessment(Assessment):
 
                     if COST_samples is None:
                         # there are no costs assigned to this DS
-                        DV_COST.drop(DV_COST.loc[:, idx[FG._ID, :, d_tag]].columns, axis=1, inplace=True)
+                        FG_has_cost[DS_pos] = False
 
                     elif isinstance(COST_samples, pd.Series):
                         # the assigned costs are random numbers
-                        for pg_i, PG in enumerate(PG_set):
-
-                            PG_ID = PG._ID
-                            DS = PG._DSG_set[dsg_i]._DS_set[ds_i]
+                        for pos in DS_pos:
+                            DS = PG_set[DS_cols.PG_i[offset + pos]]._DSG_set[
+                                dsg_i]._DS_set[ds_i]
 
                             COST_samples = DS.unit_repair_cost(quantity=TOT_qnt).values
 
-                            DV_COST.loc[:,(FG._ID, PG_ID, d_tag)] = DV_COST.loc[:, (FG._ID, PG_ID, d_tag)].values * COST_samples
+                            FG_COST[:, pos] *= COST_samples
 
                     else:
                         # the assigned costs are identical for all realizations
-                        DV_COST.loc[:, idx[FG._ID, :, d_tag]] *= COST_samples
+                        FG_COST[:, DS_pos] *= np.reshape(COST_samples, (-1, 1))
 
                 if DVs['rec_time']:
                     TIME_samples = DS_test.unit_reconstruction_time(quantity=TOT_qnt)
 
                     if TIME_samples is None:
                         # there are no repair times assigned to this DS
-                        DV_TIME.drop(DV_TIME.loc[:, idx[FG._ID, :, d_tag]].columns, axis=1, inplace=True)
+                        FG_has_time[DS_pos] = False
 
                     elif isinstance(TIME_samples, pd.Series):
                         # the assigned repair times are random numbers
-                        for pg_i, PG in enumerate(PG_set):
-
-                            PG_ID = PG._ID
-                            DS = PG._DSG_set[dsg_i]._DS_set[ds_i]
+                        for pos in DS_pos:
+                            DS = PG_set[DS_cols.PG_i[offset + pos]]._DSG_set[
+                                dsg_i]._DS_set[ds_i]
 
                             TIME_samples = DS.unit_reconstruction_time(quantity=TOT_qnt).values
 
-                            DV_TIME.loc[:, (FG._ID, PG_ID, d_tag)] = DV_TIME.loc[:, (FG._ID, PG_ID, d_tag)].values * TIME_samples
+                            FG_TIME[:, pos] *= TIME_samples
 
                     else:
                         # the assigned repair times are identical for all realizations
-                        DV_TIME.loc[:, idx[FG._ID, :, d_tag]] *= TIME_samples
+                        FG_TIME[:, DS_pos] *= np.reshape(TIME_samples, (-1, 1))
+
+            return FG_COST, FG_TIME, FG_has_cost, FG_has_time
+
+        s_fg_keys = sorted(self._FG_dict.keys())
+
+        FG_results = self._evaluate_FGs(calc_FG_repairs, s_fg_keys)
+
+        DV_COST = DMG.copy()
+        DV_TIME = DMG.copy()
+        has_cost = np.ones(DS_cols.size, dtype=bool)
+        has_time = np.ones(DS_cols.size, dtype=bool)
+
+        for fg_id, (FG_COST, FG_TIME, FG_has_cost, FG_has_time) in zip(
+            s_fg_keys, FG_results):
+            FG_cols = DS_cols.FG_columns(self._FG_dict[fg_id]._ID)
+            DV_COST[:, FG_cols] = FG_COST
+            DV_TIME[:, FG_cols] = FG_TIME
+            has_cost[FG_cols] = FG_has_cost
+            has_time[FG_cols] = FG_has_time
 
-        # sort the columns to enable index slicing later
         if DVs['rec_cost']:
-            DV_COST = DV_COST.sort_index(axis=1, ascending=True)
+            DV_COST = pd.DataFrame(
+                DV_COST[:, has_cost], index=repID,
+                columns=DS_cols.labels(np.where(has_cost)[0]))
         else:
             DV_COST = None
         if DVs['rec_time']:
-            DV_TIME = DV_TIME.sort_index(axis=1, ascending=True)
+            DV_TIME = pd.DataFrame(
+                DV_TIME[:, has_time], index=repID,
+                columns=DS_cols.labels(np.where(has_time)[0]))
         else:
             DV_TIME = None
 
@@ -3874,15 +5374,18 @@ class HAZUS_Assessment(Assessment):
 
     def _calc_non_collapse_injuries(self):
 
-        idx = pd.IndexSlice
-
         ncID = self._ID_dict['non-collapse']
         P_affected = self._POP.loc[ncID]
 
         NC_samples = len(ncID)
-        DV_INJ_dict = dict(
-            [(i, self._DMG.loc[ncID, :].copy()) for i in range(self._inj_lvls)]
-        )
+
+        DS_cols = self._DS_columns
+        DMG = self._DMG.loc[ncID].values
+        DV_INJ_list = [DMG.copy() for i in range(self._inj_lvls)]
+
+        # the columns without injuries are removed at the end
+        has_inj = [np.ones(DS_cols.size, dtype=bool)
+                   for i in range(self._inj_lvls)]
 
         s_fg_keys = sorted(self._FG_dict.keys())
         for fg_id in s_fg_keys:
@@ -3891,14 +5394,16 @@ class HAZUS_Assessment(Assessment):
 
             PG_set = FG._performance_groups
 
-            DS_list = self._DMG.loc[:, idx[FG._ID, PG_set[0]._ID, :]].columns
-            DS_list = DS_list.levels[2][DS_list.codes[2]].values
+            offset, PG_count, DS_count = DS_cols.FG_block(FG._ID)
 
             for i in range(self._inj_lvls):
 
-                for d_i, d_tag in enumerate(DS_list):
-                    dsg_i = int(d_tag[0]) - 1
-                    ds_i = int(d_tag[-1]) - 1
+                for d_i in range(DS_count):
+
+                    # the columns of the DS in each PG of the FG
+                    DS_pos = offset + d_i + DS_count * np.arange(PG_count)
+                    dsg_i = DS_cols.DSG_i[DS_pos[0]]
+                    ds_i = DS_cols.DS_i[DS_pos[0]]
 
                     # check what can we expect later
                     # pull the DS from the first PG
@@ -3908,7 +5413,7 @@ class HAZUS_Assessment(Assessment):
 
                     if INJ_samples is None:
                         # there are no injuries assigned to this DS
-                        DV_INJ_dict[i].drop(DV_INJ_dict[i].loc[:, idx[FG._ID, :, d_tag]].columns, axis=1, inplace=True)
+                        has_inj[i][DS_pos] = False
                         continue
 
                     elif isinstance(INJ_samples, pd.Series):
@@ -3919,9 +5424,9 @@ class HAZUS_Assessment(Assessment):
                         # the assigned injuries are identical for all realizations
                         rnd_inj = False
 
-                    for pg_i, PG in enumerate(PG_set):
+                    for pos in DS_pos:
 
-                        PG_ID = PG._ID
+                        PG = PG_set[DS_cols.PG_i[pos]]
                         DS = PG._DSG_set[dsg_i]._DS_set[ds_i]
 
                         # get injury samples if needed
@@ -3930,15 +5435,15 @@ class HAZUS_Assessment(Assessment):
                                 severity_level=i, sample_size=NC_samples).values
 
                         P_aff_i = P_affected.loc[:,'LOC{}'.format(PG._location)].values * INJ_samples
-                        DV_INJ_dict[i].loc[:, (FG._ID, PG_ID, d_tag)] = DV_INJ_dict[i].loc[:, (FG._ID, PG_ID, d_tag)].values * P_aff_i
+                        DV_INJ_list[i][:, pos] *= P_aff_i
 
         # remove the useless columns from DV_INJ
+        DV_INJ_dict = {}
         for i in range(self._inj_lvls):
-            DV_INJ = DV_INJ_dict[i]
-            DV_INJ_dict[i] = DV_INJ.loc[:, (DV_INJ != 0.0).any(axis=0)]
-
-        # sort the columns to enable index slicing later
-        for i in range(self._inj_lvls):
-            DV_INJ_dict[i] = DV_INJ_dict[i].sort_index(axis=1, ascending=True)
+            DV_INJ = DV_INJ_list[i]
+            INJ_pos = np.where(has_inj[i] & (DV_INJ != 0.0).any(axis=0))[0]
+            DV_INJ_dict.update({i: pd.DataFrame(
+                DV_INJ[:, INJ_pos], index=ncID,
+                columns=DS_cols.labels(INJ_pos))})
 
         return DV_INJ_dict
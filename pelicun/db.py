@@ -48,14 +48,23 @@ This module has classes and methods to manage databases used by pelicun.
     create_HAZUS_EQ_json_files
     create_HAZUS_EQ_PGA_json_files
     create_HAZUS_HU_json_files
+    build_DL_library
+    save_to_standard_HDF
+    read_standard_HDF
+    save_to_DL_library
+    DLLibrary
+    open_DL_library
+    close_DL_libraries
 
 """
 
 from .base import *
 from pathlib import Path
-import json, h5py
-import xml.etree.ElementTree as ET
-import shutil
+from functools import lru_cache
+import json
+
+# h5py and the xml parser are only needed by the converters; they are imported
+# in those functions to keep the import of pelicun.file_io light
 
 
 def dict_generator(indict, pre=None):
@@ -118,111 +127,386 @@ def get_val_from_dict(indict, col):
 
     return val
 
-def convert_jsons_to_table(json_id_list, json_list, json_template):
-    # Define the header for the data table based on the template structure
-    header = np.array(
-        [[col[:-1], len(col[:-1])] for col in dict_generator(json_template)])
-    lvls = max(np.transpose(header)[1])
-    header = [col + (lvls - size) * [' ', ] for col, size in header]
+def _flatten_json(json_data, col_codes):
+    """
+    Flattens a json dictionary into a list of (column code, value) pairs.
 
-    # Use the header to initialize the DataFrame that will hold the data
-    MI = pd.MultiIndex.from_tuples(header)
+    The branches of the dictionary are collected with dict_generator and only
+    those with a code in col_codes are kept. If json_data is not a dictionary,
+    it is assumed to be the path to a json file that is loaded first. This
+    allows the converters to load and flatten files in worker processes.
 
-    json_DF = pd.DataFrame(columns=MI, index=json_id_list)
-    json_DF.index.name = 'ID'
+    """
+    if not isinstance(json_data, dict):
+        with open(json_data, 'r') as f:
+            json_data = json.load(f)
+
+    flat_data = []
+    for branch in dict_generator(json_data):
+        code = col_codes.get(tuple(branch[:-1]), None)
+        if (code is not None) and (branch[-1] is not None):
+            flat_data.append((code, branch[-1]))
 
-    # Load the data into the DF
-    for json_id, json_data in zip(json_id_list, json_list):
+    return flat_data
+
+def convert_jsons_to_table(json_id_list, json_list, json_template, n_jobs=1,
+                           return_errors=False):
+    """
+    Converts a list of json dictionaries into a table.
+
+    The columns of the table are defined by the branches of the template and
+    their dtypes by the values at the end of each branch. Each json is
+    flattened once into (column, value) pairs and the table is assembled from
+    the collected column arrays in one step.
+
+    Parameters
+    ----------
+    json_id_list: list of strings
+        IDs of the jsons; these are used as the index of the table.
+    json_list: list of dicts or paths
+        The json data or the paths to the json files.
+    json_template: dict
+        Template that describes the schema of the jsons and the dtype of each
+        branch ('float', 'int', 'bool' or 'string').
+    n_jobs: int, default: 1
+        Number of worker processes used to load and flatten the jsons.
+    return_errors: bool, default: False
+        If True, the type conversion errors are returned besides the table.
+
+    Returns
+    -------
+    json_DF: DataFrame
+        Table with one row per json and one column per template branch.
+        Empty rows and columns are removed.
+    errors: list of dicts
+        Only returned if return_errors is True. Each dict describes a column
+        that could not be converted to its prescribed dtype using the
+        'column', 'dtype' and 'error' keys. Such columns are kept with
+        object dtype.
 
-        for col in json_DF.columns:
+    """
+    # Define the header for the data table based on the template structure
+    template_cols = list(dict_generator(json_template))
+    lvls = max([len(col) - 1 for col in template_cols])
+    header = [tuple(col[:-1] + (lvls - len(col) + 1) * [' ', ])
+              for col in template_cols]
+    dtypes = [col[-1] for col in template_cols]
+    col_codes = dict([(tuple(col[:-1]), c_i)
+                      for c_i, col in enumerate(template_cols)])
+
+    # Flatten the jsons into (column code, value) pairs
+    if n_jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        from functools import partial
+
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            flat_list = list(executor.map(
+                partial(_flatten_json, col_codes=col_codes), json_list,
+                chunksize=max(1, len(json_list) // (4 * n_jobs))))
+    else:
+        flat_list = [_flatten_json(json_data, col_codes)
+                     for json_data in json_list]
 
-            val = get_val_from_dict(json_data, col)
+    # Collect the values in an array with one row per json
+    data = np.full((len(json_id_list), len(header)), np.nan, dtype=object)
+    for row_i, flat_data in enumerate(flat_list):
+        for code, val in flat_data:
+            data[row_i, code] = val
 
-            if val is not None:
-                json_DF.at[json_id, col] = val
+    json_DF = pd.DataFrame(data, index=json_id_list,
+                           columns=pd.MultiIndex.from_tuples(header))
+    json_DF.index.name = 'ID'
 
     # Remove empty rows and columns
     json_DF = json_DF.dropna(axis=0, how='all')
     json_DF = json_DF.dropna(axis=1, how='all')
 
     # Set the dtypes for the columns based on the template
-    for col in json_DF.columns:
-        dtype = get_val_from_dict(json_template, col)
+    col_dtypes = dict(zip(header, dtypes))
+    col_data = []
+    errors = []
+    for col_i, col in enumerate(json_DF.columns):
+        dtype = col_dtypes[col]
+        col_vals = json_DF.iloc[:, col_i]
 
         if dtype != 'string':
             try:
-                json_DF[col] = json_DF[col].astype(dtype)
-            except:
-                print(col, dtype)
+                col_vals = col_vals.astype(dtype)
+            except (ValueError, TypeError) as e:
+                errors.append({'column': col, 'dtype': dtype,
+                               'error': '{}: {}'.format(type(e).__name__, e)})
         else:
-            json_DF[col] = json_DF[col].apply(str)
+            col_vals = col_vals.apply(str)
+
+        col_data.append(col_vals.values)
+
+    DF_cols = json_DF.columns
+    json_DF = pd.DataFrame(dict(enumerate(col_data)), index=json_DF.index)
+    json_DF.columns = DF_cols
+
+    if len(errors) > 0:
+        show_warning(
+            'The following columns could not be converted to the dtype '
+            'prescribed by the template: {}'.format(
+                ', '.join(['{} ({})'.format(
+                    '/'.join([c for c in err['column'] if c != ' ']),
+                    err['dtype']) for err in errors])))
+
+    if return_errors:
+        return json_DF, errors
 
     return json_DF
 
 
-def save_to_standard_HDF(df, name, target_path, mode='w'):
+def _encode_ASCII(values):
+    """
+    Encodes strings as ASCII; non-ASCII characters are backslash-escaped.
+
+    """
+    values = np.asarray(values).astype(str)
+    return np.char.encode(values, encoding='ASCII', errors='backslashreplace')
+
+def _decode_ASCII(values):
+    """
+    Decodes the strings encoded by _encode_ASCII.
+
+    """
+    return np.array([val.decode('unicode_escape') if b'\\' in val
+                     else val.decode('ASCII') for val in values.ravel()],
+                    dtype=object).reshape(values.shape)
+
+def save_to_standard_HDF(df, name, target_path, mode='w', chunk_rows=64):
     """
     Saves a DataFrame in a standard HDF format using h5py.
 
+    The columns of the DataFrame are grouped by their type into a few 2D
+    datasets (blocks) with one row per row of the DataFrame: float columns are
+    saved as floats with NaN for missing values, integer and boolean columns
+    as integers and string columns as fixed-length ASCII strings (in blocks of
+    similar string length). Integer and string blocks are accompanied by a
+    boolean mask that identifies the missing values. The
+    blocks are chunked by rows and compressed, so a single row can be loaded
+    without reading the whole table (see read_standard_HDF).
+
+    The column index of the DataFrame is saved in the 'columns' group: the
+    labels of the columns, their path in the hierarchy (the non-blank labels
+    joined by '/'), the block they are stored in, their offset in that block
+    and their original data type. The row index is saved in the 'index'
+    dataset.
+
+    Strings are saved as ASCII strings so that the files can be opened with
+    any tool on any platform. Non-ASCII characters are replaced by a
+    backslash-escaped UTF8 identifier.
+
+    Parameters
+    ----------
+    df: DataFrame
+        Table to save with the IDs of components in the index and with
+        (typically MultiIndex) columns.
+    name: string
+        Name of the group in the HDF5 file where the data is saved. An
+        existing group with the same name is replaced.
+    target_path: string
+        Path to the HDF5 file.
+    mode: {'w', 'a'}, default: 'w'
+        'w' creates a new file, 'a' adds the data to an existing file.
+    chunk_rows: int, default: 64
+        Number of rows in a chunk of the datasets.
+
     """
+    import h5py
+
+    n_rows = df.shape[0]
 
-    df = df.T
+    # identify the block of each column; string columns are grouped by their
+    # width to avoid padding short strings to the length of the longest one
+    blocks = {}
+    col_info = []
+    for col_i, (col, dtype) in enumerate(df.dtypes.items()):
+
+        mask = df.iloc[:, col_i].isna().values
+
+        if pd.api.types.is_bool_dtype(dtype) or (
+            pd.api.types.is_integer_dtype(dtype)):
+            block = 'int'
+            values = df.iloc[:, col_i].where(~mask, -1).values.astype(np.int64)
+
+        elif pd.api.types.is_float_dtype(dtype):
+            block = 'float'
+            values = df.iloc[:, col_i].values.astype(float)
+
+        else:
+            values = _encode_ASCII(df.iloc[:, col_i].where(~mask, '').values)
+            width = 8
+            while width < values.itemsize:
+                width *= 2
+            block = f'string_{width}'
+            values = values.astype(f'S{width}')
+
+        blocks.setdefault(block, {'values': [], 'mask': []})
+        col_info.append((block, len(blocks[block]['values']), str(dtype)))
+        blocks[block]['values'].append(values)
+        blocks[block]['mask'].append(mask)
 
     hf = h5py.File(target_path, mode)
 
-    #try:
-    if True:
-        # save each row (i.e., column of FG_df) as a separate dataset in the file
-        for row_id, row in df.iterrows():
-            row = row.convert_dtypes()
+    try:
+        if name in hf:
+            del hf[name]
+
+        grp = hf.create_group(name)
+        grp.attrs['layout'] = 'columns'
+        grp.attrs['n_levels'] = df.columns.nlevels
 
-            # create a tree that identifies the column in the hierarchy
-            row_name = name
-            for label in row_id:
-                if label != " ":
-                    row_name += f'/{label}'
+        grp.create_dataset('index', data=_encode_ASCII(df.index.values))
+        if df.index.name is not None:
+            grp['index'].attrs['name'] = str(df.index.name)
 
-            # perform the appropriate type conversion before saving
-            if row.dtype == np.float64:
-                values = row.values.astype(float)
+        for block, block_data in blocks.items():
 
-                hf.create_dataset(row_name, data=values)
+            values = np.column_stack(block_data['values'])
+            chunks = (max(1, min(chunk_rows, n_rows)), values.shape[1])
 
-            elif row.dtype == pd.StringDtype():
-                # Strings are saved as ASCII strings so that the files can be
-                # opened with any tool on any platform. Non-ASCII characters
-                # are replaced by a backslash-escaped UTF8 identifier.
-                values = row.values.astype(str)
-                values = np.char.encode(values, encoding='ASCII',
-                                        errors='backslashreplace')
+            block_grp = grp.create_group(block)
+            block_grp.create_dataset('values', data=values, chunks=chunks,
+                                     compression='gzip', shuffle=True)
+            if block != 'float':
+                block_grp.create_dataset(
+                    'mask', data=np.column_stack(block_data['mask']),
+                    chunks=chunks, compression='gzip')
 
-                hf.create_dataset(row_name, data=values)
+        # finally, save the column index
+        if df.columns.nlevels > 1:
+            labels = np.array(df.columns.tolist(), dtype=object)
+        else:
+            labels = np.array(df.columns.tolist(), dtype=object)[:, None]
 
-            elif row.dtype in [pd.BooleanDtype(), pd.Int64Dtype()]:
-                row.fillna(-1, inplace=True)
-                values = row.values.astype(int)
+        paths = ['/'.join([label for label in col_labels if label != ' '])
+                 for col_labels in labels]
 
-                hf.create_dataset(row_name, data=values)
+        cols_grp = grp.create_group('columns')
+        cols_grp.create_dataset('labels', data=_encode_ASCII(labels))
+        cols_grp.create_dataset('path', data=_encode_ASCII(paths))
+        cols_grp.create_dataset('block', data=_encode_ASCII(
+            [info[0] for info in col_info]))
+        cols_grp.create_dataset('offset', data=np.array(
+            [info[1] for info in col_info], dtype=np.int64))
+        cols_grp.create_dataset('dtype', data=_encode_ASCII(
+            [info[2] for info in col_info]))
 
+    finally:
+        hf.close()
+
+def read_standard_HDF(target_path, name, index_list=None):
+    """
+    Loads a table saved by save_to_standard_HDF.
+
+    Only the requested rows are read from the file, hence the data of a single
+    component can be loaded without reading the whole table.
+
+    Parameters
+    ----------
+    target_path: string
+        Path to the HDF5 file.
+    name: string
+        Name of the group in the HDF5 file where the table is saved.
+    index_list: list of strings, optional
+        IDs of the rows to load. All rows are loaded if not provided.
+
+    Returns
+    -------
+    df: DataFrame
+        The requested rows of the table with the original column index and
+        data types. Integer and boolean columns with missing values are
+        returned with an object data type.
+
+    """
+    import h5py
+
+    with h5py.File(target_path, 'r') as hf:
+
+        grp = hf[name]
+
+        index = _decode_ASCII(grp['index'][()])
+        index_name = grp['index'].attrs.get('name', None)
+
+        if index_list is None:
+            index_list = list(index)
+            rows = np.arange(len(index))
+        else:
+            index_pos = dict([(idx, pos) for pos, idx in enumerate(index)])
+            try:
+                rows = np.array([index_pos[idx] for idx in index_list],
+                                dtype=np.int64)
+            except KeyError as e:
+                raise ValueError(
+                    f"{e.args[0]} is not in the {name} table of {target_path}")
+
+        # h5py needs the rows in increasing order
+        read_rows, row_order = np.unique(rows, return_inverse=True)
+
+        cols_grp = grp['columns']
+        labels = _decode_ASCII(cols_grp['labels'][()])
+        col_blocks = _decode_ASCII(cols_grp['block'][()])
+        offsets = cols_grp['offset'][()]
+        dtypes = _decode_ASCII(cols_grp['dtype'][()])
+
+        block_data = {}
+        for block in set(col_blocks):
+            if len(read_rows) == len(index):
+                values = grp[block]['values'][()]
+            else:
+                values = grp[block]['values'][list(read_rows), :]
+
+            if block == 'float':
+                mask = np.isnan(values)
+            else:
+                if len(read_rows) == len(index):
+                    mask = grp[block]['mask'][()]
+                else:
+                    mask = grp[block]['mask'][list(read_rows), :]
+
+            if block.startswith('string'):
+                values = _decode_ASCII(values)
+
+            block_data.update({block: (values[row_order], mask[row_order])})
+
+    data = {}
+    for col_i, (block, offset, dtype) in enumerate(
+        zip(col_blocks, offsets, dtypes)):
+
+        values, mask = block_data[block]
+        values = values[:, offset]
+        mask = mask[:, offset]
+
+        if block.startswith('string'):
+            values = values.copy()
+            values[mask] = np.nan
+        elif block == 'int':
+            if np.any(mask):
+                values = values.astype(object)
+                values[mask] = np.nan
             else:
-                print("unknown dtype: ", row.dtype)
+                values = values.astype(dtype)
 
-        # finally, save the index
-        values = df.columns.values.astype(str)
-        values = np.char.encode(values, encoding='ASCII',
-                                errors='backslashreplace')
-        hf.create_dataset(f'{name}/index', data=values)
+        data.update({col_i: values})
 
-    #except:
-    #    show_warning("Error while trying to save standard HDF5 file.")
+    df = pd.DataFrame(data, index=pd.Index(index_list, name=index_name))
 
-    hf.close()
+    if labels.shape[1] > 1:
+        df.columns = pd.MultiIndex.from_tuples([tuple(col_labels)
+                                                for col_labels in labels])
+    else:
+        df.columns = labels[:, 0]
 
+    return df
 
-def convert_json_files_to_HDF(data_source_dir, DL_dir, db_name):
+def convert_json_files_to_HDF(data_source_dir, DL_dir, db_name, n_jobs=1):
     """
     Converts data from json files to a single HDF5 file
 
+    The json files are loaded and flattened in n_jobs worker processes.
+
     """
 
     # Start with the fragility and consequence data - we'll call it data
@@ -238,13 +522,11 @@ def convert_json_files_to_HDF(data_source_dir, DL_dir, db_name):
     with open(data_source_dir / 'DL_template.json', 'r') as f:
         FG_template = json.load(f)
 
-    FG_list = []
     DL_json_dir = DL_dir / 'DL json'
-    for FG_i in FG_ID_list:
-        with open(DL_json_dir / f'{FG_i}.json', 'r') as f:
-            FG_list.append(json.load(f))
+    FG_list = [DL_json_dir / f'{FG_i}.json' for FG_i in FG_ID_list]
 
-    FG_df = convert_jsons_to_table(FG_ID_list, FG_list, FG_template)
+    FG_df = convert_jsons_to_table(FG_ID_list, FG_list, FG_template,
+                                   n_jobs=n_jobs)
 
     # start with saving the data in standard HDF5 format
     save_to_standard_HDF(FG_df, name='data_standard',
@@ -279,59 +561,897 @@ def convert_json_files_to_HDF(data_source_dir, DL_dir, db_name):
     except:
         pass
 
-def convert_Series_to_dict(comp_Series):
+def compile_table_paths(columns):
     """
-    Converts data from a table to a json file
+    Parses the column labels of a table into a reusable path plan.
+
+    The plan describes where the value in each column of a table shall be
+    placed in the nested dictionary of a component. Parsing the labels only
+    once allows a large number of rows to be converted without processing the
+    labels for every row.
+
+    Parameters
+    ----------
+    columns: Index or MultiIndex
+        Column labels of a table created by convert_jsons_to_table. Blank
+        labels (' ') are ignored and labels with a '#<i>' suffix identify the
+        i-th element of a list.
+
+    Returns
+    -------
+    plan: list of tuples
+        Each element corresponds to a column and has the position of the
+        column and the sequence of (key, list_id) steps that lead to the leaf
+        in the nested dictionary. list_id is None for dictionary keys.
 
     """
+    plan = []
+
+    for col_pos, branch in enumerate(columns):
 
-    comp_Series = comp_Series.dropna(how='all')
+        if not isinstance(branch, tuple):
+            branch = (branch,)
+
+        steps = []
+        for label in branch:
+            if label != ' ':
+                if '#' in label:
+                    key, list_id = label.split('#')
+                    steps.append((key, int(list_id)))
+                else:
+                    steps.append((label, None))
 
+        plan.append((col_pos, tuple(steps)))
+
+    return plan
+
+@lru_cache(maxsize=32)
+def _cached_table_paths(columns):
+    return compile_table_paths(columns)
+
+def _apply_table_paths(values, mask, plan):
+    """
+    Builds the nested dictionary of a single row following the path plan.
+
+    """
     comp_dict = {}
 
-    for branch in comp_Series.index:
+    for col_pos, steps in plan:
+
+        if not mask[col_pos]:
+            continue
 
         nested_dict = comp_dict
-        parent_dict = None
-        parent_val = None
-        parent_id = None
-
-        for val in branch:
-            if val != ' ':
-                if '#' in val:
-                    val, list_id = val.split('#')
-                    list_id = int(list_id)
+
+        for key, list_id in steps[:-1]:
+            if list_id is None:
+                nested_dict = nested_dict.setdefault(key, {})
+            else:
+                nested_list = nested_dict.setdefault(key, [])
+                while len(nested_list) <= list_id:
+                    nested_list.append({})
+                nested_dict = nested_list[list_id]
+
+        key, list_id = steps[-1]
+        if list_id is None:
+            nested_dict[key] = values[col_pos]
+        else:
+            nested_list = nested_dict.setdefault(key, [])
+            while len(nested_list) <= list_id:
+                nested_list.append({})
+            nested_list[list_id] = values[col_pos]
+
+    return comp_dict
+
+def convert_DataFrame_to_dicts(table, plan=None):
+    """
+    Converts every row of a table to the nested dictionary of a component.
+
+    This is the batch version of convert_Series_to_dict. Empty cells are
+    skipped, the remaining values are placed in the dictionaries following
+    the path plan of the columns.
+
+    Parameters
+    ----------
+    table: DataFrame
+        Table created by convert_jsons_to_table with components in the rows.
+    plan: list of tuples, optional
+        Path plan created by compile_table_paths for the columns of the table.
+        It is compiled from the columns if not provided.
+
+    Returns
+    -------
+    comp_dicts: dict
+        Nested dictionaries of the components with the index of the table as
+        keys.
+
+    """
+    if plan is None:
+        plan = _cached_table_paths(tuple(table.columns))
+
+    values = table.values
+    mask = table.notna().values
+
+    return dict([(row_id, _apply_table_paths(values[row_i], mask[row_i], plan))
+                 for row_i, row_id in enumerate(table.index)])
+
+def convert_Series_to_dict(comp_Series):
+    """
+    Converts data from a table to a json file
+
+    """
+    plan = _cached_table_paths(tuple(comp_Series.index))
+
+    return _apply_table_paths(comp_Series.values, comp_Series.notna().values,
+                              plan)
+
+_DL_LIBRARY_MAGIC = b'PELICUN-DLLIB\x00\x00\x00'
+_DL_LIBRARY_VERSION = 1
+_DL_LIBRARY_ALIGN = 64
+
+def save_to_DL_library(tables, target_path):
+    """
+    Saves tables of component data in a memory-mappable DL library file.
+
+    The file starts with a JSON header that describes the layout of each
+    table, followed by aligned binary sections:
+
+    - ids: the sorted IDs of the rows as fixed-length UTF8 strings;
+    - numeric: a float64 array with one row per ID that holds the float,
+      integer and boolean columns (NaN marks missing values);
+    - str_offsets and str_data: the string columns of each row as a JSON
+      array (null marks missing values) concatenated in a byte block, and the
+      offsets of the rows in that block.
+
+    The file is read by DLLibrary; the sorted IDs allow O(log n) lookup of
+    any row and the memory-mapped pages are shared by every process that
+    opens the same file. build_DL_library creates a library file next to the
+    HDF5 file of every library it builds.
+
+    The file is written to a temporary location first and then moved to
+    target_path, so that libraries opened from an earlier version of the file
+    remain valid.
+
+    Parameters
+    ----------
+    tables: dict
+        DataFrames to save with their names as keys (e.g., {'data': FG_df,
+        'pop': pop_df}). The DataFrames follow the format created by
+        convert_jsons_to_table.
+    target_path: string
+        Path to the library file. The '.dlib' extension identifies these
+        files in read_component_DL_data and read_population_distribution.
+
+    """
+    header = {'version': _DL_LIBRARY_VERSION, 'tables': {}}
+    sections = []
+
+    for name, df in tables.items():
+
+        df = df.loc[sorted(df.index), :]
+
+        ids = np.array([str(idx).encode('utf-8') for idx in df.index])
+        if len(ids) == 0:
+            ids = ids.astype('S1')
+
+        columns = []
+        num_cols = []
+        str_cols = []
+        for col_i, (col, dtype) in enumerate(df.dtypes.items()):
+
+            if pd.api.types.is_bool_dtype(dtype):
+                kind = 'bool'
+            elif pd.api.types.is_integer_dtype(dtype):
+                kind = 'int'
+            elif pd.api.types.is_float_dtype(dtype):
+                kind = 'float'
+            else:
+                kind = 'str'
+
+            if kind == 'str':
+                columns.append([list(col) if isinstance(col, tuple)
+                                else [col,], kind, len(str_cols)])
+                str_cols.append(col_i)
+            else:
+                columns.append([list(col) if isinstance(col, tuple)
+                                else [col,], kind, len(num_cols)])
+                num_cols.append(col_i)
+
+        numeric = df.iloc[:, num_cols].astype(float).values
+
+        str_values = df.iloc[:, str_cols]
+        str_values = str_values.where(str_values.notna(), None).values
+        str_rows = [json.dumps(list(row)).encode('utf-8')
+                    for row in str_values]
+        str_offsets = np.cumsum([0,] + [len(row) for row in str_rows],
+                                dtype=np.int64)
+        str_data = np.frombuffer(b''.join(str_rows), dtype=np.uint8)
+
+        table_info = {
+            'n_rows': len(ids),
+            'index_name': df.index.name,
+            'columns': columns,
+            'n_numeric': len(num_cols),
+            'n_str': len(str_cols),
+            'sections': {}
+        }
+
+        for section, values in [('ids', ids), ('numeric', numeric),
+                                ('str_offsets', str_offsets),
+                                ('str_data', str_data)]:
+            values = np.ascontiguousarray(values)
+            table_info['sections'].update({section: {
+                'dtype': values.dtype.str, 'shape': list(values.shape)}})
+            sections.append((table_info['sections'][section], values))
+
+        header['tables'].update({name: table_info})
+
+    # the header has a fixed size once the offsets have a fixed width; the
+    # offsets are updated until the header length is stable
+    def aligned(pos):
+        return int(np.ceil(pos / _DL_LIBRARY_ALIGN) * _DL_LIBRARY_ALIGN)
+
+    header_len = 0
+    while True:
+        pos = aligned(len(_DL_LIBRARY_MAGIC) + 8 + header_len)
+        for section_info, values in sections:
+            section_info.update({'offset': pos})
+            pos = aligned(pos + values.nbytes)
+
+        header_bytes = json.dumps(header).encode('utf-8')
+        if len(header_bytes) <= header_len:
+            break
+        header_len = len(header_bytes) + 64
+
+    header_bytes = header_bytes.ljust(header_len)
+
+    # the existing file may be memory-mapped, hence it is replaced instead of
+    # being overwritten
+    target_path = str(target_path)
+    temp_path = target_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(_DL_LIBRARY_MAGIC)
+        f.write(np.uint64(header_len).tobytes())
+        f.write(header_bytes)
+        for section_info, values in sections:
+            f.write(b'\x00' * (section_info['offset'] - f.tell()))
+            f.write(values.tobytes())
+    os.replace(temp_path, target_path)
+
+class DLLibrary(object):
+    """
+    Read-only access to a DL library file created by save_to_DL_library.
+
+    The sections of the file are memory-mapped, hence only the pages that
+    hold the requested rows are read from the disk and processes that open
+    the same library share those pages. The maps are released by close().
+
+    Parameters
+    ----------
+    path: string
+        Path to the library file.
+
+    """
+
+    def __init__(self, path):
+
+        self._path = str(path)
+
+        with open(self._path, 'rb') as f:
+            magic = f.read(len(_DL_LIBRARY_MAGIC))
+            if magic != _DL_LIBRARY_MAGIC:
+                raise ValueError(
+                    f"{self._path} is not a pelicun DL library file.")
+
+            header_len = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            header = json.loads(f.read(header_len).decode('utf-8'))
+
+        if header['version'] != _DL_LIBRARY_VERSION:
+            raise ValueError(
+                f"DL library file version {header['version']} is not "
+                f"supported by this version of pelicun.")
+
+        self._tables = {}
+        for name, table_info in header['tables'].items():
+
+            sections = {}
+            for section, section_info in table_info['sections'].items():
+                if np.prod(section_info['shape']) == 0:
+                    sections.update({section: np.zeros(
+                        section_info['shape'], dtype=section_info['dtype'])})
                 else:
-                    list_id = None
+                    sections.update({section: np.memmap(
+                        self._path, dtype=section_info['dtype'], mode='r',
+                        offset=section_info['offset'],
+                        shape=tuple(section_info['shape']))})
+
+            columns = [tuple(col_labels) if len(col_labels) > 1
+                       else col_labels[0]
+                       for col_labels, kind, offset in table_info['columns']]
+
+            self._tables.update({name: {
+                'info': table_info,
+                'sections': sections,
+                'plan': compile_table_paths(columns)
+            }})
+
+    def close(self):
+        """
+        Release the memory-mapped sections of the library.
+
+        The library cannot be used after it is closed.
+
+        """
+        self._tables = {}
+
+    @property
+    def tables(self):
+        """
+        Return the names of the tables in the library.
+
+        """
+        return list(self._tables.keys())
+
+    def ids(self, table):
+        """
+        Return the sorted list of IDs in a table.
+
+        """
+        return [idx.decode('utf-8')
+                for idx in self._tables[table]['sections']['ids']]
+
+    def _locate(self, table, idx):
+
+        if table not in self._tables.keys():
+            raise ValueError(f"There is no {table} table in {self._path}")
 
-                if val not in nested_dict.keys():
-                    if list_id is not None:
-                        nested_dict.update({val: []})
-                    else:
-                        nested_dict.update({val: {}})
+        ids = self._tables[table]['sections']['ids']
+        key = str(idx).encode('utf-8')
 
-                if list_id is not None:
-                    if list_id > len(nested_dict[val]) - 1:
-                        nested_dict[val].append({})
-                    parent_dict = nested_dict
-                    nested_dict = nested_dict[val][list_id]
+        pos = np.searchsorted(ids, key)
+        if (pos >= len(ids)) or (ids[pos] != key):
+            raise ValueError(f"{idx} is not in the {table} table of "
+                             f"{self._path}")
 
-                    parent_id = list_id
+        return pos
 
+    def row(self, table, idx):
+        """
+        Return the values and the mask of missing values in a row.
+
+        """
+        T = self._tables[table]
+        info = T['info']
+        pos = self._locate(table, idx)
+
+        numeric = T['sections']['numeric'][pos] if info['n_numeric'] > 0 \
+            else []
+        offsets = T['sections']['str_offsets']
+        str_values = json.loads(
+            T['sections']['str_data'][offsets[pos]:offsets[pos + 1]].tobytes())
+
+        values = np.empty(len(info['columns']), dtype=object)
+        mask = np.ones(len(info['columns']), dtype=bool)
+        for col_i, (col_labels, kind, offset) in enumerate(info['columns']):
+
+            if kind == 'str':
+                val = str_values[offset]
+                if val is None:
+                    mask[col_i] = False
+                else:
+                    values[col_i] = val
+            else:
+                val = numeric[offset]
+                if np.isnan(val):
+                    mask[col_i] = False
+                elif kind == 'float':
+                    values[col_i] = float(val)
+                elif kind == 'int':
+                    values[col_i] = int(val)
                 else:
-                    parent_dict = nested_dict
-                    nested_dict = nested_dict[val]
+                    values[col_i] = bool(val)
+
+        return values, mask
+
+    def get(self, table, idx):
+        """
+        Return the data of a row as a nested dictionary.
+
+        The dictionary has the same structure as the one created by
+        convert_Series_to_dict for the same row in an HDF5 table.
+
+        """
+        values, mask = self.row(table, idx)
+
+        return _apply_table_paths(values, mask, self._tables[table]['plan'])
+
+_open_DL_libraries = {}
+
+def open_DL_library(path):
+    """
+    Return a DLLibrary for the file at path.
+
+    The opened libraries are reused until the file is modified. Libraries
+    opened from an earlier version of the file are closed when the new
+    version is opened. Use close_DL_libraries to close the libraries that are
+    no longer needed.
+
+    """
+    path = os.path.abspath(path)
+    key = (path, os.path.getmtime(path))
+
+    if key not in _open_DL_libraries:
+        close_DL_libraries(path)
+        _open_DL_libraries.update({key: DLLibrary(path)})
+
+    return _open_DL_libraries[key]
+
+def close_DL_libraries(path=None):
+    """
+    Close the libraries opened by open_DL_library.
 
-                parent_val = val
+    Parameters
+    ----------
+    path: string, optional, default: None
+        Path to the library file. If None, every open library is closed.
+
+    """
+    if path is not None:
+        path = os.path.abspath(path)
+
+    for key in list(_open_DL_libraries.keys()):
+        if (path is None) or (key[0] == path):
+            _open_DL_libraries.pop(key).close()
+
+_P58_convert_unit = {
+    'Unit less': 'ea',
+    'Radians'  : 'rad',
+    'g'        : 'g',
+    'meter/sec': 'mps'
+
+}
+
+_P58_convert_DSG_type = {
+    'MutEx': 'MutuallyExclusive',
+    'Simul': 'Simultaneous'
+}
+
+def _decode_P58_DS_hierarchy(DSH):
+
+    if 'Seq' == DSH[:3]:
+        DSH = DSH[4:-1]
+
+    DS_setup = []
+
+    while len(DSH) > 0:
+        if DSH[:2] == 'DS':
+            DS_setup.append(DSH[:3])
+            DSH = DSH[4:]
+        elif DSH[:5] in ['MutEx', 'Simul']:
+            closing_pos = DSH.find(')')
+            subDSH = DSH[:closing_pos + 1]
+            DSH = DSH[closing_pos + 2:]
+
+            DS_setup.append([subDSH[:5]] + subDSH[6:-1].split(','))
+
+    return DS_setup
+
+def _parse_P58_DS_xml(DS_xml):
+    CFG = DS_xml.find('ConsequenceGroup')
+    CFG_C = CFG.find('CostConsequence')
+    CFG_T = CFG.find('TimeConsequence')
+
+    repair_cost = dict(
+        Amount=[float(CFG_C.find('MaxAmount').text),
+                float(CFG_C.find('MinAmount').text)],
+        Quantity=[float(CFG_C.find('LowerQuantity').text),
+                  float(CFG_C.find('UpperQuantity').text)],
+        CurveType=CFG_C.find('CurveType').text,
+        Beta=float(CFG_C.find('Uncertainty').text),
+        Bounds=[0., 'None']
+    )
+    if repair_cost['Amount'] == [0.0, 0.0]:
+        repair_cost['Amount'] = 'Undefined'
+
+    repair_time = dict(
+        Amount=[float(CFG_T.find('MaxAmount').text),
+                float(CFG_T.find('MinAmount').text)],
+        Quantity=[float(CFG_T.find('LowerQuantity').text),
+                  float(CFG_T.find('UpperQuantity').text)],
+        CurveType=CFG_T.find('CurveType').text,
+        Beta=float(CFG_T.find('Uncertainty').text),
+        Bounds=[0., 'None']
+    )
+    if repair_time['Amount'] == [0.0, 0.0]:
+        repair_time['Amount'] = 'Undefined'
 
-        if isinstance(parent_dict[parent_val], dict):
-            parent_dict[parent_val] = comp_Series[branch]
+    return repair_cost, repair_time
+
+def _is_float(s):
+    try:
+        if type(s) == str and s[-1] == '%':
+            s_f = float(s[:-1]) / 100.
         else:
-            parent_dict[parent_val][parent_id] = comp_Series[branch]
+            s_f = float(s)
+        if np.isnan(s_f):
+            return False
+        else:
+            return True
+    except ValueError:
+        return False
 
-    return comp_dict
+def _P58_component_sources(data_dir, src_df=None):
+    """
+    Collects the source data of every component in a FEMA P58 data folder.
+
+    Returns a list of (component ID, xml path, spreadsheet row) tuples.
+
+    """
+    data_dir = Path(data_dir).resolve()
+
+    if src_df is None:
+        src_df = pd.read_excel(data_dir / 'PACT_fragility_data.xlsx')
+    ID_list = src_df['NISTIR Classification']
+
+    XML_list = [f for f in os.listdir(data_dir / 'DL xml') if f.endswith('.xml')]
+
+    comp_sources = []
+    for filename in XML_list:
+
+        comp_ID = filename[:-4]
+        xml_path = (data_dir / 'DL xml') / filename
+
+        # correct for the error in the numbering of RC beams
+        if (comp_ID[:5] == 'B1051') and (
+            comp_ID[-1] not in str([1, 2, 3, 4])):
+            comp_ID = 'B1042' + comp_ID[5:]
+
+        row = src_df.loc[np.where(ID_list == comp_ID)[0][0], :]
+
+        comp_sources.append((comp_ID, xml_path, row))
+
+    return comp_sources
+
+def _convert_P58_component(comp_ID, xml_path, row):
+    """
+    Converts the data of a single FEMA P58 component to the SimCenter format.
+
+    Parameters
+    ----------
+    comp_ID: string
+        ID of the component in the FEMA P58 database.
+    xml_path: Path
+        Path to the XML file of the component.
+    row: Series
+        Row of the PACT fragility data spreadsheet that belongs to the
+        component.
+
+    Returns
+    -------
+    comp_ID: string
+        ID of the component.
+    json_output: dict
+        Damage and loss data of the component in the SimCenter JSON format.
+    incomplete: bool
+        True if some of the damage and loss information is missing.
+
+    """
+    import xml.etree.ElementTree as ET
+
+    tree = ET.parse(xml_path)
+    root = tree.getroot()
+
+    # missing values are identified by comparing them to np.nan below; the
+    # row is unpickled with new NaN objects in worker processes, so we restore
+    # the np.nan identity first
+    row = row.map(lambda val: np.nan if (
+        isinstance(val, float) and np.isnan(val)) else val)
+
+    json_output = {}
+    incomplete = False
+
+    json_output.update({'Name': row['Component Name']})
+
+    QU = row['Fragility Unit of Measure']
+    QU = QU.split(' ')
+    if _is_float(QU[1]):
+        if QU[0] in ['TN', 'AP', 'CF', 'KV']:
+            QU[0] = 'ea'
+            QU[1] = 1
+        json_output.update({'QuantityUnit': [int(QU[1]), QU[0]]})
+    else:
+        json_output.update({'QuantityUnit': [0., 'Undefined']})
+        incomplete = True
+
+    json_output.update({'Directional': row['Directional?'] in ['YES']})
+    json_output.update({'Correlated': row['Correlated?'] in ['YES']})
+
+    json_output.update({
+        'EDP': {
+            'Type'  : row['Demand Parameter (value):'],
+            'Unit'  : [1,
+                       _P58_convert_unit[row['Demand Parameter (unit):']]],
+            'Offset': int(
+                row['Demand Location (use floor above? Yes/No)'] in [
+                    'Yes'])
+        }
+    })
+
+    json_output.update({
+        'GeneralInformation': {
+            'ID'         : row['NISTIR Classification'],
+            'Description': row['Component Description'],
+            'Author'     : row['Author'],
+            'Official'   : root.find('Official').text in ['True',
+                                                          'true'],
+            'DateCreated': root.find('DateCreated').text,
+            'Approved'   : root.find('Approved').text in ['True',
+                                                          'true'],
+            'Incomplete' : root.find('Incomplete').text in ['True',
+                                                            'true'],
+            'Notes'      : row['Comments / Notes']
+        }
+    })
+    for key in json_output['GeneralInformation'].keys():
+        if json_output['GeneralInformation'][key] is np.nan:
+            json_output['GeneralInformation'][key] = 'Undefined'
+
+    json_output.update({
+        'Ratings': {
+            'DataQuality'  : row['Data Quality'],
+            'DataRelevance': row['Data Relevance'],
+            'Documentation': row['Documentation Quality'],
+            'Rationality'  : row['Rationality'],
+        }
+    })
+    for key in json_output['Ratings'].keys():
+        if json_output['Ratings'][key] is np.nan:
+            json_output['Ratings'][key] = 'Undefined'
+
+    DSH = _decode_P58_DS_hierarchy(row['DS Hierarchy'])
+
+    json_output.update({'DSGroups': []})
+
+    for DSG in DSH:
+        if DSG[0] in ['MutEx', 'Simul']:
+            mu = row['DS {}, Median Demand'.format(DSG[1][-1])]
+            beta = row[
+                'DS {}, Total Dispersion (Beta)'.format(DSG[1][-1])]
+            if _is_float(mu) and _is_float(beta):
+                json_output['DSGroups'].append({
+                    'MedianEDP'   : float(mu),
+                    'Beta'        : float(beta),
+                    'CurveType'   : 'LogNormal',
+                    'DSGroupType' : _P58_convert_DSG_type[DSG[0]],
+                    'DamageStates': DSG[1:]
+                })
+            else:
+                json_output['DSGroups'].append({
+                    'MedianEDP'   : float(mu) if _is_float(
+                        mu) else 'Undefined',
+                    'Beta'        : float(beta) if _is_float(
+                        beta) else 'Undefined',
+                    'CurveType'   : 'LogNormal',
+                    'DSGroupType' : _P58_convert_DSG_type[DSG[0]],
+                    'DamageStates': DSG[1:]
+                })
+                incomplete = True
+        else:
+            mu = row['DS {}, Median Demand'.format(DSG[-1])]
+            beta = row['DS {}, Total Dispersion (Beta)'.format(DSG[-1])]
+            if _is_float(mu) and _is_float(beta):
+                json_output['DSGroups'].append({
+                    'MedianEDP'   : float(mu),
+                    'Beta'        : float(beta),
+                    'CurveType'   : 'LogNormal',
+                    'DSGroupType' : 'Single',
+                    'DamageStates': [DSG],
+                })
+            else:
+                json_output['DSGroups'].append({
+                    'MedianEDP'   : float(mu) if _is_float(
+                        mu) else 'Undefined',
+                    'Beta'        : float(beta) if _is_float(
+                        beta) else 'Undefined',
+                    'CurveType'   : 'LogNormal',
+                    'DSGroupType' : 'Single',
+                    'DamageStates': [DSG],
+                })
+                incomplete = True
+
+    need_INJ = False
+    need_RT = False
+    for DSG in json_output['DSGroups']:
+        DS_list = DSG['DamageStates']
+        DSG['DamageStates'] = []
+        for DS in DS_list:
+
+            # avoid having NaN as repair measures
+            repair_measures = row['DS {}, Repair Description'.format(DS[-1])]
+            if not isinstance(repair_measures, str):
+                repair_measures = ""
+
+            DSG['DamageStates'].append({
+                'Weight'        :
+                    float(row['DS {}, Probability'.format(DS[-1])]),
+                'LongLeadTime'  :
+                    int(row['DS {}, Long Lead Time'.format(DS[-1])] in [
+                        'YES']),
+                'Consequences'  : {},
+                'Description'   :
+                    row['DS {}, Description'.format(DS[-1])],
+                'RepairMeasures': repair_measures
+            })
+
+            IMG = row['DS{}, Illustrations'.format(DS[-1])]
+            if IMG not in ['none', np.nan]:
+                DSG['DamageStates'][-1].update({'DamageImageName': IMG})
+
+            AA = row['DS {} - Casualty Affected Area'.format(DS[-1])]
+            if (isinstance(AA, str) and (_is_float(AA.split(' ')[0]))):
+                AA = AA.split(' ')
+                DSG['DamageStates'][-1].update(
+                    {'AffectedArea': [int(AA[0]), AA[1]]})
+                need_INJ = True
+            else:
+                DSG['DamageStates'][-1].update(
+                    {'AffectedArea': [0, 'SF']})
+
+            DSG['DamageStates'][-1]['Consequences'].update(
+                {'Injuries': [{}, {}]})
+
+            INJ0 = DSG[
+                'DamageStates'][-1]['Consequences']['Injuries'][0]
+            INJ_mu = row[
+                'DS {} Serious Injury Rate - Median'.format(DS[-1])]
+            INJ_beta = row[
+                'DS {} Serious Injury Rate - Dispersion'.format(DS[-1])]
+            if _is_float(INJ_mu) and _is_float(INJ_beta):
+                INJ0.update({
+                    'Amount'   : float(INJ_mu),
+                    'Beta'     : float(INJ_beta),
+                    'CurveType': 'Normal',
+                    'Bounds'   : [0., 1.]
+                })
+
+                if INJ_mu != 0.0:
+                    need_INJ = True
+                    if DSG['DamageStates'][-1]['AffectedArea'][0] == 0:
+                        incomplete = True
+            else:
+                INJ0.update({'Amount'   :
+                                 float(INJ_mu) if _is_float(INJ_mu)
+                                 else 'Undefined',
+                             'Beta'     :
+                                 float(INJ_beta) if _is_float(INJ_beta)
+                                 else 'Undefined',
+                             'CurveType': 'Normal'})
+                if ((INJ0['Amount'] == 'Undefined') or
+                    (INJ0['Beta'] == 'Undefined')):
+                    incomplete = True
+
+            INJ1 = DSG[
+                'DamageStates'][-1]['Consequences']['Injuries'][1]
+            INJ_mu = row['DS {} Loss of Life Rate - Median'.format(DS[-1])]
+            INJ_beta = row['DS {} Loss of Life Rate - Dispersion'.format(DS[-1])]
+            if _is_float(INJ_mu) and _is_float(INJ_beta):
+                INJ1.update({
+                    'Amount'   : float(INJ_mu),
+                    'Beta'     : float(INJ_beta),
+                    'CurveType': 'Normal',
+                    'Bounds'   : [0., 1.]
+                })
+                if INJ_mu != 0.0:
+                    need_INJ = True
+                    if DSG['DamageStates'][-1]['AffectedArea'][0] == 0:
+                        incomplete = True
+            else:
+                INJ1.update({'Amount'   :
+                                 float(INJ_mu) if _is_float(INJ_mu)
+                                 else 'Undefined',
+                             'Beta'     :
+                                 float(INJ_beta) if _is_float(INJ_beta)
+                                 else 'Undefined',
+                             'CurveType': 'Normal',
+                             'Bounds': [0., 1.]})
+                if ((INJ1['Amount'] == 'Undefined') or
+                    (INJ1['Beta'] == 'Undefined')):
+                    incomplete = True
+
+            DSG['DamageStates'][-1]['Consequences'].update({'RedTag': {}})
+            RT = DSG['DamageStates'][-1]['Consequences']['RedTag']
+
+            RT_mu = row['DS {}, Unsafe Placard Damage Median'.format(DS[-1])]
+            RT_beta = row['DS {}, Unsafe Placard Damage Dispersion'.format(DS[-1])]
+            if _is_float(RT_mu) and _is_float(RT_beta):
+                RT.update({
+                    'Amount'   : float(RT_mu),
+                    'Beta'     : float(RT_beta),
+                    'CurveType': 'Normal',
+                    'Bounds'   : [0., 1.]
+                })
+                if RT['Amount'] != 0.0:
+                    need_RT = True
+            else:
+                RT.update({'Amount'   :
+                               float(RT_mu[:-1]) if _is_float(RT_mu)
+                               else 'Undefined',
+                           'Beta'     :
+                               float(RT_beta[:-1]) if _is_float(RT_beta)
+                               else 'Undefined',
+                           'CurveType': 'Normal',
+                           'Bounds': [0., 1.]})
+                if ((RT['Amount'] == 'Undefined') or
+                    (RT['Beta'] == 'Undefined')):
+                    incomplete = True
+
+    # remove the unused fields
+    if not need_INJ:
+        for DSG in json_output['DSGroups']:
+            for DS in DSG['DamageStates']:
+                del DS['AffectedArea']
+                del DS['Consequences']['Injuries']
+
+    if not need_RT:
+        for DSG in json_output['DSGroups']:
+            for DS in DSG['DamageStates']:
+                del DS['Consequences']['RedTag']
+
+    # collect the repair cost and time consequences from the XML file
+    DSG_list = root.find('DamageStates').findall('DamageState')
+    for DSG_i, DSG_xml in enumerate(DSG_list):
+
+        if DSG_xml.find('DamageStates') is not None:
+            DS_list = (DSG_xml.find('DamageStates')).findall('DamageState')
+            for DS_i, DS_xml in enumerate(DS_list):
+                r_cost, r_time = _parse_P58_DS_xml(DS_xml)
+                CONSEQ = json_output['DSGroups'][DSG_i][
+                    'DamageStates'][DS_i]['Consequences']
+                CONSEQ.update({
+                    'ReconstructionCost': r_cost,
+                    'ReconstructionTime': r_time
+                })
+                if ((r_cost['Amount'] == 'Undefined') or
+                    (r_time['Amount'] == 'Undefined')):
+                    incomplete = True
+
+        else:
+            r_cost, r_time = _parse_P58_DS_xml(DSG_xml)
+            CONSEQ = json_output['DSGroups'][DSG_i][
+                'DamageStates'][0]['Consequences']
+            CONSEQ.update({
+                'ReconstructionCost': r_cost,
+                'ReconstructionTime': r_time
+            })
+            if ((r_cost['Amount'] == 'Undefined') or
+                (r_time['Amount'] == 'Undefined')):
+                incomplete = True
+
+
+    if incomplete:
+        json_output['GeneralInformation']['Incomplete'] = True
+
+    return comp_ID, json_output, incomplete
+
+def _convert_P58_components(comp_sources, n_jobs=1):
+    """
+    Converts a list of FEMA P58 components, optionally in worker processes.
+
+    """
+    if (n_jobs > 1) and (len(comp_sources) > 1):
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            comp_outputs = list(executor.map(
+                _convert_P58_component, *zip(*comp_sources),
+                chunksize=max(1, len(comp_sources) // (4 * n_jobs))))
+    else:
+        comp_outputs = [_convert_P58_component(*comp_source)
+                        for comp_source in comp_sources]
 
-def convert_P58_data_to_json(data_dir, target_dir):
+    return comp_outputs
+
+def convert_P58_data_to_json(data_dir, target_dir, n_jobs=1):
     """
     Create JSON data files from publicly available P58 data.
 
@@ -353,414 +1473,328 @@ def convert_P58_data_to_json(data_dir, target_dir):
         subfolder in it that contains the XML files.
     target_dir: string
         Path to the folder where the JSON files shall be saved.
+    n_jobs: int, default: 1
+        Number of worker processes used to convert the components.
 
     """
+    import shutil
 
     data_dir = Path(data_dir).resolve()
     target_dir = Path(target_dir).resolve()
-    DL_dir = None
 
-    convert_unit = {
-        'Unit less': 'ea',
-        'Radians'  : 'rad',
-        'g'        : 'g',
-        'meter/sec': 'mps'
+    comp_sources = _P58_component_sources(data_dir)
 
-    }
+    comp_outputs = _convert_P58_components(comp_sources, n_jobs)
 
-    convert_DSG_type = {
-        'MutEx': 'MutuallyExclusive',
-        'Simul': 'Simultaneous'
-    }
-
-    def decode_DS_Hierarchy(DSH):
-
-        if 'Seq' == DSH[:3]:
-            DSH = DSH[4:-1]
-
-        DS_setup = []
-
-        while len(DSH) > 0:
-            if DSH[:2] == 'DS':
-                DS_setup.append(DSH[:3])
-                DSH = DSH[4:]
-            elif DSH[:5] in ['MutEx', 'Simul']:
-                closing_pos = DSH.find(')')
-                subDSH = DSH[:closing_pos + 1]
-                DSH = DSH[closing_pos + 2:]
-
-                DS_setup.append([subDSH[:5]] + subDSH[6:-1].split(','))
-
-        return DS_setup
-
-    def parse_DS_xml(DS_xml):
-        CFG = DS_xml.find('ConsequenceGroup')
-        CFG_C = CFG.find('CostConsequence')
-        CFG_T = CFG.find('TimeConsequence')
-
-        repair_cost = dict(
-            Amount=[float(CFG_C.find('MaxAmount').text),
-                    float(CFG_C.find('MinAmount').text)],
-            Quantity=[float(CFG_C.find('LowerQuantity').text),
-                      float(CFG_C.find('UpperQuantity').text)],
-            CurveType=CFG_C.find('CurveType').text,
-            Beta=float(CFG_C.find('Uncertainty').text),
-            Bounds=[0., 'None']
-        )
-        if repair_cost['Amount'] == [0.0, 0.0]:
-            repair_cost['Amount'] = 'Undefined'
-
-        repair_time = dict(
-            Amount=[float(CFG_T.find('MaxAmount').text),
-                    float(CFG_T.find('MinAmount').text)],
-            Quantity=[float(CFG_T.find('LowerQuantity').text),
-                      float(CFG_T.find('UpperQuantity').text)],
-            CurveType=CFG_T.find('CurveType').text,
-            Beta=float(CFG_T.find('Uncertainty').text),
-            Bounds=[0., 'None']
-        )
-        if repair_time['Amount'] == [0.0, 0.0]:
-            repair_time['Amount'] = 'Undefined'
-
-        return repair_cost, repair_time
-
-    def is_float(s):
-        try:
-            if type(s) == str and s[-1] == '%':
-                s_f = float(s[:-1]) / 100.
-            else:
-                s_f = float(s)
-            if np.isnan(s_f):
-                return False
-            else:
-                return True
-        except ValueError:
-            return False
+    if len(comp_outputs) > 0:
+        DL_dir = target_dir / "DL json"
+        DL_dir.mkdir(exist_ok=True)
 
-    src_df = pd.read_excel(data_dir / 'PACT_fragility_data.xlsx')
-    ID_list = src_df['NISTIR Classification']
+    for comp_ID, json_output, incomplete in comp_outputs:
+        with open(DL_dir / f'{comp_ID}.json', 'w') as f:
+            json.dump(json_output, f, indent=2)
 
-    XML_list = [f for f in os.listdir(data_dir / 'DL xml') if f.endswith('.xml')]
+    # finally, copy the population file
+    shutil.copy(
+        data_dir / 'population.json',
+        target_dir / 'population.json'
+    )
 
-    incomplete_count = 0
+_LIBRARY_BUILD_VERSION = 1
 
-    for filename in XML_list:
+def _hash_bytes(*chunks):
+    """
+    Returns the SHA-256 hex digest of a series of strings or bytes.
 
-        comp_ID = filename[:-4]
+    """
+    import hashlib
 
-        #try:
-        if True:
-            tree = ET.parse((data_dir / 'DL xml') / f'{comp_ID}.xml')
-            root = tree.getroot()
+    h = hashlib.sha256()
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        h.update(chunk)
+        h.update(b'\0')
 
-            # correct for the error in the numbering of RC beams
-            if (comp_ID[:5] == 'B1051') and (
-                comp_ID[-1] not in str([1, 2, 3, 4])):
-                comp_ID = 'B1042' + comp_ID[5:]
+    return h.hexdigest()
 
-            row = src_df.loc[np.where(ID_list == comp_ID)[0][0], :]
+def _hash_file(path):
 
-            json_output = {}
-            incomplete = False
+    with open(path, 'rb') as f:
+        return _hash_bytes(f.read())
 
-            json_output.update({'Name': row['Component Name']})
+def build_DL_library(data_source_dir, target_dir, db_name, library='P58',
+                     n_jobs=1, force=False):
+    """
+    Builds a damage and loss library incrementally.
+
+    The source files are converted to the SimCenter JSON format and the JSON
+    files are collected in an HDF5 file the same way as with the
+    convert_P58_data_to_json, create_HAZUS_*_json_files and
+    convert_json_files_to_HDF methods. The tables of the HDF5 file are also
+    saved in a memory-mappable DL library file (<db_name>.dlib, see
+    save_to_DL_library) that can be used in place of the HDF5 file in the
+    assessments. A manifest is saved next to the HDF5 file with the hash of
+    every input file, the source and output hash of every component, and the
+    time spent in each stage of the build.
+
+    When the library is built again, only the components with changed sources
+    (or with missing or modified output files) are converted, and the HDF5
+    and DL library files are only rebuilt if any of the JSON files or
+    templates changed.
+
+    FEMA P58 components are hashed individually using their row in the PACT
+    spreadsheet and their XML file, and the stale components are converted in
+    n_jobs worker processes. The HAZUS libraries are generated from a single
+    data file; their JSON files are regenerated when any input changes, but
+    only the files with new content replace the existing ones.
 
-            QU = row['Fragility Unit of Measure']
-            QU = QU.split(' ')
-            if is_float(QU[1]):
-                if QU[0] in ['TN', 'AP', 'CF', 'KV']:
-                    QU[0] = 'ea'
-                    QU[1] = 1
-                json_output.update({'QuantityUnit': [int(QU[1]), QU[0]]})
-            else:
-                json_output.update({'QuantityUnit': [0., 'Undefined']})
-                incomplete = True
+    Parameters
+    ----------
+    data_source_dir: string
+        Path to the folder with the source data and the DL and population
+        templates (e.g., resources/data_sources/FEMA_P58_1st_ed).
+    target_dir: string
+        Path to the folder where the JSON files, the HDF5 and DL library
+        files and the manifest shall be saved.
+    db_name: string
+        Name of the HDF5 and DL library files without the extension.
+    library: {'P58', 'HAZUS_EQ', 'HAZUS_EQ_story', 'HAZUS_EQ_PGA', 'HAZUS_HU'}
+        Type of the source data.
+    n_jobs: int, default: 1
+        Number of worker processes used to convert the components and to
+        load the JSON files when the HDF5 file is built.
+    force: bool, default: False
+        If True, the existing outputs are ignored and the whole library is
+        rebuilt.
+
+    Returns
+    -------
+    manifest: dict
+        The manifest of the build that is also saved to
+        <target_dir>/<db_name>_manifest.json.
 
-            json_output.update({'Directional': row['Directional?'] in ['YES']})
-            json_output.update({'Correlated': row['Correlated?'] in ['YES']})
+    """
+    import shutil, tempfile
 
-            json_output.update({
-                'EDP': {
-                    'Type'  : row['Demand Parameter (value):'],
-                    'Unit'  : [1,
-                               convert_unit[row['Demand Parameter (unit):']]],
-                    'Offset': int(
-                        row['Demand Location (use floor above? Yes/No)'] in [
-                            'Yes'])
-                }
-            })
+    HAZUS_builders = {
+        'HAZUS_EQ': create_HAZUS_EQ_json_files,
+        'HAZUS_EQ_story': create_HAZUS_EQ_story_json_files,
+        'HAZUS_EQ_PGA': create_HAZUS_EQ_PGA_json_files,
+        'HAZUS_HU': create_HAZUS_HU_json_files,
+    }
 
-            json_output.update({
-                'GeneralInformation': {
-                    'ID'         : row['NISTIR Classification'],
-                    'Description': row['Component Description'],
-                    'Author'     : row['Author'],
-                    'Official'   : root.find('Official').text in ['True',
-                                                                  'true'],
-                    'DateCreated': root.find('DateCreated').text,
-                    'Approved'   : root.find('Approved').text in ['True',
-                                                                  'true'],
-                    'Incomplete' : root.find('Incomplete').text in ['True',
-                                                                    'true'],
-                    'Notes'      : row['Comments / Notes']
-                }
-            })
-            for key in json_output['GeneralInformation'].keys():
-                if json_output['GeneralInformation'][key] is np.nan:
-                    json_output['GeneralInformation'][key] = 'Undefined'
+    if (library != 'P58') and (library not in HAZUS_builders.keys()):
+        raise ValueError(f"Unknown library type: {library}")
 
-            json_output.update({
-                'Ratings': {
-                    'DataQuality'  : row['Data Quality'],
-                    'DataRelevance': row['Data Relevance'],
-                    'Documentation': row['Documentation Quality'],
-                    'Rationality'  : row['Rationality'],
-                }
-            })
-            for key in json_output['Ratings'].keys():
-                if json_output['Ratings'][key] is np.nan:
-                    json_output['Ratings'][key] = 'Undefined'
+    start_time = time.time()
+    timings = {}
 
-            DSH = decode_DS_Hierarchy(row['DS Hierarchy'])
+    data_source_dir = Path(data_source_dir).resolve()
+    target_dir = Path(target_dir).resolve()
+    target_dir.mkdir(parents=True, exist_ok=True)
+    DL_json_dir = target_dir / 'DL json'
+    DL_json_dir.mkdir(exist_ok=True)
+    cache_dir = target_dir / '.build_cache'
+    HDF_path = target_dir / f'{db_name}.hdf'
+    library_path = target_dir / f'{db_name}.dlib'
+    manifest_path = target_dir / f'{db_name}_manifest.json'
+
+    # load the manifest of the previous build
+    old_manifest = {}
+    if manifest_path.exists() and (not force):
+        with open(manifest_path, 'r') as f:
+            old_manifest = json.load(f)
+
+        if ((old_manifest.get('build_version') != _LIBRARY_BUILD_VERSION) or
+            (old_manifest.get('library') != library)):
+            old_manifest = {}
+
+    old_inputs = old_manifest.get('inputs', {})
+    old_comps = old_manifest.get('components', {})
+    old_outputs = old_manifest.get('outputs', {})
+
+    def output_is_valid(rel_path, output_hash):
+        path = target_dir / rel_path
+        return path.exists() and (_hash_file(path) == output_hash)
+
+    # hash the inputs
+    stage_time = time.time()
+    inputs = dict([(path.relative_to(data_source_dir).as_posix(),
+                    _hash_file(path))
+                   for path in sorted(data_source_dir.rglob('*'))
+                   if path.is_file()])
+    timings.update({'hash_inputs': time.time() - stage_time})
+
+    components = {}
+    converted = []
+
+    if library == 'P58':
+
+        # the spreadsheet is cached in binary format because reading the
+        # Excel file takes more time than converting a few components
+        stage_time = time.time()
+        xlsx_hash = inputs['PACT_fragility_data.xlsx']
+        xlsx_cache = cache_dir / f'PACT_fragility_data_{xlsx_hash[:16]}.pkl'
+        if xlsx_cache.exists():
+            src_df = pd.read_pickle(xlsx_cache)
+        else:
+            src_df = pd.read_excel(
+                data_source_dir / 'PACT_fragility_data.xlsx')
+            if cache_dir.exists():
+                shutil.rmtree(cache_dir)
+            cache_dir.mkdir()
+            src_df.to_pickle(xlsx_cache)
+
+        comp_sources = _P58_component_sources(data_source_dir, src_df)
+        timings.update({'read_sources': time.time() - stage_time})
+
+        # identify the components that need to be converted
+        stage_time = time.time()
+        stale_sources = []
+        for comp_ID, xml_path, row in comp_sources:
+
+            source_hash = _hash_bytes(
+                str(_LIBRARY_BUILD_VERSION), row.to_json(),
+                inputs[xml_path.relative_to(data_source_dir).as_posix()])
+
+            comp_info = old_comps.get(comp_ID, None)
+            if ((comp_info is not None) and
+                (comp_info['source'] == source_hash) and
+                output_is_valid(comp_info['output'], comp_info['output_hash'])):
+                components.update({comp_ID: comp_info})
+            else:
+                components.update({comp_ID: {'source': source_hash}})
+                stale_sources.append((comp_ID, xml_path, row))
 
-            json_output.update({'DSGroups': []})
+        comp_outputs = _convert_P58_components(stale_sources, n_jobs)
 
-            for DSG in DSH:
-                if DSG[0] in ['MutEx', 'Simul']:
-                    mu = row['DS {}, Median Demand'.format(DSG[1][-1])]
-                    beta = row[
-                        'DS {}, Total Dispersion (Beta)'.format(DSG[1][-1])]
-                    if is_float(mu) and is_float(beta):
-                        json_output['DSGroups'].append({
-                            'MedianEDP'   : float(mu),
-                            'Beta'        : float(beta),
-                            'CurveType'   : 'LogNormal',
-                            'DSGroupType' : convert_DSG_type[DSG[0]],
-                            'DamageStates': DSG[1:]
-                        })
-                    else:
-                        json_output['DSGroups'].append({
-                            'MedianEDP'   : float(mu) if is_float(
-                                mu) else 'Undefined',
-                            'Beta'        : float(beta) if is_float(
-                                beta) else 'Undefined',
-                            'CurveType'   : 'LogNormal',
-                            'DSGroupType' : convert_DSG_type[DSG[0]],
-                            'DamageStates': DSG[1:]
-                        })
-                        incomplete = True
-                else:
-                    mu = row['DS {}, Median Demand'.format(DSG[-1])]
-                    beta = row['DS {}, Total Dispersion (Beta)'.format(DSG[-1])]
-                    if is_float(mu) and is_float(beta):
-                        json_output['DSGroups'].append({
-                            'MedianEDP'   : float(mu),
-                            'Beta'        : float(beta),
-                            'CurveType'   : 'LogNormal',
-                            'DSGroupType' : 'Single',
-                            'DamageStates': [DSG],
-                        })
-                    else:
-                        json_output['DSGroups'].append({
-                            'MedianEDP'   : float(mu) if is_float(
-                                mu) else 'Undefined',
-                            'Beta'        : float(beta) if is_float(
-                                beta) else 'Undefined',
-                            'CurveType'   : 'LogNormal',
-                            'DSGroupType' : 'Single',
-                            'DamageStates': [DSG],
-                        })
-                        incomplete = True
+        for comp_ID, json_output, incomplete in comp_outputs:
+            output_str = json.dumps(json_output, indent=2)
+            with open(DL_json_dir / f'{comp_ID}.json', 'w') as f:
+                f.write(output_str)
 
-            need_INJ = False
-            need_RT = False
-            for DSG in json_output['DSGroups']:
-                DS_list = DSG['DamageStates']
-                DSG['DamageStates'] = []
-                for DS in DS_list:
-
-                    # avoid having NaN as repair measures
-                    repair_measures = row['DS {}, Repair Description'.format(DS[-1])]
-                    if not isinstance(repair_measures, str):
-                        repair_measures = ""
-
-                    DSG['DamageStates'].append({
-                        'Weight'        :
-                            float(row['DS {}, Probability'.format(DS[-1])]),
-                        'LongLeadTime'  :
-                            int(row['DS {}, Long Lead Time'.format(DS[-1])] in [
-                                'YES']),
-                        'Consequences'  : {},
-                        'Description'   :
-                            row['DS {}, Description'.format(DS[-1])],
-                        'RepairMeasures': repair_measures
-                    })
+            components[comp_ID].update({
+                'output': f'DL json/{comp_ID}.json',
+                'output_hash': _hash_bytes(output_str)})
+            converted.append(comp_ID)
 
-                    IMG = row['DS{}, Illustrations'.format(DS[-1])]
-                    if IMG not in ['none', np.nan]:
-                        DSG['DamageStates'][-1].update({'DamageImageName': IMG})
-
-                    AA = row['DS {} - Casualty Affected Area'.format(DS[-1])]
-                    if (isinstance(AA, str) and (is_float(AA.split(' ')[0]))):
-                        AA = AA.split(' ')
-                        DSG['DamageStates'][-1].update(
-                            {'AffectedArea': [int(AA[0]), AA[1]]})
-                        need_INJ = True
-                    else:
-                        DSG['DamageStates'][-1].update(
-                            {'AffectedArea': [0, 'SF']})
-
-                    DSG['DamageStates'][-1]['Consequences'].update(
-                        {'Injuries': [{}, {}]})
-
-                    INJ0 = DSG[
-                        'DamageStates'][-1]['Consequences']['Injuries'][0]
-                    INJ_mu = row[
-                        'DS {} Serious Injury Rate - Median'.format(DS[-1])]
-                    INJ_beta = row[
-                        'DS {} Serious Injury Rate - Dispersion'.format(DS[-1])]
-                    if is_float(INJ_mu) and is_float(INJ_beta):
-                        INJ0.update({
-                            'Amount'   : float(INJ_mu),
-                            'Beta'     : float(INJ_beta),
-                            'CurveType': 'Normal',
-                            'Bounds'   : [0., 1.]
-                        })
+        # the population data is copied when its source changed or when the
+        # copy in the target folder is missing or modified
+        if ((inputs['population.json'] !=
+             old_inputs.get('population.json', None)) or
+            (not output_is_valid('population.json',
+                                 old_outputs.get('population.json', None)))):
+            shutil.copy(data_source_dir / 'population.json',
+                        target_dir / 'population.json')
 
-                        if INJ_mu != 0.0:
-                            need_INJ = True
-                            if DSG['DamageStates'][-1]['AffectedArea'][0] == 0:
-                                incomplete = True
-                    else:
-                        INJ0.update({'Amount'   :
-                                         float(INJ_mu) if is_float(INJ_mu)
-                                         else 'Undefined',
-                                     'Beta'     :
-                                         float(INJ_beta) if is_float(INJ_beta)
-                                         else 'Undefined',
-                                     'CurveType': 'Normal'})
-                        if ((INJ0['Amount'] == 'Undefined') or
-                            (INJ0['Beta'] == 'Undefined')):
-                            incomplete = True
-
-                    INJ1 = DSG[
-                        'DamageStates'][-1]['Consequences']['Injuries'][1]
-                    INJ_mu = row['DS {} Loss of Life Rate - Median'.format(DS[-1])]
-                    INJ_beta = row['DS {} Loss of Life Rate - Dispersion'.format(DS[-1])]
-                    if is_float(INJ_mu) and is_float(INJ_beta):
-                        INJ1.update({
-                            'Amount'   : float(INJ_mu),
-                            'Beta'     : float(INJ_beta),
-                            'CurveType': 'Normal',
-                            'Bounds'   : [0., 1.]
-                        })
-                        if INJ_mu != 0.0:
-                            need_INJ = True
-                            if DSG['DamageStates'][-1]['AffectedArea'][0] == 0:
-                                incomplete = True
-                    else:
-                        INJ1.update({'Amount'   :
-                                         float(INJ_mu) if is_float(INJ_mu)
-                                         else 'Undefined',
-                                     'Beta'     :
-                                         float(INJ_beta) if is_float(INJ_beta)
-                                         else 'Undefined',
-                                     'CurveType': 'Normal',
-                                     'Bounds': [0., 1.]})
-                        if ((INJ1['Amount'] == 'Undefined') or
-                            (INJ1['Beta'] == 'Undefined')):
-                            incomplete = True
-
-                    DSG['DamageStates'][-1]['Consequences'].update({'RedTag': {}})
-                    RT = DSG['DamageStates'][-1]['Consequences']['RedTag']
-
-                    RT_mu = row['DS {}, Unsafe Placard Damage Median'.format(DS[-1])]
-                    RT_beta = row['DS {}, Unsafe Placard Damage Dispersion'.format(DS[-1])]
-                    if is_float(RT_mu) and is_float(RT_beta):
-                        RT.update({
-                            'Amount'   : float(RT_mu),
-                            'Beta'     : float(RT_beta),
-                            'CurveType': 'Normal',
-                            'Bounds'   : [0., 1.]
-                        })
-                        if RT['Amount'] != 0.0:
-                            need_RT = True
-                    else:
-                        RT.update({'Amount'   :
-                                       float(RT_mu[:-1]) if is_float(RT_mu)
-                                       else 'Undefined',
-                                   'Beta'     :
-                                       float(RT_beta[:-1]) if is_float(RT_beta)
-                                       else 'Undefined',
-                                   'CurveType': 'Normal',
-                                   'Bounds': [0., 1.]})
-                        if ((RT['Amount'] == 'Undefined') or
-                            (RT['Beta'] == 'Undefined')):
-                            incomplete = True
-
-            # remove the unused fields
-            if not need_INJ:
-                for DSG in json_output['DSGroups']:
-                    for DS in DSG['DamageStates']:
-                        del DS['AffectedArea']
-                        del DS['Consequences']['Injuries']
-
-            if not need_RT:
-                for DSG in json_output['DSGroups']:
-                    for DS in DSG['DamageStates']:
-                        del DS['Consequences']['RedTag']
-
-            # collect the repair cost and time consequences from the XML file
-            DSG_list = root.find('DamageStates').findall('DamageState')
-            for DSG_i, DSG_xml in enumerate(DSG_list):
-
-                if DSG_xml.find('DamageStates') is not None:
-                    DS_list = (DSG_xml.find('DamageStates')).findall('DamageState')
-                    for DS_i, DS_xml in enumerate(DS_list):
-                        r_cost, r_time = parse_DS_xml(DS_xml)
-                        CONSEQ = json_output['DSGroups'][DSG_i][
-                            'DamageStates'][DS_i]['Consequences']
-                        CONSEQ.update({
-                            'ReconstructionCost': r_cost,
-                            'ReconstructionTime': r_time
-                        })
-                        if ((r_cost['Amount'] == 'Undefined') or
-                            (r_time['Amount'] == 'Undefined')):
-                            incomplete = True
+        timings.update({'convert': time.time() - stage_time})
 
-                else:
-                    r_cost, r_time = parse_DS_xml(DSG_xml)
-                    CONSEQ = json_output['DSGroups'][DSG_i][
-                        'DamageStates'][0]['Consequences']
-                    CONSEQ.update({
-                        'ReconstructionCost': r_cost,
-                        'ReconstructionTime': r_time
-                    })
-                    if ((r_cost['Amount'] == 'Undefined') or
-                        (r_time['Amount'] == 'Undefined')):
-                        incomplete = True
+    else:
 
-            if incomplete:
-                json_output['GeneralInformation']['Incomplete'] = True
-                incomplete_count += 1
+        source_hash = _hash_bytes(str(_LIBRARY_BUILD_VERSION),
+                                  *[inputs[key] for key in sorted(inputs)])
 
-            if DL_dir is None:
-                DL_dir = target_dir / "DL json"
-                DL_dir.mkdir(exist_ok=True)
+        stage_time = time.time()
+        up_to_date = (len(old_comps) > 0) and np.all([
+            (comp_info['source'] == source_hash) and
+            output_is_valid(comp_info['output'], comp_info['output_hash'])
+            for comp_info in old_comps.values()])
 
-            with open(DL_dir / f'{comp_ID}.json', 'w') as f:
-                json.dump(json_output, f, indent=2)
+        if up_to_date:
+            components = old_comps
 
-        #except:
-        #    warnings.warn(UserWarning(
-        #        'Error converting data for component {}'.format(comp_ID)))
+        else:
+            # generate the files in a staging folder and only replace the
+            # files that changed
+            with tempfile.TemporaryDirectory() as stage_dir:
+                stage_dir = Path(stage_dir)
+                HAZUS_builders[library](data_source_dir, stage_dir)
+
+                for path in sorted((stage_dir / 'DL json').iterdir()):
+                    comp_ID = path.stem
+                    output_hash = _hash_file(path)
+                    rel_path = f'DL json/{path.name}'
+
+                    comp_info = old_comps.get(comp_ID, None)
+                    if ((comp_info is None) or
+                        (not output_is_valid(rel_path, output_hash))):
+                        shutil.copy(path, DL_json_dir / path.name)
+                        converted.append(comp_ID)
+
+                    components.update({comp_ID: {
+                        'source': source_hash,
+                        'output': rel_path,
+                        'output_hash': output_hash}})
+
+                if (stage_dir / 'population.json').exists():
+                    shutil.copy(stage_dir / 'population.json',
+                                target_dir / 'population.json')
+
+        timings.update({'convert': time.time() - stage_time})
+
+    # remove the outputs of the components that are no longer in the sources
+    removed = [comp_ID for comp_ID in old_comps.keys()
+               if comp_ID not in components.keys()]
+    for comp_ID in removed:
+        old_output = target_dir / old_comps[comp_ID]['output']
+        if old_output.exists():
+            old_output.unlink()
+
+    outputs = {}
+    if (target_dir / 'population.json').exists():
+        outputs.update({
+            'population.json': _hash_file(target_dir / 'population.json')})
+
+    # rebuild the HDF5 file if anything changed
+    stage_time = time.time()
+    templates = ['DL_template.json', 'pop_template.json', 'population.json']
+    HDF_rebuilt = ((len(converted) > 0) or (len(removed) > 0) or
+        (outputs.get('population.json', None) !=
+         old_outputs.get('population.json', None)) or
+        np.any([inputs.get(template, None) != old_inputs.get(template, None)
+                for template in templates]) or
+        (not output_is_valid(HDF_path.name,
+                             old_outputs.get(HDF_path.name, None))))
+
+    if HDF_rebuilt:
+        convert_json_files_to_HDF(data_source_dir, target_dir, db_name,
+                                  n_jobs=n_jobs)
+    outputs.update({HDF_path.name: _hash_file(HDF_path)})
+    timings.update({'HDF': time.time() - stage_time})
+
+    # the DL library file follows the HDF5 file
+    stage_time = time.time()
+    if HDF_rebuilt or (not output_is_valid(
+            library_path.name, old_outputs.get(library_path.name, None))):
+        with pd.HDFStore(HDF_path, mode='r') as store:
+            library_tables = dict([(name, store[name])
+                                   for name in ['data', 'pop']
+                                   if f'/{name}' in store.keys()])
+        save_to_DL_library(library_tables, library_path)
+    outputs.update({library_path.name: _hash_file(library_path)})
+    timings.update({'DL_library': time.time() - stage_time})
+
+    timings.update({'total': time.time() - start_time})
+
+    manifest = {
+        'library': library,
+        'db_name': db_name,
+        'build_version': _LIBRARY_BUILD_VERSION,
+        'created': strftime('%Y-%m-%dT%H:%M:%S'),
+        'inputs': inputs,
+        'outputs': outputs,
+        'components': components,
+        'converted': converted,
+        'removed': removed,
+        'HDF_rebuilt': bool(HDF_rebuilt),
+        'timings': timings,
+    }
 
-    # finally, copy the population file
-    shutil.copy(
-        data_dir / 'population.json',
-        target_dir / 'population.json'
-    )
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
 
+    return manifest
 
 def create_HAZUS_EQ_json_files(data_dir, target_dir):
     """
@@ -47,9 +47,14 @@ This module has classes and methods that handle file input and output.
 
     read_SimCenter_DL_input
     read_SimCenter_EDP_input
+    index_EDP_events
+    read_EDP_events
     read_population_distribution
     read_component_DL_data
+    enable_DL_data_cache
     write_SimCenter_DL_output
+    write_SimCenter_DL_shard
+    merge_SimCenter_DL_shards
     write_SimCenter_DM_output
     write_SimCenter_DV_output
 
@@ -57,9 +62,12 @@ This module has classes and methods that handle file input and output.
 
 from .base import *
 from pathlib import Path
-from .db import convert_Series_to_dict
+from .db import convert_DataFrame_to_dicts, compile_table_paths, \
+    open_DL_library
 
 import json, posixpath
+from io import BytesIO
+from copy import deepcopy
 
 
 import warnings
@@ -74,6 +82,101 @@ convert_dv_name = {
     'DV_red_tag': 'Red Tag ',
 }
 
+# Cache for the component and population data. The cache is disabled by
+# default; long-running processes (e.g. the DL_server tool) enable it to avoid
+# re-reading the same libraries for every assessment.
+_DL_data_cache = None
+
+def enable_DL_data_cache(enabled=True):
+    """
+    Turn the in-memory cache of component and population data on or off.
+
+    When the cache is enabled, the data from each json file and each HDF5
+    table is loaded and converted to a dictionary only once and then served
+    from memory in subsequent read_component_DL_data and
+    read_population_distribution calls. Entries are keyed by the absolute
+    path and the modification time of the source, hence changes to the
+    libraries are picked up automatically and the entries of the earlier
+    versions of a file are dropped. Disabling the cache clears it.
+
+    Parameters
+    ----------
+    enabled: bool, default: True
+        If True, the cache is turned on. Otherwise, it is turned off.
+
+    """
+    global _DL_data_cache
+
+    if enabled:
+        if _DL_data_cache is None:
+            _DL_data_cache = {}
+    else:
+        _DL_data_cache = None
+
+def _drop_stale_DL_data(path, mtime):
+    """
+    Remove the cached data of earlier versions of the file at path.
+
+    """
+    for cache_key in list(_DL_data_cache.keys()):
+        if (cache_key[1] == path) and (cache_key[-1] != mtime):
+            del _DL_data_cache[cache_key]
+
+def _load_json_data(path):
+    """
+    Load a json file using the DL data cache when it is enabled.
+
+    """
+    if _DL_data_cache is None:
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    path = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    cache_key = ('json', path, mtime)
+    if cache_key not in _DL_data_cache:
+        _drop_stale_DL_data(path, mtime)
+        with open(path, 'r') as f:
+            _DL_data_cache[cache_key] = json.load(f)
+
+    return deepcopy(_DL_data_cache[cache_key])
+
+def _load_HDF_data(path, key, index_list):
+    """
+    Load the rows in index_list from an HDF5 table as a dict of dictionaries.
+
+    When the DL data cache is enabled, the whole table is read the first time
+    and the converted rows are kept in memory.
+
+    """
+    if _DL_data_cache is None:
+        store = pd.HDFStore(path)
+        store.open()
+        table = store.select(key, where=f'index in {index_list}')
+        store.close()
+
+        rows = convert_DataFrame_to_dicts(table)
+
+        return dict([(idx, rows[idx]) for idx in index_list])
+
+    path = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    cache_key = ('hdf', path, key, mtime)
+    if cache_key not in _DL_data_cache:
+        _drop_stale_DL_data(path, mtime)
+        table = pd.read_hdf(path, key)
+        _DL_data_cache[cache_key] = {
+            'table': table, 'rows': {},
+            'plan': compile_table_paths(table.columns)}
+    cached = _DL_data_cache[cache_key]
+
+    new_rows = [idx for idx in index_list if idx not in cached['rows']]
+    if len(new_rows) > 0:
+        cached['rows'].update(convert_DataFrame_to_dicts(
+            cached['table'].loc[new_rows, :], cached['plan']))
+
+    return dict([(idx, deepcopy(cached['rows'][idx])) for idx in index_list])
+
 # this is a convenience function for converting strings to float or None
 def float_or_None(string):
     try:
@@ -597,6 +700,16 @@ def read_SimCenter_DL_input(input_path, assessment_type='P58', verbose=False):
                                                     'lognormal'),
             'EDP_dist_basis':   res_description.get('BasisOfEDP_Distribution',
                                                     'all results')}})
+
+        # importance sampling of EDPs (optional)
+        # The sampling density is the fitted EDP distribution with its
+        # logarithmic mean shifted by `Shift` standard deviations and its
+        # logarithmic standard deviations multiplied by `DispersionFactor`.
+        IS = res_description.get('ImportanceSampling', None)
+        if IS is not None:
+            data['general']['response'].update({'importance_sampling': {
+                'shift': float(IS.get('Shift', 0.)),
+                'dispersion_factor': float(IS.get('DispersionFactor', 1.))}})
     else:
         data['general'].update({'response': {
             'EDP_distribution': 'lognormal',
@@ -838,6 +951,268 @@ def read_SimCenter_DL_input(input_path, assessment_type='P58', verbose=False):
 
     return data
 
+def _load_EDP_table(input_path):
+    """
+    Load the EDP table from a text, NumPy, Parquet or HDF5 file.
+
+    """
+    # the table might have been loaded already (e.g., by read_EDP_events)
+    if isinstance(input_path, pd.DataFrame):
+        EDP_raw = input_path
+
+    # NumPy archives either have a 2D 'data' array and the corresponding
+    # 'columns' or one array per column
+    elif input_path.endswith('npz'):
+        with np.load(input_path, allow_pickle=False) as npz:
+            if 'data' in npz.files:
+                EDP_raw = pd.DataFrame(npz['data'],
+                                       columns=npz['columns'].astype(str))
+            else:
+                EDP_raw = pd.DataFrame(dict([(column, npz[column])
+                                             for column in npz.files]))
+
+    elif input_path.endswith(('parquet', 'pq')):
+        EDP_raw = pd.read_parquet(input_path)
+
+    # HDF5 files are expected to have the EDPs in an 'EDP' table
+    elif input_path.endswith(('hdf', 'h5')):
+        EDP_raw = pd.read_hdf(input_path, 'EDP')
+
+    # If the file name ends with csv, we assume a standard csv file
+    elif input_path.endswith('csv'):
+        EDP_raw = pd.read_csv(input_path, header=0, index_col=0)
+
+    # otherwise, we assume that a dakota file is provided...
+    else:
+        # the read_csv method in pandas is sufficiently versatile to handle the
+        # tabular format of dakota
+        EDP_raw = pd.read_csv(input_path, sep=r'\s+', header=0, index_col=0)
+
+    return EDP_raw
+
+def _line_offsets(input_path, block_size=2**24):
+    """
+    Return the byte offset of the start of every line in a file.
+
+    The last element of the returned array is the size of the file.
+
+    """
+    line_starts = [np.zeros(1, dtype=np.int64)]
+    pos = 0
+    last = b''
+    with open(input_path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if len(block) == 0:
+                break
+            newlines = np.flatnonzero(
+                np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+            line_starts.append(pos + newlines.astype(np.int64) + 1)
+            pos += len(block)
+            last = block[-1:]
+
+    line_starts = np.concatenate(line_starts)
+
+    # without a newline at the end of the file, the last line ends at the end
+    # of the file; with a newline, the last start is the end of the file
+    if last != b'\n':
+        line_starts = np.append(line_starts, pos)
+
+    return line_starts
+
+def index_EDP_events(input_path, event_column='MultipleEvent',
+                     chunksize=100000, persist=True):
+    """
+    Index the rows that belong to each event in a dakotaTab EDP file.
+
+    The file is parsed once in chunks of rows; only the event column is kept
+    in memory. Consecutive rows of the same event are collected in blocks and
+    the first and last rows of each block are mapped to byte offsets in the
+    file, so that read_EDP_events can load the EDPs of any set of events
+    without parsing the rest of the file.
+
+    Parameters
+    ----------
+    input_path: string
+        Location of the EDP input file in the dakotaTab format.
+    event_column: string, default: 'MultipleEvent'
+        Name of the column that identifies the event of each row.
+    chunksize: int, default: 100000
+        Number of rows parsed at a time.
+    persist: bool, default: True
+        If True, the index is saved next to the input file in
+        <input_path>.events.json and it is reused as long as the size and the
+        modification time of the input file do not change.
+
+    Returns
+    -------
+    event_index: DataFrame
+        One row per block of consecutive rows of the same event with the name
+        of the event, the first row and the row after the last one, and the
+        corresponding byte offsets in the file. The byte offsets are -1 if the
+        rows could not be mapped to lines in the file (e.g., because of empty
+        lines).
+    """
+
+    index_path = input_path + '.events.json'
+    index_columns = ['event', 'start', 'stop', 'start_byte', 'stop_byte']
+
+    file_stats = os.stat(input_path)
+    source = {'size': file_stats.st_size, 'mtime': file_stats.st_mtime,
+              'event_column': event_column}
+
+    if persist and os.path.exists(index_path):
+        try:
+            with open(index_path, 'r') as f:
+                saved_index = json.load(f)
+
+            if saved_index['source'] == source:
+                return pd.DataFrame(saved_index['blocks'],
+                                    columns=index_columns)
+
+        except (ValueError, KeyError):
+            pass
+
+    # collect the blocks of consecutive rows of the same event
+    blocks = []
+    row_count = 0
+    for chunk in pd.read_csv(input_path, sep=r'\s+', header=0,
+                             usecols=[event_column], chunksize=chunksize):
+
+        events = chunk[event_column].values.astype(str)
+
+        changes = np.flatnonzero(events[1:] != events[:-1]) + 1
+        starts = np.concatenate([[0,], changes])
+        stops = np.concatenate([changes, [len(events),]])
+
+        for start, stop in zip(starts, stops):
+            event = events[start]
+            if (len(blocks) > 0) and (blocks[-1][0] == event) and (
+                blocks[-1][2] == row_count + start):
+                blocks[-1][2] = row_count + int(stop)
+            else:
+                blocks.append([event, row_count + int(start),
+                               row_count + int(stop)])
+
+        row_count += len(events)
+
+    # map the rows to lines in the file; the first line is the header
+    line_starts = _line_offsets(input_path)
+    if len(line_starts) - 1 == row_count + 1:
+        for block in blocks:
+            block += [int(line_starts[block[1] + 1]),
+                      int(line_starts[block[2] + 1])]
+    else:
+        for block in blocks:
+            block += [-1, -1]
+
+    if persist:
+        try:
+            with open(index_path, 'w') as f:
+                json.dump({'source': source, 'blocks': blocks}, f)
+        except OSError:
+            show_warning(f'Could not save the EDP event index to '
+                         f'{index_path}')
+
+    return pd.DataFrame(blocks, columns=index_columns)
+
+def read_EDP_events(input_path, events, event_index=None,
+                    event_column='MultipleEvent'):
+    """
+    Load the rows of a set of events from a dakotaTab EDP file.
+
+    Only the blocks of the file that belong to the requested events are read
+    and parsed.
+
+    Parameters
+    ----------
+    input_path: string
+        Location of the EDP input file in the dakotaTab format.
+    events: list of strings
+        Names of the events to load.
+    event_index: DataFrame, optional
+        Index of the events in the file created by index_EDP_events. It is
+        created (or loaded from the disk) if not provided.
+    event_column: string, default: 'MultipleEvent'
+        Name of the column that identifies the event of each row.
+
+    Returns
+    -------
+    EDP_raw: DataFrame
+        The rows of the requested events in the order they appear in the
+        file, with the same columns as the file.
+    """
+
+    if event_index is None:
+        event_index = index_EDP_events(input_path, event_column)
+
+    blocks = event_index[event_index['event'].isin(
+        [str(event) for event in events])]
+
+    if np.all(blocks['start_byte'].values >= 0):
+
+        with open(input_path, 'rb') as f:
+            data = [f.readline(),]
+            for start_byte, stop_byte in blocks[
+                ['start_byte', 'stop_byte']].values:
+                f.seek(start_byte)
+                data.append(f.read(stop_byte - start_byte))
+                if data[-1][-1:] != b'\n':
+                    data.append(b'\n')
+
+        EDP_raw = pd.read_csv(BytesIO(b''.join(data)), sep=r'\s+', header=0,
+                              index_col=0)
+
+    # if the rows are not mapped to lines, we parse the whole file but only
+    # keep the rows of the requested events
+    else:
+        keep_lines = set([0,])
+        for start, stop in blocks[['start', 'stop']].values:
+            keep_lines.update(range(start + 1, stop + 1))
+
+        EDP_raw = pd.read_csv(input_path, sep=r'\s+', header=0, index_col=0,
+                              skiprows=lambda line: line not in keep_lines)
+
+    return EDP_raw
+
+def _parse_EDP_columns(columns, EDP_kinds):
+    """
+    Parse the EDP column names into a table of EDP metadata.
+
+    Column names follow the <scenario>-<kind>-<location>-<direction> naming
+    convention of the dakotaTab files. A column is assigned to every EDP kind
+    in EDP_kinds that appears in its name.
+
+    Parameters
+    ----------
+    columns: list of strings
+        Column names in the EDP file.
+    EDP_kinds: tuple of strings
+        Collection of the kinds of EDPs to look for in the column names.
+
+    Returns
+    -------
+    EDP_index: DataFrame
+        One row per EDP with the position and name of the column, the kind of
+        EDP, and the scenario, location and direction of the EDP.
+    """
+
+    records = []
+    for col_i, column in enumerate(columns):
+        column = str(column)
+        for kind in EDP_kinds:
+            if kind in column:
+
+                # extract info about the location, direction, and scenario
+                info = column.split('-')
+
+                records.append([col_i, column, kind, info[0], info[2],
+                                info[3]])
+
+    return pd.DataFrame(records, columns=['position', 'column', 'kind',
+                                          'scenario_id', 'location',
+                                          'direction'])
+
 def read_SimCenter_EDP_input(input_path, EDP_kinds=('PID', 'PFA'),
                              units = dict(PID=1., PFA=1.),
                              verbose=False):
@@ -851,10 +1226,17 @@ def read_SimCenter_EDP_input(input_path, EDP_kinds=('PID', 'PFA'),
     automatically generated. The Input section of the documentation provides
     more information about the expected formatting of the EDP input file.
 
+    The same table can also be provided in binary formats identified by their
+    extension: a NumPy archive (.npz) with a 2D 'data' array and the
+    corresponding 'columns' or with one array per column; a Parquet file
+    (.parquet or .pq); or an HDF5 file (.hdf or .h5) with the table saved
+    under the 'EDP' key.
+
     Parameters
     ----------
-    input_path: string
-        Location of the EDP input file.
+    input_path: string or DataFrame
+        Location of the EDP input file or a DataFrame with the table of EDPs
+        (e.g., the rows of a stripe loaded by read_EDP_events).
     EDP_kinds: tuple of strings, default: ('PID', 'PFA')
         Collection of the kinds of EDPs in the input file. The default pair of
         'PID' and 'PFA' can be replaced or extended by any other EDPs.
@@ -868,7 +1250,8 @@ def read_SimCenter_EDP_input(input_path, EDP_kinds=('PID', 'PFA'),
     Returns
     -------
     data: dict
-        A dictionary with all the EDP data.
+        A dictionary with all the EDP data. The raw_data of each EDP is a
+        view of a single array that holds the EDPs in its rows.
     """
 
     # initialize the data container
@@ -876,41 +1259,33 @@ def read_SimCenter_EDP_input(input_path, EDP_kinds=('PID', 'PFA'),
 
     # read the collection of EDP inputs...
     log_msg('\t\tOpening the input file...')
-    # If the file name ends with csv, we assume a standard csv file
-    if input_path.endswith('csv'):
-        EDP_raw = pd.read_csv(input_path, header=0, index_col=0)
-
-    # otherwise, we assume that a dakota file is provided...
-    else:
-        # the read_csv method in pandas is sufficiently versatile to handle the
-        # tabular format of dakota
-        EDP_raw = pd.read_csv(input_path, sep=r'\s+', header=0, index_col=0)
-
-    # set the index to be zero-based
-    if EDP_raw.index[0] == 1:
-        EDP_raw.index = EDP_raw.index - 1
+    EDP_raw = _load_EDP_table(input_path)
 
     # search the header for EDP information
-    for column in EDP_raw.columns:
-        for kind in EDP_kinds:
-            if kind in column:
+    EDP_index = _parse_EDP_columns(EDP_raw.columns, EDP_kinds)
 
-                if kind not in data.keys():
-                    data.update({kind: []})
+    # get the scale factors to perform unit conversion
+    f_units = np.array([units[kind] for kind in EDP_index['kind']])
 
-                # extract info about the location, direction, and scenario
-                info = column.split('-')
+    # collect the EDPs in the rows of a single array
+    EDP_values = np.ascontiguousarray(
+        EDP_raw.iloc[:, EDP_index['position'].values].to_numpy(
+            dtype=np.float64).T)
+    EDP_values *= f_units[:, np.newaxis]
 
-                # get the scale factor to perform unit conversion
-                f_unit = units[kind]
+    # store the data
+    for EDP_i, (kind, scenario_id, location, direction) in enumerate(
+        EDP_index[['kind', 'scenario_id', 'location', 'direction']].values):
 
-                # store the data
-                data[kind].append(dict(
-                    raw_data=(EDP_raw[column].values * f_unit).tolist(),
-                    location=info[2],
-                    direction=info[3],
-                    scenario_id=info[0]
-                ))
+        if kind not in data.keys():
+            data.update({kind: []})
+
+        data[kind].append(dict(
+            raw_data=EDP_values[EDP_i],
+            location=location,
+            direction=direction,
+            scenario_id=scenario_id
+        ))
 
     if verbose: pp.pprint(data)
 
@@ -939,7 +1314,8 @@ def read_population_distribution(path_POP, occupancy, assessment_type='P58',
     Parameters
     ----------
     path_POP: string
-        Location of the population distribution json file.
+        Location of the population distribution json file, or an HDF5 or DL
+        library (.dlib) file with a 'pop' table.
     occupancy: string
         Identifies the occupancy category.
     assessment_type: {'P58', 'HAZUS_EQ'}
@@ -983,19 +1359,19 @@ def read_population_distribution(path_POP, occupancy, assessment_type='P58',
 
     # If a json file is provided:
     if path_POP.endswith('json'):
-        with open(path_POP, 'r') as f:
-            jd = json.load(f)
+        jd = _load_json_data(path_POP)
 
         data = jd[occupancy]
 
     # else if an HDF5 file is provided
     elif path_POP.endswith('hdf'):
 
-        store = pd.HDFStore(path_POP)
-        store.open()
-        pop_table = store.select('pop', where = f'index in {[occupancy,]}')
-        data = convert_Series_to_dict(pop_table.loc[occupancy,:])
-        store.close()
+        data = _load_HDF_data(path_POP, 'pop', [occupancy,])[occupancy]
+
+    # else if a DL library file is provided
+    elif path_POP.endswith('dlib'):
+
+        data = open_DL_library(path_POP).get('pop', occupancy)
 
     # convert peak population to persons/m2
     if 'peak' in data.keys():
@@ -1025,7 +1401,8 @@ def read_component_DL_data(path_CMP, comp_info, assessment_type='P58',
     Parameters
     ----------
     path_CMP: string
-        Location of the folder that contains the component data in JSON files.
+        Location of the folder that contains the component data in JSON files,
+        or an HDF5 or DL library (.dlib) file with a 'data' table.
     comp_info: dict
         Dictionary with additional information about the components.
     assessment_type: {'P58', 'HAZUS_EQ', 'HAZUS_HU'}
@@ -1075,23 +1452,27 @@ def read_component_DL_data(path_CMP, comp_info, assessment_type='P58',
         CMP_dir = Path(path_CMP).resolve()
 
         for c_id in s_cmp_keys:
-            with open(CMP_dir / f'{c_id}.json', 'r') as f:
-                DL_data_dict.update({c_id: json.load(f)})
+            DL_data_dict.update(
+                {c_id: _load_json_data(str(CMP_dir / f'{c_id}.json'))})
 
     # else if an HDF5 file is provided we assume it contains the DL data
     elif path_CMP.endswith('hdf'):
 
-        store = pd.HDFStore(path_CMP)
-        store.open()
-        CMP_table = store.select('data', where=f'index in {s_cmp_keys}')
-        for c_id in s_cmp_keys:
-            DL_data_dict.update({c_id: convert_Series_to_dict(CMP_table.loc[c_id, :])})
-        store.close()
+        DL_data_dict = _load_HDF_data(path_CMP, 'data', s_cmp_keys)
+
+    # else if a DL library file is provided
+    elif path_CMP.endswith('dlib'):
+
+        DL_library = open_DL_library(path_CMP)
+
+        DL_data_dict = dict([(c_id, DL_library.get('data', c_id))
+                             for c_id in s_cmp_keys])
 
     else:
         raise ValueError(
             "Component data source not recognized. Please provide "
-            "either a folder with DL json files or an HDF5 table.")
+            "a folder with DL json files, an HDF5 table or a DL library "
+            "(.dlib) file.")
 
     # for each component
     for c_id in s_cmp_keys:
@@ -1353,17 +1734,23 @@ def read_component_DL_data(path_CMP, comp_info, assessment_type='P58',
     return data
 
 def write_SimCenter_DL_output(output_dir, output_filename, output_df, index_name='#Num',
-                              collapse_columns = True, stats_only=False):
+                              collapse_columns = True, stats_only=False,
+                              weights=None):
 
     # if the summary flag is set, then not all realizations are returned, but
     # only the first two moments and the empirical CDF through 100 percentiles
+    # (weighted statistics are provided if the realizations have weights)
     if stats_only:
         #output_df = output_df.describe(np.arange(1, 100)/100.)
         #output_df = output_df.describe([0.1,0.5,0.9])
-        if len(output_df.columns) > 0:
-            output_df = describe(output_df)
+        if isinstance(output_df, StatsAccumulator):
+            # the statistics were collected while the results were produced
+            output_df = output_df.describe()
+        elif len(output_df.columns) > 0:
+            output_df = describe(output_df, weights=weights)
         else:
-            output_df = describe(np.zeros(len(output_df.index)))
+            output_df = describe(np.zeros(len(output_df.index)),
+                                 weights=weights)
     else:
         output_df = output_df.copy()
 
@@ -1386,6 +1773,136 @@ def write_SimCenter_DL_output(output_dir, output_filename, output_df, index_name
     #with open(file_path[:-3]+'zip', 'w') as f:
     #    output_df.to_csv(f, compression=dict(mehtod='zip', archive_name=output_filename))
 
+def write_SimCenter_DL_shard(output_dir, shard, outputs):
+    """
+    Save the mergeable results of a shard of an assessment.
+
+    The statistics of every output are saved in numpy (npz) files next to
+    the standard outputs of the shard and a shard.json file describes the
+    shard and its outputs. The shard.json is written last, hence it also
+    marks that the shard is complete.
+
+    Parameters
+    ----------
+    output_dir: string
+        Location of the outputs of the shard.
+    shard: dict
+        Description of the shard as provided by the _shard attribute of the
+        assessment.
+    outputs: dict
+        Maps the suffix of each set of outputs (e.g., the stripe) to the
+        statistics collected in the _stats attribute of the assessment.
+
+    """
+    output_list = {}
+    for suffix, stats in outputs.items():
+        for name, acc in stats.items():
+            acc.save(posixpath.join(output_dir,
+                                    '{}{}_stats.npz'.format(suffix, name)))
+        output_list.update({suffix: sorted(stats.keys())})
+
+    shard_info = dict(shard)
+    shard_info.update({'outputs': output_list})
+
+    with open(posixpath.join(output_dir, 'shard.json'), 'w') as f:
+        json.dump(shard_info, f, indent=2)
+
+def merge_SimCenter_DL_shards(shard_dirs, output_dir):
+    """
+    Merge the outputs of the shards of an assessment.
+
+    The realizations in the DL_summary, DMG_agg and DV _agg files of the
+    shards are concatenated and numbered according to their position in the
+    full set of realizations. The statistics of the shards are merged and
+    saved in the standard _stats files. When the shards collected exact
+    statistics, the merged statistics are identical to the statistics of the
+    concatenated realizations.
+
+    Parameters
+    ----------
+    shard_dirs: list of strings
+        Locations of the outputs of the shards. Every shard of the assessment
+        needs to be provided and complete.
+    output_dir: string
+        Location of the merged outputs.
+
+    """
+    shards = []
+    for shard_dir in shard_dirs:
+        info_path = posixpath.join(shard_dir, 'shard.json')
+        if not os.path.exists(info_path):
+            raise ValueError(
+                'The shard in {} is incomplete or missing.'.format(shard_dir))
+
+        with open(info_path, 'r') as f:
+            shard_info = json.load(f)
+        shard_info.update({'path': shard_dir})
+        shards.append(shard_info)
+
+    if len(shards) == 0:
+        raise ValueError('There are no shards to merge.')
+
+    shards = sorted(shards, key=lambda shard: shard['shard_id'])
+
+    # the shards need to belong to the same assessment
+    ref = shards[0]
+    for att in ['shard_count', 'seed', 'total_realizations', 'outputs']:
+        for shard in shards[1:]:
+            if shard[att] != ref[att]:
+                raise ValueError(
+                    'The shards in {} and {} belong to different assessments '
+                    '({} does not match).'.format(
+                        ref['path'], shard['path'], att))
+
+    shard_ids = [shard['shard_id'] for shard in shards]
+    if shard_ids != list(range(ref['shard_count'])):
+        missing = sorted(set(range(ref['shard_count'])) - set(shard_ids))
+        raise ValueError(
+            'The shards are incomplete; missing: {}, duplicate: {}.'.format(
+                [shard_id + 1 for shard_id in missing],
+                sorted(set([shard_id + 1 for shard_id in shard_ids
+                            if shard_ids.count(shard_id) > 1]))))
+
+    log_msg('Merging {} shards...'.format(len(shards)))
+
+    for suffix, stat_names in ref['outputs'].items():
+
+        # realizations
+        filenames = ['DL_summary.csv']
+        if 'DMG' in stat_names:
+            filenames.append('DMG_agg.csv')
+        filenames += ['{}.csv'.format(name) for name in stat_names
+                      if name.endswith('_agg')]
+
+        for filename in filenames:
+            filename = suffix + filename
+
+            shard_dfs = []
+            for shard in shards:
+                shard_df = pd.read_csv(
+                    posixpath.join(shard['path'], filename), index_col=0,
+                    float_precision='round_trip')
+                shard_df.index = shard_df.index + shard['offset']
+                shard_dfs.append(shard_df)
+
+            log_msg('\tSaving file {}'.format(filename))
+            pd.concat(shard_dfs, axis=0).to_csv(
+                posixpath.join(output_dir, filename))
+
+        # statistics
+        for name in stat_names:
+            stats = StatsAccumulator.load(posixpath.join(
+                shards[0]['path'], '{}{}_stats.npz'.format(suffix, name)))
+            for shard in shards[1:]:
+                stats.merge(StatsAccumulator.load(posixpath.join(
+                    shard['path'], '{}{}_stats.npz'.format(suffix, name))))
+
+            is_summary = name == 'DL_summary'
+            write_SimCenter_DL_output(
+                output_dir, '{}{}_stats.csv'.format(suffix, name), stats,
+                index_name='attribute' if is_summary else '#Num',
+                collapse_columns=is_summary, stats_only=True)
+
 def write_SimCenter_EDP_output(output_dir, EDP_filename, EDP_df):
 
     # initialize the output DF
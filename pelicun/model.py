@@ -51,6 +51,9 @@ loss assessment.
     DamageStateGroup
     PerformanceGroup
     FragilityGroup
+    ConsequenceTable
+    DamageStateTable
+    ColumnRegistry
 
     prep_constant_median_DV
     prep_bounded_linear_median_DV
@@ -59,6 +62,7 @@ loss assessment.
 
 import numpy as np
 import pandas as pd
+from functools import partial
 from .uq import RandomVariableSubset
 
 class FragilityFunction(object):
@@ -91,6 +95,8 @@ class FragilityFunction(object):
 
     """
 
+    __slots__ = ['_EDP_limit']
+
     def __init__(self, EDP_limit):
         self._EDP_limit = EDP_limit
 
@@ -229,10 +235,14 @@ def prep_constant_median_DV(median):
         A function that returns the constant median DV for all component
         quantities.
     """
-    def f(quantity):
-        return median
+    return partial(_constant_median_DV, median)
+
+# The median DV functions are defined at the module level and bound to their
+# parameters by the prep_*_median_DV functions. This keeps the consequence
+# functions, and the loss models that use them, picklable.
 
-    return f
+def _constant_median_DV(median, quantity):
+    return median
 
 def prep_bounded_linear_median_DV(median_max, median_min, quantity_lower,
                                   quantity_upper):
@@ -261,23 +271,8 @@ def prep_bounded_linear_median_DV(median_max, median_min, quantity_lower,
         A function that returns the median DV given the quantity of damaged
         components.
     """
-    def f(quantity):
-        if quantity is None:
-            raise ValueError(
-                'A bounded linear median Decision Variable function called '
-                'without specifying the quantity of damaged components')
-
-        q_array = np.asarray(quantity, dtype=np.float64)
-
-        # calculate the median consequence given the quantity of damaged
-        # components
-        output = np.interp(q_array,
-                           [quantity_lower, quantity_upper],
-                           [median_max, median_min])
-
-        return output
-
-    return f
+    return partial(_bounded_multilinear_median_DV,
+                   [median_max, median_min], [quantity_lower, quantity_upper])
 
 def prep_bounded_multilinear_median_DV(medians, quantities):
     """
@@ -303,21 +298,21 @@ def prep_bounded_multilinear_median_DV(medians, quantities):
         A function that returns the median DV given the quantity of damaged
         components.
     """
-    def f(quantity):
-        if quantity is None:
-            raise ValueError(
-                'A bounded linear median Decision Variable function called '
-                'without specifying the quantity of damaged components')
+    return partial(_bounded_multilinear_median_DV, medians, quantities)
 
-        q_array = np.asarray(quantity, dtype=np.float64)
+def _bounded_multilinear_median_DV(medians, quantities, quantity):
+    if quantity is None:
+        raise ValueError(
+            'A bounded linear median Decision Variable function called '
+            'without specifying the quantity of damaged components')
 
-        # calculate the median consequence given the quantity of damaged
-        # components
-        output = np.interp(q_array, quantities, medians)
+    q_array = np.asarray(quantity, dtype=np.float64)
 
-        return output
+    # calculate the median consequence given the quantity of damaged
+    # components
+    output = np.interp(q_array, quantities, medians)
 
-    return f
+    return output
 
 class ConsequenceFunction(object):
     """
@@ -347,6 +342,8 @@ class ConsequenceFunction(object):
 
     """
 
+    __slots__ = ['_DV_median', '_DV_distribution']
+
     def __init__(self, DV_median, DV_distribution):
 
         self._DV_median = DV_median
@@ -502,6 +499,10 @@ class DamageState(object):
 
     """
 
+    __slots__ = ['_ID', '_weight', '_description', '_repair_cost_CF',
+                 '_reconstruction_time_CF', '_injuries_CF_set',
+                 '_affected_area', '_red_tag_CF']
+
     def __init__(self, ID, weight=1.0, description='',
                  repair_cost_CF=None, reconstruction_time_CF=None,
                  injuries_CF_set=None, affected_area=0., red_tag_CF=None):
@@ -677,6 +678,8 @@ class DamageStateGroup(object):
         they can occur at the same time and at least one of them has to occur.
     """
 
+    __slots__ = ['_ID', '_DS_set', '_DS_set_kind']
+
     def __init__(self, ID, DS_set, DS_set_kind):
         self._ID = ID
         self._DS_set = DS_set
@@ -736,6 +739,9 @@ class PerformanceGroup(object):
         the directions assigned to Demand objects.
     """
 
+    __slots__ = ['_ID', '_location', '_quantity', '_FF_set', '_DSG_set',
+                 '_csg_weights', '_direction']
+
     def __init__(self, ID, location, quantity, fragility_functions, DSG_set,
                  csg_weights=[1.0], direction=0):
         self._ID = ID
@@ -817,6 +823,10 @@ class FragilityGroup(object):
         Provides a detailed description of the fragility group.
     """
 
+    __slots__ = ['_ID', '_demand_type', '_performance_groups', '_directional',
+                 '_correlation', '_demand_location_offset', '_incomplete',
+                 '_name', '_description', '_unit']
+
     def __init__(self, ID, demand_type, performance_groups,
                  directional=True, correlation=True, demand_location_offset=0,
                  incomplete=False, name='', description='', unit="ea"):
@@ -844,4 +854,416 @@ class FragilityGroup(object):
         Return the name of the fragility group.
 
         """
-        return self._name
\ No newline at end of file
+        return self._name
+
+class ConsequenceTable(object):
+    """
+    Stores one type of consequence of the damage states of an FG in arrays.
+
+    The consequence functions of a damage state are identical in every PG of
+    an FG; only the dimensions of the random variable that describe their
+    uncertainty differ. The table stores the breakpoints of the median DV
+    functions once for every damage state and the position of the random
+    variable dimension for every PG and damage state. Consequence functions
+    are assembled from these arrays when they are requested.
+
+    Parameters
+    ----------
+    medians: float ndarray
+        The median DVs of the damage states in one flat array.
+    quantities: float ndarray
+        The component quantities that correspond to the medians. The quantity
+        is not used when a damage state has only one median - such damage
+        states have a constant median DV.
+    offsets: int ndarray
+        The position of the first median of each damage state in the medians
+        array, followed by the total number of medians. Damage states without
+        medians have no consequence function of this type.
+    RV: RandomVariable, optional
+        The random variable that describes the uncertainty in the DVs.
+    RV_positions: int ndarray, optional
+        The position of the dimension of the RV that belongs to each damage
+        state (columns) in each PG (rows). Negative positions indicate that
+        there is no uncertainty in the DV.
+
+    """
+
+    __slots__ = ['_medians', '_quantities', '_offsets', '_RV', '_RV_positions']
+
+    def __init__(self, medians, quantities, offsets, RV=None,
+                 RV_positions=None):
+        self._medians = np.asarray(medians, dtype=np.float64)
+        self._quantities = np.asarray(quantities, dtype=np.float64)
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+        self._RV = RV
+        if RV_positions is not None:
+            RV_positions = np.asarray(RV_positions, dtype=np.int64)
+        self._RV_positions = RV_positions
+
+    def consequence_function(self, PG_i, DS_i):
+        """
+        Return the consequence function of a damage state in a PG.
+
+        Parameters
+        ----------
+        PG_i: int
+            Zero-based index of the PG in the FG.
+        DS_i: int
+            Zero-based index of the damage state in the table.
+
+        Returns
+        -------
+        CF: ConsequenceFunction
+            None if the damage state has no consequence of this type.
+        """
+        start, stop = self._offsets[DS_i:DS_i + 2]
+
+        if start == stop:
+            return None
+
+        if stop - start == 1:
+            DV_median = prep_constant_median_DV(self._medians[start])
+        else:
+            DV_median = prep_bounded_multilinear_median_DV(
+                self._medians[start:stop], self._quantities[start:stop])
+
+        DV_distribution = None
+        if self._RV_positions is not None:
+            RV_pos = self._RV_positions[PG_i, DS_i]
+            if RV_pos >= 0:
+                DV_distribution = RandomVariableSubset(
+                    self._RV, tags=self._RV.dimension_tags[RV_pos])
+
+        return ConsequenceFunction(DV_median=DV_median,
+                                   DV_distribution=DV_distribution)
+
+
+class DamageStateTable(object):
+    """
+    Stores the damage states of an FG and their consequences in arrays.
+
+    Every PG of an FG has the same set of DSGs and damage states. The table
+    stores their parameters once and provides DamageStateGroup and
+    DamageState views for each PG. The views look up their attributes in the
+    table when they are accessed, hence, the memory used by the damage model
+    scales with the number of damage states rather than with the number of
+    PGs in the FG.
+
+    Parameters
+    ----------
+    DSG_kinds: str list
+        The DS_set_kind of each DSG.
+    DSG_index: int ndarray
+        The zero-based index of the DSG that each damage state belongs to.
+        The damage states of a DSG shall be consecutive.
+    weights: float ndarray
+        The weight of each damage state.
+    descriptions: str list, optional
+        The description of each damage state.
+    affected_areas: float ndarray, optional
+        The affected area of each damage state. Zero by default.
+    repair_cost: ConsequenceTable, optional
+    reconstruction_time: ConsequenceTable, optional
+    red_tag: ConsequenceTable, optional
+        The consequences of the damage states. None means that none of the
+        damage states has a consequence of that type.
+    injuries: ConsequenceTable list, optional
+        The injury consequences of the damage states; one table for each
+        severity level.
+
+    """
+
+    __slots__ = ['_DSG_kinds', '_DSG_index', '_DSG_offsets', '_weights',
+                 '_descriptions', '_affected_areas', '_repair_cost',
+                 '_reconstruction_time', '_red_tag', '_injuries']
+
+    def __init__(self, DSG_kinds, DSG_index, weights, descriptions=None,
+                 affected_areas=None, repair_cost=None,
+                 reconstruction_time=None, red_tag=None, injuries=None):
+
+        DS_count = len(DSG_index)
+
+        self._DSG_kinds = list(DSG_kinds)
+        self._DSG_index = np.asarray(DSG_index, dtype=np.int64)
+        self._DSG_offsets = np.searchsorted(self._DSG_index,
+                                            np.arange(len(self._DSG_kinds) + 1))
+        self._weights = np.asarray(weights, dtype=np.float64)
+        if descriptions is None:
+            descriptions = [''] * DS_count
+        self._descriptions = list(descriptions)
+        if affected_areas is None:
+            affected_areas = np.zeros(DS_count)
+        self._affected_areas = np.asarray(affected_areas, dtype=np.float64)
+        self._repair_cost = repair_cost
+        self._reconstruction_time = reconstruction_time
+        self._red_tag = red_tag
+        if injuries is None:
+            injuries = []
+        self._injuries = list(injuries)
+
+    def DSG_set(self, PG_i):
+        """
+        Return the damage state groups of a PG.
+
+        Parameters
+        ----------
+        PG_i: int
+            Zero-based index of the PG in the FG.
+
+        Returns
+        -------
+        DSG_set: DamageStateGroup list
+            Views of the DSGs in the table that belong to the PG.
+        """
+        return [_DamageStateGroupView(self, PG_i, DSG_i)
+                for DSG_i in range(len(self._DSG_kinds))]
+
+
+class _DamageStateGroupView(DamageStateGroup):
+    """
+    A DamageStateGroup of a PG that is stored in a DamageStateTable.
+    """
+
+    __slots__ = ['_table', '_PG_i', '_DSG_i']
+
+    def __init__(self, table, PG_i, DSG_i):
+        self._table = table
+        self._PG_i = PG_i
+        self._DSG_i = DSG_i
+
+    def __reduce__(self):
+        return (self.__class__, (self._table, self._PG_i, self._DSG_i))
+
+    @property
+    def _ID(self):
+        return self._DSG_i + 1
+
+    @property
+    def _DS_set(self):
+        start, stop = self._table._DSG_offsets[self._DSG_i:self._DSG_i + 2]
+        return [_DamageStateView(self._table, self._PG_i, DS_i)
+                for DS_i in range(start, stop)]
+
+    @property
+    def _DS_set_kind(self):
+        return self._table._DSG_kinds[self._DSG_i]
+
+
+class _DamageStateView(DamageState):
+    """
+    A DamageState of a PG that is stored in a DamageStateTable.
+    """
+
+    __slots__ = ['_table', '_PG_i', '_DS_i']
+
+    def __init__(self, table, PG_i, DS_i):
+        self._table = table
+        self._PG_i = PG_i
+        self._DS_i = DS_i
+
+    def __reduce__(self):
+        return (self.__class__, (self._table, self._PG_i, self._DS_i))
+
+    def _consequence_function(self, CT):
+        if CT is None:
+            return None
+        return CT.consequence_function(self._PG_i, self._DS_i)
+
+    @property
+    def _ID(self):
+        table = self._table
+        DSG_i = table._DSG_index[self._DS_i]
+        return int(self._DS_i - table._DSG_offsets[DSG_i] + 1)
+
+    @property
+    def _weight(self):
+        return float(self._table._weights[self._DS_i])
+
+    @property
+    def _description(self):
+        return self._table._descriptions[self._DS_i]
+
+    @property
+    def _affected_area(self):
+        return float(self._table._affected_areas[self._DS_i])
+
+    @property
+    def _repair_cost_CF(self):
+        return self._consequence_function(self._table._repair_cost)
+
+    @property
+    def _reconstruction_time_CF(self):
+        return self._consequence_function(self._table._reconstruction_time)
+
+    @property
+    def _red_tag_CF(self):
+        return self._consequence_function(self._table._red_tag)
+
+    @property
+    def _injuries_CF_set(self):
+        CF_set = [self._consequence_function(CT)
+                  for CT in self._table._injuries]
+        if len(CF_set) == 0:
+            CF_set = [None, ]
+        return CF_set
+
+
+class ColumnRegistry(object):
+    """
+    Assigns integer positions to the damage state columns of a loss model.
+
+    Each Damage State (DS) of each Performance Group (PG) in a Fragility Group
+    (FG) corresponds to a column in the damage and loss results. The registry
+    orders the columns by the IDs of the FG, PG, Damage State Group (DSG) and
+    DS. The columns of an FG form a contiguous block that has one sub-block of
+    DS columns for each of its PGs. The calculations access the columns
+    through their positions and the readable labels (e.g., '1_2' for the
+    second DS in the first DSG) are only generated for the results.
+
+    Parameters
+    ----------
+    FG_list: FragilityGroup list
+        The Fragility Groups of the loss model. Every PG of an FG shall have
+        the same set of DSGs and DSs.
+    """
+
+    def __init__(self, FG_list):
+
+        columns = []
+        self._FG_blocks = {}
+        self._PG_offsets = {}
+
+        for FG in sorted(FG_list, key=lambda FG: FG._ID):
+            PG_set = FG._performance_groups
+
+            PG_order = sorted(range(len(PG_set)),
+                              key=lambda pg_i: PG_set[pg_i]._ID)
+            DS_order = sorted(
+                [(dsg_i, ds_i)
+                 for dsg_i, DSG in enumerate(PG_set[0]._DSG_set)
+                 for ds_i in range(len(DSG._DS_set))],
+                key=lambda d: (PG_set[0]._DSG_set[d[0]]._ID,
+                               PG_set[0]._DSG_set[d[0]]._DS_set[d[1]]._ID))
+
+            self._FG_blocks.update({
+                FG._ID: (len(columns), len(PG_order), len(DS_order))})
+
+            for pg_i in PG_order:
+                PG = PG_set[pg_i]
+                self._PG_offsets.update({(FG._ID, PG._ID): len(columns)})
+                for dsg_i, ds_i in DS_order:
+                    DSG = PG._DSG_set[dsg_i]
+                    columns.append((FG._ID, PG._ID, DSG._ID,
+                                    DSG._DS_set[ds_i]._ID,
+                                    pg_i, dsg_i, ds_i))
+
+        columns = np.array(columns, dtype=np.int64).reshape(-1, 7)
+
+        # IDs and the indices in the model objects for each column
+        self.FG, self.PG, self.DSG, self.DS = columns[:, :4].T
+        self.PG_i, self.DSG_i, self.DS_i = columns[:, 4:].T
+
+        self._positions = dict([
+            (tuple(ids), pos) for pos, ids in enumerate(columns[:, :4])])
+
+    @property
+    def size(self):
+        """
+        Return the number of columns.
+
+        """
+        return len(self.FG)
+
+    def position(self, FG_ID, PG_ID, DSG_ID, DS_ID):
+        """
+        Return the position of the column of a Damage State.
+
+        Parameters
+        ----------
+        FG_ID: int
+        PG_ID: int
+        DSG_ID: int
+        DS_ID: int
+
+        Returns
+        -------
+        position: int
+        """
+        return self._positions[(FG_ID, PG_ID, DSG_ID, DS_ID)]
+
+    def FG_block(self, FG_ID):
+        """
+        Return the layout of the columns of a Fragility Group.
+
+        Parameters
+        ----------
+        FG_ID: int
+
+        Returns
+        -------
+        offset: int
+            Position of the first column of the FG.
+        PG_count: int
+            Number of Performance Groups in the FG.
+        DS_count: int
+            Number of Damage State columns in each Performance Group.
+        """
+        return self._FG_blocks[FG_ID]
+
+    def FG_columns(self, FG_ID):
+        """
+        Return the slice of positions that belongs to a Fragility Group.
+
+        Parameters
+        ----------
+        FG_ID: int
+
+        Returns
+        -------
+        columns: slice
+        """
+        offset, PG_count, DS_count = self._FG_blocks[FG_ID]
+
+        return slice(offset, offset + PG_count * DS_count)
+
+    def PG_columns(self, FG_ID, PG_ID):
+        """
+        Return the slice of positions that belongs to a Performance Group.
+
+        Parameters
+        ----------
+        FG_ID: int
+        PG_ID: int
+
+        Returns
+        -------
+        columns: slice
+        """
+        offset = self._PG_offsets[(FG_ID, PG_ID)]
+
+        return slice(offset, offset + self._FG_blocks[FG_ID][2])
+
+    def labels(self, positions=None):
+        """
+        Return the readable labels of the columns.
+
+        Parameters
+        ----------
+        positions: int ndarray or slice, optional
+            Positions of the labeled columns. By default, every column is
+            labeled.
+
+        Returns
+        -------
+        labels: MultiIndex
+            The FG and PG IDs and the DSG_DS tags of the columns.
+        """
+        if positions is None:
+            positions = slice(None)
+
+        DSG_DS = ['{}_{}'.format(DSG, DS) for DSG, DS in
+                  zip(self.DSG[positions], self.DS[positions])]
+
+        return pd.MultiIndex.from_arrays(
+            [self.FG[positions], self.PG[positions], DSG_DS],
+            names=['FG', 'PG', 'DSG_DS'])
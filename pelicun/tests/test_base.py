@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of pelicun.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# pelicun. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Adam Zsarnóczay
+
+"""
+This subpackage performs unit tests on the base module of pelicun.
+
+"""
+
+import pytest
+import numpy as np
+import pandas as pd
+from numpy.testing import assert_allclose
+
+import os, sys, inspect
+current_dir = os.path.dirname(
+    os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0,os.path.dirname(parent_dir))
+
+from pelicun.base import *
+
+# -----------------------------------------------------------------------------
+# StatsAccumulator
+# -----------------------------------------------------------------------------
+
+def _test_samples():
+
+    rng = np.random.RandomState(42)
+
+    samples = pd.DataFrame(
+        rng.lognormal(size=(10000, 3)),
+        columns=pd.MultiIndex.from_tuples([('A', '1'), ('A', '2'), ('B', '1')]))
+    samples.iloc[rng.rand(10000) < 0.1, 1] = np.nan
+
+    weights = rng.uniform(0.5, 2.0, size=10000)
+
+    return samples, weights
+
+def test_StatsAccumulator_exact_merge():
+    """
+    Test if the statistics of exact accumulators that are merged from chunks
+    of realizations match the statistics of the full set of realizations.
+    """
+
+    samples, weights = _test_samples()
+
+    for W in [None, weights]:
+        ref = describe(samples, weights=W)
+
+        acc = StatsAccumulator(exact=True)
+        for chunk in np.array_split(np.arange(len(samples)), 7):
+            part = StatsAccumulator(exact=True).update(
+                samples.iloc[chunk], weights=None if W is None else W[chunk])
+            acc.merge(part)
+
+        stats = acc.describe()
+
+        assert stats.index.equals(ref.index)
+        assert stats.columns.equals(ref.columns)
+        assert stats.equals(ref)
+
+def test_StatsAccumulator_sketch():
+    """
+    Test if the percentiles estimated by the sketch are close to the exact
+    ones, while the moments remain exact.
+    """
+
+    samples, weights = _test_samples()
+
+    for W in [None, weights]:
+        ref = describe(samples, weights=W)
+
+        acc = StatsAccumulator(exact=False, compression=200)
+        for chunk in np.array_split(np.arange(len(samples)), 5):
+            acc.update(samples.iloc[chunk],
+                       weights=None if W is None else W[chunk])
+
+        stats = acc.describe()
+
+        assert_allclose(stats.loc[['count', 'mean', 'std', 'min', 'max']],
+                        ref.loc[['count', 'mean', 'std', 'min', 'max']],
+                        rtol=1e-10)
+        assert_allclose(stats.loc[['10%', '50%', '90%']],
+                        ref.loc[['10%', '50%', '90%']], rtol=0.02)
+
+        # the size of the sketch is bounded
+        assert max([len(m) for m, w in acc._centroids]) <= 100
+
+def test_StatsAccumulator_save_and_load(tmp_path):
+    """
+    Test if the accumulators are restored from the saved files.
+    """
+
+    samples, weights = _test_samples()
+
+    for exact in [True, False]:
+        acc = StatsAccumulator(exact=exact).update(samples.iloc[:5000])
+
+        acc.save(tmp_path / 'stats.npz')
+        acc_load = StatsAccumulator.load(tmp_path / 'stats.npz')
+
+        assert acc_load.describe().equals(acc.describe())
+
+        # the loaded accumulator can be merged with other results
+        acc_load.merge(StatsAccumulator(exact=exact).update(
+            samples.iloc[5000:]))
+        if exact:
+            assert acc_load.describe().equals(describe(samples))
+
+def test_StatsAccumulator_errors():
+    """
+    Test if incompatible inputs and accumulators are rejected.
+    """
+
+    samples, weights = _test_samples()
+
+    acc = StatsAccumulator().update(samples)
+
+    with pytest.raises(ValueError):
+        acc.update(samples.iloc[:, :2])
+
+    with pytest.raises(ValueError):
+        acc.merge(StatsAccumulator(exact=False).update(samples))
+
+    # results of different quantities are not merged even if their shapes
+    # match
+    other = samples.copy()
+    other.columns = other.columns[::-1]
+    with pytest.raises(ValueError):
+        acc.merge(StatsAccumulator().update(other))
+    with pytest.raises(ValueError):
+        acc.update(other)
+
+    # arrays only need to have the same number of columns
+    acc.update(samples.values)
+
+    with pytest.raises(ValueError):
+        StatsAccumulator().describe()
@@ -45,6 +45,7 @@ This subpackage performs system tests on the control module of pelicun.
 import pytest
 import numpy as np
 from numpy.testing import assert_allclose
+from scipy.stats import norm, truncnorm
 from scipy.stats import truncnorm as tnorm
 from copy import deepcopy
 
@@ -641,6 +642,134 @@ def test_FEMA_P58_Assessment_EDP_uncertainty_basic():
     P_no_RED_test = (1.0 - SD.loc[('red tagged', ''), 'mean']) * SD.loc[
         ('red tagged', ''), 'count'] / 10000.
 
+def test_FEMA_P58_Assessment_EDP_importance_sampling():
+    """
+    Perform a loss assessment with importance sampling of EDPs. The inputs are
+    identical to those in the basic EDP uncertainty test, but the EDPs are
+    sampled from a shifted and inflated distribution. The weighted statistics
+    of the results shall match the reference values of the target
+    distribution, while the unweighted statistics shall overestimate the
+    probability of collapse.
+    """
+
+    base_input_path = 'resources/'
+    DL_input = base_input_path + 'input data/' + "DL_input_test_12.json"
+    EDP_input = base_input_path + 'EDP data/' + "EDP_table_test_2.out"
+
+    A = FEMA_P58_Assessment()
+
+    A.read_inputs(DL_input, EDP_input, verbose=False)
+
+    A.define_random_variables()
+
+    # the target distribution is the fitted EDP distribution
+    RV_EDP = A._EDP_target_RV
+    assert_allclose(RV_EDP.theta, [9.80665, 12.59198, 0.074081, 0.044932],
+                    rtol=0.05)
+
+    # the sampling distribution is shifted by one standard deviation
+    RV_IS = A._RV_dict['EDP']
+    assert_allclose(np.log(RV_IS.theta),
+                    np.log(RV_EDP.theta) + RV_EDP.sig, rtol=1e-6)
+    assert_allclose(RV_IS.sig, RV_EDP.sig * 1.2, rtol=1e-6)
+
+    # weights are the likelihood ratios of the realizations; they are not
+    # normalized by the sample, so the weights of sharded assessments match
+    EDP_samples = RV_IS.samples.values
+    assert_allclose(A._W.values, np.exp(RV_EDP.log_pdf(EDP_samples) -
+                                        RV_IS.log_pdf(EDP_samples)))
+    assert A._W.mean() == pytest.approx(1.0, rel=0.1)
+    assert len(A._W) == 10000
+
+    A.define_loss_model()
+
+    A.calculate_damage()
+
+    A.calculate_losses()
+
+    A.aggregate_results()
+
+    # ------------------------------------------------ check result aggregation
+    col_target = 1.0 - mvn_od(np.log([0.074081, 0.044932]),
+                              np.array([[1, 0.7], [0.7, 1]]) * np.outer(
+                                  [0.3, 0.4], [0.3, 0.4]),
+                              upper=np.log([0.1, 0.1]))[0]
+
+    S = A._SUMMARY
+    W = S[('sampling', 'weight')].values
+    COL = S[('collapses', 'collapsed')]
+
+    assert COL.mean() > 1.5 * col_target
+
+    SD = describe(COL, weights=W)
+    assert SD['mean'] == pytest.approx(col_target, rel=0.1)
+
+    # weighted statistics are identical to the plain ones with unit weights
+    S_stats = describe(S[('reconstruction', 'cost')])
+    S_stats_W = describe(S[('reconstruction', 'cost')],
+                         weights=np.ones(len(S.index)))
+    assert_allclose(S_stats[['count', 'mean', 'std', 'min', 'max']].values,
+                    S_stats_W[['count', 'mean', 'std', 'min', 'max']].values)
+
+def test_FEMA_P58_Assessment_compiled_model(tmp_path):
+    """
+    Compile the loss model of the basic EDP uncertainty test and use it to
+    repeat the assessment. With the same seed, the assessment with the
+    compiled model shall give the same results as the original one.
+    """
+
+    base_input_path = 'resources/'
+    DL_input = base_input_path + 'input data/' + "DL_input_test_2.json"
+    EDP_input = base_input_path + 'EDP data/' + "EDP_table_test_2.out"
+    compiled_path = str(tmp_path / 'test_model.plc')
+
+    A = FEMA_P58_Assessment()
+    A.read_inputs(DL_input, EDP_input, verbose=False)
+
+    # the loss model has to be defined first
+    with pytest.raises(ValueError) as e_info:
+        A.compile(compiled_path)
+
+    np.random.seed(42)
+    A.define_random_variables()
+    A.define_loss_model()
+    A.compile(compiled_path)
+    A.calculate_damage()
+    A.calculate_losses()
+    A.aggregate_results()
+
+    B = FEMA_P58_Assessment.from_compiled(compiled_path)
+    assert B._compiled
+    assert B._EDP_in is None
+    assert sorted(B._FG_dict.keys()) == sorted(A._FG_dict.keys())
+
+    # the covariance matrices are factored when the model is compiled
+    for key, rv in B._RV_dict.items():
+        if (rv is not None) and (rv._COV is not None):
+            assert rv._COV_chol is not None
+            assert_allclose(rv._COV_chol @ rv._COV_chol.T, rv.COV,
+                            atol=1e-10)
+
+    B.read_EDP_input(EDP_input)
+
+    np.random.seed(42)
+    B.define_random_variables()
+    B.define_loss_model()
+    B.calculate_damage()
+    B.calculate_losses()
+    B.aggregate_results()
+
+    assert_allclose(B._SUMMARY.values, A._SUMMARY.values)
+
+    # compiling does not remove the samples from the original assessment
+    for key, rv in A._RV_dict.items():
+        if rv is not None:
+            assert rv.samples is not None
+
+    # the model cannot be loaded as a different type of assessment
+    with pytest.raises(ValueError) as e_info:
+        HAZUS_Assessment.from_compiled(compiled_path)
+
 def test_FEMA_P58_Assessment_EDP_uncertainty_detection_limit():
     """
     Perform a loss assessment with customized inputs that focus on testing the
@@ -3423,6 +3552,406 @@ def test_FEMA_P58_Assessment_FRAG_uncertainty_dependencies_DS():
 
     test_FEMA_P58_Assessment_FRAG_uncertainty_dependencies('DS')
 
+def test_FEMA_P58_Assessment_n_threads():
+    """
+    Perform the same assessment with one and with several threads. The
+    Fragility Groups use separate random number streams, hence the results
+    shall be identical regardless of the number of threads.
+    """
+
+    base_input_path = 'resources/'
+    DL_input = base_input_path + 'input data/' + "DL_input_test_9.json"
+    EDP_input = base_input_path + 'EDP data/' + "EDP_table_test_9.out"
+
+    with pytest.raises(ValueError) as e_info:
+        FEMA_P58_Assessment(n_threads=0)
+
+    results = []
+    for n_threads in [1, 4]:
+
+        A = FEMA_P58_Assessment(n_threads=n_threads)
+
+        A.read_inputs(DL_input, EDP_input, verbose=False)
+        A._AIM_in['general']['realizations'] = 1000
+
+        np.random.seed(42)
+        A.define_random_variables()
+        A.define_loss_model()
+        A.calculate_damage()
+        A.calculate_losses()
+        A.aggregate_results()
+
+        results.append(A)
+
+    A, B = results
+
+    assert_allclose(B._DMG.values, A._DMG.values)
+    assert list(B._DMG.columns) == list(A._DMG.columns)
+    for DV_name, DV in A._DV_dict.items():
+        if isinstance(DV, dict):
+            for lvl, DV_lvl in DV.items():
+                assert_allclose(B._DV_dict[DV_name][lvl].values, DV_lvl.values)
+        elif DV is not None:
+            assert_allclose(B._DV_dict[DV_name].values, DV.values)
+    assert_allclose(B._SUMMARY.values.astype(float),
+                    A._SUMMARY.values.astype(float))
+
+def test_FEMA_P58_Assessment_set_shard():
+    """
+    Split the realizations of an assessment into shards. The shards shall
+    cover every realization once and each shard shall be sampled from its own
+    reproducible stream of random numbers.
+    """
+
+    base_input_path = 'resources/'
+    DL_input = base_input_path + 'input data/' + "DL_input_test_9.json"
+    EDP_input = base_input_path + 'EDP data/' + "EDP_table_test_9.out"
+
+    A = FEMA_P58_Assessment()
+
+    # the inputs are needed to shard the assessment
+    with pytest.raises(ValueError) as e_info:
+        A.set_shard(0, 3)
+
+    A.read_inputs(DL_input, EDP_input, verbose=False)
+    A._AIM_in['general']['realizations'] = 1000
+
+    with pytest.raises(ValueError) as e_info:
+        A.set_shard(3, 3)
+
+    offsets, counts, EDP_samples = [], [], []
+    for shard_id in [0, 1, 2, 1]:
+        A.set_shard(shard_id, 3, seed=42)
+        offsets.append(A._shard['offset'])
+        counts.append(A._AIM_in['general']['realizations'])
+
+        A.define_random_variables()
+        EDP_samples.append(A._RV_dict['EDP'].samples.values)
+
+    assert offsets == [0, 333, 666, 333]
+    assert counts == [333, 333, 334, 333]
+    assert A._shard['total_realizations'] == 1000
+
+    assert_allclose(EDP_samples[1], EDP_samples[3])
+    assert not np.allclose(EDP_samples[0], EDP_samples[1])
+
+def test_FEMA_P58_Assessment_damage_screening(tmp_path):
+    """
+    Screen out the Fragility Groups that cannot be damaged at the sampled
+    EDPs. The PFA demands are reduced to a negligible level, hence the two
+    acceleration-sensitive components shall be screened out and the others
+    shall be assessed as usual.
+    """
+
+    base_input_path = 'resources/'
+    DL_input = base_input_path + 'input data/' + "DL_input_test_9.json"
+    EDP_input = base_input_path + 'EDP data/' + "EDP_table_test_9.out"
+
+    A = FEMA_P58_Assessment()
+
+    with pytest.raises(ValueError) as e_info:
+        A.set_damage_screening(0.)
+
+    A.read_inputs(DL_input, EDP_input, verbose=False)
+    A._AIM_in['general']['realizations'] = 1000
+
+    for EDP_data in A._EDP_in['PFA']:
+        EDP_data['raw_data'] = EDP_data['raw_data'] * 1e-4
+
+    A.set_damage_screening(1e-6)
+
+    np.random.seed(42)
+    A.define_random_variables()
+    A.define_loss_model()
+    A.calculate_damage()
+    A.calculate_losses()
+    A.aggregate_results()
+
+    assert sorted(A._FG_screened.keys()) == ['T0003.003', 'T0003.004']
+    assert sorted(A._FG_dict.keys()) == ['T0003.001', 'T0003.002']
+    assert 'FR-T0003.003' not in A._RV_dict.keys()
+    assert len(A._DMG.columns.unique(level='FG')) == 2
+
+    # the screened model is incomplete and cannot be compiled
+    with pytest.raises(ValueError) as e_info:
+        A.compile(str(tmp_path / 'model.pkl'))
+
+    # without screening, the screened components are not damaged
+    A.set_damage_screening(None)
+
+    np.random.seed(42)
+    A.define_random_variables()
+    A.define_loss_model()
+    A.calculate_damage()
+
+    assert len(A._FG_screened) == 0
+    assert len(A._FG_dict) == 4
+    for c_id in ['T0003.003', 'T0003.004']:
+        assert np.all(A._DMG.loc[:, A._FG_dict[c_id]._ID].values == 0.)
+
+    # the shards of a screened assessment would have different components
+    A.set_damage_screening(1e-6)
+    with pytest.raises(ValueError) as e_info:
+        A.set_shard(0, 2)
+
+    A.set_damage_screening(None)
+    A.set_shard(0, 2)
+    with pytest.raises(ValueError) as e_info:
+        A.set_damage_screening(1e-6)
+
+    # a single shard covers every realization
+    A.set_shard(0, 1)
+    A.set_damage_screening(1e-6)
+
+def test_FEMA_P58_Assessment_recalculate():
+    """
+    Edit the inputs of a tracked assessment and recalculate it. Only the
+    stages affected by the changes shall be evaluated and the results shall
+    be identical to those of a complete assessment with the edited inputs.
+    """
+
+    base_input_path = 'resources/'
+    DL_input = base_input_path + 'input data/' + "DL_input_test_9.json"
+    EDP_input = base_input_path + 'EDP data/' + "EDP_table_test_9.out"
+
+    def run_assessment(edits=[], tracked=False):
+        A = FEMA_P58_Assessment()
+        A.read_inputs(DL_input, EDP_input, verbose=False)
+        A._AIM_in['general']['realizations'] = 1000
+
+        for edit_inputs in edits:
+            edit_inputs(A)
+
+        if tracked:
+            A.enable_stage_tracking()
+
+        np.random.seed(42)
+        A.define_random_variables()
+        A.define_loss_model()
+        A.calculate_damage()
+        A.calculate_losses()
+        A.aggregate_results()
+
+        return A
+
+    def new_replacement_cost(A):
+        A._AIM_in['general']['replacement_cost'] = 2e7
+
+    def new_repair_costs(A):
+        for DSG in A._FG_in['T0003.001']['DSG_set'].values():
+            for DS in DSG['DS_set'].values():
+                DS['repair_cost']['medians'] = [
+                    2. * med for med in DS['repair_cost']['medians']]
+
+    A = run_assessment()
+
+    # stage tracking has to be enabled first
+    with pytest.raises(ValueError) as e_info:
+        A.recalculate()
+
+    A = run_assessment(tracked=True)
+
+    assert A.recalculate() == []
+
+    DMG = A._DMG
+
+    edits = []
+    for edit_inputs, stages in [
+        (new_replacement_cost, ['aggregate_results']),
+        (new_repair_costs, ['define_loss_model', 'calculate_losses',
+                            'aggregate_results'])]:
+
+        edit_inputs(A)
+        edits.append(edit_inputs)
+        assert A.recalculate() == stages
+
+        # the damage is reused
+        assert A._DMG is DMG
+
+        B = run_assessment(edits)
+
+        assert_allclose(A._SUMMARY.values.astype(float),
+                        B._SUMMARY.values.astype(float))
+        assert_allclose(A._DV_dict['rec_cost'].values,
+                        B._DV_dict['rec_cost'].values)
+        assert list(A._COL.columns) == list(B._COL.columns)
+
+    # new population data requires new damage and loss results
+    A._POP_in['peak'] = [2. * pop for pop in A._POP_in['peak']]
+    assert A.recalculate() == ['calculate_damage', 'calculate_losses',
+                               'aggregate_results']
+
+def test_FEMA_P58_Assessment_common_random_numbers():
+    """
+    Assess the same building under two sets of EDPs with common random
+    numbers. The building-side samples shall be identical in every
+    assessment - including sharded ones and those that reuse the samples of
+    another assessment - while the EDPs are sampled independently.
+    """
+
+    base_input_path = 'resources/'
+    DL_input = base_input_path + 'input data/' + "DL_input_test_9.json"
+    EDP_input = base_input_path + 'EDP data/' + "EDP_table_test_9.out"
+
+    def run_assessment(EDP_scale=1., seed=42, samples=None, shard=None):
+        A = FEMA_P58_Assessment()
+        A.read_inputs(DL_input, EDP_input, verbose=False)
+        A._AIM_in['general']['realizations'] = 1000
+
+        for EDP_data_list in A._EDP_in.values():
+            for EDP_data in EDP_data_list:
+                EDP_data['raw_data'] = EDP_data['raw_data'] * EDP_scale
+
+        np.random.seed(seed)
+        if shard is not None:
+            A.set_shard(*shard)
+        A.set_common_random_numbers(seed=7, samples=samples)
+        A.define_random_variables()
+        A.define_loss_model()
+        A.calculate_damage()
+
+        return A
+
+    A = run_assessment()
+    B = run_assessment(EDP_scale=1.5, seed=43)
+
+    A_samples = A.get_building_samples()
+    B_samples = B.get_building_samples()
+
+    assert 'EDP' not in A_samples.keys()
+    assert sorted(A_samples.keys()) == sorted(B_samples.keys())
+    for key in A_samples.keys():
+        assert_allclose(A_samples[key].values, B_samples[key].values)
+
+    assert not np.allclose(A._RV_dict['EDP'].samples.values,
+                           B._RV_dict['EDP'].samples.values)
+
+    # reusing the building samples gives the same results
+    C = run_assessment(samples=A_samples)
+
+    for key in A_samples.keys():
+        assert C._RV_dict[key].samples is A_samples[key]
+    assert_allclose(A._DMG.values, C._DMG.values)
+
+    # a shard gets its part of the building samples
+    D = run_assessment(shard=(1, 2))
+
+    for key, samples in D.get_building_samples().items():
+        assert_allclose(samples.values, A_samples[key].values[500:])
+
+    # the samples have to match the random variables
+    with pytest.raises(ValueError) as e_info:
+        run_assessment(samples=D.get_building_samples())
+
+def test_FEMA_P58_Assessment_estimate_resources():
+    """
+    Estimate the resources of an assessment before running it. The model
+    dimensions shall match those of the assessment and the recommended chunk
+    size shall fit in the memory budget.
+    """
+
+    base_input_path = 'resources/'
+    DL_input = base_input_path + 'input data/' + "DL_input_test_9.json"
+    EDP_input = base_input_path + 'EDP data/' + "EDP_table_test_9.out"
+
+    A = FEMA_P58_Assessment()
+
+    # the inputs have to be read first
+    with pytest.raises(ValueError) as e_info:
+        A.estimate_resources()
+
+    A.read_inputs(DL_input, EDP_input, verbose=False)
+    A._AIM_in['general']['realizations'] = 100
+
+    estimate = A.estimate_resources()
+    dims = estimate['dimensions']
+
+    assert estimate['chunk_size'] is None
+    assert estimate['peak_memory'] == max(estimate['memory'].values())
+    assert estimate['total_runtime'] > 0.
+
+    # more realizations need more memory
+    A._AIM_in['general']['realizations'] = 10000
+    large_estimate = A.estimate_resources()
+    assert large_estimate['peak_memory'] > estimate['peak_memory']
+
+    # recommend a chunk size if the assessment does not fit in the budget
+    budget = (estimate['peak_memory'] + large_estimate['peak_memory']) / 2.
+    large_estimate = A.estimate_resources(memory_budget=budget)
+    chunk_size = large_estimate['chunk_size']
+
+    assert 100 < chunk_size < 10000
+    assert large_estimate['shard_count'] == int(np.ceil(10000 / chunk_size))
+
+    A._AIM_in['general']['realizations'] = chunk_size
+    assert A.estimate_resources()['peak_memory'] <= budget
+    A._AIM_in['general']['realizations'] = chunk_size + 1
+    assert A.estimate_resources()['peak_memory'] > budget
+
+    assert A.estimate_resources(memory_budget=1.)['chunk_size'] == 0
+
+    # compare the dimensions with those of the assessment
+    A._AIM_in['general']['realizations'] = 100
+
+    np.random.seed(42)
+    A.define_random_variables()
+    A.define_loss_model()
+    A.calculate_damage()
+    A.calculate_losses()
+
+    assert dims['DS_columns'] == A._DMG.shape[1]
+    assert dims['EDP_dims'] == len(A._RV_dict['EDP'].theta)
+    assert dims['RV_dims'] >= sum([len(RV.theta)
+                                   for RV in A._RV_dict.values()
+                                   if RV is not None])
+
+def test_FEMA_P58_Assessment_precision():
+    """
+    Perform the same assessment in double and in single precision. The damage
+    and loss results shall be stored as float32 in the latter case and the
+    aggregated results shall match those of the double precision assessment.
+    """
+
+    base_input_path = 'resources/'
+    DL_input = base_input_path + 'input data/' + "DL_input_test_9.json"
+    EDP_input = base_input_path + 'EDP data/' + "EDP_table_test_9.out"
+
+    def run_assessment(precision):
+        A = FEMA_P58_Assessment()
+        A.read_inputs(DL_input, EDP_input, verbose=False)
+        A._AIM_in['general']['realizations'] = 200
+        A.set_precision(precision)
+
+        np.random.seed(42)
+        A.define_random_variables()
+        A.define_loss_model()
+        A.calculate_damage()
+        A.calculate_losses()
+        A.aggregate_results()
+
+        return A
+
+    with pytest.raises(ValueError) as e_info:
+        FEMA_P58_Assessment().set_precision('float16')
+
+    A = run_assessment('float64')
+    B = run_assessment('float32')
+
+    for RV in B._RV_dict.values():
+        if RV is not None:
+            assert np.all(RV.samples.dtypes == np.float32)
+
+    assert np.all(B._DMG.dtypes == np.float32)
+    for key in ['rec_cost', 'rec_time']:
+        assert np.all(B._DV_dict[key].dtypes == np.float32)
+    for DV_INJ in B._DV_dict['injuries'].values():
+        assert np.all(DV_INJ.dtypes == np.float32)
+
+    # the SUMMARY is accumulated in double precision
+    assert np.all(B._SUMMARY.dtypes != np.float32)
+    assert_allclose(B._DMG.values, A._DMG.values, rtol=1e-4, atol=1e-6)
+    assert_allclose(B._SUMMARY.values, A._SUMMARY.values, rtol=1e-4)
+
 def test_FEMA_P58_Assessment_DV_uncertainty_dependencies():
     """
     Perform loss assessment with customized inputs that focus on testing the
@@ -44,7 +44,7 @@ This subpackage performs unit tests on the file_io module of pelicun.
 
 import pytest
 
-import os, sys, inspect
+import os, sys, inspect, shutil
 from pathlib import Path
 current_dir = os.path.dirname(
     os.path.abspath(inspect.getfile(inspect.currentframe())))
@@ -133,4 +133,267 @@ def test_create_HAZUS_json_files():
 
     finally:
         #pass
-        shutil.rmtree(test_dir)
\ No newline at end of file
+        shutil.rmtree(test_dir)
+
+# -----------------------------------------------------------------------------
+# convert jsons to table
+# -----------------------------------------------------------------------------
+
+def test_convert_jsons_to_table():
+    """
+    Test if a set of jsons is converted into a table with the columns and
+    dtypes prescribed by the template, if the conversion gives the same
+    results in worker processes and if the columns that cannot be converted
+    are reported.
+    """
+
+    template = {
+        'Name': 'string',
+        'Incomplete': 'bool',
+        'Count': 'int',
+        'DSGroups': [{'MedianEDP': 'float', 'Description': 'string'}],
+        'Unused': 'float'
+    }
+
+    json_list = [
+        {'Name': 'A', 'Incomplete': False, 'Count': 2,
+         'DSGroups': [{'MedianEDP': 0.5, 'Description': 'slight'}]},
+        {'Name': 'B', 'Incomplete': True,
+         'DSGroups': [{'MedianEDP': 1.5}]},
+    ]
+
+    with pytest.warns(UserWarning):
+        test_DF, errors = convert_jsons_to_table(
+            ['A', 'B'], json_list, template, return_errors=True)
+
+    # the empty column is removed
+    assert ('Unused', ' ') not in test_DF.columns
+
+    assert list(test_DF.index) == ['A', 'B']
+    assert test_DF.dtypes[('Incomplete', ' ')] == bool
+    assert test_DF.dtypes[('DSGroups#0', 'MedianEDP')] == float
+    assert list(test_DF[('DSGroups#0', 'MedianEDP')]) == [0.5, 1.5]
+    assert list(test_DF[('Name', ' ')]) == ['A', 'B']
+
+    # the missing count cannot be stored as an integer
+    assert len(errors) == 1
+    assert errors[0]['column'] == ('Count', ' ')
+    assert errors[0]['dtype'] == 'int'
+
+    # the results do not depend on the number of processes
+    with pytest.warns(UserWarning):
+        test_DF_par = convert_jsons_to_table(
+            ['A', 'B'], json_list, template, n_jobs=2)
+
+    assert test_DF_par.equals(test_DF)
+
+# -----------------------------------------------------------------------------
+# convert DataFrame to dicts
+# -----------------------------------------------------------------------------
+
+def test_convert_DataFrame_to_dicts():
+    """
+    Test if the rows of a table are converted back to the nested dictionaries
+    in batch and if the results match the row-by-row conversion.
+    """
+
+    template = {
+        'Name': 'string',
+        'Directional': 'bool',
+        'DSGroups': [{'MedianEDP': 'float',
+                      'DamageStates': [{'Weight': 'float'},
+                                       {'Weight': 'float'}]},
+                     {'MedianEDP': 'float',
+                      'DamageStates': [{'Weight': 'float'},
+                                       {'Weight': 'float'}]}],
+        'Tags': ['string']
+    }
+
+    json_list = [
+        {'Name': 'A', 'Directional': True,
+         'DSGroups': [{'MedianEDP': 0.5,
+                       'DamageStates': [{'Weight': 0.4}, {'Weight': 0.6}]},
+                      {'MedianEDP': 1.5,
+                       'DamageStates': [{'Weight': 1.0}]}],
+         'Tags': ['x']},
+        {'Name': 'B', 'Directional': False,
+         'DSGroups': [{'MedianEDP': 0.2,
+                       'DamageStates': [{'Weight': 1.0}]}],
+         'Tags': ['z']},
+    ]
+
+    test_DF = convert_jsons_to_table(['A', 'B'], json_list, template)
+
+    plan = compile_table_paths(test_DF.columns)
+
+    test_dicts = convert_DataFrame_to_dicts(test_DF, plan)
+
+    assert list(test_dicts.keys()) == ['A', 'B']
+
+    for json_data, (row_id, row) in zip(json_list, test_DF.iterrows()):
+        assert test_dicts[row_id] == json_data
+        assert convert_Series_to_dict(row) == json_data
+
+# -----------------------------------------------------------------------------
+# build DL library
+# -----------------------------------------------------------------------------
+
+def test_build_DL_library(tmp_path):
+    """
+    Test if a library is built from the raw HAZUS data, if the manifest
+    records the inputs and outputs of the build and if only the changed
+    components and the HDF and DL library files are rebuilt in later builds.
+    """
+
+    data_dir = tmp_path / 'source'
+    target_dir = tmp_path / 'target'
+
+    # use the subset of the HAZUS data with the templates of the full library
+    shutil.copytree(Path('resources/io testing/HAZUS creator/source/'),
+                    data_dir)
+    for template in ['DL_template.json', 'pop_template.json']:
+        shutil.copy(Path('../resources/data_sources/HAZUS_MH_2.1_EQ/') /
+                    template, data_dir / template)
+
+    manifest = build_DL_library(data_dir, target_dir, 'test_DB',
+                                library='HAZUS_EQ')
+
+    comp_IDs = sorted(manifest['components'].keys())
+    assert sorted(manifest['converted']) == comp_IDs
+    assert manifest['HDF_rebuilt']
+    assert 'hazus_data_eq.json' in manifest['inputs'].keys()
+    assert 'test_DB.hdf' in manifest['outputs'].keys()
+    assert 'test_DB.dlib' in manifest['outputs'].keys()
+
+    library = open_DL_library(target_dir / 'test_DB.dlib')
+    assert library.ids('data') == comp_IDs
+    assert open_DL_library(target_dir / 'test_DB.dlib') is library
+
+    with open(target_dir / 'test_DB_manifest.json', 'r') as f:
+        assert json.load(f)['components'] == manifest['components']
+
+    # the library is up to date
+    manifest = build_DL_library(data_dir, target_dir, 'test_DB',
+                                library='HAZUS_EQ')
+    assert manifest['converted'] == []
+    assert not manifest['HDF_rebuilt']
+
+    # a modified output is regenerated and the HDF file is rebuilt
+    with open(target_dir / 'DL json' / f'{comp_IDs[0]}.json', 'w') as f:
+        json.dump({}, f)
+
+    manifest = build_DL_library(data_dir, target_dir, 'test_DB',
+                                library='HAZUS_EQ')
+    assert manifest['converted'] == [comp_IDs[0]]
+    assert manifest['HDF_rebuilt']
+
+    DB_df = pd.read_hdf(target_dir / 'test_DB.hdf', 'data')
+    assert sorted(DB_df.index) == comp_IDs
+
+    # the library opened from the earlier version of the file is closed
+    new_library = open_DL_library(target_dir / 'test_DB.dlib')
+    assert new_library is not library
+    assert library.tables == []
+    assert new_library.ids('data') == comp_IDs
+
+    close_DL_libraries()
+    assert new_library.tables == []
+
+    with pytest.raises(ValueError) as e_info:
+        build_DL_library(data_dir, target_dir, 'test_DB', library='unknown')
+
+def test_build_DL_library_P58(tmp_path):
+    """
+    Test if only the components with modified sources are converted again
+    in an incremental build of a FEMA P58 library and if a modified
+    population file is copied to the library and triggers an HDF rebuild.
+    """
+
+    data_dir = tmp_path / 'source'
+    target_dir = tmp_path / 'target'
+
+    # use the subset of the P58 data with the templates of the full library
+    shutil.copytree(Path('resources/io testing/P58 converter/source/'),
+                    data_dir)
+    for template in ['DL_template.json', 'pop_template.json']:
+        shutil.copy(Path('../resources/data_sources/FEMA_P58_1st_ed/') /
+                    template, data_dir / template)
+
+    manifest = build_DL_library(data_dir, target_dir, 'test_DB',
+                                library='P58')
+
+    comp_IDs = sorted(manifest['components'].keys())
+    assert sorted(manifest['converted']) == comp_IDs
+    assert manifest['HDF_rebuilt']
+
+    # a modified component source is converted again
+    with open(data_dir / 'DL xml' / f'{comp_IDs[0]}.xml', 'a') as f:
+        f.write('\n<!-- modified -->\n')
+
+    manifest = build_DL_library(data_dir, target_dir, 'test_DB',
+                                library='P58')
+    assert manifest['converted'] == [comp_IDs[0]]
+    assert manifest['HDF_rebuilt']
+
+    # a modified population file is copied and the HDF file is rebuilt
+    with open(data_dir / 'population.json', 'r') as f:
+        population = json.load(f)
+    population.update({'Test Occupancy': population[list(population)[0]]})
+    with open(data_dir / 'population.json', 'w') as f:
+        json.dump(population, f)
+
+    manifest = build_DL_library(data_dir, target_dir, 'test_DB',
+                                library='P58')
+    assert manifest['converted'] == []
+    assert manifest['HDF_rebuilt']
+
+    with open(target_dir / 'population.json', 'r') as f:
+        assert json.load(f) == population
+
+    # the library is up to date
+    manifest = build_DL_library(data_dir, target_dir, 'test_DB',
+                                library='P58')
+    assert manifest['converted'] == []
+    assert not manifest['HDF_rebuilt']
+
+# -----------------------------------------------------------------------------
+# standard HDF
+# -----------------------------------------------------------------------------
+
+def test_save_and_read_standard_HDF(tmp_path):
+    """
+    Test if a table is saved in the standard HDF format and if the whole
+    table and individual rows are loaded with the original columns and data
+    types.
+    """
+
+    columns = pd.MultiIndex.from_tuples([
+        ('Name', ' '), ('Directional', ' '), ('Count', ' '),
+        ('DSGroups#0', 'MedianEDP'), ('DSGroups#0', 'Description')])
+
+    test_DF = pd.DataFrame([
+        ['A', True, 1, 0.5, 'slight'],
+        ['B', False, 2, np.nan, 'extensive damage'],
+        ['Cé', True, 3, 1.5, np.nan]], columns=columns,
+        index=pd.Index(['A', 'B', 'C'], name='ID'))
+    test_DF = test_DF.astype({('Directional', ' '): bool,
+                              ('Count', ' '): np.int64})
+
+    target_path = tmp_path / 'test.hdf'
+    save_to_standard_HDF(test_DF, 'data_standard', target_path, chunk_rows=2)
+
+    # the columns are grouped by type
+    import h5py
+    with h5py.File(target_path, 'r') as hf:
+        assert sorted(hf['data_standard'].keys()) == [
+            'columns', 'float', 'index', 'int', 'string_16', 'string_8']
+
+    pd.testing.assert_frame_equal(
+        read_standard_HDF(target_path, 'data_standard'), test_DF)
+
+    pd.testing.assert_frame_equal(
+        read_standard_HDF(target_path, 'data_standard', ['C', 'A']),
+        test_DF.loc[['C', 'A']])
+
+    with pytest.raises(ValueError) as e_info:
+        read_standard_HDF(target_path, 'data_standard', ['D'])
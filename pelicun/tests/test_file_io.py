@@ -43,6 +43,8 @@ This subpackage performs unit tests on the file_io module of pelicun.
 """
 
 import pytest
+import numpy as np
+from numpy.testing import assert_allclose
 
 import os, sys, inspect, shutil
 current_dir = os.path.dirname(
@@ -232,9 +234,91 @@ def test_read_SimCenter_EDP_input():
         units = dict(PID=1., PFA=9.81, RD=1., PRD=0.2),
         verbose=False)
 
+    # the raw data is provided in arrays
+    for EDP_kind in test_EDP.values():
+        for EDP_data in EDP_kind:
+            assert isinstance(EDP_data['raw_data'], np.ndarray)
+            EDP_data['raw_data'] = EDP_data['raw_data'].tolist()
+
     # check if the returned dictionary is appropriate
     assert ref_EDP == test_EDP
 
+def test_read_SimCenter_EDP_input_binary_formats(tmp_path):
+    """
+    Test if the EDPs are read the same way from NumPy and HDF5 files as from
+    the dakota text file.
+    """
+
+    EDP_kinds = ('PID', 'PFA', 'RD', 'PRD')
+    units = dict(PID=1., PFA=9.81, RD=1., PRD=0.2)
+
+    ref_EDP = read_SimCenter_EDP_input(
+        'resources/io testing/test/test_EDP_input.out',
+        EDP_kinds=EDP_kinds, units=units)
+
+    EDP_df = pd.read_csv('resources/io testing/test/test_EDP_input.out',
+                         sep=r'\s+', header=0, index_col=0)
+    EDP_df = EDP_df.drop(columns='MultipleEvent')
+
+    # npz with a 2D array, npz with one array per column, and HDF5
+    np.savez(tmp_path / 'EDP_2D.npz', data=EDP_df.values,
+             columns=EDP_df.columns.values.astype(str))
+    np.savez(tmp_path / 'EDP_cols.npz',
+             **dict([(col, EDP_df[col].values) for col in EDP_df.columns]))
+    EDP_df.to_hdf(tmp_path / 'EDP.hdf', 'EDP')
+
+    for filename in ['EDP_2D.npz', 'EDP_cols.npz', 'EDP.hdf']:
+        test_EDP = read_SimCenter_EDP_input(
+            str(tmp_path / filename), EDP_kinds=EDP_kinds, units=units)
+
+        assert list(test_EDP.keys()) == list(ref_EDP.keys())
+
+        for EDP_kind in ref_EDP.keys():
+            for ref_data, test_data in zip(ref_EDP[EDP_kind],
+                                           test_EDP[EDP_kind]):
+                for key in ['location', 'direction', 'scenario_id']:
+                    assert ref_data[key] == test_data[key]
+                assert_allclose(ref_data['raw_data'], test_data['raw_data'])
+
+def test_read_EDP_events(tmp_path):
+    """
+    Test if the rows of each event are indexed in an EDP file, if the index is
+    saved next to the file and reused, and if the EDPs of a set of events are
+    loaded from the file in the same form as if the whole file was filtered.
+    """
+
+    input_path = str(tmp_path / 'EDP_input.out')
+    shutil.copy('resources/io testing/test/test_EDP_input.out', input_path)
+
+    ref_df = pd.read_csv(input_path, sep=r'\s+', header=0, index_col=0)
+
+    event_index = index_EDP_events(input_path)
+
+    assert os.path.exists(input_path + '.events.json')
+    assert sorted(event_index['event'].unique()) == sorted(
+        ref_df['MultipleEvent'].unique())
+    assert np.sum(event_index['stop'] - event_index['start']) == len(ref_df)
+
+    # the saved index is reused
+    pd.testing.assert_frame_equal(index_EDP_events(input_path), event_index)
+
+    for events in [['GM_A',], ['GM_B', 'GM_A']]:
+        test_df = read_EDP_events(input_path, events, event_index)
+
+        pd.testing.assert_frame_equal(
+            test_df, ref_df[ref_df['MultipleEvent'].isin(events)])
+
+    test_df = read_EDP_events(input_path, ['unknown',], event_index)
+    assert len(test_df) == 0
+    assert list(test_df.columns) == list(ref_df.columns)
+
+    # the EDPs of an event can be passed on to read_SimCenter_EDP_input
+    test_EDP = read_SimCenter_EDP_input(
+        read_EDP_events(input_path, ['GM_B',]), EDP_kinds=('PID',),
+        units=dict(PID=1.))
+    ref_PID = ref_df.loc[ref_df['MultipleEvent'] == 'GM_B', '1-PID-1-1']
+    assert_allclose(test_EDP['PID'][0]['raw_data'], ref_PID.values)
+
 # -----------------------------------------------------------------------------
 # read_population_distribution
 # -----------------------------------------------------------------------------
@@ -429,7 +513,202 @@ def test_read_component_DL_data():
 
     assert test_CMP == {}
 
+def test_read_component_DL_data_cache():
+    """
+    Test if the cached component and population data are identical to the
+    data read directly from the files and if changes to the returned data do
+    not leak into the cache.
+    """
+
+    comp_info = {
+        "B1071.011": {
+            "locations": [2, 2],
+            "directions": [1, 2],
+            "quantities": [50.0, 50.0],
+            "csg_weights" : [[1.0,], [1.0,]],
+            "cov"         : ["0.1", "0.1"],
+            "distribution": ["normal", "normal"],
+            "unit"        : "ft2"
+        }
+    }
+
+    ref_CMP = read_component_DL_data('../resources/FEMA_P58_1st_ed.hdf',
+                                     comp_info)
+    ref_POP = read_population_distribution(
+        'resources/io testing/test/test_POP_data.json',
+        occupancy='Commercial Office')
+
+    enable_DL_data_cache(True)
+    try:
+        for i in range(2):
+            test_CMP = read_component_DL_data(
+                '../resources/FEMA_P58_1st_ed.hdf', comp_info)
+            assert test_CMP == ref_CMP
+
+            test_POP = read_population_distribution(
+                'resources/io testing/test/test_POP_data.json',
+                occupancy='Commercial Office')
+            assert test_POP == ref_POP
+
+            # modify the returned data; the next read shall not see this
+            test_CMP['B1071.011']['DSG_set'].clear()
+            test_POP['peak'] = -1.0
+    finally:
+        enable_DL_data_cache(False)
+
+def test_read_component_DL_data_cache_update(tmp_path):
+    """
+    Test if the cached data of a modified file are replaced by the new data
+    instead of being kept next to them.
+    """
+
+    from pelicun import file_io
+
+    POP_path = tmp_path / 'test_POP_data.json'
+    HDF_path = tmp_path / 'HAZUS_MH_2.1_EQ_eqv_PGA.hdf'
+    shutil.copy('resources/io testing/test/test_POP_data.json', POP_path)
+    shutil.copy('../resources/HAZUS_MH_2.1_EQ_eqv_PGA.hdf', HDF_path)
+
+    comp_info = {'S-C1L-HC-RES1': {
+        "locations"   : [1,],
+        "directions"  : [1,],
+        "quantities"  : [1.0,],
+        "csg_weights" : [[1.0,],],
+        "cov"         : ["0",],
+        "distribution": ["N/A",],
+        "unit"        : "ea"
+    }}
+
+    def cached_versions(path):
+        return set([cache_key[-1] for cache_key in file_io._DL_data_cache
+                    if cache_key[1] == str(path)])
+
+    enable_DL_data_cache(True)
+    try:
+        for i in range(2):
+            read_population_distribution(str(POP_path),
+                                         occupancy='Commercial Office')
+            read_component_DL_data(str(HDF_path), comp_info,
+                                   assessment_type='HAZUS_EQ')
+
+            assert cached_versions(POP_path) == {os.path.getmtime(POP_path)}
+            assert cached_versions(HDF_path) == {os.path.getmtime(HDF_path)}
+
+            # a newer version of the files replaces the cached data
+            for path in [POP_path, HDF_path]:
+                mtime = os.path.getmtime(path) + 10.
+                os.utime(path, (mtime, mtime))
+    finally:
+        enable_DL_data_cache(False)
+
+def test_read_component_DL_data_library(tmp_path):
+    """
+    Test if the component and population data read from a DL library file
+    are identical to the data read from the HDF5 file it was created from.
+    """
+
+    from pelicun.db import save_to_DL_library
+
+    HDF_path = '../resources/HAZUS_MH_2.1_EQ_eqv_PGA.hdf'
+    library_path = str(tmp_path / 'HAZUS_MH_2.1_EQ_eqv_PGA.dlib')
+
+    save_to_DL_library({'data': pd.read_hdf(HDF_path, 'data'),
+                        'pop': pd.read_hdf(HDF_path, 'pop')}, library_path)
+
+    comp_info = dict([(c_id, {
+        "locations"   : [1,],
+        "directions"  : [1,],
+        "quantities"  : [1.0,],
+        "csg_weights" : [[1.0,],],
+        "cov"         : ["0",],
+        "distribution": ["N/A",],
+        "unit"        : "ea"
+    }) for c_id in ['S-C1L-HC-RES1', 'S-W1-PC-EDU2']])
+
+    ref_CMP = read_component_DL_data(HDF_path, comp_info,
+                                     assessment_type='HAZUS_EQ')
+    test_CMP = read_component_DL_data(library_path, comp_info,
+                                      assessment_type='HAZUS_EQ')
+    assert test_CMP == ref_CMP
+
+    ref_POP = read_population_distribution(HDF_path, 'RES1',
+                                           assessment_type='HAZUS_EQ')
+    test_POP = read_population_distribution(library_path, 'RES1',
+                                            assessment_type='HAZUS_EQ')
+    assert test_POP == ref_POP
+
+    # unknown components raise an error
+    with pytest.raises(ValueError) as e_info:
+        read_component_DL_data(library_path, {'unknown': comp_info[
+            'S-C1L-HC-RES1']}, assessment_type='HAZUS_EQ')
+
 # -----------------------------------------------------------------------------
 # write_SimCenter_DL_output
 # -----------------------------------------------------------------------------
 
+
+# -----------------------------------------------------------------------------
+# merge_SimCenter_DL_shards
+# -----------------------------------------------------------------------------
+
+def test_merge_SimCenter_DL_shards(tmp_path):
+    """
+    Test if the outputs of the shards of an assessment are merged into the
+    same realizations and statistics that a single run provides.
+    """
+
+    rng = np.random.RandomState(42)
+
+    SUMMARY = pd.DataFrame(
+        rng.lognormal(size=(1000, 2)),
+        columns=pd.MultiIndex.from_tuples([('reconstruction', 'cost'),
+                                           ('reconstruction', 'time')]))
+    DV_agg = pd.DataFrame(rng.lognormal(size=(1000, 3)),
+                          columns=['B.10.31.001', 'C.20.11.001', 'D.30.31.013'])
+
+    shard_count = 3
+    shard_dirs = []
+    for shard_id in range(shard_count):
+        shard_dir = tmp_path / 'shard_{}_of_{}'.format(shard_id + 1,
+                                                       shard_count)
+        shard_dir.mkdir()
+        shard_dirs.append(str(shard_dir))
+
+        offset = 1000 * shard_id // shard_count
+        count = 1000 * (shard_id + 1) // shard_count - offset
+        shard_rows = slice(offset, offset + count)
+
+        # the realizations of every shard are numbered from zero
+        shard_SUMMARY = SUMMARY.iloc[shard_rows].reset_index(drop=True)
+        shard_DV_agg = DV_agg.iloc[shard_rows].reset_index(drop=True)
+
+        write_SimCenter_DL_output(str(shard_dir), 'DL_summary.csv',
+                                  shard_SUMMARY, collapse_columns=True)
+        write_SimCenter_DL_output(str(shard_dir), 'DV_rec_cost_agg.csv',
+                                  shard_DV_agg, collapse_columns=False)
+
+        shard = {'shard_id': shard_id, 'shard_count': shard_count,
+                 'seed': 42, 'stream_id': 0, 'offset': offset,
+                 'realizations': count, 'total_realizations': 1000}
+        stats = {
+            'DL_summary': StatsAccumulator().update(shard_SUMMARY),
+            'DV_rec_cost_agg': StatsAccumulator().update(shard_DV_agg)}
+
+        write_SimCenter_DL_shard(str(shard_dir), shard, {'': stats})
+
+    # every shard is needed for the merge
+    with pytest.raises(ValueError) as e_info:
+        merge_SimCenter_DL_shards(shard_dirs[:2], str(tmp_path))
+
+    merge_SimCenter_DL_shards(shard_dirs, str(tmp_path))
+
+    SUMMARY_merged = pd.read_csv(tmp_path / 'DL_summary.csv', index_col=0,
+                                 float_precision='round_trip')
+    assert_allclose(SUMMARY_merged.values, SUMMARY.values, rtol=1e-15)
+    assert_allclose(SUMMARY_merged.index, np.arange(1000))
+
+    for filename, ref_df in [('DL_summary_stats.csv', SUMMARY),
+                             ('DV_rec_cost_agg_stats.csv', DV_agg)]:
+        stats = pd.read_csv(tmp_path / filename, index_col=0,
+                            float_precision='round_trip')
+        assert_allclose(stats.values, describe(ref_df).values, rtol=1e-15)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of pelicun.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# pelicun. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Adam Zsarnóczay
+
+"""
+This subpackage checks the modules imported with pelicun through the
+DL_calculation command line tool.
+
+"""
+
+import pytest
+
+import os, sys, inspect, subprocess
+current_dir = os.path.dirname(
+    os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0,os.path.dirname(parent_dir))
+
+def get_import_times(module, path):
+    """
+    Import a module in a fresh interpreter with -X importtime and return the
+    cumulative import time of every imported module in seconds.
+    """
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [path, os.path.dirname(parent_dir), env.get('PYTHONPATH', '')])
+
+    res = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                          f'import {module}'],
+                         env=env, stdout=subprocess.DEVNULL,
+                         stderr=subprocess.PIPE, universal_newlines=True,
+                         check=True)
+
+    import_times = {}
+    for line in res.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            __, cumulative, name = line.split('|')
+            try:
+                import_times[name.strip()] = float(cumulative) / 1e6
+            except ValueError:
+                # header line
+                continue
+
+    return import_times
+
+def test_DL_calculation_import_time():
+    """
+    Test if the command line tool can be imported without the heavy optional
+    dependencies. The import time itself depends on the machine, hence it is
+    not checked; the modules that dominate it are.
+    """
+
+    import_times = get_import_times('DL_calculation',
+                                    os.path.join(parent_dir, 'tools'))
+
+    # scipy and h5py are loaded on first use only
+    for module in ['scipy', 'scipy.stats', 'scipy.optimize', 'h5py']:
+        assert module not in import_times
+
+    assert 'DL_calculation' in import_times
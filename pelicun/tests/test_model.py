@@ -46,7 +46,7 @@ import numpy as np
 from numpy.testing import assert_allclose
 from scipy.stats import norm, truncnorm
 
-import os, sys, inspect
+import os, sys, inspect, pickle
 current_dir = os.path.dirname(
     os.path.abspath(inspect.getfile(inspect.currentframe())))
 parent_dir = os.path.dirname(current_dir)
@@ -744,4 +744,121 @@ def test_FragilityGroup_description_and_name():
                         name=ref_name, description=ref_desc)
 
     assert FG.name == ref_name
-    assert FG.description == ref_desc
\ No newline at end of file
+    assert FG.description == ref_desc
+
+# ------------------------------------------------------------------------------
+# Column Registry
+# ------------------------------------------------------------------------------
+def test_ColumnRegistry_positions_and_labels():
+    """
+    Test if the column registry orders the damage state columns by their IDs
+    and returns the positions and labels of the columns.
+    """
+    def create_FG(FG_ID, PG_IDs, DSG_count, DS_count):
+        PG_list = []
+        for PG_ID in PG_IDs:
+            DSG_set = [DamageStateGroup(
+                ID=DSG_ID,
+                DS_set=[DamageState(ID=DS_ID)
+                        for DS_ID in range(DS_count, 0, -1)],
+                DS_set_kind='mutually exclusive')
+                for DSG_ID in range(DSG_count, 0, -1)]
+            PG_list.append(PerformanceGroup(ID=PG_ID, location=PG_ID,
+                                            quantity=1.0,
+                                            fragility_functions=None,
+                                            DSG_set=DSG_set))
+        return FragilityGroup(ID=FG_ID, demand_type='PID',
+                              performance_groups=PG_list)
+
+    # more than 9 damage state groups make sure that the columns are ordered
+    # by the numerical value of the IDs rather than by their tags
+    FG_list = [create_FG(3, [2, 1], 1, 2), create_FG(1, [1, ], 11, 1)]
+
+    DS_cols = ColumnRegistry(FG_list)
+
+    assert DS_cols.size == 15
+
+    assert_allclose(DS_cols.FG, [1] * 11 + [3] * 4)
+    assert_allclose(DS_cols.DSG[:11], np.arange(1, 12))
+    assert_allclose(DS_cols.PG[11:], [1, 1, 2, 2])
+    assert_allclose(DS_cols.DS[11:], [1, 2, 1, 2])
+
+    assert DS_cols.position(1, 1, 10, 1) == 9
+    assert DS_cols.position(3, 2, 1, 2) == 14
+    assert DS_cols.FG_columns(3) == slice(11, 15)
+    assert DS_cols.PG_columns(3, 2) == slice(13, 15)
+    assert DS_cols.FG_block(3) == (11, 2, 2)
+
+    labels = DS_cols.labels()
+    assert list(labels.names) == ['FG', 'PG', 'DSG_DS']
+    assert labels[9] == (1, 1, '10_1')
+    assert list(DS_cols.labels([12, 13])) == [(3, 1, '1_2'), (3, 2, '1_1')]
+
+# ------------------------------------------------------------------------------
+# Damage State Table
+# ------------------------------------------------------------------------------
+def test_DamageStateTable_views():
+    """
+    Test if the damage state groups and damage states of the PGs return the
+    parameters and consequence functions stored in the table.
+    """
+    RV = RandomVariable(ID=1, dimension_tags=['C-1-1-LOC-1', 'C-1-2-LOC-1',
+                                              'C-1-1-LOC-2', 'C-1-2-LOC-2'],
+                        distribution_kind='normal',
+                        theta=np.ones(4), COV=np.eye(4) * 0.01)
+    RV.sample_distribution(10)
+
+    # the first DS has a quantity-dependent median with uncertainty, the
+    # second has a constant median and the third has no consequence
+    CT_cost = ConsequenceTable(medians=[100., 50., 10.],
+                               quantities=[1., 2., 0.],
+                               offsets=[0, 2, 3, 3],
+                               RV=RV, RV_positions=[[0, -1, -1],
+                                                    [2, -1, -1]])
+    CT_inj = ConsequenceTable(medians=[0.1, ], quantities=[0., ],
+                              offsets=[0, 0, 0, 1])
+
+    DS_table = DamageStateTable(
+        DSG_kinds=['single', 'mutually exclusive'],
+        DSG_index=[0, 1, 1],
+        weights=[1.0, 0.6, 0.4],
+        descriptions=['a', 'b', 'c'],
+        affected_areas=[0., 0., 5.],
+        repair_cost=CT_cost,
+        injuries=[None, CT_inj])
+
+    DSG_set = DS_table.DSG_set(1)
+
+    assert [DSG._ID for DSG in DSG_set] == [1, 2]
+    assert DSG_set[1]._DS_set_kind == 'mutually exclusive'
+    assert isinstance(DSG_set[1], DamageStateGroup)
+
+    DS_1, DS_2 = DSG_set[1]._DS_set
+    assert isinstance(DS_2, DamageState)
+    assert [DS_1._ID, DS_2._ID] == [1, 2]
+    assert DS_1.weight == 0.6
+    assert DS_2.description == 'c'
+    assert DS_2._affected_area == 5.
+
+    # consequences
+    assert DS_2._repair_cost_CF is None
+    assert DS_1._red_tag_CF is None
+    assert DS_1._repair_cost_CF._DV_distribution is None
+    assert_allclose(DS_1.unit_repair_cost(quantity=[1., 2.]), 10.)
+    assert DS_2._injuries_CF_set[0] is None
+    assert_allclose(DS_2.unit_injuries(severity_level=1), 0.1)
+
+    CF = DSG_set[0]._DS_set[0]._repair_cost_CF
+    assert CF._DV_distribution.tags == 'C-1-1-LOC-2'
+    assert_allclose(CF.median(quantity=[1., 1.5, 2.]), [100., 75., 50.])
+    assert_allclose(CF.sample_unit_DV(quantity=np.ones(10)),
+                    RV.samples.iloc[:, 2] * 100.)
+
+    # the views are compact and can be pickled
+    with pytest.raises(AttributeError):
+        DS_1.__dict__
+
+    DS_copy = pickle.loads(pickle.dumps(DS_1))
+    assert DS_copy._ID == 1
+    assert DS_copy.weight == 0.6
+    assert_allclose(DS_copy._repair_cost_CF.median(), 10.)
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of pelicun.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# pelicun. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Adam Zsarnóczay
+
+"""
+This subpackage performs unit tests on the command line tools of pelicun.
+
+"""
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+import os, sys, inspect, json, threading
+from urllib import request, error
+current_dir = os.path.dirname(
+    os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0,os.path.dirname(parent_dir))
+sys.path.insert(0,os.path.join(parent_dir, 'tools'))
+
+from pelicun.control import FEMA_P58_Assessment, HAZUS_Assessment
+
+from synthetic_building import write_P58_building, write_HAZUS_building
+from DL_server import DLServer, submit_job, main as DL_server_main
+import benchmark
+
+# -----------------------------------------------------------------------------
+# DL_server
+# -----------------------------------------------------------------------------
+
+def test_DL_server(tmp_path):
+    """
+    Test if the jobs submitted to the server run in their own working
+    directory, if the server counts the completed and failed jobs and if the
+    jobs above the queue limit are rejected.
+    """
+
+    # the job paths are relative to the working directory of each job
+    valid_dir = tmp_path / 'valid'
+    invalid_dir = tmp_path / 'invalid'
+    write_P58_building(valid_dir, stories=2, components=2, realizations=100,
+                       EDP_samples=20)
+    invalid_dir.mkdir()
+
+    job_args = ['--filenameDL', 'DL_input.json', '--filenameEDP', 'EDP.out',
+                '--Realizations', '100']
+
+    server = DLServer(('127.0.0.1', 0), n_workers=1, max_queue=0)
+    port = server.server_address[1]
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.start()
+
+    try:
+        result = submit_job(job_args, port=port, cwd=str(valid_dir))
+        assert result['status'] == 'done'
+        assert (valid_dir / 'DL_summary.csv').exists()
+        assert (valid_dir / 'DV_rec_cost_agg_stats.csv').exists()
+
+        # the same job fails without the input files
+        result = submit_job(job_args, port=port, cwd=str(invalid_dir))
+        assert result['status'] == 'failed'
+        assert 'DL_input.json' in result['error']
+        assert not (invalid_dir / 'DL_summary.csv').exists()
+
+        with request.urlopen(f'http://127.0.0.1:{port}/status') as response:
+            status = json.loads(response.read())
+        assert status['workers'] == 1
+        assert status['jobs'] == {'active': 0, 'done': 1, 'failed': 1}
+
+        # every slot is taken, hence the next job is rejected
+        server.slots.acquire()
+        try:
+            req = request.Request(
+                f'http://127.0.0.1:{port}/run',
+                data=json.dumps({'args': job_args,
+                                 'cwd': str(valid_dir)}).encode('utf-8'),
+                method='POST')
+            with pytest.raises(error.HTTPError) as e_info:
+                request.urlopen(req)
+            assert e_info.value.code == 503
+
+            result = submit_job(job_args, port=port, cwd=str(valid_dir))
+            assert result['status'] == 'rejected'
+
+            assert DL_server_main(['submit', '--port', str(port), '--'] +
+                                  job_args) == 1
+        finally:
+            server.slots.release()
+
+        # rejected jobs are not counted
+        with request.urlopen(f'http://127.0.0.1:{port}/status') as response:
+            assert json.loads(response.read())['jobs']['done'] == 1
+
+    finally:
+        server.shutdown()
+        server.server_close()
+        server_thread.join()
+
+# -----------------------------------------------------------------------------
+# synthetic buildings and benchmarks
+# -----------------------------------------------------------------------------
+
+def test_synthetic_buildings(tmp_path):
+    """
+    Test if the synthetic FEMA P58 and HAZUS buildings are valid inputs of
+    an assessment with the prescribed size.
+    """
+
+    def assess(assessment_class, DL_path, EDP_path):
+        A = assessment_class(log_file=False)
+        A.read_inputs(DL_path, EDP_path, verbose=False)
+        np.random.seed(42)
+        A.define_random_variables()
+        A.define_loss_model()
+        A.calculate_damage()
+        A.calculate_losses()
+        A.aggregate_results()
+        return A
+
+    DL_path, EDP_path = write_P58_building(
+        tmp_path / 'P58', stories=2, components=3, realizations=200,
+        EDP_samples=50)
+    A = assess(FEMA_P58_Assessment, DL_path, EDP_path)
+
+    assert sorted(A._FG_dict.keys()) == ['S0001.001', 'S0002.001',
+                                         'S0003.001']
+    assert sorted(A._EDP_in.keys()) == ['PFA', 'PID']
+    assert len(A._SUMMARY.index) == 200
+    assert A._SUMMARY[('reconstruction', 'cost')].max() > 0.
+
+    DL_path, EDP_path = write_HAZUS_building(
+        tmp_path / 'HAZUS', components=2, realizations=200, EDP_samples=50)
+    A = assess(HAZUS_Assessment, DL_path, EDP_path)
+
+    assert len(A._FG_dict) == 2
+    assert len(A._SUMMARY.index) == 200
+    assert A._SUMMARY[('reconstruction', 'cost')].max() > 0.
+
+def test_HAZUS_Assessment_n_threads(tmp_path):
+    """
+    Perform the same HAZUS assessment with one and with several threads. The
+    Fragility Groups use separate random number streams, hence the results
+    shall be identical regardless of the number of threads.
+    """
+
+    DL_path, EDP_path = write_HAZUS_building(
+        tmp_path, components=3, realizations=500, EDP_samples=50)
+
+    results = []
+    for n_threads in [1, 4]:
+
+        A = HAZUS_Assessment(log_file=False, n_threads=n_threads)
+
+        A.read_inputs(DL_path, EDP_path, verbose=False)
+
+        np.random.seed(42)
+        A.define_random_variables()
+        A.define_loss_model()
+        A.calculate_damage()
+        A.calculate_losses()
+        A.aggregate_results()
+
+        results.append(A)
+
+    A, B = results
+
+    assert_allclose(B._DMG.values, A._DMG.values)
+    assert list(B._DMG.columns) == list(A._DMG.columns)
+    for DV_name, DV in A._DV_dict.items():
+        if isinstance(DV, dict):
+            for lvl, DV_lvl in DV.items():
+                assert_allclose(B._DV_dict[DV_name][lvl].values, DV_lvl.values)
+        elif DV is not None:
+            assert_allclose(B._DV_dict[DV_name].values, DV.values)
+            assert list(B._DV_dict[DV_name].columns) == list(DV.columns)
+    assert_allclose(B._SUMMARY.values.astype(float),
+                    A._SUMMARY.values.astype(float))
+
+def test_benchmark(tmp_path, monkeypatch):
+    """
+    Test if a small benchmark suite runs every stage of the pipelines and the
+    kernels and if the comparison of results flags the regressions.
+    """
+
+    # the HAZUS outputs include an EDP.csv in the working directory
+    monkeypatch.chdir(tmp_path)
+
+    monkeypatch.setitem(benchmark.SUITES, 'test', {
+        'P58': {
+            'base': dict(stories=1, components=2, directions=1,
+                         realizations=100, EDP_samples=20, dependency=None),
+            'sweeps': {}},
+        'HAZUS': {
+            'base': dict(components=1, realizations=100, EDP_samples=20,
+                         dependency=None),
+            'sweeps': {}},
+        'kernels': {
+            'tmvn_rvs': {'dims': [2]}}})
+
+    results = benchmark.run_benchmarks(suite='test', repeat=1)
+
+    assert len(results['benchmarks']) == 3
+    for name, bm in results['benchmarks'].items():
+        if name.startswith('tmvn_rvs'):
+            assert list(bm['time'].keys()) == ['call']
+        else:
+            assert list(bm['time'].keys()) == benchmark.STAGES + ['total']
+            assert set(bm['peakmem'].keys()) == set(bm['time'].keys())
+
+    old_path = tmp_path / 'old.json'
+    new_path = tmp_path / 'new.json'
+    with open(old_path, 'w') as f:
+        json.dump(results, f)
+
+    # the same results have no regressions
+    with open(new_path, 'w') as f:
+        json.dump(results, f)
+    assert benchmark.compare_results(old_path, new_path) == 0
+
+    # slower kernels are flagged
+    for bm in results['benchmarks'].values():
+        if 'call' in bm['time']:
+            bm['time']['call'] *= 2.
+    with open(new_path, 'w') as f:
+        json.dump(results, f)
+    assert benchmark.compare_results(old_path, new_path) == 1
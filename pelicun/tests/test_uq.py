@@ -43,7 +43,7 @@ This subpackage performs unit tests on the random module of pelicun.
 """
 import pytest
 import numpy as np
-from scipy.stats import norm
+from scipy.stats import norm, lognorm, truncnorm, multivariate_normal
 from numpy.testing import assert_allclose
 from copy import deepcopy
 
@@ -136,6 +136,39 @@ def test_TMVN_sampling_non_truncated():
 
     assert assert_normal_distribution(sampling_function, ref_mean, ref_COV)
 
+def test_TMVN_sampling_cholesky_factor():
+    """
+    Test if the stored Cholesky factor of the covariance matrix is used for
+    sampling and if it is available for perfectly correlated variables.
+
+    """
+
+    ref_mean = [0.5, 1.5, 1.0]
+    ref_std = [0.25, 1.0, 0.5]
+
+    for rho in [0.5, 1.0]:
+        ref_rho = np.ones((3, 3)) * rho
+        np.fill_diagonal(ref_rho, 1.0)
+        ref_COV = np.outer(ref_std, ref_std) * ref_rho
+
+        RV = RandomVariable(ID=1, dimension_tags=['A', 'B', 'C'],
+                            distribution_kind='normal',
+                            theta=ref_mean, COV=ref_COV)
+
+        L = RV.COV_chol
+        assert_allclose(L @ L.T, ref_COV, atol=1e-10)
+        assert RV.COV_chol is L
+
+        np.random.seed(42)
+        samples = RV.sample_distribution(10).values
+        np.random.seed(42)
+        samples_ref = tmvn_rvs(ref_mean, ref_COV, size=10)
+        np.random.seed(42)
+        samples_L = tmvn_rvs(ref_mean, ref_COV, size=10, COV_chol=L)
+
+        assert_allclose(samples, samples_ref)
+        assert_allclose(samples, samples_L)
+
 def test_TMVN_sampling_truncated_wide_limits():
     """
     Test if the sampling method returns appropriate samples for a truncated
@@ -651,6 +684,65 @@ def test_MVN_MLE_small_alpha():
                  censored_count=c_count, det_lower=det_lower,
                  det_upper=det_upper, alpha_lim=0.2)
 
+# ------------------------------------------------------------------------------
+# damage state allocation
+# ------------------------------------------------------------------------------
+def test_mutually_exclusive_sampling():
+    """
+    Test if the mutually exclusive events are sampled with their probabilities
+    and if invalid weights are identified.
+    """
+    weights = np.array([0.2, 0.0, 0.5, 0.3])
+
+    samples = mutually_exclusive_rvs(weights, size=100000,
+                                     random_state=np.random.RandomState(1))
+
+    assert samples.shape == (100000,)
+    assert_allclose(np.bincount(samples, minlength=4) / 100000., weights,
+                    atol=0.01)
+
+    with pytest.raises(ValueError):
+        mutually_exclusive_rvs([0., 0.], size=10)
+
+def test_simultaneous_sampling():
+    """
+    Test if the simultaneous events are sampled from their distribution
+    conditioned on at least one event occurring, even if the events are
+    unlikely.
+    """
+    weights = np.array([0.1, 0.4, 0.2])
+
+    samples = simultaneous_rvs(weights, size=100000,
+                               random_state=np.random.RandomState(1))
+
+    assert samples.shape == (100000, 3)
+    assert np.all(np.any(samples, axis=1))
+
+    P_any = 1. - np.prod(1. - weights)
+    assert_allclose(np.mean(samples, axis=0), weights / P_any, atol=0.01)
+    assert_allclose(np.mean(np.all(samples, axis=1)),
+                    np.prod(weights) / P_any, atol=0.005)
+
+    # when the events are unlikely, almost always only one of them occurs
+    samples = simultaneous_rvs([1e-4, 3e-4], size=10000,
+                               random_state=np.random.RandomState(1))
+    assert np.all(np.any(samples, axis=1))
+    assert_allclose(np.mean(samples, axis=0), [0.25, 0.75], atol=0.02)
+
+    # probabilities below the machine epsilon are not lost in 1 - w
+    samples = simultaneous_rvs([1e-17, 3e-17], size=10000,
+                               random_state=np.random.RandomState(1))
+    assert np.all(np.any(samples, axis=1))
+    assert_allclose(np.mean(samples, axis=0), [0.25, 0.75], atol=0.02)
+
+    # certain events always occur
+    samples = simultaneous_rvs([0.5, 1.0], size=1000,
+                               random_state=np.random.RandomState(1))
+    assert np.all(samples[:, 1])
+
+    with pytest.raises(ValueError):
+        simultaneous_rvs([0., 0.], size=10)
+
 # ------------------------------------------------------------------------------
 # Random_Variable
 # ------------------------------------------------------------------------------
@@ -1638,6 +1730,40 @@ def test_RandomVariable_orthotope_density():
     test_alpha = RV.orthotope_density(lower=[None, None, 2.])[0]
     assert test_alpha == pytest.approx(0.5)
 
+def test_RandomVariable_log_pdf():
+    """
+    Test if the log pdf of normal, lognormal and truncated distributions
+    matches the reference values from scipy.
+
+    """
+    # univariate lognormal
+    RV = RandomVariable(ID=1, dimension_tags=['A'],
+                        distribution_kind='lognormal',
+                        theta=2.0, COV=0.25)
+    x = np.array([0.5, 1.0, 2.0, 5.0])
+    ref_log_f = lognorm.logpdf(x, s=0.5, scale=2.0)
+    assert_allclose(RV.log_pdf(x), ref_log_f, rtol=1e-10)
+
+    # bivariate mixed normal and lognormal with correlation
+    ref_COV = np.array([[1.0, 0.3], [0.3, 0.5]])
+    RV = RandomVariable(ID=1, dimension_tags=['A', 'B'],
+                        distribution_kind=['normal', 'lognormal'],
+                        theta=[1.0, 2.0], COV=ref_COV)
+    x = np.array([[0.5, 1.0], [2.0, 3.0]])
+    ref_log_f = (multivariate_normal.logpdf(
+        np.column_stack([x[:, 0], np.log(x[:, 1])]),
+        mean=[1.0, np.log(2.0)], cov=ref_COV) - np.log(x[:, 1]))
+    assert_allclose(RV.log_pdf(x), ref_log_f, rtol=1e-10)
+
+    # truncated normal: zero density outside and normalized density inside
+    RV = RandomVariable(ID=1, dimension_tags=['A'],
+                        distribution_kind='normal',
+                        theta=0.0, COV=1.0,
+                        truncation_limits=[0., None])
+    log_f = RV.log_pdf(np.array([-1.0, 1.0]))
+    assert log_f[0] == -np.inf
+    assert log_f[1] == pytest.approx(norm.logpdf(1.0) + np.log(2.0))
+
 def test_RandomVariableSubset_orthotope_density():
     """
     Test if the orthotope density function provides accurate estimates of the
@@ -60,6 +60,8 @@ import pelicun
 from pelicun.base import str2bool
 from pelicun.control import FEMA_P58_Assessment, HAZUS_Assessment
 from pelicun.file_io import write_SimCenter_DL_output, write_SimCenter_DM_output, write_SimCenter_DV_output
+from pelicun.file_io import index_EDP_events, read_EDP_events
+from pelicun.file_io import write_SimCenter_DL_shard
 from pelicun.auto import auto_populate
 
 # START temporary functions ----
@@ -124,7 +126,10 @@ def update_collapsep(BIMfile, RPi, theta, beta, num_collapses):
 def run_pelicun(DL_input_path, EDP_input_path,
 	DL_method, realization_count, EDP_file, DM_file, DV_file, 
 	output_path=None, detailed_results=True, coupled_EDP=False,
-	log_file=True, event_time=None, ground_failure=False):
+	log_file=True, event_time=None, ground_failure=False,
+	exact_stats=True, stats_compression=500., shard=None, seed=None,
+	damage_screening=None, common_random_numbers=False, dry_run=False,
+	memory_budget=None, precision='float64'):
 
 	DL_input_path = os.path.abspath(DL_input_path) # BIM file
 	EDP_input_path = os.path.abspath(EDP_input_path) # dakotaTab
@@ -134,15 +139,22 @@ def run_pelicun(DL_input_path, EDP_input_path,
 	if output_path is None:
 		output_path = ntpath.dirname(DL_input_path)
 
-	# delete output files from previous runs
-	files = os.listdir(output_path)
+	# the outputs of a shard are saved in a separate folder in the output dir
+	# and they are merged with DL_merge once every shard is complete
+	if shard is not None:
+		output_path = posixpath.join(output_path,
+			'shard_{}_of_{}'.format(shard[0] + 1, shard[1]))
+		os.makedirs(output_path, exist_ok=True)
+
+	# delete output files from previous runs (a dry run keeps them)
+	files = [] if dry_run else os.listdir(output_path)
 	for filename in files:
-		if (filename[-3:] == 'csv') and (
+		if ((filename[-3:] == 'csv') and (
 			('DL_summary' in filename) or
 			('DMG' in filename) or
 			('DV_' in filename) or
 			('EDP' in filename)
-			):
+			)) or (filename[-9:] == 'stats.npz') or (filename == 'shard.json'):
 			try:
 				os.remove(posixpath.join(output_path, filename))
 			except:
@@ -160,39 +172,31 @@ def run_pelicun(DL_input_path, EDP_input_path,
 		for evt_i, event in enumerate(event_list):
 			df_event.iloc[evt_i] = [event['name'], event['stripe'], event['rate'], event['IM']]
 
-		# Create a separate EDP input for each stripe
-		EDP_input_full = pd.read_csv(EDP_input_path, sep='\s+', header=0,
-									 index_col=0)
-
-		# EDP_input_full.to_csv(EDP_input_path[:-4]+'_1.out', sep=' ')
+		# Index the rows of each event in the EDP input; the EDPs of each
+		# stripe are loaded from the input file once and the table is passed
+		# to the assessment of the stripe
+		event_index = index_EDP_events(EDP_input_path)
 
 		stripes = df_event['stripe'].unique()
-		EDP_files = []
+		EDP_tables = []
 		IM_list = []
 		num_events = []
 		num_collapses = []
 		for stripe in stripes:
 			events = df_event[df_event['stripe']==stripe]['name'].values
 
-			EDP_input = EDP_input_full[EDP_input_full['MultipleEvent'].isin(events)]
-
-			EDP_files.append(EDP_input_path[:-4]+'_{}.out'.format(stripe))
+			EDP_input = read_EDP_events(EDP_input_path, events, event_index)
 
-			EDP_input.to_csv(EDP_files[-1], sep=' ')
+			EDP_tables.append(EDP_input)
 
 			IM_list.append(df_event[df_event['stripe']==stripe]['IM'].values[0])
 
 			# record number of collapses and number of events per stripe
 			PID_columns = [col for col in list(EDP_input) if 'PID' in col] # list of column headers with PID
 			num_events.append(EDP_input.shape[0])
-			count = 0
-			for row in range(num_events[-1]):
-				print(row)
-				for col in PID_columns:
-					if EDP_input.iloc[row][col] >= 0.20: # TODO: PID collapse limit as argument
-						count += 1
-						break
-			num_collapses.append(count)
+			# TODO: PID collapse limit as argument
+			num_collapses.append(int(np.sum(np.any(
+				EDP_input[PID_columns].values >= 0.20, axis=1))))
 
 		# fit lognormal distribution to all points by maximum likelihood estimation (MLE)
 		theta, beta = lognormal_MLE(IM_list, num_events, num_collapses)
@@ -208,12 +212,15 @@ def run_pelicun(DL_input_path, EDP_input_path,
 
 	except: # run analysis for single IM
 		stripes = [1]
-		EDP_files = [EDP_input_path]
+		EDP_tables = [None]
 		DL_files = [DL_input_path]
 
 	# run the analysis and save results separately for each stripe
-	#print(stripes, EDP_files)
+	#print(stripes, EDP_tables)
 
+	shard_outputs = {}
+	building_samples = None
+	estimates = {}
 	for s_i, stripe in enumerate(stripes):
 
 		DL_input_path = DL_files[s_i]
@@ -229,8 +236,6 @@ def run_pelicun(DL_input_path, EDP_input_path,
 			# if the loss model is not defined, give a warning
 			print('WARNING No loss model defined in the BIM file. Trying to auto-populate.')
 
-			EDP_input_path = EDP_files[s_i]
-
 			# and try to auto-populate the loss model using the BIM information
 			DL_input, DL_input_path = auto_populate(DL_input_path, EDP_input_path,
 													DL_method, realization_count,
@@ -249,10 +254,55 @@ def run_pelicun(DL_input_path, EDP_input_path,
 		elif DL_method == 'HAZUS MH HU':
 			A = HAZUS_Assessment(hazard = 'HU', log_file=log_file)
 
-		A.read_inputs(DL_input_path, EDP_files[s_i], verbose=False) # make DL inputs into array of all BIM files
+		# the EDPs of a stripe are passed to the assessment as a table
+		if EDP_tables[s_i] is None:
+			EDP_input = EDP_input_path
+		else:
+			EDP_input = EDP_tables[s_i]
+
+		A.read_inputs(DL_input_path, EDP_input, verbose=False) # make DL inputs into array of all BIM files
+
+		# sharded and seeded runs sample every stripe from its own substream
+		if (shard is not None) or (seed is not None):
+			shard_id, shard_count = (0, 1) if shard is None else shard
+			A.set_shard(shard_id, shard_count,
+						seed=0 if seed is None else seed, stream_id=s_i)
+
+		# skip the components that cannot be damaged at the sampled EDPs
+		if (damage_screening is not None) and isinstance(A, FEMA_P58_Assessment):
+			A.set_damage_screening(damage_screening)
+
+		A.set_precision(precision)
+
+		# a dry run only estimates the resources needed by the assessment
+		if dry_run:
+			estimate = A.estimate_resources(memory_budget=memory_budget)
+			estimates.update({stripe_str: estimate})
+
+			log_msg('Estimated runtime: {:.0f} s, peak memory: {:.0f} MB'.format(
+				estimate['total_runtime'], estimate['peak_memory'] / 2**20))
+			if estimate['chunk_size'] == 0:
+				log_msg('WARNING The loss model does not fit in the memory '
+						'budget.')
+			elif estimate['chunk_size'] is not None:
+				log_msg('WARNING The assessment does not fit in the memory '
+						'budget. Run it in chunks of {} realizations, e.g., '
+						'with --shard i/{}'.format(estimate['chunk_size'],
+												   estimate['shard_count']))
+			continue
+
+		# every stripe uses the building samples of the first one; screened
+		# assessments have different building RVs, so they only share the seed
+		if common_random_numbers:
+			A.set_common_random_numbers(seed=0 if seed is None else seed,
+										samples=building_samples)
 
 		A.define_random_variables()
 
+		if common_random_numbers and (damage_screening is None) and (
+			building_samples is None):
+			building_samples = A.get_building_samples()
+
 		A.define_loss_model()
 
 		A.calculate_damage()
@@ -262,7 +312,20 @@ def run_pelicun(DL_input_path, EDP_input_path,
 		A.aggregate_results()
 
 		A.save_outputs(output_path, EDP_file, DM_file, DV_file, stripe_str,
-					   detailed_results=detailed_results)
+					   detailed_results=detailed_results,
+					   exact_stats=exact_stats,
+					   stats_compression=stats_compression)
+
+		if shard is not None:
+			shard_outputs.update({stripe_str: A._stats})
+
+	if dry_run:
+		with open(posixpath.join(output_path, 'resource_estimate.json'),
+				  'w') as f:
+			json.dump(estimates, f, indent=2)
+
+	elif shard is not None:
+		write_SimCenter_DL_shard(output_path, A._shard, shard_outputs)
 
 	return 0
 
@@ -286,8 +349,46 @@ def main(args):
 		type = str2bool, nargs='?', const=True)
 	parser.add_argument('--ground_failure', default = False,
 		type = str2bool, nargs='?', const=False)
+	parser.add_argument('--exact_stats', default = True,
+		type = str2bool, nargs='?', const=True)
+	parser.add_argument('--stats_compression', default = 500., type = float)
+	parser.add_argument('--shard', default = None,
+		help = 'Evaluate shard i of N (i/N, 1 <= i <= N) of the realizations')
+	parser.add_argument('--seed', default = None, type = int)
+	parser.add_argument('--damage_screening', default = None, type = float,
+		help = 'Skip the components whose probability of damage at the '
+			   'sampled EDPs is below this value (FEMA P58 only)')
+	parser.add_argument('--common_random_numbers', default = False,
+		type = str2bool, nargs='?', const=True,
+		help = 'Sample the building-side random variables once and use '
+			   'them for every stripe; only the EDPs are resampled')
+	parser.add_argument('--dry_run', '--dry-run', default = False,
+		type = str2bool, nargs='?', const=True,
+		help = 'Estimate the runtime and memory of the assessment without '
+			   'running it; the estimates are saved in resource_estimate.json')
+	parser.add_argument('--memory_budget', default = None, type = float,
+		help = 'Memory available to the assessment in GB; a dry run '
+			   'recommends a chunk size if the assessment exceeds it')
+	parser.add_argument('--precision', default = 'float64',
+		choices = ['float64', 'float32'],
+		help = 'Precision of the samples and results; float32 reduces the '
+			   'memory footprint of the assessment')
 	args = parser.parse_args(args)
 
+	shard = None
+	if args.shard is not None:
+		try:
+			shard_id, shard_count = [int(val) for val in args.shard.split('/')]
+		except ValueError:
+			parser.error('--shard expects i/N, e.g., 1/4')
+		if not (1 <= shard_id <= shard_count):
+			parser.error('--shard expects 1 <= i <= N')
+		shard = (shard_id - 1, shard_count)
+		if (shard_count > 1) and (args.damage_screening is not None):
+			parser.error('--damage_screening cannot be used with --shard; '
+						 'every shard would screen a different set of '
+						 'components')
+
 	log_msg('Initializing pelicun calculation...')
 
 	#print(args)
@@ -300,7 +401,17 @@ def main(args):
 		coupled_EDP = args.coupled_EDP,
 		log_file = args.log_file,
 		event_time = args.event_time,
-		ground_failure = args.ground_failure)
+		ground_failure = args.ground_failure,
+		exact_stats = args.exact_stats,
+		stats_compression = args.stats_compression,
+		shard = shard,
+		seed = args.seed,
+		damage_screening = args.damage_screening,
+		common_random_numbers = args.common_random_numbers,
+		dry_run = args.dry_run,
+		memory_budget = (None if args.memory_budget is None
+						 else args.memory_budget * 2**30),
+		precision = args.precision)
 
 	log_msg('pelicun calculation completed.')
 
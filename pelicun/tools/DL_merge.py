@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of pelicun.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# pelicun. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Adam Zsarnóczay
+
+"""
+Merge the outputs of a sharded DL_calculation.
+
+The realizations of a single assessment can be split into N shards with the
+--shard i/N option of DL_calculation. Every shard saves its outputs in a
+shard_<i>_of_<N> folder in the output directory. Once every shard is complete,
+this tool combines them into the standard DL_summary, DMG_agg and DV _agg files
+and their _stats files in the output directory. The shards only need a shared
+filesystem to coordinate.
+
+	python DL_calculation.py --filenameDL BIM.json --filenameEDP EDP.out \\
+		--dirnameOutput results --shard 1/4 --seed 42
+	...
+	python DL_merge.py --dirnameOutput results
+
+"""
+
+import sys, os, glob, argparse
+from time import gmtime, strftime
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+from pelicun.file_io import merge_SimCenter_DL_shards
+
+def log_msg(msg):
+
+	formatted_msg = '{} {}'.format(strftime('%Y-%m-%dT%H:%M:%SZ', gmtime()), msg)
+
+	print(formatted_msg)
+
+def main(args):
+
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--dirnameOutput', default = '.')
+	parser.add_argument('--shards', default = None, nargs='+',
+		help = 'Folders of the shards; by default, every shard_<i>_of_<N> '
+			   'folder in the output directory is merged')
+	args = parser.parse_args(args)
+
+	if args.shards is None:
+		shard_dirs = sorted(glob.glob(
+			os.path.join(args.dirnameOutput, 'shard_*_of_*')))
+	else:
+		shard_dirs = args.shards
+
+	shard_dirs = [os.path.abspath(shard_dir).replace('\\', '/')
+				  for shard_dir in shard_dirs]
+	output_dir = os.path.abspath(args.dirnameOutput).replace('\\', '/')
+
+	try:
+		merge_SimCenter_DL_shards(shard_dirs, output_dir)
+	except ValueError as e:
+		log_msg('Merge failed: {}'.format(e))
+		return 1
+
+	log_msg('Merged {} shards into {}'.format(len(shard_dirs), output_dir))
+
+	return 0
+
+if __name__ == '__main__':
+
+	sys.exit(main(sys.argv[1:]))
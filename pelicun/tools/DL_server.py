@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of pelicun.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# pelicun. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Adam Zsarnóczay
+
+"""
+Local job server for DL_calculation.
+
+The server is a long-lived process that keeps a pool of worker processes with
+pelicun, pandas and scipy already imported and with the component and
+population libraries cached in memory. Jobs are submitted over HTTP on the
+local host using the same arguments as DL_calculation and each request returns
+when the corresponding job is finished.
+
+Start the server:
+
+	python DL_server.py start --port 8123 --workers 4
+
+Submit a job and wait for it to finish:
+
+	python DL_server.py submit --port 8123 -- --filenameDL BIM.json \\
+		--filenameEDP EDP.out --Realizations 1000
+
+"""
+
+import sys, os, json, time, argparse, threading, traceback
+from time import gmtime, strftime
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import request, error
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+# pelicun is only imported by the server and its workers; the client does not
+# need it and stays lightweight
+
+def log_msg(msg):
+
+	formatted_msg = '{} {}'.format(strftime('%Y-%m-%dT%H:%M:%SZ', gmtime()), msg)
+
+	print(formatted_msg)
+
+def _init_worker():
+
+	# importing DL_calculation pulls in pelicun and its dependencies once per
+	# worker (this is a no-op when the worker is forked from the server)
+	import DL_calculation
+	from pelicun.file_io import enable_DL_data_cache
+
+	# keep the component and population data in memory between jobs
+	enable_DL_data_cache(True)
+
+def _run_job(job_args, cwd):
+
+	from DL_calculation import main as DL_calculation_main
+
+	start_time = time.time()
+
+	try:
+		if cwd is not None:
+			os.chdir(cwd)
+
+		DL_calculation_main(job_args)
+
+		status, msg = 'done', None
+
+	# argparse reports invalid arguments through SystemExit
+	except (Exception, SystemExit):
+		status, msg = 'failed', traceback.format_exc()
+
+	return {'status': status, 'error': msg,
+			'elapsed': time.time() - start_time}
+
+class DLServer(ThreadingHTTPServer):
+	"""
+	HTTP server that runs DL_calculation jobs in a bounded process pool.
+
+	At most n_workers jobs run at the same time and at most max_queue jobs wait
+	for a free worker. Requests above that limit are rejected with a 503
+	response instead of piling up in the server.
+
+	"""
+
+	daemon_threads = True
+
+	def __init__(self, address, n_workers, max_queue):
+
+		super().__init__(address, DLRequestHandler)
+
+		self.n_workers = n_workers
+		self.pool = ProcessPoolExecutor(max_workers=n_workers,
+										initializer=_init_worker)
+		self.slots = threading.BoundedSemaphore(n_workers + max_queue)
+
+		self.lock = threading.Lock()
+		self.jobs = {'active': 0, 'done': 0, 'failed': 0}
+
+	def run_job(self, job_args, cwd):
+
+		if not self.slots.acquire(blocking=False):
+			return None
+
+		with self.lock:
+			self.jobs['active'] += 1
+
+		try:
+			result = self.pool.submit(_run_job, job_args, cwd).result()
+		except Exception:
+			result = {'status': 'failed', 'error': traceback.format_exc(),
+					  'elapsed': None}
+		finally:
+			self.slots.release()
+
+		with self.lock:
+			self.jobs['active'] -= 1
+			self.jobs[result['status']] += 1
+
+		return result
+
+	def server_close(self):
+
+		super().server_close()
+		self.pool.shutdown(wait=True)
+
+class DLRequestHandler(BaseHTTPRequestHandler):
+
+	def _respond(self, code, data):
+
+		body = json.dumps(data).encode('utf-8')
+
+		self.send_response(code)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_GET(self):
+
+		if self.path == '/status':
+			with self.server.lock:
+				jobs = dict(self.server.jobs)
+			self._respond(200, {'workers': self.server.n_workers, 'jobs': jobs})
+		else:
+			self._respond(404, {'error': f'Unknown endpoint: {self.path}'})
+
+	def do_POST(self):
+
+		if self.path == '/run':
+			try:
+				length = int(self.headers.get('Content-Length', 0))
+				job = json.loads(self.rfile.read(length))
+				job_args = [str(arg) for arg in job['args']]
+				cwd = job.get('cwd', None)
+			except (ValueError, KeyError, TypeError):
+				self._respond(400, {'error': 'Invalid job description.'})
+				return
+
+			result = self.server.run_job(job_args, cwd)
+
+			if result is None:
+				self._respond(503, {'error': 'The job queue is full.'})
+			else:
+				self._respond(200, result)
+
+		elif self.path == '/shutdown':
+			self._respond(200, {'status': 'shutting down'})
+			threading.Thread(target=self.server.shutdown).start()
+
+		else:
+			self._respond(404, {'error': f'Unknown endpoint: {self.path}'})
+
+	def log_message(self, format, *args):
+
+		log_msg('DL_server: ' + format % args)
+
+def start_server(host='127.0.0.1', port=8123, n_workers=None, max_queue=64):
+
+	if n_workers is None:
+		n_workers = os.cpu_count() or 1
+
+	# pre-import the calculation modules so that forked workers start warm
+	import DL_calculation
+
+	server = DLServer((host, port), n_workers, max_queue)
+
+	log_msg(f'DL_server listening on {host}:{port} with {n_workers} workers')
+
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+
+	log_msg('DL_server stopped.')
+
+def submit_job(job_args, host='127.0.0.1', port=8123, cwd=None):
+
+	if cwd is None:
+		cwd = os.getcwd()
+
+	req = request.Request(f'http://{host}:{port}/run',
+		data=json.dumps({'args': job_args, 'cwd': cwd}).encode('utf-8'),
+		headers={'Content-Type': 'application/json'}, method='POST')
+
+	try:
+		with request.urlopen(req) as response:
+			result = json.loads(response.read())
+	except error.HTTPError as e:
+		result = json.loads(e.read())
+		result['status'] = 'rejected'
+
+	return result
+
+def main(args):
+
+	parser = argparse.ArgumentParser()
+	subparsers = parser.add_subparsers(dest='command')
+
+	parser_start = subparsers.add_parser('start')
+	parser_start.add_argument('--host', default='127.0.0.1')
+	parser_start.add_argument('--port', default=8123, type=int)
+	parser_start.add_argument('--workers', default=None, type=int)
+	parser_start.add_argument('--queue', default=64, type=int)
+
+	parser_submit = subparsers.add_parser('submit')
+	parser_submit.add_argument('--host', default='127.0.0.1')
+	parser_submit.add_argument('--port', default=8123, type=int)
+
+	args, job_args = parser.parse_known_args(args)
+
+	if args.command == 'start':
+		start_server(args.host, args.port, args.workers, args.queue)
+		return 0
+
+	elif args.command == 'submit':
+		if (len(job_args) > 0) and (job_args[0] == '--'):
+			job_args = job_args[1:]
+
+		result = submit_job(job_args, args.host, args.port)
+
+		if result['status'] == 'done':
+			log_msg('Job completed in {:.1f} s.'.format(result['elapsed']))
+			return 0
+
+		log_msg(f"Job {result['status']}:")
+		print(result['error'])
+		return 1
+
+	parser.print_help()
+	return 1
+
+if __name__ == '__main__':
+
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,471 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of pelicun.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# pelicun. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Adam Zsarnóczay
+
+"""
+Benchmark the assessment pipeline and its numerical kernels.
+
+The pipeline benchmarks assess synthetic buildings (see synthetic_building)
+and measure the time and the peak memory of every stage from read_inputs to
+save_outputs. Each sweep varies one parameter of a base building (stories,
+components, EDP directions, realizations, dependencies) to show how the
+stages scale with it. The kernel benchmarks measure the tmvn_rvs, tmvn_MLE
+and mvn_orthotope_density functions and the DSG_given_EDP method of
+Fragility Functions.
+
+Times are the minimum of the repeated runs. Peak memory is the largest
+amount of memory allocated by a stage on top of the memory held before it
+(measured with tracemalloc in a separate run). The results are saved in a
+JSON file together with the commit and the machine information, so that runs
+from different commits can be compared on the same machine:
+
+	python benchmark.py --output old.json
+	git checkout <other commit>
+	python benchmark.py --output new.json
+	python benchmark.py --compare old.json new.json
+
+"""
+
+import sys, os, re, json, time, platform, argparse, tempfile, subprocess
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import pelicun
+from pelicun.control import FEMA_P58_Assessment, HAZUS_Assessment
+from pelicun.uq import tmvn_rvs, tmvn_MLE, mvn_orthotope_density
+from pelicun.uq import RandomVariable, RandomVariableSubset
+from pelicun.model import FragilityFunction
+from synthetic_building import write_P58_building, write_HAZUS_building
+
+STAGES = ['read_inputs', 'define_random_variables', 'define_loss_model',
+		  'calculate_damage', 'calculate_losses', 'aggregate_results',
+		  'save_outputs']
+
+# Each sweep varies one parameter of the base building. The quick suite is
+# meant for a check before a commit, the full suite for a thorough comparison.
+SUITES = {
+	'quick': {
+		'P58': {
+			'base': dict(stories=3, components=4, directions=2,
+						 realizations=500, EDP_samples=100, dependency=None),
+			'sweeps': {
+				'stories': [1, 6],
+				'components': [8],
+				'realizations': [2000],
+				'dependency': ['btw. Performance Groups']}},
+		'HAZUS': {
+			'base': dict(components=1, realizations=1000, EDP_samples=100,
+						 dependency=None),
+			'sweeps': {
+				'realizations': [10000]}},
+		'kernels': {
+			'tmvn_rvs': {'dims': [2, 8]},
+			'tmvn_MLE': {'dims': [1, 2]},
+			'mvn_orthotope_density': {'dims': [2, 8]},
+			'DSG_given_EDP': {'EDP_count': [1000, 100000]}}},
+	'full': {
+		'P58': {
+			'base': dict(stories=3, components=4, directions=2,
+						 realizations=1000, EDP_samples=100, dependency=None),
+			'sweeps': {
+				'stories': [1, 6, 12, 24],
+				'components': [1, 8, 16, 32],
+				'directions': [1],
+				'realizations': [100, 10000, 100000],
+				'EDP_samples': [20, 1000],
+				'dependency': ['Independent', 'btw. Fragility Groups',
+							   'btw. Performance Groups', 'btw. Floors',
+							   'btw. Directions']}},
+		'HAZUS': {
+			'base': dict(components=1, realizations=1000, EDP_samples=100,
+						 dependency=None),
+			'sweeps': {
+				'components': [4, 16],
+				'realizations': [100, 10000, 100000],
+				'dependency': ['btw. Performance Groups']}},
+		'kernels': {
+			'tmvn_rvs': {'dims': [1, 2, 8, 32]},
+			'tmvn_MLE': {'dims': [1, 2, 4]},
+			'mvn_orthotope_density': {'dims': [1, 2, 8, 32]},
+			'DSG_given_EDP': {'EDP_count': [1000, 10000, 100000, 1000000]}}},
+}
+
+def log_msg(msg):
+
+	print(msg)
+	sys.stdout.flush()
+
+def _benchmark_name(group, params):
+
+	return '{}({})'.format(group, ', '.join(
+		['{}={}'.format(key, val) for key, val in params.items()]))
+
+def _pipeline_cases(group_suite):
+	"""
+	Collect the base case and the cases of every sweep without duplicates.
+
+	"""
+	base = group_suite['base']
+	cases = [dict(base)]
+	for param, values in group_suite['sweeps'].items():
+		for val in values:
+			case = dict(base)
+			case.update({param: val})
+			if case not in cases:
+				cases.append(case)
+
+	return cases
+
+def _run_pipeline(assessment_class, DL_path, EDP_path, output_dir,
+				  track_memory=False):
+	"""
+	Run an assessment and measure the time or the peak memory of its stages.
+
+	"""
+	A = assessment_class(log_file=False)
+	stages = [
+		('read_inputs', lambda: A.read_inputs(DL_path, EDP_path,
+											  verbose=False)),
+		('define_random_variables', A.define_random_variables),
+		('define_loss_model', A.define_loss_model),
+		('calculate_damage', A.calculate_damage),
+		('calculate_losses', A.calculate_losses),
+		('aggregate_results', A.aggregate_results),
+		('save_outputs', lambda: A.save_outputs(
+			output_dir + '/', 'EDP.csv', 'DM.csv', 'DV.csv'))]
+
+	np.random.seed(42)
+
+	results = {}
+	for stage, run_stage in stages:
+		if track_memory:
+			tracemalloc.clear_traces()
+			run_stage()
+			results.update({stage: tracemalloc.get_traced_memory()[1]})
+		else:
+			start = time.perf_counter()
+			run_stage()
+			results.update({stage: time.perf_counter() - start})
+
+	return results
+
+def _measure(run, repeat):
+	"""
+	Measure the time and the peak memory of the stages run by a callable.
+
+	The callable runs every stage and returns a dict with their times or
+	peak memory usage.
+
+	"""
+	times = [run(track_memory=False) for i in range(repeat)]
+	time_dict = dict([(stage, min([t[stage] for t in times]))
+					  for stage in times[0].keys()])
+
+	tracemalloc.start()
+	try:
+		peakmem = run(track_memory=True)
+	finally:
+		tracemalloc.stop()
+
+	if len(time_dict) > 1:
+		time_dict.update({'total': sum(time_dict.values())})
+		peakmem.update({'total': max(peakmem.values())})
+
+	return time_dict, peakmem
+
+def benchmark_pipeline(group, group_suite, repeat, name_filter=None):
+	"""
+	Benchmark the stages of FEMA P58 or HAZUS assessments.
+
+	"""
+	if group == 'P58':
+		assessment_class, write_building = (FEMA_P58_Assessment,
+											write_P58_building)
+	else:
+		assessment_class, write_building = (HAZUS_Assessment,
+											write_HAZUS_building)
+
+	results = {}
+	for case in _pipeline_cases(group_suite):
+		name = _benchmark_name(group, case)
+		if (name_filter is not None) and (re.search(name_filter, name) is None):
+			continue
+
+		log_msg(name)
+		with tempfile.TemporaryDirectory() as temp_dir:
+			temp_dir = temp_dir.replace('\\', '/')
+			DL_path, EDP_path = write_building(temp_dir, **case)
+
+			def run(track_memory):
+				return _run_pipeline(assessment_class, DL_path, EDP_path,
+									 temp_dir, track_memory=track_memory)
+
+			time_dict, peakmem = _measure(run, repeat)
+
+		results.update({name: {'params': case, 'time': time_dict,
+							   'peakmem': peakmem}})
+		log_msg('\t{:.3f} s, {:.1f} MB'.format(time_dict['total'],
+											   peakmem['total'] / 2**20))
+
+	return results
+
+def _kernel_calls(kernel, param):
+	"""
+	Prepare the inputs of a kernel and return a function that calls it.
+
+	"""
+	if kernel in ['tmvn_rvs', 'tmvn_MLE', 'mvn_orthotope_density']:
+		dims = param
+		mu = np.ones(dims)
+		COV = np.full((dims, dims), 0.5 * 0.25)
+		np.fill_diagonal(COV, 0.25)
+		lower = np.zeros(dims)
+
+		if kernel == 'tmvn_rvs':
+			return lambda: tmvn_rvs(mu, COV, lower=lower, size=10000)
+
+		elif kernel == 'mvn_orthotope_density':
+			return lambda: mvn_orthotope_density(mu, COV, lower=lower)
+
+		else:
+			samples = tmvn_rvs(mu, COV, lower=lower, size=500).T
+			return lambda: tmvn_MLE(samples, tr_lower=lower)
+
+	elif kernel == 'DSG_given_EDP':
+		EDP_count = param
+		RV = RandomVariable(ID=1, dimension_tags=['DS1', 'DS2', 'DS3'],
+							distribution_kind='lognormal',
+							theta=[0.01, 0.02, 0.04],
+							COV=np.full((3, 3), 0.4 ** 2.))
+		RVS = RandomVariableSubset(RV=RV, tags=['DS1', 'DS2', 'DS3'])
+		FF = FragilityFunction(EDP_limit=RVS)
+		RVS.sample_distribution(EDP_count)
+		EDP = pd.Series(np.exp(np.random.normal(np.log(0.02), 0.6,
+												size=EDP_count)))
+		return lambda: FF.DSG_given_EDP(EDP)
+
+def benchmark_kernels(kernel_suite, repeat, name_filter=None):
+	"""
+	Benchmark the numerical kernels of the uq and model modules.
+
+	"""
+	results = {}
+	for kernel, kernel_params in kernel_suite.items():
+		param_name, param_list = list(kernel_params.items())[0]
+		for param in param_list:
+			name = _benchmark_name(kernel, {param_name: param})
+			if ((name_filter is not None) and
+				(re.search(name_filter, name) is None)):
+				continue
+
+			log_msg(name)
+			np.random.seed(42)
+			call_kernel = _kernel_calls(kernel, param)
+
+			def run(track_memory):
+				np.random.seed(42)
+				if track_memory:
+					tracemalloc.clear_traces()
+					call_kernel()
+					return {'call': tracemalloc.get_traced_memory()[1]}
+				else:
+					start = time.perf_counter()
+					call_kernel()
+					return {'call': time.perf_counter() - start}
+
+			time_dict, peakmem = _measure(run, repeat)
+
+			results.update({name: {'params': {param_name: param},
+								   'time': time_dict, 'peakmem': peakmem}})
+			log_msg('\t{:.5f} s, {:.2f} MB'.format(time_dict['call'],
+												   peakmem['call'] / 2**20))
+
+	return results
+
+def _environment():
+	"""
+	Describe the commit and the machine that the benchmarks run on.
+
+	"""
+	try:
+		commit = subprocess.run(
+			['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+			cwd=os.path.dirname(os.path.realpath(__file__))).stdout.strip()
+	except OSError:
+		commit = ''
+
+	import scipy
+
+	return {
+		'pelicun_version': pelicun.__version__,
+		'commit': commit if commit != '' else None,
+		'date': datetime.now().isoformat(timespec='seconds'),
+		'machine': {
+			'platform': platform.platform(),
+			'processor': platform.processor(),
+			'cpu_count': os.cpu_count(),
+			'python': platform.python_version(),
+			'numpy': np.__version__,
+			'pandas': pd.__version__,
+			'scipy': scipy.__version__}}
+
+def run_benchmarks(suite='quick', groups=None, repeat=3, name_filter=None):
+	"""
+	Run a benchmark suite and return the results.
+
+	Parameters
+	----------
+	suite: {'quick', 'full'}, default: 'quick'
+		Size of the benchmark suite.
+	groups: list of strings, optional
+		Run only these benchmark groups out of 'P58', 'HAZUS' and 'kernels'.
+	repeat: int, default: 3
+		Number of timed runs; the fastest one is reported.
+	name_filter: string, optional
+		Run only the benchmarks with names that match this regular expression.
+
+	Returns
+	-------
+	results: dict
+		Description of the environment and the results of the benchmarks.
+
+	"""
+	if groups is None:
+		groups = ['P58', 'HAZUS', 'kernels']
+
+	results = _environment()
+	results.update({'suite': suite, 'repeat': repeat, 'benchmarks': {}})
+
+	for group in groups:
+		if group == 'kernels':
+			results['benchmarks'].update(benchmark_kernels(
+				SUITES[suite][group], repeat, name_filter))
+		else:
+			results['benchmarks'].update(benchmark_pipeline(
+				group, SUITES[suite][group], repeat, name_filter))
+
+	return results
+
+def compare_results(old_path, new_path, threshold=0.1):
+	"""
+	Compare two result files and list the changes in time and peak memory.
+
+	Returns the number of measurements that got worse by more than the
+	threshold (e.g., 0.1 means 10%).
+
+	"""
+	with open(old_path, 'r') as f:
+		old = json.load(f)
+	with open(new_path, 'r') as f:
+		new = json.load(f)
+
+	if old['machine'] != new['machine']:
+		log_msg('WARNING The results come from different machines or '
+				'environments.')
+
+	log_msg('{:>8} {:>8}  {}'.format('time', 'peakmem', 'benchmark'))
+
+	regressions = 0
+	for name in sorted(set(old['benchmarks']) & set(new['benchmarks'])):
+		old_bm, new_bm = old['benchmarks'][name], new['benchmarks'][name]
+		for key in old_bm['time'].keys():
+			ratios = []
+			for measure in ['time', 'peakmem']:
+				old_val = old_bm[measure][key]
+				new_val = new_bm[measure].get(key, np.nan)
+				ratios.append(new_val / old_val if old_val > 0 else np.nan)
+
+			flag = ''
+			if np.nanmax(ratios) > 1. + threshold:
+				flag = ' (worse)'
+				regressions += 1
+			elif np.nanmax(ratios) < 1. / (1. + threshold):
+				flag = ' (better)'
+
+			log_msg('{:>8.2f} {:>8.2f}  {} {}{}'.format(
+				ratios[0], ratios[1], name,
+				'' if key in ['total', 'call'] else key, flag))
+
+	return regressions
+
+def main(args):
+
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--output', default = None,
+		help = 'JSON file for the results; benchmark_<commit>.json by '
+			   'default')
+	parser.add_argument('--suite', default = 'quick',
+		choices = list(SUITES.keys()))
+	parser.add_argument('--groups', default = None, nargs='+',
+		choices = ['P58', 'HAZUS', 'kernels'])
+	parser.add_argument('--filter', default = None,
+		help = 'Run only the benchmarks that match this regular expression')
+	parser.add_argument('--repeat', default = 3, type = int)
+	parser.add_argument('--compare', default = None, nargs=2,
+		metavar=('OLD', 'NEW'),
+		help = 'Compare two result files instead of running the benchmarks')
+	parser.add_argument('--threshold', default = 0.1, type = float)
+	args = parser.parse_args(args)
+
+	if args.compare is not None:
+		regressions = compare_results(*args.compare,
+									  threshold=args.threshold)
+		return 1 if regressions > 0 else 0
+
+	results = run_benchmarks(suite=args.suite, groups=args.groups,
+							 repeat=args.repeat, name_filter=args.filter)
+
+	output = args.output
+	if output is None:
+		output = 'benchmark_{}.json'.format(
+			(results['commit'] or 'unknown')[:8])
+
+	with open(output, 'w') as f:
+		json.dump(results, f, indent=2)
+
+	log_msg('Results saved in {}'.format(output))
+
+	return 0
+
+if __name__ == '__main__':
+
+	sys.exit(main(sys.argv[1:]))
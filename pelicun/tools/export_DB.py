@@ -41,7 +41,7 @@ import pandas as pd
 import sys, json, argparse
 from pathlib import Path
 
-from pelicun.db import convert_Series_to_dict
+from pelicun.db import convert_DataFrame_to_dicts
 
 def export_DB(data_path, target_dir):
 	data_path = Path(data_path).resolve()
@@ -55,12 +55,13 @@ def export_DB(data_path, target_dir):
 
 	DB_df = pd.read_hdf(data_path, 'data')
 
-	for row_id, row in DB_df.iterrows():
-	    
-	    row_dict = convert_Series_to_dict(row)
-	    
-	    with open(target_dir_data / f'{row_id}.json', 'w') as f:
-	        json.dump(row_dict, f, indent=2)
+	# the column labels are parsed once and applied to every row
+	DB_dicts = convert_DataFrame_to_dicts(DB_df)
+
+	for row_id, row_dict in DB_dicts.items():
+
+		with open(target_dir_data / f'{row_id}.json', 'w') as f:
+			json.dump(row_dict, f, indent=2)
 
 	# add population if it exists
 
@@ -68,12 +69,8 @@ def export_DB(data_path, target_dir):
 
 		DB_df = pd.read_hdf(data_path, 'pop')
 
-		pop_dict = {}
+		pop_dict = convert_DataFrame_to_dicts(DB_df)
 
-		for row_id, row in DB_df.iterrows():
-		    
-		    pop_dict.update({row_id: convert_Series_to_dict(row)})
-		    
 		with open(target_dir / 'population.json', 'w') as f:
 			json.dump(pop_dict, f, indent=2)
 
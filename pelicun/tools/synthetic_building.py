@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of pelicun.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# pelicun. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Adam Zsarnóczay
+
+"""
+Generate synthetic buildings to test and benchmark the assessment pipeline.
+
+The buildings are described by a DL input file and an EDP file that follow the
+SimCenter formats, hence they can be assessed with DL_calculation or with the
+Assessment classes directly. The size of the building is controlled by the
+number of stories, components, EDP directions and EDP samples. FEMA P58
+buildings use the component data of the test library and the population data
+bundled with pelicun; HAZUS buildings use the bundled HAZUS EQ (PGA) library.
+
+	python synthetic_building.py --dirnameOutput bldg --stories 10 \\
+		--components 20 --realizations 10000
+
+"""
+
+import sys, os, json, argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+from pelicun.base import pelicun_path
+
+# component data used as templates for the synthetic P58 components
+P58_COMPONENT_DIR = pelicun_path + '/tests/resources/DL data/json/'
+P58_COMPONENTS = ['T0001.001', 'T0002.001', 'T0002.002', 'T0003.001',
+				  'T0003.002', 'T0003.003', 'T0003.004', 'T0004.001',
+				  'T0004.002']
+P58_POPULATION = (pelicun_path +
+				  '/resources/data_sources/FEMA_P58_2nd_ed/population.json')
+
+HAZUS_EQ_LIBRARY = pelicun_path + '/resources/HAZUS_MH_2.1_EQ_eqv_PGA.hdf'
+
+def _write_EDP_file(EDP_path, EDP_medians, EDP_samples, beta, rho, seed):
+	"""
+	Sample correlated lognormal EDPs and save them in a dakotaTab file.
+
+	"""
+	EDP_names = list(EDP_medians.keys())
+	dims = len(EDP_names)
+
+	COV = np.full((dims, dims), rho * beta ** 2.)
+	np.fill_diagonal(COV, beta ** 2.)
+
+	rng = np.random.RandomState(seed)
+	samples = np.exp(rng.multivariate_normal(
+		np.log(list(EDP_medians.values())), COV, size=EDP_samples))
+
+	EDP_df = pd.DataFrame(samples, columns=EDP_names)
+	EDP_df.index.name = '%eval_id'
+	EDP_df.to_csv(EDP_path, sep=' ')
+
+def write_P58_building(output_dir, stories=3, components=4, directions=2,
+					   realizations=1000, EDP_samples=100, dependency=None,
+					   seed=0):
+	"""
+	Write the inputs of a synthetic FEMA P58 building.
+
+	Every story of the building has the same components. The components are
+	copies of the components in the test library with new IDs, so any number
+	of them can be used. Their data is saved in a components folder in the
+	output directory. Every component is assessed on every story in every
+	direction, half of them with uncertain quantities. The EDPs are peak
+	interstory drifts and peak floor accelerations sampled from a correlated
+	lognormal distribution.
+
+	Parameters
+	----------
+	output_dir: string
+		Folder where the input files are saved. It is created if needed.
+	stories: int, default: 3
+		Number of stories.
+	components: int, default: 4
+		Number of component types (Fragility Groups) in the building.
+	directions: {1, 2}, default: 2
+		Number of directions with EDPs and components.
+	realizations: int, default: 1000
+		Number of realizations in the assessment.
+	EDP_samples: int, default: 100
+		Number of EDP samples (i.e., simulations) in the EDP file.
+	dependency: string, optional
+		Dependency setting (e.g., 'btw. Performance Groups') applied to every
+		source of uncertainty. By default, the sources are independent and the
+		fragilities follow the ATC recommendation.
+	seed: int, default: 0
+		Seed of the EDP samples.
+
+	Returns
+	-------
+	DL_path, EDP_path: string
+		Location of the DL input and EDP files.
+
+	"""
+	if directions not in [1, 2]:
+		raise ValueError('Synthetic buildings have 1 or 2 directions.')
+
+	output_dir = os.path.abspath(output_dir).replace('\\', '/')
+	CMP_dir = output_dir + '/components/'
+	os.makedirs(CMP_dir, exist_ok=True)
+
+	CMP_data = {}
+	for c_i in range(components):
+		c_id = 'S{:04d}.001'.format(c_i + 1)
+		template = P58_COMPONENTS[c_i % len(P58_COMPONENTS)]
+
+		with open(P58_COMPONENT_DIR + template + '.json', 'r') as f:
+			DL_data = json.load(f)
+
+		DL_data['GeneralInformation']['ID'] = c_id
+		with open(CMP_dir + c_id + '.json', 'w') as f:
+			json.dump(DL_data, f, indent=2)
+
+		CMP_data.update({c_id: [
+			dict([
+				('location', '1-{}'.format(stories)),
+				('direction', str(dir_i + 1)),
+				('median_quantity', '100.0'),
+				('unit', 'ft2')] + (
+				[('distribution', 'lognormal'), ('cov', '0.2')]
+				if c_i % 2 else [('distribution', 'N/A')]))
+			for dir_i in range(directions)]})
+
+	DL_input = {
+		'GeneralInformation': {
+			'planArea': 100.0 * components,
+			'stories': stories,
+			'units': {'force': 'N', 'length': 'm', 'temperature': 'C',
+					  'time': 'sec'}},
+		'DamageAndLoss': {
+			'_method': 'FEMA P58',
+			'ResponseModel': {
+				'ResponseDescription': {
+					'EDP_Distribution': 'lognormal',
+					'BasisOfEDP_Distribution': 'all results',
+					'Realizations': str(realizations)}},
+			'DamageModel': {
+				'IrrepairableResidualDrift': {'Median': '10.',
+											  'Beta': '0.0001'},
+				'CollapseLimits': {'PID': '0.10'},
+				'CollapseProbability': {'Value': 'estimated',
+										'BasisOfEstimate': 'sampled EDP'}},
+			'LossModel': {
+				'ReplacementCost': str(1e6 * components * stories),
+				'ReplacementTime': str(1e3 * components * stories),
+				'DecisionVariables': {'Injuries': True,
+									  'ReconstructionCost': True,
+									  'ReconstructionTime': True,
+									  'RedTag': True},
+				'Inhabitants': {'OccupancyType': 'Commercial Office',
+								'PeakPopulation': str(10. * stories),
+								'PopulationDataFile': P58_POPULATION}},
+			'CollapseModes': [{'affected_area': '1.0',
+							   'injuries': '0.1, 0.9',
+							   'name': 'complete',
+							   'weight': '1.0'}],
+			'ComponentDataFolder': CMP_dir,
+			'Components': CMP_data}}
+
+	if dependency is not None:
+		DL_input['DamageAndLoss'].update({'Dependencies': dict([
+			(source, dependency) for source in [
+				'Quantities', 'Fragilities', 'Injuries',
+				'ReconstructionCosts', 'ReconstructionTimes',
+				'RedTagProbabilities']])})
+
+	DL_path = output_dir + '/DL_input.json'
+	with open(DL_path, 'w') as f:
+		json.dump(DL_input, f, indent=2)
+
+	# drifts decrease and accelerations increase along the height
+	EDP_medians = {}
+	for dir_i in range(1, directions + 1):
+		for loc in range(stories + 1):
+			EDP_medians.update({
+				'1-PFA-{}-{}'.format(loc, dir_i):
+					0.3 * 9.81 * (1. + loc / stories)})
+		for loc in range(1, stories + 1):
+			EDP_medians.update({
+				'1-PID-{}-{}'.format(loc, dir_i):
+					0.01 * (1.5 - 0.5 * loc / stories)})
+
+	EDP_path = output_dir + '/EDP.out'
+	_write_EDP_file(EDP_path, EDP_medians, EDP_samples, beta=0.4, rho=0.6,
+					seed=seed)
+
+	return DL_path, EDP_path
+
+def write_HAZUS_building(output_dir, components=1, structure_type='C1L',
+						 design_level='HC', realizations=1000,
+						 EDP_samples=100, dependency=None, seed=0):
+	"""
+	Write the inputs of a synthetic HAZUS earthquake building.
+
+	The components are taken from the bundled HAZUS EQ library with
+	PGA-based fragilities. A real building has one structural component; the
+	synthetic one gets the structural components of the given structure type
+	and design level for the first few occupancies in the library. The EDP is
+	the PGA at the building site.
+
+	Parameters
+	----------
+	output_dir: string
+		Folder where the input files are saved. It is created if needed.
+	components: int, default: 1
+		Number of components.
+	structure_type: string, default: 'C1L'
+		HAZUS structure type.
+	design_level: {'HC', 'MC', 'LC', 'PC'}, default: 'HC'
+		HAZUS seismic design level.
+	realizations: int, default: 1000
+		Number of realizations in the assessment.
+	EDP_samples: int, default: 100
+		Number of EDP samples (i.e., simulations) in the EDP file.
+	dependency: string, optional
+		Dependency setting (e.g., 'btw. Performance Groups') applied to the
+		fragilities.
+	seed: int, default: 0
+		Seed of the EDP samples.
+
+	Returns
+	-------
+	DL_path, EDP_path: string
+		Location of the DL input and EDP files.
+
+	"""
+	output_dir = os.path.abspath(output_dir).replace('\\', '/')
+	os.makedirs(output_dir, exist_ok=True)
+
+	prefix = 'S-{}-{}-'.format(structure_type, design_level)
+	c_ids = [c_id for c_id in
+			 pd.read_hdf(HAZUS_EQ_LIBRARY, 'data').index.values
+			 if c_id.startswith(prefix)]
+
+	if len(c_ids) < components:
+		raise ValueError(
+			'The HAZUS library has only {} components for {} '
+			'buildings.'.format(len(c_ids), prefix[:-1]))
+
+	CMP_data = dict([(c_id, [{'location': '1',
+							  'direction': '1',
+							  'median_quantity': '1.0',
+							  'unit': 'ea',
+							  'distribution': 'N/A'}])
+					 for c_id in c_ids[:components]])
+
+	DL_input = {
+		'GeneralInformation': {
+			'planArea': 100.0,
+			'stories': 1,
+			'units': {'force': 'N', 'length': 'm', 'temperature': 'C',
+					  'time': 'sec'}},
+		'DamageAndLoss': {
+			'_method': 'HAZUS MH EQ IM',
+			'DamageModel': {'StructureType': structure_type,
+							'DesignLevel': design_level},
+			'LossModel': {
+				'DecisionVariables': {'ReconstructionCost': True,
+									  'ReconstructionTime': True,
+									  'Injuries': True},
+				'Inhabitants': {'OccupancyType': 'RES1',
+								'PeakPopulation': '5.0',
+								'PopulationDataFile': HAZUS_EQ_LIBRARY},
+				'ReplacementCost': 100.0,
+				'ReplacementTime': 50.0},
+			'ResponseModel': {
+				'ResponseDescription': {'Realizations': realizations,
+										'CoupledAssessment': False},
+				'AdditionalUncertainty': {'GroundMotion': '0.10',
+										  'Modeling': '0.20'}},
+			'ComponentDataFolder': HAZUS_EQ_LIBRARY,
+			'Components': CMP_data}}
+
+	if dependency is not None:
+		DL_input['DamageAndLoss'].update({
+			'Dependencies': {'Fragilities': dependency}})
+
+	DL_path = output_dir + '/DL_input.json'
+	with open(DL_path, 'w') as f:
+		json.dump(DL_input, f, indent=2)
+
+	EDP_path = output_dir + '/EDP.out'
+	_write_EDP_file(EDP_path, {'1-PGA-1-1': 0.3, '1-PGA-1-2': 0.3},
+					EDP_samples, beta=0.6, rho=0.8, seed=seed)
+
+	return DL_path, EDP_path
+
+def main(args):
+
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--dirnameOutput', default = '.')
+	parser.add_argument('--DL_Method', default = 'FEMA P58',
+		choices = ['FEMA P58', 'HAZUS MH EQ IM'])
+	parser.add_argument('--stories', default = 3, type = int)
+	parser.add_argument('--components', default = None, type = int)
+	parser.add_argument('--directions', default = 2, type = int)
+	parser.add_argument('--realizations', default = 1000, type = int)
+	parser.add_argument('--EDP_samples', default = 100, type = int)
+	parser.add_argument('--dependency', default = None)
+	parser.add_argument('--seed', default = 0, type = int)
+	args = parser.parse_args(args)
+
+	if args.DL_Method == 'FEMA P58':
+		paths = write_P58_building(
+			args.dirnameOutput, stories = args.stories,
+			components = 4 if args.components is None else args.components,
+			directions = args.directions, realizations = args.realizations,
+			EDP_samples = args.EDP_samples, dependency = args.dependency,
+			seed = args.seed)
+	else:
+		paths = write_HAZUS_building(
+			args.dirnameOutput,
+			components = 1 if args.components is None else args.components,
+			realizations = args.realizations,
+			EDP_samples = args.EDP_samples, dependency = args.dependency,
+			seed = args.seed)
+
+	print('\n'.join(paths))
+
+	return 0
+
+if __name__ == '__main__':
+
+	sys.exit(main(sys.argv[1:]))
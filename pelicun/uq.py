@@ -51,6 +51,8 @@ quantification in pelicun.
     tmvn_rvs
     mvn_orthotope_density
     tmvn_MLE
+    mutually_exclusive_rvs
+    simultaneous_rvs
 
 
 """
@@ -58,12 +60,48 @@ quantification in pelicun.
 from .base import *
 
 import warnings
-from scipy.stats import norm, truncnorm, multivariate_normal, multinomial
-from scipy.stats.mvn import mvndst
-from scipy.optimize import minimize, differential_evolution
 from copy import deepcopy
 
-def tmvn_rvs(mu, COV, lower=None, upper=None, size=1):
+# scipy is imported in the functions that use it; importing scipy.stats and
+# scipy.optimize takes most of the time needed to import pelicun
+
+def _cholesky(COV):
+    """
+    Factor a covariance matrix into L such that L L^T = COV.
+
+    The lower triangular Cholesky factor is returned for positive definite
+    matrices. Covariance matrices of perfectly correlated variables are only
+    positive semi-definite; their factor is calculated from the eigenvalue
+    decomposition instead.
+
+    """
+    COV = np.asarray(COV, dtype=np.float64)
+    if COV.ndim < 2:
+        COV = np.diag(np.atleast_1d(COV))
+
+    try:
+        return np.linalg.cholesky(COV)
+    except np.linalg.LinAlgError:
+        eig_vals, eig_vecs = np.linalg.eigh(COV)
+        return eig_vecs * np.sqrt(np.maximum(eig_vals, 0.))
+
+def _mvn_rvs(mu, COV_chol, size):
+    """
+    Sample an MVN distribution using a factor of its covariance matrix.
+
+    The output has the same shape as that of scipy's multivariate_normal.rvs.
+
+    """
+    samples = mu + np.random.standard_normal(
+        size=(size, len(mu))) @ COV_chol.T
+
+    samples = samples.squeeze()
+    if samples.ndim == 0:
+        samples = samples[()]
+
+    return samples
+
+def tmvn_rvs(mu, COV, lower=None, upper=None, size=1, COV_chol=None):
     """
     Sample a truncated MVN distribution.
 
@@ -96,6 +134,10 @@ def tmvn_rvs(mu, COV, lower=None, upper=None, size=1):
         (i.e. numpy.inf) to those dimensions.
     size: int
         Number of samples requested.
+    COV_chol: float ndarray, optional, default: None
+        Cholesky factor of the covariance matrix (see RandomVariable.COV_chol).
+        Provide it to avoid factoring the same matrix every time the
+        distribution is sampled.
 
     Returns
     -------
@@ -103,16 +145,18 @@ def tmvn_rvs(mu, COV, lower=None, upper=None, size=1):
         Samples generated from the truncated distribution.
 
     """
-
     mu = np.asarray(mu)
     if mu.shape == ():
         mu = np.asarray([mu])
         COV = np.asarray([COV])
 
+    if COV_chol is None:
+        COV_chol = _cholesky(COV)
+
     # if there are no bounds, simply sample an MVN distribution
     if lower is None and upper is None:
 
-        samples = multivariate_normal.rvs(mean=mu, cov=COV, size=size)
+        samples = _mvn_rvs(mu, COV_chol, size)
 
     else:
         # first, get the rejection rate
@@ -160,8 +204,7 @@ def tmvn_rvs(mu, COV, lower=None, upper=None, size=1):
                 req_samples = max(int(1.1*(size-sample_count)/alpha), 2)
 
                 # generate the raw samples
-                raw_samples = multivariate_normal.rvs(mu, COV,
-                                                      size=req_samples)
+                raw_samples = _mvn_rvs(mu, COV_chol, req_samples)
 
                 # remove the samples that are outside the truncation limits
                 good_ones = np.all([raw_samples>lower, raw_samples<upper],
@@ -223,6 +266,7 @@ def mvn_orthotope_density(mu, COV, lower=None, upper=None):
         Estimate of the error in alpha.
 
     """
+    from scipy.stats.mvn import mvndst
 
     # process the inputs and get the number of dimensions
     mu = np.asarray(mu)
@@ -342,6 +386,8 @@ def tmvn_MLE(samples,
         case.
 
     """
+    from scipy.stats import multivariate_normal
+    from scipy.optimize import minimize, differential_evolution
 
     verbose = False
     if verbose:
@@ -814,6 +860,103 @@ def tmvn_MLE(samples,
     return mu, COV
 
 
+def mutually_exclusive_rvs(weights, size=1, random_state=None):
+    """
+    Sample one of a set of mutually exclusive events in each realization.
+
+    Every realization uses a single uniform random number that is located
+    among the cumulative weights of the events.
+
+    Parameters
+    ----------
+    weights: float ndarray
+        The probability of each event. The weights are normalized by their
+        sum.
+    size: int
+        Number of samples requested.
+    random_state: RandomState, optional
+        The source of the random numbers. The global random state of numpy
+        is used by default.
+
+    Returns
+    -------
+    samples: int ndarray
+        The zero-based index of the event that occurs in each realization.
+
+    """
+    if random_state is None:
+        random_state = np.random
+
+    weights = np.asarray(weights, dtype=np.float64)
+    if np.any(weights < 0.) or (np.sum(weights) <= 0.):
+        raise ValueError(
+            "The weights of mutually exclusive events shall be non-negative "
+            "and at least one of them shall be positive.")
+
+    cdf = np.cumsum(weights)
+    cdf = cdf / cdf[-1]
+
+    samples = np.searchsorted(cdf, random_state.uniform(size=size),
+                              side='right')
+
+    return np.minimum(samples, len(weights) - 1)
+
+def simultaneous_rvs(weights, size=1, random_state=None):
+    """
+    Sample a set of independent events conditioned on at least one of them
+    occurring.
+
+    The events are sampled one after the other. Until an event occurs in a
+    realization, the probability of the next event is conditioned on at least
+    one of the remaining events occurring; after that, the events are
+    independent. This yields samples from the conditional distribution
+    without rejecting any of them.
+
+    Parameters
+    ----------
+    weights: float ndarray
+        The probability of each event. Weights above 1 are treated as 1.
+    size: int
+        Number of samples requested.
+    random_state: RandomState, optional
+        The source of the random numbers. The global random state of numpy
+        is used by default.
+
+    Returns
+    -------
+    samples: bool ndarray
+        Identifies the events (columns) that occur in each realization (rows).
+
+    """
+    if random_state is None:
+        random_state = np.random
+
+    weights = np.asarray(weights, dtype=np.float64)
+    if np.any(weights < 0.) or np.all(weights == 0.):
+        raise ValueError(
+            "The probabilities of simultaneous events shall be non-negative "
+            "and at least one of them shall be positive.")
+    weights = np.minimum(weights, 1.)
+
+    # probability that at least one of the events from the i-th on occurs;
+    # log1p and expm1 keep the precision of probabilities below the machine
+    # epsilon that would be lost in 1 - w
+    with np.errstate(divide='ignore', invalid='ignore'):
+        P_tail = -np.expm1(np.cumsum(np.log1p(-weights)[::-1])[::-1])
+
+        P_first = np.where(P_tail > 0., weights / P_tail, 0.)
+
+    U = random_state.uniform(size=(size, len(weights)))
+
+    samples = np.zeros((size, len(weights)), dtype=bool)
+    none_yet = np.ones(size, dtype=bool)
+    for i, w in enumerate(weights):
+        samples[:, i] = U[:, i] < np.where(none_yet, P_first[i], w)
+        none_yet &= ~samples[:, i]
+
+    return samples
+
+
 class RandomVariable(object):
     """
     Characterizes a Random Variable (RV) that represents a source of
@@ -920,6 +1063,7 @@ class RandomVariable(object):
         self._ID = ID
 
         self._dimension_tags = np.asarray(dimension_tags)
+        self._tag_positions = None
 
         if raw_data is not None:
             raw_data = np.atleast_1d(raw_data)
@@ -953,6 +1097,7 @@ class RandomVariable(object):
             if COV is not None:
                 COV = np.asarray(COV)
             self._COV = COV
+            self._COV_chol = None
 
             self._corr_ref = np.asarray(corr_ref)
 
@@ -969,6 +1114,7 @@ class RandomVariable(object):
         else:
             self._theta = None
             self._COV = None
+            self._COV_chol = None
             self._corr_ref = corr_ref
             self._p_set = None
             self._tr_limits_pre = self._convert_limits(None)
@@ -1198,6 +1344,18 @@ class RandomVariable(object):
                 "this random variable is not yet specified."
             )
 
+    @property
+    def COV_chol(self):
+        """
+        Return the Cholesky factor of the covariance matrix. The factor is
+        calculated on first use and kept with the random variable (and with
+        compiled loss models), so that the matrix is factored only once.
+        """
+        if self._COV_chol is None:
+            self._COV_chol = _cholesky(self.COV)
+
+        return self._COV_chol
+
     @property
     def corr(self):
         """
@@ -1251,6 +1409,34 @@ class RandomVariable(object):
         # this is very simple for now
         return self._dimension_tags
 
+    def dimension_positions(self, tags):
+        """
+        Return the positions of the dimensions identified by their tags.
+
+        The positions are collected in a registry when the first tag is
+        requested, so subsequent lookups do not need to search the tags.
+
+        Parameters
+        ----------
+        tags: str, int, or list of str or int
+            Tags among the `dimension_tags` of the RV.
+
+        Returns
+        -------
+        positions: int or list of int
+            The position of each tag among the dimensions of the RV. A single
+            tag returns a single position.
+        """
+        if self._tag_positions is None:
+            self._tag_positions = dict([
+                (tag, pos) for pos, tag in
+                enumerate(np.atleast_1d(self._dimension_tags))])
+
+        if np.ndim(tags) == 0:
+            return self._tag_positions[tags]
+        else:
+            return [self._tag_positions[tag] for tag in tags]
+
     @property
     def detection_limits(self):
         """
@@ -1474,6 +1660,7 @@ class RandomVariable(object):
         # store and return the parameters
         self._theta = theta
         self._COV = COV
+        self._COV_chol = None
         self._corr_ref = 'pre'
         #TODO: implement 'post' corr_ref as an option for fitting
 
@@ -1518,6 +1705,7 @@ class RandomVariable(object):
             Samples generated from the distribution. Columns correspond to the
             dimension tags that identify the variables.
         """
+        from scipy.stats import norm, truncnorm, multinomial
 
         if (not preserve_order) and (self._distribution_kind is not None):
             if ((self._distribution_kind.shape == ()) and
@@ -1536,7 +1724,8 @@ class RandomVariable(object):
                 raw_samples = tmvn_rvs(mu=self.mu, COV=self.COV,
                                        lower=self.tr_lower_pre,
                                        upper=self.tr_upper_pre,
-                                       size=sample_size)
+                                       size=sample_size,
+                                       COV_chol=self.COV_chol)
                 raw_samples = np.transpose(raw_samples)
 
                 # enforce post-truncation correlations if needed
@@ -1604,6 +1793,82 @@ class RandomVariable(object):
 
         return self._samples
 
+    def log_pdf(self, values):
+        """
+        Evaluate the logarithm of the probability density function.
+
+        The density is evaluated in linear space, i.e., the Jacobian of the
+        log transformation is considered for lognormal dimensions. Pre-defined
+        `pre` truncation limits are taken into consideration by assigning zero
+        density to points outside the limits and normalizing the density by
+        the probability enclosed by the limits. This is the basis of the
+        likelihood ratios used for importance sampling.
+
+        Parameters
+        ----------
+        values: float ndarray
+            Points where the density is evaluated. A 2D array is expected with
+            rows corresponding to points and columns corresponding to the
+            dimensions of the random variable (i.e., the layout of the samples
+            DataFrame).
+
+        Returns
+        -------
+        log_f: float ndarray
+            Logarithm of the probability density at each point.
+        """
+        from scipy.stats import multivariate_normal
+
+        if ((self._distribution_kind is None) or
+            ((self._distribution_kind.shape == ()) and
+             (self._distribution_kind == 'multinomial'))):
+            raise ValueError(
+                "The probability density can only be evaluated for normal "
+                "and lognormal distributions.")
+
+        if self.tr_limits_post is not None:
+            raise ValueError(
+                "Evaluating the probability density of distributions with "
+                "post-truncation correlations is not supported.")
+
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values.reshape(-1, self._ndim)
+
+        # move the data to log space for the lognormal dimensions
+        data = self._move_to_log(np.transpose(values).copy(),
+                                 self._distribution_kind)
+        data = np.atleast_2d(data)
+
+        mu = np.atleast_1d(self.mu)
+        COV = np.atleast_2d(self.COV)
+
+        log_f = np.atleast_1d(multivariate_normal.logpdf(
+            np.transpose(data), mean=mu, cov=COV, allow_singular=True))
+
+        # consider the Jacobian of the log transformation
+        dist_list = self._distribution_kind
+        if dist_list.shape == ():
+            dist_list = np.asarray([dist_list, ] * self._ndim)
+        for dim, dk in enumerate(dist_list):
+            if dk == 'lognormal':
+                log_f = log_f - data[dim]
+
+        # consider the truncation limits
+        if self.tr_limits_pre is not None:
+            lower = np.atleast_1d(self.tr_lower_pre)
+            upper = np.atleast_1d(self.tr_upper_pre)
+
+            inside = np.all([np.all(np.transpose(data) > lower, axis=1),
+                             np.all(np.transpose(data) < upper, axis=1)],
+                            axis=0)
+            log_f[~inside] = -np.inf
+
+            alpha, __ = mvn_orthotope_density(mu, COV, lower, upper)
+            log_f = log_f - np.log(alpha)
+
+        return log_f
+
     def orthotope_density(self, lower=None, upper=None):
         """
         Estimate the probability density within an orthotope for a TMVN distr.
@@ -1638,6 +1903,8 @@ class RandomVariable(object):
             Estimate of the error in alpha.
 
         """
+        from scipy.stats import norm, truncnorm
+
         # get the orthotope density within the truncation limits
         if (self.tr_lower_pre is None) and (self.tr_upper_pre is None):
             alpha_0 = 1.
@@ -1702,10 +1969,13 @@ class RandomVariableSubset(object):
         the RV.
     """
 
+    __slots__ = ['_RV', '_tags', '_positions']
+
     def __init__(self, RV, tags):
 
         self._RV = RV
         self._tags = tags
+        self._positions = None
 
     @property
     def tags(self):
@@ -1716,6 +1986,18 @@ class RandomVariableSubset(object):
         # this is very simple for now
         return self._tags
 
+    @property
+    def positions(self):
+        """
+        Return the positions of the components in the RV subset among the
+        dimensions of the RV.
+
+        """
+        if self._positions is None:
+            self._positions = self._RV.dimension_positions(self._tags)
+
+        return self._positions
+
     @property
     def samples(self):
         """
@@ -1726,7 +2008,7 @@ class RandomVariableSubset(object):
         samples = self._RV.samples
 
         if samples is not None:
-            return samples[self._tags]
+            return samples.iloc[:, self.positions]
         else:
             return None
 
@@ -1755,7 +2037,7 @@ class RandomVariableSubset(object):
         """
         samples = self._RV.sample_distribution(sample_size, preserve_order)
 
-        return samples[self._tags]
+        return samples.iloc[:, self.positions]
 
     def orthotope_density(self, lower=None, upper=None):
         """
@@ -1790,13 +2072,9 @@ class RandomVariableSubset(object):
             Estimate of the error in alpha.
         """
 
-        # get the dimension tags from the parent RV and find the ones that
-        # define this RVS
-        dtags = self._RV.dimension_tags
-        if dtags.size == 1:
-            dtags = [dtags]
-        sorter = np.argsort(dtags)
-        tag_ids = sorter[np.searchsorted(dtags, self._tags, sorter=sorter)]
+        # find the dimensions of the parent RV that define this RVS
+        dtags = np.atleast_1d(self._RV.dimension_tags)
+        tag_ids = self.positions
 
         # prepare the limit vectors and assign the limits to the appropriate
         # dimensions